@@ -20,6 +20,10 @@ extensions = [
         name="flight_profiler.ext.trace_profile_C",
         sources=["csrc/trace/trace_profile.c"],
     ),
+    Extension(
+        name="flight_profiler.ext.wire_format_C",
+        sources=["csrc/wire/wire_format.c"],
+    ),
 ]
 
 
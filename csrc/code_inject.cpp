@@ -9,6 +9,7 @@
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
+#include <unistd.h>
 static char filename[FILENAME_MAX] = "";
 static char take_gil_literal[9] = "take_gil";
 static int py_injected = 0;
@@ -251,8 +252,14 @@ void inject_inner() {
 
   get_parent_directory(so_path_modify);
   char params_path[PATH_MAX]; // Make sure the buffer is large enough
-  snprintf(params_path, sizeof(params_path), "%s/inject_params.data",
-           so_path_modify);
+  // per-pid params allow attaching several processes concurrently, the shared
+  // file is used when pid differs from the one seen by client (pid namespace)
+  snprintf(params_path, sizeof(params_path), "%s/inject_params_%d.data",
+           so_path_modify, (int)getpid());
+  if (access(params_path, R_OK) != 0) {
+    snprintf(params_path, sizeof(params_path), "%s/inject_params.data",
+             so_path_modify);
+  }
 
   FILE *file;
   char py_code[PATH_MAX];
@@ -3,6 +3,7 @@
 #include <float.h>
 #include <frameobject.h>
 #include <stdio.h>
+#include <stdlib.h>
 #include <structmember.h>
 #include <sys/time.h>
 
@@ -28,103 +29,141 @@ static PyCodeObject *_code_from_frame(PyFrameObject *frame) {
 #endif
 }
 
-static PyObject *_get_frame_info(PyFrameObject *frame, Py_ssize_t start_ns,
-                                 Py_ssize_t cost_ns, Py_ssize_t pid,
-                                 PyObject *arg, int c_frame) {
+/**
+ * 'name\x00file\x00line' header of a python function or a c function, built
+ * once per code object or c function, see TraceProfiler_Describe.
+ */
+static PyObject *_get_header(PyCodeObject *code, int c_frame, PyObject *arg) {
   if (c_frame) {
     PyObject *qualname = PyObject_GetAttrString(arg, "__qualname__");
     if (!qualname) {
+      PyErr_Clear();
       qualname = PyObject_GetAttrString(arg, "__name__");
     }
-    PyObject *result = PyUnicode_FromFormat("%U%c%s%c%i%c%lld%c%lld%c%lld",
-                                            qualname, 0, "<built-in>", 0, 0, 1,
-                                            start_ns, 1, cost_ns, 1, pid);
-    Py_XDECREF(qualname);
-    return result;
-  } else {
-    PyCodeObject *code = _code_from_frame(frame);
-    PyObject *result = PyUnicode_FromFormat(
-        "%U%c%U%c%i%c%lld%c%lld%c%lld", code->co_name, 0, code->co_filename, 0,
-        code->co_firstlineno, 1, start_ns, 1, cost_ns, 1, pid);
-    Py_XDECREF(code);
-    return result;
-  }
-}
-
-static PyObject *_get_header(PyFrameObject *frame, int c_frame, PyObject *arg) {
-  if (c_frame) {
-    PyObject *qualname = PyObject_GetAttrString(arg, "__qualname__");
     if (!qualname) {
-      qualname = PyObject_GetAttrString(arg, "__name__");
+      PyErr_Clear();
+      return PyUnicode_FromFormat("%s%c%s%c%i", Py_TYPE(arg)->tp_name, 0,
+                                  "<built-in>", 0, 0);
     }
     PyObject *result =
-        PyUnicode_FromFormat("%U%c%s%c%i", qualname, 0, "<built-in>", 0, 0);
-    Py_XDECREF(qualname);
+        PyUnicode_FromFormat("%S%c%s%c%i", qualname, 0, "<built-in>", 0, 0);
+    Py_DECREF(qualname);
     return result;
   } else {
-    PyCodeObject *code = _code_from_frame(frame);
-    PyObject *result =
-        PyUnicode_FromFormat("%U%c%U%c%i", code->co_name, 0, code->co_filename,
-                             0, code->co_firstlineno);
-    Py_XDECREF(code);
-    return result;
+    return PyUnicode_FromFormat("%U%c%U%c%i", code->co_name, 0,
+                                code->co_filename, 0, code->co_firstlineno);
   }
 }
 
-static PyObject *build_context_switch_frame(Py_ssize_t start_ns,
-                                            Py_ssize_t cost_ns,
-                                            Py_ssize_t pid) {
-  PyObject *result =
-      PyUnicode_FromFormat("%s%c%c%i%c%lld%c%lld%c%lld", "[await]", 0, 0, 0, 1,
-                           start_ns, 1, cost_ns, 1, pid);
-  return result;
-}
-
-static PyObject *build_last_async_frame(PyObject *frame_desp,
-                                        Py_ssize_t start_ns, Py_ssize_t cost_ns,
-                                        Py_ssize_t pid) {
-  PyObject *result = PyUnicode_FromFormat("%U%c%lld%c%lld%c%lld", frame_desp, 1,
-                                          start_ns, 1, cost_ns, 1, pid);
-  return result;
+static int _grow_array(void **items, Py_ssize_t *capacity, Py_ssize_t size,
+                       size_t item_size) {
+  if (size < *capacity) {
+    return 0;
+  }
+  Py_ssize_t new_capacity = *capacity > 0 ? *capacity * 2 : 64;
+  void *new_items = PyMem_Realloc(*items, new_capacity * item_size);
+  if (new_items == NULL) {
+    return -1;
+  }
+  *items = new_items;
+  *capacity = new_capacity;
+  return 0;
 }
 
 ///////////////////
 // TraceProfiler //
 ///////////////////
+
+// descriptor of context switch frames of coroutines
+#define AWAIT_DESCRIPTOR 0
+#define NO_DESCRIPTOR -1
+
 typedef struct {
   PyObject_HEAD PyObject *prev; // LinkedList FrameNode
   PyObject *succ;
   Py_ssize_t start_ns;
   Py_ssize_t offset; // target frameNode in sending frame offset
 
-  PyObject *frame_desp;
-  PyObject *frame_id;
+  Py_ssize_t desc;   // descriptor of coroutine frames
+  void *frame_id;    // coroutine frame, compared by address only
   PyObject *enter_timestamp;
 } FrameNode;
 
+// children dropped to keep a profiler within its budget, sent as one
+// '[elided]' frame below their parent
+typedef struct {
+  Py_ssize_t count; // elided frames, including descendants
+  long long start_ns;
+  long long cost_ns; // cost of elided children, descendants are covered
+} ElidedFrames;
+
+// frame of sync profiler stack
+typedef struct {
+  long long start_ns;
+  Py_ssize_t offset; // offset in sending frames, -1 for root
+  ElidedFrames elided;
+} StackFrame;
+
+// frame ready to be sent, written into binary record or materialized as
+// 'desp\x01start_ns\x01cost_ns\x01pid' only in TraceProfiler_SendTraceFrames
+typedef struct {
+  Py_ssize_t desc; // index of descriptors, NO_DESCRIPTOR sends None
+  long long start_ns;
+  long long cost_ns;
+  Py_ssize_t pid;
+  ElidedFrames elided;
+} SendingFrame;
+
+// estimated bytes of a sent frame besides its descriptor: the struct, the
+// list slot and the string object with timestamps
+#define SENDING_FRAME_BYTES                                                    \
+  (sizeof(SendingFrame) + sizeof(PyObject *) + sizeof(PyASCIIObject) + 48)
+
+// code object or (c function def, self type) of an interned descriptor
+typedef struct {
+  void *key;
+  void *scope;
+  Py_ssize_t desc;
+} DescriptorSlot;
+
 typedef struct trace_profiler {
   PyObject_HEAD PyObject *target; // output message to client callable target
-  PyObject *on_sending_frame;     // frames that ready to be sent
   PyObject *out_queue;            // sending queue
-  FrameNode *top;                 // frame stack top
+  FrameNode *top;                 // frame stack top of async profiler
+  StackFrame *stack;              // frame stack of sync profiler
+  Py_ssize_t stack_size;
+  Py_ssize_t stack_capacity;
+  SendingFrame *sending;          // frames that ready to be sent
+  Py_ssize_t sending_size;
+  Py_ssize_t sending_capacity;
+  PyObject *descriptors;          // interned headers, indexed by desc
+  PyObject *descriptor_owners;    // keeps keys of slots alive
+  DescriptorSlot *slots;          // open addressing table of descriptors
+  Py_ssize_t slot_capacity;
   Py_ssize_t sf_sz;               // sending frame size
   Py_ssize_t is_async;            // async function
   long long interval;             // interval
   Py_ssize_t current_depth;       // current top depth
   Py_ssize_t depth_limit;         // depth limit
+  Py_ssize_t max_frames;          // frames budget, 0 is unlimited
+  Py_ssize_t max_bytes;           // estimated bytes budget, 0 is unlimited
+  Py_ssize_t retained_frames;     // frames in sending frames
+  Py_ssize_t retained_bytes;      // estimated bytes of frames and descriptors
+  long long elide_ns;             // sync frames cheaper than this are elided
+  ElidedFrames elided;            // async frames dropped beyond budget
+  int encoded;                    // frames sent as binary frame section
 } TraceProfiler;
 
 static void TraceProfiler_Dealloc(TraceProfiler *self) {
-  if (!self->is_async) {
-    FrameNode *top_frame = (FrameNode *)self->top;
-    self->top = (FrameNode *)top_frame->prev;
-    Py_DECREF(top_frame);
-  }
   Py_XDECREF(self->top);
   self->top = NULL;
-  Py_DECREF(self->on_sending_frame);
-  Py_DECREF(self->target);
-  Py_DECREF(self->out_queue);
+  PyMem_Free(self->stack);
+  PyMem_Free(self->sending);
+  PyMem_Free(self->slots);
+  Py_DECREF(self->descriptors);
+  Py_DECREF(self->descriptor_owners);
+  Py_XDECREF(self->target);
+  Py_XDECREF(self->out_queue);
   Py_TYPE(self)->tp_free(self);
 }
 
@@ -132,8 +171,6 @@ static void FrameNode_Dealloc(FrameNode *self) {
   self->prev = NULL;
   Py_XDECREF(self->succ);
   Py_XDECREF(self->enter_timestamp);
-  Py_XDECREF(self->frame_id);
-  Py_XDECREF(self->frame_desp);
   Py_TYPE(self)->tp_free(self);
 }
 
@@ -236,12 +273,272 @@ static FrameNode *FrameNode_New() {
   FrameNode *node = PyObject_New(FrameNode, &FrameNode_Type);
   node->prev = NULL;
   node->succ = PyList_New(0);
-  node->frame_desp = NULL;
+  node->desc = NO_DESCRIPTOR;
   node->enter_timestamp = PyList_New(0);
   node->frame_id = NULL;
   return node;
 }
 
+static size_t _descriptor_hash(void *key, void *scope) {
+  size_t hash = ((size_t)key >> 4) ^ ((size_t)scope >> 3);
+  return hash * (size_t)0x9E3779B97F4A7C15ULL;
+}
+
+static int TraceProfiler_GrowSlots(TraceProfiler *self) {
+  Py_ssize_t capacity = self->slot_capacity > 0 ? self->slot_capacity * 2 : 64;
+  DescriptorSlot *slots = PyMem_Calloc(capacity, sizeof(DescriptorSlot));
+  if (slots == NULL) {
+    return -1;
+  }
+  for (Py_ssize_t i = 0; i < self->slot_capacity; i++) {
+    DescriptorSlot *slot = &self->slots[i];
+    if (slot->key == NULL) {
+      continue;
+    }
+    size_t idx = _descriptor_hash(slot->key, slot->scope) & (capacity - 1);
+    while (slots[idx].key != NULL) {
+      idx = (idx + 1) & (capacity - 1);
+    }
+    slots[idx] = *slot;
+  }
+  PyMem_Free(self->slots);
+  self->slots = slots;
+  self->slot_capacity = capacity;
+  return 0;
+}
+
+/**
+ * index of the interned header of a python function or c function, the header
+ * is built by the first frame of each code object. c functions are keyed by
+ * method def and type of self, as a bound method is created per access.
+ */
+static Py_ssize_t TraceProfiler_Describe(TraceProfiler *self,
+                                         PyCodeObject *code, int c_frame,
+                                         PyObject *arg) {
+  PyObject *owner = c_frame ? arg : (PyObject *)code;
+  void *key = owner;
+  void *scope = NULL;
+  if (c_frame && PyCFunction_Check(arg)) {
+    PyObject *bound = PyCFunction_GET_SELF(arg);
+    key = ((PyCFunctionObject *)arg)->m_ml;
+    if (bound != NULL) {
+      scope = PyType_Check(bound) ? bound : (PyObject *)Py_TYPE(bound);
+    }
+  }
+  if (self->slot_capacity > 0) {
+    size_t mask = self->slot_capacity - 1;
+    size_t idx = _descriptor_hash(key, scope) & mask;
+    while (self->slots[idx].key != NULL) {
+      DescriptorSlot *slot = &self->slots[idx];
+      if (slot->key == key && slot->scope == scope) {
+        return slot->desc;
+      }
+      idx = (idx + 1) & mask;
+    }
+  }
+
+  // keep load factor below 2/3
+  Py_ssize_t desc = PyList_GET_SIZE(self->descriptors);
+  if ((desc + 1) * 3 >= self->slot_capacity * 2 &&
+      TraceProfiler_GrowSlots(self) < 0) {
+    PyErr_Clear();
+    return NO_DESCRIPTOR;
+  }
+  PyObject *header = _get_header(code, c_frame, arg);
+  if (header == NULL || PyList_Append(self->descriptors, header) < 0 ||
+      PyList_Append(self->descriptor_owners, owner) < 0) {
+    PyErr_Clear();
+    Py_XDECREF(header);
+    return NO_DESCRIPTOR;
+  }
+  self->retained_bytes += sizeof(PyASCIIObject) + PyUnicode_GET_LENGTH(header);
+  Py_DECREF(header);
+  size_t mask = self->slot_capacity - 1;
+  size_t idx = _descriptor_hash(key, scope) & mask;
+  while (self->slots[idx].key != NULL) {
+    idx = (idx + 1) & mask;
+  }
+  self->slots[idx].key = key;
+  self->slots[idx].scope = scope;
+  self->slots[idx].desc = desc;
+  return desc;
+}
+
+static void _elide(ElidedFrames *elided, Py_ssize_t count, long long start_ns,
+                   long long cost_ns) {
+  if (elided->count == 0) {
+    elided->start_ns = start_ns;
+    elided->cost_ns = 0;
+  } else if (start_ns < elided->start_ns) {
+    elided->start_ns = start_ns;
+  }
+  elided->count += count;
+  elided->cost_ns += cost_ns;
+}
+
+static Py_ssize_t TraceProfiler_FrameBytes(TraceProfiler *self,
+                                           Py_ssize_t desc) {
+  if (desc == NO_DESCRIPTOR) {
+    return 0;
+  }
+  return SENDING_FRAME_BYTES +
+         PyUnicode_GET_LENGTH(PyList_GET_ITEM(self->descriptors, desc));
+}
+
+static int TraceProfiler_OverBudget(TraceProfiler *self) {
+  return (self->max_frames > 0 && self->retained_frames > self->max_frames) ||
+         (self->max_bytes > 0 && self->retained_bytes > self->max_bytes);
+}
+
+/**
+ * offsets between the last sending frame and #offset are sent as None. Async
+ * profilers stop growing sending frames once over budget: offsets are in call
+ * order and a parent always precedes its children, so no frame loses its
+ * parent and the latest calls are elided.
+ */
+static void TraceProfiler_PutSendingFrame(TraceProfiler *self,
+                                          Py_ssize_t offset, Py_ssize_t desc,
+                                          long long start_ns, long long cost_ns,
+                                          Py_ssize_t pid) {
+  if (self->is_async && offset >= self->sending_size &&
+      TraceProfiler_OverBudget(self)) {
+    _elide(&self->elided, 1, start_ns, cost_ns);
+    return;
+  }
+  while (self->sending_size <= offset) {
+    if (_grow_array((void **)&self->sending, &self->sending_capacity,
+                    self->sending_size, sizeof(SendingFrame)) < 0) {
+      return;
+    }
+    SendingFrame *hole = &self->sending[self->sending_size];
+    hole->desc = NO_DESCRIPTOR;
+    hole->elided.count = 0;
+    self->sending_size += 1;
+  }
+  SendingFrame *frame = &self->sending[offset];
+  if (frame->desc == NO_DESCRIPTOR && desc != NO_DESCRIPTOR) {
+    self->retained_frames += 1;
+  }
+  self->retained_bytes += TraceProfiler_FrameBytes(self, desc) -
+                          TraceProfiler_FrameBytes(self, frame->desc);
+  frame->desc = desc;
+  frame->start_ns = start_ns;
+  frame->cost_ns = cost_ns;
+  frame->pid = pid;
+  frame->elided.count = 0;
+}
+
+static int _compare_cost(const void *a, const void *b) {
+  long long left = *(const long long *)a;
+  long long right = *(const long long *)b;
+  return (left > right) - (left < right);
+}
+
+/**
+ * Called when a sync profiler exceeds its budget. Finished frames cheaper than
+ * the median cost are dropped and summarized in the elided frames of their
+ * closest kept ancestor, later frames that cheap are elided when they finish.
+ * A child never costs more than its parent, so whole subtrees are dropped and
+ * the most expensive ones are kept. Holes of sending frames are the frames
+ * still on the stack.
+ */
+static void TraceProfiler_Compact(TraceProfiler *self) {
+  Py_ssize_t size = self->sending_size;
+  long long *costs = PyMem_Malloc(sizeof(long long) * (size + 1));
+  Py_ssize_t *new_offsets = PyMem_Malloc(sizeof(Py_ssize_t) * (size + 1));
+  if (costs == NULL || new_offsets == NULL) {
+    PyMem_Free(costs);
+    PyMem_Free(new_offsets);
+    return;
+  }
+  Py_ssize_t finished = 0;
+  for (Py_ssize_t i = 0; i < size; i++) {
+    if (self->sending[i].desc != NO_DESCRIPTOR) {
+      costs[finished++] = self->sending[i].cost_ns;
+    }
+  }
+  if (finished > 0) {
+    qsort(costs, finished, sizeof(long long), _compare_cost);
+    if (costs[finished / 2] + 1 > self->elide_ns) {
+      self->elide_ns = costs[finished / 2] + 1;
+    }
+  }
+  PyMem_Free(costs);
+
+  // new offset of a kept frame, or -2 - new offset of the ancestor a dropped
+  // frame is elided into
+  Py_ssize_t kept = 0;
+  self->retained_frames = 0;
+  Py_ssize_t frame_bytes = 0;
+  for (Py_ssize_t i = 0; i < size; i++) {
+    SendingFrame frame = self->sending[i];
+    if (frame.desc == NO_DESCRIPTOR) {
+      frame.elided.count = 0;
+    } else if (frame.pid >= 0 && (frame.cost_ns < self->elide_ns ||
+                                  new_offsets[frame.pid] < 0)) {
+      Py_ssize_t parent = new_offsets[frame.pid];
+      int direct = parent >= 0;
+      if (!direct) {
+        parent = -2 - parent;
+      }
+      // time of a dropped grandchild is covered by its dropped parent
+      _elide(&self->sending[parent].elided, 1 + frame.elided.count,
+             frame.start_ns, direct ? frame.cost_ns : 0);
+      new_offsets[i] = -2 - parent;
+      continue;
+    } else {
+      if (frame.pid >= 0) {
+        frame.pid = new_offsets[frame.pid];
+      }
+      self->retained_frames += 1;
+      frame_bytes += TraceProfiler_FrameBytes(self, frame.desc);
+    }
+    new_offsets[i] = kept;
+    self->sending[kept++] = frame;
+  }
+  Py_ssize_t dropped = size - kept;
+
+  // frames on the stack collect the elided children of their holes
+  for (Py_ssize_t i = 1; i < self->stack_size; i++) {
+    StackFrame *entry = &self->stack[i];
+    if (entry->offset >= size) {
+      entry->offset -= dropped;
+      continue;
+    }
+    entry->offset = new_offsets[entry->offset];
+    ElidedFrames *elided = &self->sending[entry->offset].elided;
+    if (elided->count > 0) {
+      _elide(&entry->elided, elided->count, elided->start_ns,
+             elided->cost_ns);
+      elided->count = 0;
+    }
+  }
+  PyMem_Free(new_offsets);
+
+  Py_ssize_t descriptor_bytes = 0;
+  for (Py_ssize_t i = 0; i < PyList_GET_SIZE(self->descriptors); i++) {
+    descriptor_bytes += sizeof(PyASCIIObject) +
+                        PyUnicode_GET_LENGTH(PyList_GET_ITEM(self->descriptors, i));
+  }
+  self->retained_bytes = frame_bytes + descriptor_bytes;
+  self->sending_size = kept;
+  self->sf_sz -= dropped;
+}
+
+static void TraceProfiler_PushStackFrame(TraceProfiler *self,
+                                         long long start_ns) {
+  if (_grow_array((void **)&self->stack, &self->stack_capacity,
+                  self->stack_size, sizeof(StackFrame)) < 0) {
+    return;
+  }
+  StackFrame *frame = &self->stack[self->stack_size];
+  frame->start_ns = start_ns;
+  frame->offset = self->sf_sz;
+  frame->elided.count = 0;
+  self->stack_size += 1;
+  self->sf_sz += 1;
+}
+
 static void TraceProfiler_PushFrame(TraceProfiler *self, Py_ssize_t start_ns) {
   FrameNode *node = FrameNode_New();
   node->prev = (PyObject *)self->top;
@@ -265,8 +562,8 @@ static void TraceProfiler_PushFrameWithDepth(TraceProfiler *self,
 
 static void TraceProfiler_InnerPushAsyncFrame(TraceProfiler *self,
                                               Py_ssize_t start_ns,
-                                              PyObject *frame_desp,
-                                              PyObject *frame_id) {
+                                              Py_ssize_t desc,
+                                              void *frame_id) {
   FrameNode *node = FrameNode_New();
   PyObject *temp_start_ns = PyLong_FromLong(start_ns);
   PyList_Append(node->enter_timestamp, temp_start_ns);
@@ -279,15 +576,15 @@ static void TraceProfiler_InnerPushAsyncFrame(TraceProfiler *self,
   node->offset = self->sf_sz;
 
   self->sf_sz += 1;
-  node->frame_desp = frame_desp;
+  node->desc = desc;
   self->top = node;
   Py_DECREF(node);
 }
 
 static void TraceProfiler_InnerPushAsyncFrameWithDepth(TraceProfiler *self,
                                                        Py_ssize_t start_ns,
-                                                       PyObject *frame_desp,
-                                                       PyObject *frame_id) {
+                                                       Py_ssize_t desc,
+                                                       void *frame_id) {
   FrameNode *node = FrameNode_New();
   PyObject *temp_start_ns = PyLong_FromLong(start_ns);
   PyList_Append(node->enter_timestamp, temp_start_ns);
@@ -300,7 +597,7 @@ static void TraceProfiler_InnerPushAsyncFrameWithDepth(TraceProfiler *self,
   node->offset = self->sf_sz;
 
   self->sf_sz += 1;
-  node->frame_desp = frame_desp;
+  node->desc = desc;
   self->current_depth += 1;
   self->top = node;
   Py_DECREF(node);
@@ -324,16 +621,9 @@ static void TraceProfiler_FinishUnclosedAsyncFrame(TraceProfiler *self) {
 
     if (cost_ns >= self->interval) {
       Py_ssize_t pid = current_top->offset;
-      PyObject *frame_desp = build_last_async_frame(
-          last_async_node->frame_desp, last_async_start_ns, cost_ns, pid);
-      Py_ssize_t real_sf_sz = PyList_Size(self->on_sending_frame);
-      long long distance = last_async_node->offset + 1 - real_sf_sz;
-      long long idx;
-      for (idx = 0; idx < distance; idx++) {
-        PyList_Append(self->on_sending_frame, Py_None);
-      }
-      PyList_SetItem(self->on_sending_frame, last_async_node->offset,
-                     frame_desp);
+      TraceProfiler_PutSendingFrame(self, last_async_node->offset,
+                                    last_async_node->desc, last_async_start_ns,
+                                    cost_ns, pid);
       if (current_top != self->top) {
         Py_DECREF(current_top);
       }
@@ -368,16 +658,9 @@ TraceProfiler_FinishUnclosedAsyncFrameWithDepth(TraceProfiler *self) {
 
     if (self->current_depth < self->depth_limit) {
       Py_ssize_t pid = current_top->offset;
-      PyObject *frame_desp = build_last_async_frame(
-          last_async_node->frame_desp, last_async_start_ns, cost_ns, pid);
-      Py_ssize_t real_sf_sz = PyList_Size(self->on_sending_frame);
-      long long distance = last_async_node->offset + 1 - real_sf_sz;
-      long long idx;
-      for (idx = 0; idx < distance; idx++) {
-        PyList_Append(self->on_sending_frame, Py_None);
-      }
-      PyList_SetItem(self->on_sending_frame, last_async_node->offset,
-                     frame_desp);
+      TraceProfiler_PutSendingFrame(self, last_async_node->offset,
+                                    last_async_node->desc, last_async_start_ns,
+                                    cost_ns, pid);
       if (current_top != self->top) {
         Py_DECREF(current_top);
       }
@@ -394,9 +677,8 @@ TraceProfiler_FinishUnclosedAsyncFrameWithDepth(TraceProfiler *self) {
 }
 
 static void TraceProfiler_PushAsyncFrame(TraceProfiler *self,
-                                         Py_ssize_t start_ns, PyObject *f_desp,
-                                         int is_async_frame,
-                                         PyObject *frame_id) {
+                                         Py_ssize_t start_ns, Py_ssize_t desc,
+                                         int is_async_frame, void *frame_id) {
   if (!is_async_frame) {
     if (self->top->offset == -1) {
       return;
@@ -409,18 +691,17 @@ static void TraceProfiler_PushAsyncFrame(TraceProfiler *self,
       if (children_len > 0) {
         FrameNode *last_element =
             (FrameNode *)PyList_GetItem(self->top->succ, children_len - 1);
-        if (PyObject_RichCompareBool(last_element->frame_id, frame_id, Py_EQ) ==
-            1) {
+        if (last_element->frame_id == frame_id) {
           self->top = last_element;
         } else {
           return;
         }
       } else {
-        TraceProfiler_InnerPushAsyncFrame(self, start_ns, f_desp, frame_id);
+        TraceProfiler_InnerPushAsyncFrame(self, start_ns, desc, frame_id);
         return;
       }
     }
-    if (PyObject_RichCompareBool(self->top->frame_id, frame_id, Py_EQ) == 1) {
+    if (self->top->frame_id == frame_id) {
       Py_ssize_t succ_len = PyList_Size(self->top->succ);
       if (succ_len == 0) {
         Py_ssize_t e_size = PyList_Size(self->top->enter_timestamp);
@@ -431,15 +712,8 @@ static void TraceProfiler_PushAsyncFrame(TraceProfiler *self,
 
         if (cost_ns >= self->interval) {
           Py_ssize_t pid = self->top->offset;
-          PyObject *frame_desp =
-              build_context_switch_frame(t_last_leave_ns, cost_ns, pid);
-          Py_ssize_t real_sf_sz = PyList_Size(self->on_sending_frame);
-          long long distance = self->sf_sz + 1 - real_sf_sz;
-          long long idx;
-          for (idx = 0; idx < distance; idx++) {
-            PyList_Append(self->on_sending_frame, Py_None);
-          }
-          PyList_SetItem(self->on_sending_frame, self->sf_sz, frame_desp);
+          TraceProfiler_PutSendingFrame(self, self->sf_sz, AWAIT_DESCRIPTOR,
+                                        t_last_leave_ns, cost_ns, pid);
           self->sf_sz += 1;
           Py_DECREF(pop_last_element(self->top->enter_timestamp, e_size));
         }
@@ -451,16 +725,16 @@ static void TraceProfiler_PushAsyncFrame(TraceProfiler *self,
       }
     } else {
       TraceProfiler_FinishUnclosedAsyncFrame(self);
-      TraceProfiler_InnerPushAsyncFrame(self, start_ns, f_desp, frame_id);
+      TraceProfiler_InnerPushAsyncFrame(self, start_ns, desc, frame_id);
     }
   }
 }
 
 static void TraceProfiler_PushAsyncFrameWithDepth(TraceProfiler *self,
                                                   Py_ssize_t start_ns,
-                                                  PyObject *f_desp,
+                                                  Py_ssize_t desc,
                                                   int is_async_frame,
-                                                  PyObject *frame_id) {
+                                                  void *frame_id) {
   if (!is_async_frame) {
     if (self->top->offset == -1) {
       return;
@@ -473,20 +747,19 @@ static void TraceProfiler_PushAsyncFrameWithDepth(TraceProfiler *self,
       if (children_len > 0) {
         FrameNode *last_element =
             (FrameNode *)PyList_GetItem(self->top->succ, children_len - 1);
-        if (PyObject_RichCompareBool(last_element->frame_id, frame_id, Py_EQ) ==
-            1) {
+        if (last_element->frame_id == frame_id) {
           self->top = last_element;
           self->current_depth += 1;
         } else {
           return;
         }
       } else {
-        TraceProfiler_InnerPushAsyncFrameWithDepth(self, start_ns, f_desp,
+        TraceProfiler_InnerPushAsyncFrameWithDepth(self, start_ns, desc,
                                                    frame_id);
         return;
       }
     }
-    if (PyObject_RichCompareBool(self->top->frame_id, frame_id, Py_EQ) == 1) {
+    if (self->top->frame_id == frame_id) {
       Py_ssize_t succ_len = PyList_Size(self->top->succ);
       if (succ_len == 0) {
         Py_ssize_t e_size = PyList_Size(self->top->enter_timestamp);
@@ -497,15 +770,8 @@ static void TraceProfiler_PushAsyncFrameWithDepth(TraceProfiler *self,
 
         if (self->current_depth < self->depth_limit) {
           Py_ssize_t pid = self->top->offset;
-          PyObject *frame_desp =
-              build_context_switch_frame(t_last_leave_ns, cost_ns, pid);
-          Py_ssize_t real_sf_sz = PyList_Size(self->on_sending_frame);
-          long long distance = self->sf_sz + 1 - real_sf_sz;
-          long long idx;
-          for (idx = 0; idx < distance; idx++) {
-            PyList_Append(self->on_sending_frame, Py_None);
-          }
-          PyList_SetItem(self->on_sending_frame, self->sf_sz, frame_desp);
+          TraceProfiler_PutSendingFrame(self, self->sf_sz, AWAIT_DESCRIPTOR,
+                                        t_last_leave_ns, cost_ns, pid);
           self->sf_sz += 1;
           Py_DECREF(pop_last_element(self->top->enter_timestamp, e_size));
         }
@@ -518,27 +784,23 @@ static void TraceProfiler_PushAsyncFrameWithDepth(TraceProfiler *self,
       }
     } else {
       TraceProfiler_FinishUnclosedAsyncFrameWithDepth(self);
-      TraceProfiler_InnerPushAsyncFrameWithDepth(self, start_ns, f_desp,
+      TraceProfiler_InnerPushAsyncFrameWithDepth(self, start_ns, desc,
                                                  frame_id);
     }
   }
 }
 
-static FrameNode *TraceProfiler_PopFrame(TraceProfiler *self) {
-  FrameNode *top_frame = (FrameNode *)self->top;
-  self->top = (FrameNode *)top_frame->prev;
-  top_frame->prev = NULL;
-
-  return top_frame;
-}
-
-static FrameNode *TraceProfiler_PopFrameWithDepth(TraceProfiler *self) {
-  FrameNode *top_frame = (FrameNode *)self->top;
-  self->top = (FrameNode *)top_frame->prev;
-  top_frame->prev = NULL;
-
-  self->current_depth -= 1;
-  return top_frame;
+/**
+ * returns 0 for returns of frames entered before the profiler was set, which
+ * would pop the root
+ */
+static int TraceProfiler_PopStackFrame(TraceProfiler *self, StackFrame *frame) {
+  if (self->stack_size <= 1) {
+    return 0;
+  }
+  self->stack_size -= 1;
+  *frame = self->stack[self->stack_size];
+  return 1;
 }
 
 static FrameNode *TraceProfiler_PopFrameAsync(TraceProfiler *self,
@@ -615,16 +877,9 @@ static void TraceProfiler_FulfillAsyncUnfinishedRequests(TraceProfiler *self) {
       if (cost_ns >= self->interval) {
         FrameNode *prev_node = (FrameNode *)self->top->prev;
         Py_ssize_t pid = prev_node->offset;
-        PyObject *frame_desp = build_last_async_frame(
-            last_async_node->frame_desp, last_async_start_ns, cost_ns, pid);
-        Py_ssize_t real_sf_sz = PyList_Size(self->on_sending_frame);
-        long long distance = last_async_node->offset + 1 - real_sf_sz;
-        long long idx;
-        for (idx = 0; idx < distance; idx++) {
-          PyList_Append(self->on_sending_frame, Py_None);
-        }
-        PyList_SetItem(self->on_sending_frame, last_async_node->offset,
-                       frame_desp);
+        TraceProfiler_PutSendingFrame(self, last_async_node->offset,
+                                      last_async_node->desc,
+                                      last_async_start_ns, cost_ns, pid);
         Py_ssize_t succ_len_2 = PyList_Size(self->top->succ);
         if (succ_len_2 > 0) {
           FrameNode *cur_top_2 = self->top;
@@ -668,16 +923,9 @@ TraceProfiler_FulfillAsyncUnfinishedRequestsWithDepth(TraceProfiler *self) {
       if (self->current_depth <= self->depth_limit) {
         FrameNode *prev_node = (FrameNode *)self->top->prev;
         Py_ssize_t pid = prev_node->offset;
-        PyObject *frame_desp = build_last_async_frame(
-            last_async_node->frame_desp, last_async_start_ns, cost_ns, pid);
-        Py_ssize_t real_sf_sz = PyList_Size(self->on_sending_frame);
-        long long distance = last_async_node->offset + 1 - real_sf_sz;
-        long long idx;
-        for (idx = 0; idx < distance; idx++) {
-          PyList_Append(self->on_sending_frame, Py_None);
-        }
-        PyList_SetItem(self->on_sending_frame, last_async_node->offset,
-                       frame_desp);
+        TraceProfiler_PutSendingFrame(self, last_async_node->offset,
+                                      last_async_node->desc,
+                                      last_async_start_ns, cost_ns, pid);
         Py_ssize_t succ_len_2 = PyList_Size(self->top->succ);
         if (succ_len_2 > 0) {
           FrameNode *cur_top_2 = self->top;
@@ -695,24 +943,298 @@ TraceProfiler_FulfillAsyncUnfinishedRequestsWithDepth(TraceProfiler *self) {
 }
 
 static TraceProfiler *TraceProfiler_New(long long interval, Py_ssize_t is_async,
-                                        Py_ssize_t depth_limit) {
+                                        Py_ssize_t depth_limit,
+                                        Py_ssize_t max_frames,
+                                        Py_ssize_t max_bytes) {
   TraceProfiler *trace_profiler =
       PyObject_New(TraceProfiler, &TraceProfiler_Type);
   trace_profiler->target = NULL;
   trace_profiler->interval = interval;
   trace_profiler->is_async = is_async;
-  FrameNode *node = FrameNode_New();
-  node->offset = -1;
-  trace_profiler->top = (FrameNode *)node;
+  trace_profiler->top = NULL;
+  trace_profiler->stack = NULL;
+  trace_profiler->stack_size = 0;
+  trace_profiler->stack_capacity = 0;
+  if (is_async) {
+    FrameNode *node = FrameNode_New();
+    node->offset = -1;
+    trace_profiler->top = (FrameNode *)node;
+  } else if (_grow_array((void **)&trace_profiler->stack,
+                         &trace_profiler->stack_capacity, 0,
+                         sizeof(StackFrame)) == 0) {
+    trace_profiler->stack[0].start_ns = 0;
+    trace_profiler->stack[0].offset = -1;
+    trace_profiler->stack[0].elided.count = 0;
+    trace_profiler->stack_size = 1;
+  }
   trace_profiler->sf_sz = 0;
   trace_profiler->current_depth = 0;
   trace_profiler->depth_limit = depth_limit;
-
-  trace_profiler->on_sending_frame = PyList_New(0);
+  trace_profiler->max_frames = max_frames;
+  trace_profiler->max_bytes = max_bytes;
+  trace_profiler->retained_frames = 0;
+  trace_profiler->retained_bytes = 0;
+  trace_profiler->elide_ns = 0;
+  trace_profiler->elided.count = 0;
+  trace_profiler->encoded = 0;
+
+  trace_profiler->sending = NULL;
+  trace_profiler->sending_size = 0;
+  trace_profiler->sending_capacity = 0;
+  trace_profiler->slots = NULL;
+  trace_profiler->slot_capacity = 0;
+  trace_profiler->descriptor_owners = PyList_New(0);
+  trace_profiler->descriptors = PyList_New(0);
+  PyObject *await_header = PyUnicode_FromFormat("%s%c%c%i", "[await]", 0, 0, 0);
+  PyList_Append(trace_profiler->descriptors, await_header);
+  trace_profiler->retained_bytes +=
+      sizeof(PyASCIIObject) + PyUnicode_GET_LENGTH(await_header);
+  Py_XDECREF(await_header);
   trace_profiler->out_queue = NULL;
   return trace_profiler;
 }
 
+/////////////////////////
+// Binary frame record //
+/////////////////////////
+
+// string slots of wire_format.py: 0 is None, 1 introduces a new string,
+// n >= 2 references the (n - 2)th string of record
+#define WIRE_STR_NONE 0
+#define WIRE_STR_NEW 1
+#define WIRE_STR_REF_BASE 2
+
+typedef struct {
+  char *data;
+  Py_ssize_t size;
+  Py_ssize_t capacity;
+} WireBuffer;
+
+static int WireBuffer_Reserve(WireBuffer *buf, Py_ssize_t extra) {
+  if (buf->size + extra <= buf->capacity) {
+    return 0;
+  }
+  Py_ssize_t capacity = buf->capacity * 2;
+  if (capacity < buf->size + extra) {
+    capacity = buf->size + extra;
+  }
+  char *data = PyMem_Realloc(buf->data, capacity);
+  if (data == NULL) {
+    PyErr_NoMemory();
+    return -1;
+  }
+  buf->data = data;
+  buf->capacity = capacity;
+  return 0;
+}
+
+static int WireBuffer_PutUVarint(WireBuffer *buf, unsigned long long value) {
+  if (WireBuffer_Reserve(buf, 10) < 0) {
+    return -1;
+  }
+  while (value > 0x7F) {
+    buf->data[buf->size++] = (char)((value & 0x7F) | 0x80);
+    value >>= 7;
+  }
+  buf->data[buf->size++] = (char)value;
+  return 0;
+}
+
+static int WireBuffer_PutVarint(WireBuffer *buf, long long value) {
+  // zigzag keeps small negative numbers short
+  return WireBuffer_PutUVarint(
+      buf, ((unsigned long long)value << 1) ^ (unsigned long long)(value >> 63));
+}
+
+static int WireBuffer_PutBytes(WireBuffer *buf, const char *data,
+                               Py_ssize_t size) {
+  if (WireBuffer_Reserve(buf, size) < 0) {
+    return -1;
+  }
+  memcpy(buf->data + buf->size, data, size);
+  buf->size += size;
+  return 0;
+}
+
+static int WireBuffer_PutString(WireBuffer *buf, const char *data,
+                                Py_ssize_t size) {
+  if (WireBuffer_PutUVarint(buf, WIRE_STR_NEW) < 0 ||
+      WireBuffer_PutUVarint(buf, size) < 0) {
+    return -1;
+  }
+  return WireBuffer_PutBytes(buf, data, size);
+}
+
+// timings of a frame following its description, start_ns is delta encoded
+// against the previous frame
+static int WireBuffer_PutTimes(WireBuffer *buf, long long start_ns,
+                               long long cost_ns, long long parent_id,
+                               long long *last_start_ns) {
+  if (WireBuffer_PutVarint(buf, start_ns - *last_start_ns) < 0 ||
+      WireBuffer_PutUVarint(buf, (unsigned long long)cost_ns) < 0) {
+    return -1;
+  }
+  *last_start_ns = start_ns;
+  return WireBuffer_PutVarint(buf, parent_id);
+}
+
+static int _encode_elided_frame(WireBuffer *buf, ElidedFrames *elided,
+                                Py_ssize_t pid, long long *last_start_ns) {
+  char desp[64];
+  int size = snprintf(desp, sizeof(desp), "[elided]%c%zd frames elided%c0", 0,
+                      elided->count, 0);
+  if (WireBuffer_PutString(buf, desp, size) < 0) {
+    return -1;
+  }
+  return WireBuffer_PutTimes(buf, elided->start_ns, elided->cost_ns, pid,
+                             last_start_ns);
+}
+
+static PyObject *_build_elided_frame(ElidedFrames *elided, Py_ssize_t pid) {
+  return PyUnicode_FromFormat("%s%c%zd frames elided%c%i%c%lld%c%lld%c%zd",
+                              "[elided]", 0, elided->count, 0, 0, 1,
+                              elided->start_ns, 1, elided->cost_ns, 1, pid);
+}
+
+/**
+ * sending frames as 'desp\x01start_ns\x01cost_ns\x01pid' strings, holes of
+ * discarded frames are None. Elided frames follow all sending frames, so
+ * parents still precede their children.
+ */
+static PyObject *TraceProfiler_BuildSendingFrames(TraceProfiler *self) {
+  Py_ssize_t elided_size = 0;
+  for (Py_ssize_t i = 0; i < self->sending_size; i++) {
+    if (self->sending[i].desc != NO_DESCRIPTOR &&
+        self->sending[i].elided.count > 0) {
+      elided_size += 1;
+    }
+  }
+  // frames an async profiler dropped go below the traced method
+  int async_elided = self->elided.count > 0 && self->sending_size > 0 &&
+                     self->sending[0].desc != NO_DESCRIPTOR;
+  PyObject *frames =
+      PyList_New(self->sending_size + elided_size + async_elided);
+  if (frames == NULL) {
+    return NULL;
+  }
+  Py_ssize_t elided_offset = self->sending_size;
+  for (Py_ssize_t i = 0; i < self->sending_size; i++) {
+    SendingFrame *frame = &self->sending[i];
+    PyObject *item;
+    if (frame->desc == NO_DESCRIPTOR) {
+      Py_INCREF(Py_None);
+      item = Py_None;
+    } else {
+      item = PyUnicode_FromFormat(
+          "%U%c%lld%c%lld%c%zd", PyList_GET_ITEM(self->descriptors, frame->desc),
+          1, frame->start_ns, 1, frame->cost_ns, 1, frame->pid);
+      if (item == NULL) {
+        Py_DECREF(frames);
+        return NULL;
+      }
+      if (frame->elided.count > 0) {
+        PyObject *elided_item = _build_elided_frame(&frame->elided, i);
+        if (elided_item == NULL) {
+          Py_DECREF(item);
+          Py_DECREF(frames);
+          return NULL;
+        }
+        PyList_SET_ITEM(frames, elided_offset++, elided_item);
+      }
+    }
+    PyList_SET_ITEM(frames, i, item);
+  }
+  if (async_elided) {
+    PyObject *elided_item = _build_elided_frame(&self->elided, 0);
+    if (elided_item == NULL) {
+      Py_DECREF(frames);
+      return NULL;
+    }
+    PyList_SET_ITEM(frames, elided_offset, elided_item);
+  }
+  return frames;
+}
+
+/**
+ * sending frames as the frame section of binary trace record, written straight
+ * from the sending frames and descriptors: a descriptor is written once and
+ * referenced by its index in the record's string table afterwards. Frames are
+ * in the same order as TraceProfiler_BuildSendingFrames. See
+ * encode_trace_record in trace_frame.py
+ */
+static PyObject *TraceProfiler_EncodeSendingFrames(TraceProfiler *self) {
+  Py_ssize_t elided_size = 0;
+  for (Py_ssize_t i = 0; i < self->sending_size; i++) {
+    if (self->sending[i].desc != NO_DESCRIPTOR &&
+        self->sending[i].elided.count > 0) {
+      elided_size += 1;
+    }
+  }
+  int async_elided = self->elided.count > 0 && self->sending_size > 0 &&
+                     self->sending[0].desc != NO_DESCRIPTOR;
+  // string index of each descriptor in the record, -1 until written
+  Py_ssize_t desc_size = PyList_GET_SIZE(self->descriptors);
+  Py_ssize_t *indexes = PyMem_Malloc(desc_size * sizeof(Py_ssize_t));
+  if (indexes == NULL) {
+    return PyErr_NoMemory();
+  }
+  for (Py_ssize_t i = 0; i < desc_size; i++) {
+    indexes[i] = -1;
+  }
+  WireBuffer buf = {NULL, 0, 0};
+  PyObject *result = NULL;
+  Py_ssize_t strings = 0;
+  long long last_start_ns = 0;
+  if (WireBuffer_Reserve(&buf, 32 + self->sending_size * 16) < 0 ||
+      WireBuffer_PutUVarint(&buf, self->sending_size + elided_size +
+                                      async_elided) < 0) {
+    goto done;
+  }
+  for (Py_ssize_t i = 0; i < self->sending_size; i++) {
+    SendingFrame *frame = &self->sending[i];
+    if (frame->desc == NO_DESCRIPTOR) {
+      if (WireBuffer_PutUVarint(&buf, WIRE_STR_NONE) < 0) {
+        goto done;
+      }
+      continue;
+    }
+    if (indexes[frame->desc] >= 0) {
+      if (WireBuffer_PutUVarint(&buf, indexes[frame->desc] +
+                                          WIRE_STR_REF_BASE) < 0) {
+        goto done;
+      }
+    } else {
+      Py_ssize_t size;
+      const char *desp = PyUnicode_AsUTF8AndSize(
+          PyList_GET_ITEM(self->descriptors, frame->desc), &size);
+      if (desp == NULL || WireBuffer_PutString(&buf, desp, size) < 0) {
+        goto done;
+      }
+      indexes[frame->desc] = strings++;
+    }
+    if (WireBuffer_PutTimes(&buf, frame->start_ns, frame->cost_ns, frame->pid,
+                            &last_start_ns) < 0) {
+      goto done;
+    }
+  }
+  for (Py_ssize_t i = 0; i < self->sending_size; i++) {
+    SendingFrame *frame = &self->sending[i];
+    if (frame->desc != NO_DESCRIPTOR && frame->elided.count > 0 &&
+        _encode_elided_frame(&buf, &frame->elided, i, &last_start_ns) < 0) {
+      goto done;
+    }
+  }
+  if (async_elided &&
+      _encode_elided_frame(&buf, &self->elided, 0, &last_start_ns) < 0) {
+    goto done;
+  }
+  result = PyBytes_FromStringAndSize(buf.data, buf.size);
+done:
+  PyMem_Free(indexes);
+  PyMem_Free(buf.data);
+  return result;
+}
+
 static void TraceProfiler_SendTraceFrames(TraceProfiler *self) {
   if (self->is_async) {
     if (self->depth_limit <= 0) {
@@ -721,116 +1243,134 @@ static void TraceProfiler_SendTraceFrames(TraceProfiler *self) {
       TraceProfiler_FulfillAsyncUnfinishedRequestsWithDepth(self);
     }
   }
+  PyObject *frames = self->encoded ? TraceProfiler_EncodeSendingFrames(self)
+                                   : TraceProfiler_BuildSendingFrames(self);
+  if (frames == NULL) {
+    return;
+  }
 
 #if PY_VERSION_HEX >= 0x03090000
   // vectorcall implementation could be faster, is available in Python 3.9
-  PyObject *callargs[3] = {NULL, (PyObject *)self->out_queue,
-                           (PyObject *)self->on_sending_frame};
+  PyObject *callargs[3] = {NULL, (PyObject *)self->out_queue, frames};
   PyObject *result = PyObject_Vectorcall(
       self->target, callargs + 1, 2 | PY_VECTORCALL_ARGUMENTS_OFFSET, NULL);
 #else
   PyObject *result = PyObject_CallFunctionObjArgs(self->target, self->out_queue,
-                                                  self->on_sending_frame, NULL);
+                                                  frames, NULL);
 #endif
   Py_XDECREF(result);
+  Py_DECREF(frames);
 }
 
 //////////////////////
-// Public functions //
+// Trace events     //
 //////////////////////
 
+static void TraceProfiler_SetSendingFrame(TraceProfiler *tp, Py_ssize_t offset,
+                                          long long start_ns, long long cost_ns,
+                                          Py_ssize_t pid, PyCodeObject *code,
+                                          int what, PyObject *arg) {
+  int c_frame = (what == PyTrace_RETURN) ? 0 : 1;
+  TraceProfiler_PutSendingFrame(tp, offset,
+                                TraceProfiler_Describe(tp, code, c_frame, arg),
+                                start_ns, cost_ns, pid);
+}
+
 /**
- * called when python/c method are called.
+ * keeps a finished frame of sync profiler, or elides it into its parent when
+ * it's cheaper than frames kept after the budget was exceeded
  */
-static int profile(PyObject *op, PyFrameObject *frame, int what,
-                   PyObject *arg) {
-  TraceProfiler *tp = (TraceProfiler *)op;
-  PyObject *result;
+static void TraceProfiler_FinishStackFrame(TraceProfiler *tp, StackFrame *node,
+                                           long long cost_ns,
+                                           PyCodeObject *code, int what,
+                                           PyObject *arg) {
+  StackFrame *parent = &tp->stack[tp->stack_size - 1];
+  if (cost_ns < tp->elide_ns && parent->offset >= 0 &&
+      node->offset == tp->sf_sz - 1) {
+    // elided children were dropped with the frame, no offset is taken
+    tp->sf_sz -= 1;
+    _elide(&parent->elided, 1 + node->elided.count, node->start_ns, cost_ns);
+    return;
+  }
+  TraceProfiler_SetSendingFrame(tp, node->offset, node->start_ns, cost_ns,
+                                parent->offset, code, what, arg);
+  if (node->offset < tp->sending_size) {
+    tp->sending[node->offset].elided = node->elided;
+  }
+  if (TraceProfiler_OverBudget(tp)) {
+    TraceProfiler_Compact(tp);
+  }
+}
 
+/**
+ * #code is the code of called python function on call/return, unused for
+ * c_call/c_return/c_exception whose #arg is the called c function.
+ */
+static void trace_event(TraceProfiler *tp, PyCodeObject *code, int what,
+                        PyObject *arg) {
   long long current_time = _get_time_ns();
   // what:        0         1           3        4           5             6
   // return:      call   exception    return    c_call    c_exception   c_return
   if (what == 0 || what == 4) {
     // call/c_call
-    TraceProfiler_PushFrame(tp, current_time);
+    TraceProfiler_PushStackFrame(tp, current_time);
   } else if (what == 3 || what == 6 || what == 5) {
     // return/c_exception/c_return
-    FrameNode *node = TraceProfiler_PopFrame(tp);
-    long long cost_ns = current_time - node->start_ns;
+    StackFrame node;
+    if (!TraceProfiler_PopStackFrame(tp, &node)) {
+      return;
+    }
+    long long cost_ns = current_time - node.start_ns;
     if (cost_ns < tp->interval) {
       tp->sf_sz -= 1;
     } else {
-      int c_frame = (what == 3) ? 0 : 1;
-      FrameNode *parent_node = (FrameNode *)tp->top;
-      PyObject *frame_desp = _get_frame_info(frame, node->start_ns, cost_ns,
-                                             parent_node->offset, arg, c_frame);
-
-      Py_ssize_t real_sf_sz = PyList_Size(tp->on_sending_frame);
-      long long distance = node->offset + 1 - real_sf_sz;
-      long long idx;
-      for (idx = 0; idx < distance; idx++) {
-        PyList_Append(tp->on_sending_frame, Py_None);
-      }
-      PyList_SetItem(tp->on_sending_frame, node->offset, frame_desp);
+      TraceProfiler_FinishStackFrame(tp, &node, cost_ns, code, what, arg);
     }
-    Py_DECREF(node);
   }
-  return 0;
 }
 
-static int profile_with_depth(PyObject *op, PyFrameObject *frame, int what,
-                              PyObject *arg) {
-  TraceProfiler *tp = (TraceProfiler *)op;
-  PyObject *result;
-
+static void trace_event_with_depth(TraceProfiler *tp, PyCodeObject *code,
+                                   int what, PyObject *arg) {
   long long current_time = _get_time_ns();
-  // what:        0         1           3        4           5             6
-  // return:      call   exception    return    c_call    c_exception   c_return
   if (what == 0 || what == 4) {
     // call/c_call
-    TraceProfiler_PushFrameWithDepth(tp, current_time);
+    TraceProfiler_PushStackFrame(tp, current_time);
+    tp->current_depth += 1;
   } else if (what == 3 || what == 6 || what == 5) {
     // return/c_exception/c_return
-    FrameNode *node = TraceProfiler_PopFrameWithDepth(tp);
-    long long cost_ns = current_time - node->start_ns;
+    StackFrame node;
+    if (!TraceProfiler_PopStackFrame(tp, &node)) {
+      return;
+    }
+    tp->current_depth -= 1;
+    long long cost_ns = current_time - node.start_ns;
     if (tp->current_depth >= tp->depth_limit) {
       tp->sf_sz -= 1;
     } else {
-      int c_frame = (what == 3) ? 0 : 1;
-      FrameNode *parent_node = (FrameNode *)tp->top;
-      PyObject *frame_desp = _get_frame_info(frame, node->start_ns, cost_ns,
-                                             parent_node->offset, arg, c_frame);
-
-      Py_ssize_t real_sf_sz = PyList_Size(tp->on_sending_frame);
-      long long distance = node->offset + 1 - real_sf_sz;
-      long long idx;
-      for (idx = 0; idx < distance; idx++) {
-        PyList_Append(tp->on_sending_frame, Py_None);
-      }
-      PyList_SetItem(tp->on_sending_frame, node->offset, frame_desp);
+      TraceProfiler_FinishStackFrame(tp, &node, cost_ns, code, what, arg);
     }
-    Py_DECREF(node);
   }
-  return 0;
 }
 
-static int async_profile(PyObject *op, PyFrameObject *frame, int what,
-                         PyObject *arg) {
-  TraceProfiler *tp = (TraceProfiler *)op;
-  PyObject *result;
-
+/**
+ * #frame identifies a coroutine across its resumptions, NULL means the
+ * current frame and is only looked up for coroutine code.
+ */
+static void async_trace_event(TraceProfiler *tp, PyFrameObject *frame,
+                              PyCodeObject *code, int what, PyObject *arg) {
   long long current_time = _get_time_ns();
-  // what:        0         1           3        4           5             6
-  // return:      call   exception    return    c_call    c_exception   c_return
-  PyCodeObject *code_obj = _code_from_frame(frame);
-  int is_async_frame = (code_obj->co_flags & 0x80) > 0 && (what < 4);
-  Py_DECREF(code_obj);
+  int is_async_frame = (code->co_flags & 0x80) > 0 && (what < 4);
   if (what == 0 || what == 4) {
-    // call/c_call
-    int c_frame = (what == 4) ? 1 : 0;
-    TraceProfiler_PushAsyncFrame(
-        tp, current_time, _get_header(frame, c_frame, arg), is_async_frame,
-        PyLong_FromVoidPtr((void *)frame));
+    // call/c_call, only coroutine frames keep their descriptor from entering
+    Py_ssize_t desc = NO_DESCRIPTOR;
+    if (is_async_frame) {
+      desc = TraceProfiler_Describe(tp, code, 0, arg);
+      if (frame == NULL) {
+        frame = PyEval_GetFrame();
+      }
+    }
+    TraceProfiler_PushAsyncFrame(tp, current_time, desc, is_async_frame,
+                                 (void *)frame);
   } else if (what == 3 || what == 6 || what == 5) {
     // return/c_exception/c_return
     FrameNode *node =
@@ -840,42 +1380,32 @@ static int async_profile(PyObject *op, PyFrameObject *frame, int what,
       if (cost_ns < tp->interval) {
         tp->sf_sz -= 1;
       } else {
-        int c_frame = (what == 3) ? 0 : 1;
-        FrameNode *parent_node = (FrameNode *)tp->top;
-        PyObject *frame_desp = _get_frame_info(
-            frame, node->start_ns, cost_ns, parent_node->offset, arg, c_frame);
-
-        Py_ssize_t real_sf_sz = PyList_Size(tp->on_sending_frame);
-        long long distance = node->offset + 1 - real_sf_sz;
-        long long idx;
-        for (idx = 0; idx < distance; idx++) {
-          PyList_Append(tp->on_sending_frame, Py_None);
-        }
-        PyList_SetItem(tp->on_sending_frame, node->offset, frame_desp);
+        TraceProfiler_SetSendingFrame(tp, node->offset, node->start_ns,
+                                      cost_ns, tp->top->offset, code, what,
+                                      arg);
       }
     }
     Py_XDECREF(node);
   }
-  return 0;
 }
 
-static int async_profile_with_depth(PyObject *op, PyFrameObject *frame,
-                                    int what, PyObject *arg) {
-  TraceProfiler *tp = (TraceProfiler *)op;
-  PyObject *result;
-
+static void async_trace_event_with_depth(TraceProfiler *tp,
+                                         PyFrameObject *frame,
+                                         PyCodeObject *code, int what,
+                                         PyObject *arg) {
   long long current_time = _get_time_ns();
-  // what:        0         1           3        4           5             6
-  // return:      call   exception    return    c_call    c_exception   c_return
-  PyCodeObject *code_obj = _code_from_frame(frame);
-  int is_async_frame = (code_obj->co_flags & 0x80) > 0 && (what < 4);
-  Py_DECREF(code_obj);
+  int is_async_frame = (code->co_flags & 0x80) > 0 && (what < 4);
   if (what == 0 || what == 4) {
     // call/c_call
-    int c_frame = (what == 4) ? 1 : 0;
-    TraceProfiler_PushAsyncFrameWithDepth(
-        tp, current_time, _get_header(frame, c_frame, arg), is_async_frame,
-        PyLong_FromVoidPtr((void *)frame));
+    Py_ssize_t desc = NO_DESCRIPTOR;
+    if (is_async_frame) {
+      desc = TraceProfiler_Describe(tp, code, 0, arg);
+      if (frame == NULL) {
+        frame = PyEval_GetFrame();
+      }
+    }
+    TraceProfiler_PushAsyncFrameWithDepth(tp, current_time, desc,
+                                          is_async_frame, (void *)frame);
   } else if (what == 3 || what == 6 || what == 5) {
     // return/c_exception/c_return
     FrameNode *node =
@@ -885,67 +1415,383 @@ static int async_profile_with_depth(PyObject *op, PyFrameObject *frame,
       if (tp->current_depth >= tp->depth_limit) {
         tp->sf_sz -= 1;
       } else {
-        int c_frame = (what == 3) ? 0 : 1;
-        FrameNode *parent_node = (FrameNode *)tp->top;
-        PyObject *frame_desp = _get_frame_info(
-            frame, node->start_ns, cost_ns, parent_node->offset, arg, c_frame);
-
-        Py_ssize_t real_sf_sz = PyList_Size(tp->on_sending_frame);
-        long long distance = node->offset + 1 - real_sf_sz;
-        long long idx;
-        for (idx = 0; idx < distance; idx++) {
-          PyList_Append(tp->on_sending_frame, Py_None);
-        }
-        PyList_SetItem(tp->on_sending_frame, node->offset, frame_desp);
+        TraceProfiler_SetSendingFrame(tp, node->offset, node->start_ns,
+                                      cost_ns, tp->top->offset, code, what,
+                                      arg);
       }
     }
     Py_XDECREF(node);
   }
-  return 0;
 }
 
-static PyObject *set_trace_profile(PyObject *m, PyObject *args,
-                                   PyObject *kwds) {
+static void TraceProfiler_Event(TraceProfiler *tp, PyFrameObject *frame,
+                                PyCodeObject *code, int what, PyObject *arg) {
+  if (tp->is_async) {
+    if (tp->depth_limit <= 0) {
+      async_trace_event(tp, frame, code, what, arg);
+    } else {
+      async_trace_event_with_depth(tp, frame, code, what, arg);
+    }
+  } else {
+    if (tp->depth_limit <= 0) {
+      trace_event(tp, code, what, arg);
+    } else {
+      trace_event_with_depth(tp, code, what, arg);
+    }
+  }
+}
 
+///////////////////
+// Profile hook  //
+///////////////////
+
+/**
+ * called when python/c method are called.
+ */
+static int profile(PyObject *op, PyFrameObject *frame, int what,
+                   PyObject *arg) {
+  PyCodeObject *code = _code_from_frame(frame);
+  TraceProfiler_Event((TraceProfiler *)op, frame, code, what, arg);
+  Py_DECREF(code);
+  return 0;
+}
+
+static TraceProfiler *TraceProfiler_Create(PyObject *args) {
   TraceProfiler *profiler = NULL;
   PyObject *out_q;
   PyObject *target;
   long long interval = 0;
   Py_ssize_t depth_limit = 0;
   int async_func = 0;
+  Py_ssize_t max_frames = 0;
+  Py_ssize_t max_bytes = 0;
+  int encoded = 0;
 
-  if (!PyArg_ParseTuple(args, "OOLpn", &target, &out_q, &interval, &async_func,
-                        &depth_limit)) {
+  if (!PyArg_ParseTuple(args, "OOLpn|nnp", &target, &out_q, &interval,
+                        &async_func, &depth_limit, &max_frames, &max_bytes,
+                        &encoded)) {
     return NULL;
   }
   if (out_q == NULL) {
     return NULL;
   }
 
-  profiler = TraceProfiler_New(interval, async_func, depth_limit);
+  profiler = TraceProfiler_New(interval, async_func, depth_limit, max_frames,
+                               max_bytes);
   Py_XINCREF(out_q);
   profiler->out_queue = out_q;
   Py_XINCREF(target);
   profiler->target = target;
-  if (async_func == 1) {
-    if (depth_limit <= 0) {
-      PyEval_SetProfile(async_profile, (PyObject *)profiler);
-    } else {
-      PyEval_SetProfile(async_profile_with_depth, (PyObject *)profiler);
+  profiler->encoded = encoded;
+  return profiler;
+}
+
+static PyObject *set_trace_profile(PyObject *m, PyObject *args,
+                                   PyObject *kwds) {
+  TraceProfiler *profiler = TraceProfiler_Create(args);
+  if (profiler == NULL) {
+    return NULL;
+  }
+  PyEval_SetProfile(profile, (PyObject *)profiler);
+  return (PyObject *)profiler;
+}
+
+////////////////////////////
+// sys.monitoring backend //
+////////////////////////////
+
+#if PY_VERSION_HEX >= 0x030C0000
+// sys.monitoring.PROFILER_ID
+#define MONITORING_TOOL_ID 2
+#define MONITORING_TOOL_NAME "flight_profiler"
+
+// profiler of the invocation traced by current thread, events of other
+// threads are ignored
+static _Thread_local TraceProfiler *monitoring_profiler = NULL;
+// sys.monitoring, set while the tool id is held
+static PyObject *monitoring = NULL;
+static long monitoring_events = 0;
+// threads tracing an invocation, events are only enabled while it's positive
+static Py_ssize_t monitoring_threads = 0;
+// tool id is released once the last traced invocation finishes
+static int monitoring_release_pending = 0;
+
+/**
+ * callable of a CALL event the profile hook would report as c_call, NULL for
+ * python functions whose PY_START is reported instead.
+ */
+static PyObject *_c_callable(PyObject *callable) {
+  if (PyCFunction_Check(callable) ||
+      Py_IS_TYPE(callable, &PyMethodDescr_Type)) {
+    return callable;
+  }
+  if (PyMethod_Check(callable) &&
+      PyCFunction_Check(PyMethod_GET_FUNCTION(callable))) {
+    return PyMethod_GET_FUNCTION(callable);
+  }
+  return NULL;
+}
+
+static PyObject *set_trace_monitoring(PyObject *m, PyObject *args,
+                                      PyObject *kwds);
+
+/**
+ * c_return of set_trace_monitoring itself is reported when events were
+ * already enabled by another thread, its c_call never was.
+ */
+static int _is_monitoring_setter(PyObject *callable) {
+  return PyCFunction_Check(callable) &&
+         PyCFunction_GET_FUNCTION(callable) == (PyCFunction)set_trace_monitoring;
+}
+
+// PY_START/PY_RESUME/PY_THROW(code, offset[, exception])
+static PyObject *monitoring_py_start(PyObject *m, PyObject *const *args,
+                                     Py_ssize_t nargs) {
+  TraceProfiler *tp = monitoring_profiler;
+  if (tp != NULL) {
+    TraceProfiler_Event(tp, NULL, (PyCodeObject *)args[0], PyTrace_CALL,
+                        Py_None);
+  }
+  Py_RETURN_NONE;
+}
+
+// PY_RETURN/PY_YIELD/PY_UNWIND(code, offset, value)
+static PyObject *monitoring_py_return(PyObject *m, PyObject *const *args,
+                                      Py_ssize_t nargs) {
+  TraceProfiler *tp = monitoring_profiler;
+  if (tp != NULL) {
+    TraceProfiler_Event(tp, NULL, (PyCodeObject *)args[0], PyTrace_RETURN,
+                        Py_None);
+  }
+  Py_RETURN_NONE;
+}
+
+// CALL(code, offset, callable, arg0)
+// call sites are never disabled: DISABLE would hold for every thread and every
+// later callable of the site, so C calls of polymorphic sites would be lost
+static PyObject *monitoring_call(PyObject *m, PyObject *const *args,
+                                 Py_ssize_t nargs) {
+  TraceProfiler *tp = monitoring_profiler;
+  if (tp == NULL) {
+    Py_RETURN_NONE;
+  }
+  // calls of python functions are seen through PY_START
+  PyObject *callable = _c_callable(args[2]);
+  if (callable != NULL) {
+    TraceProfiler_Event(tp, NULL, (PyCodeObject *)args[0], PyTrace_C_CALL,
+                        callable);
+  }
+  Py_RETURN_NONE;
+}
+
+// C_RETURN(code, offset, callable, arg0)
+static PyObject *monitoring_c_return(PyObject *m, PyObject *const *args,
+                                     Py_ssize_t nargs) {
+  TraceProfiler *tp = monitoring_profiler;
+  PyObject *callable = _c_callable(args[2]);
+  if (tp != NULL && callable != NULL && !_is_monitoring_setter(callable)) {
+    TraceProfiler_Event(tp, NULL, (PyCodeObject *)args[0], PyTrace_C_RETURN,
+                        callable);
+  }
+  Py_RETURN_NONE;
+}
+
+// C_RAISE(code, offset, callable, arg0)
+static PyObject *monitoring_c_raise(PyObject *m, PyObject *const *args,
+                                    Py_ssize_t nargs) {
+  TraceProfiler *tp = monitoring_profiler;
+  PyObject *callable = _c_callable(args[2]);
+  if (tp != NULL && callable != NULL && !_is_monitoring_setter(callable)) {
+    TraceProfiler_Event(tp, NULL, (PyCodeObject *)args[0],
+                        PyTrace_C_EXCEPTION, callable);
+  }
+  Py_RETURN_NONE;
+}
+
+static PyMethodDef monitoring_callback_defs[] = {
+    {"py_start", (PyCFunction)(void (*)(void))monitoring_py_start,
+     METH_FASTCALL, NULL},
+    {"py_return", (PyCFunction)(void (*)(void))monitoring_py_return,
+     METH_FASTCALL, NULL},
+    {"call", (PyCFunction)(void (*)(void))monitoring_call, METH_FASTCALL,
+     NULL},
+    {"c_return", (PyCFunction)(void (*)(void))monitoring_c_return,
+     METH_FASTCALL, NULL},
+    {"c_raise", (PyCFunction)(void (*)(void))monitoring_c_raise, METH_FASTCALL,
+     NULL},
+};
+
+// events of sys.monitoring.events and index of their callback above, same
+// mapping as the profile hook implemented by sys.setprofile on 3.12+
+static const struct {
+  const char *event;
+  int callback;
+} monitoring_callbacks[] = {
+    {"PY_START", 0},  {"PY_RESUME", 0}, {"PY_THROW", 0},
+    {"PY_RETURN", 1}, {"PY_YIELD", 1},  {"PY_UNWIND", 1},
+    {"CALL", 2},      {"C_RETURN", 3},  {"C_RAISE", 4},
+};
+#define MONITORING_CALLBACK_COUNT                                              \
+  (sizeof(monitoring_callbacks) / sizeof(monitoring_callbacks[0]))
+
+static int monitoring_register(PyObject *event_ids, int index,
+                               PyObject *callback) {
+  PyObject *event =
+      PyObject_GetAttrString(event_ids, monitoring_callbacks[index].event);
+  if (event == NULL) {
+    return -1;
+  }
+  monitoring_events |= PyLong_AsLong(event);
+  PyObject *result =
+      PyObject_CallMethod(monitoring, "register_callback", "iOO",
+                          MONITORING_TOOL_ID, event, callback);
+  Py_DECREF(event);
+  if (result == NULL) {
+    return -1;
+  }
+  Py_DECREF(result);
+  return 0;
+}
+
+static void monitoring_release(void) {
+  PyObject *event_ids = PyObject_GetAttrString(monitoring, "events");
+  size_t idx;
+  for (idx = 0; event_ids != NULL && idx < MONITORING_CALLBACK_COUNT; idx++) {
+    monitoring_register(event_ids, idx, Py_None);
+  }
+  Py_XDECREF(event_ids);
+  PyObject *result =
+      PyObject_CallMethod(monitoring, "set_events", "ii", MONITORING_TOOL_ID, 0);
+  Py_XDECREF(result);
+  result =
+      PyObject_CallMethod(monitoring, "free_tool_id", "i", MONITORING_TOOL_ID);
+  Py_XDECREF(result);
+  PyErr_Clear();
+  Py_CLEAR(monitoring);
+  monitoring_events = 0;
+  monitoring_release_pending = 0;
+}
+
+/**
+ * holds the profiler tool id until release_trace_monitoring, returns 0 if
+ * another tool such as cProfile holds it.
+ */
+static int monitoring_acquire(void) {
+  PyObject *sys = PyImport_ImportModule("sys");
+  if (sys == NULL) {
+    PyErr_Clear();
+    return 0;
+  }
+  monitoring = PyObject_GetAttrString(sys, "monitoring");
+  Py_DECREF(sys);
+  if (monitoring == NULL) {
+    PyErr_Clear();
+    return 0;
+  }
+  PyObject *result = PyObject_CallMethod(monitoring, "use_tool_id", "is",
+                                         MONITORING_TOOL_ID,
+                                         MONITORING_TOOL_NAME);
+  if (result == NULL) {
+    PyErr_Clear();
+    Py_CLEAR(monitoring);
+    return 0;
+  }
+  Py_DECREF(result);
+
+  PyObject *event_ids = PyObject_GetAttrString(monitoring, "events");
+  int failed = event_ids == NULL;
+  size_t idx;
+  for (idx = 0; !failed && idx < MONITORING_CALLBACK_COUNT; idx++) {
+    PyObject *callback = PyCFunction_New(
+        &monitoring_callback_defs[monitoring_callbacks[idx].callback], NULL);
+    failed = callback == NULL ||
+             monitoring_register(event_ids, idx, callback) < 0;
+    Py_XDECREF(callback);
+  }
+  Py_XDECREF(event_ids);
+  if (failed) {
+    PyErr_Clear();
+    monitoring_release();
+    return 0;
+  }
+  return 1;
+}
+
+static int monitoring_set_events(long events) {
+  PyObject *result = PyObject_CallMethod(monitoring, "set_events", "il",
+                                         MONITORING_TOOL_ID, events);
+  if (result == NULL) {
+    PyErr_Clear();
+    return 0;
+  }
+  Py_DECREF(result);
+  return 1;
+}
+
+/**
+ * returns 0 if current thread wasn't traced through sys.monitoring.
+ */
+static int monitoring_remove(void) {
+  TraceProfiler *tp = monitoring_profiler;
+  if (tp == NULL) {
+    return 0;
+  }
+  monitoring_profiler = NULL;
+  Py_DECREF(tp);
+  monitoring_threads -= 1;
+  if (monitoring_threads == 0) {
+    monitoring_set_events(0);
+    if (monitoring_release_pending) {
+      monitoring_release();
     }
-  } else {
-    if (depth_limit <= 0) {
-      PyEval_SetProfile(profile, (PyObject *)profiler);
-    } else {
-      PyEval_SetProfile(profile_with_depth, (PyObject *)profiler);
+  }
+  return 1;
+}
+#endif
+
+/**
+ * same as set_trace_profile, but events come from sys.monitoring (PEP 669) on
+ * Python 3.12+. Falls back to the profile hook on older versions or when
+ * another tool holds the profiler tool id.
+ */
+static PyObject *set_trace_monitoring(PyObject *m, PyObject *args,
+                                      PyObject *kwds) {
+  TraceProfiler *profiler = TraceProfiler_Create(args);
+  if (profiler == NULL) {
+    return NULL;
+  }
+#if PY_VERSION_HEX >= 0x030C0000
+  if (monitoring != NULL || monitoring_acquire()) {
+    monitoring_release_pending = 0;
+    if (monitoring_profiler != NULL) {
+      // nested trace in current thread replaces the outer one, as
+      // PyEval_SetProfile does
+      Py_DECREF(monitoring_profiler);
+      Py_INCREF(profiler);
+      monitoring_profiler = profiler;
+      return (PyObject *)profiler;
+    }
+    if (monitoring_threads > 0 || monitoring_set_events(monitoring_events)) {
+      Py_INCREF(profiler);
+      monitoring_profiler = profiler;
+      monitoring_threads += 1;
+      return (PyObject *)profiler;
     }
   }
+#endif
+  PyEval_SetProfile(profile, (PyObject *)profiler);
   return (PyObject *)profiler;
 }
 
 static PyObject *remove_trace_profile(PyObject *m, PyObject *args,
                                       PyObject *kwds) {
+#if PY_VERSION_HEX >= 0x030C0000
+  if (!monitoring_remove()) {
+    PyEval_SetProfile(NULL, NULL);
+  }
+#else
   PyEval_SetProfile(NULL, NULL);
+#endif
   PyObject *profiler_obj;
 
   if (!PyArg_ParseTuple(args, "O", &profiler_obj)) {
@@ -959,6 +1805,132 @@ static PyObject *remove_trace_profile(PyObject *m, PyObject *args,
   Py_RETURN_NONE;
 }
 
+static PyObject *release_trace_monitoring(PyObject *m, PyObject *args) {
+#if PY_VERSION_HEX >= 0x030C0000
+  if (monitoring != NULL) {
+    if (monitoring_threads > 0) {
+      monitoring_release_pending = 1;
+    } else {
+      monitoring_release();
+    }
+  }
+#endif
+  Py_RETURN_NONE;
+}
+
+// description of a string frame written in the record, points into the
+// utf-8 buffer of the frame string
+typedef struct {
+  const char *data;
+  Py_ssize_t size;
+  size_t hash;
+  Py_ssize_t index;
+} WireString;
+
+static size_t _bytes_hash(const char *data, Py_ssize_t size) {
+  // FNV-1a
+  size_t hash = (size_t)14695981039346656037ULL;
+  for (Py_ssize_t i = 0; i < size; i++) {
+    hash = (hash ^ (unsigned char)data[i]) * (size_t)1099511628211ULL;
+  }
+  return hash;
+}
+
+/**
+ * writes a frame string 'desp\x01start_ns\x01cost_ns\x01parent_id' as
+ * description slot, start_ns delta, cost_ns and parent_id. #table is an open
+ * addressing table of written descriptions, it never fills up as it has more
+ * slots than frames.
+ */
+static int _encode_frame(WireBuffer *buf, WireString *table, size_t mask,
+                         Py_ssize_t *strings, PyObject *frame,
+                         long long *last_start_ns) {
+  Py_ssize_t size;
+  const char *text = PyUnicode_AsUTF8AndSize(frame, &size);
+  if (text == NULL) {
+    return -1;
+  }
+  const char *sep = memchr(text, 1, size);
+  if (sep == NULL) {
+    PyErr_SetString(PyExc_ValueError, "malformed trace frame");
+    return -1;
+  }
+  Py_ssize_t desp_size = sep - text;
+  size_t hash = _bytes_hash(text, desp_size);
+  size_t idx = hash & mask;
+  WireString *slot = &table[idx];
+  while (slot->data != NULL &&
+         (slot->hash != hash || slot->size != desp_size ||
+          memcmp(slot->data, text, desp_size) != 0)) {
+    idx = (idx + 1) & mask;
+    slot = &table[idx];
+  }
+  if (slot->data != NULL) {
+    if (WireBuffer_PutUVarint(buf, slot->index + WIRE_STR_REF_BASE) < 0) {
+      return -1;
+    }
+  } else {
+    if (WireBuffer_PutString(buf, text, desp_size) < 0) {
+      return -1;
+    }
+    slot->data = text;
+    slot->size = desp_size;
+    slot->hash = hash;
+    slot->index = (*strings)++;
+  }
+
+  char *end;
+  long long start_ns = strtoll(sep + 1, &end, 10);
+  long long cost_ns = strtoll(end + 1, &end, 10);
+  long long parent_id = strtoll(end + 1, &end, 10);
+  return WireBuffer_PutTimes(buf, start_ns, cost_ns, parent_id, last_start_ns);
+}
+
+/**
+ * encode sending frames list into the frame section of binary trace record,
+ * for frames python consumers got as strings, e.g. stitched with followed
+ * threads. see encode_trace_frames in trace_frame.py
+ */
+static PyObject *encode_trace_frames(PyObject *m, PyObject *args) {
+  PyObject *frames;
+  if (!PyArg_ParseTuple(args, "O!", &PyList_Type, &frames)) {
+    return NULL;
+  }
+  Py_ssize_t frame_count = PyList_GET_SIZE(frames);
+  size_t capacity = 8;
+  while (capacity < (size_t)frame_count * 2) {
+    capacity *= 2;
+  }
+  WireString *table = PyMem_Calloc(capacity, sizeof(WireString));
+  if (table == NULL) {
+    return PyErr_NoMemory();
+  }
+  WireBuffer buf = {NULL, 0, 0};
+  PyObject *result = NULL;
+  Py_ssize_t strings = 0;
+  long long last_start_ns = 0;
+  if (WireBuffer_Reserve(&buf, 32 + frame_count * 16) < 0 ||
+      WireBuffer_PutUVarint(&buf, frame_count) < 0) {
+    goto done;
+  }
+  for (Py_ssize_t i = 0; i < frame_count; i++) {
+    PyObject *frame = PyList_GET_ITEM(frames, i);
+    if (frame == Py_None) {
+      if (WireBuffer_PutUVarint(&buf, WIRE_STR_NONE) < 0) {
+        goto done;
+      }
+    } else if (_encode_frame(&buf, table, capacity - 1, &strings, frame,
+                             &last_start_ns) < 0) {
+      goto done;
+    }
+  }
+  result = PyBytes_FromStringAndSize(buf.data, buf.size);
+done:
+  PyMem_Free(table);
+  PyMem_Free(buf.data);
+  return result;
+}
+
 ///////////////////////////
 // Module initialization //
 ///////////////////////////
@@ -966,8 +1938,15 @@ static PyObject *remove_trace_profile(PyObject *m, PyObject *args,
 static PyMethodDef module_methods[] = {
     {"set_trace_profile", (PyCFunction)set_trace_profile,
      METH_VARARGS | METH_KEYWORDS, "set_trace_profile implementation."},
+    {"set_trace_monitoring", (PyCFunction)set_trace_monitoring,
+     METH_VARARGS | METH_KEYWORDS,
+     "set_trace_profile through sys.monitoring on Python 3.12+."},
     {"remove_trace_profile", (PyCFunction)remove_trace_profile,
      METH_VARARGS | METH_KEYWORDS, "remove by setting sys.setprofile(None)"},
+    {"release_trace_monitoring", (PyCFunction)release_trace_monitoring,
+     METH_NOARGS, "release sys.monitoring tool id of set_trace_monitoring."},
+    {"encode_trace_frames", (PyCFunction)encode_trace_frames, METH_VARARGS,
+     "encode sending frames into binary record."},
     {NULL} /* Sentinel */
 };
 
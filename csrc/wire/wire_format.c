@@ -0,0 +1,281 @@
+#include <Python.h>
+
+/////////////////////////
+// Binary record       //
+/////////////////////////
+
+// string slots of wire_format.py: 0 is None, 1 introduces a new string,
+// n >= 2 references the (n - 2)th string of record
+#define WIRE_STR_NONE 0
+#define WIRE_STR_NEW 1
+#define WIRE_STR_REF_BASE 2
+
+typedef struct {
+  char *data;
+  Py_ssize_t size;
+  Py_ssize_t capacity;
+} WireBuffer;
+
+static int WireBuffer_Reserve(WireBuffer *buf, Py_ssize_t extra) {
+  if (buf->size + extra <= buf->capacity) {
+    return 0;
+  }
+  Py_ssize_t capacity = buf->capacity * 2;
+  if (capacity < buf->size + extra) {
+    capacity = buf->size + extra;
+  }
+  char *data = PyMem_Realloc(buf->data, capacity);
+  if (data == NULL) {
+    PyErr_NoMemory();
+    return -1;
+  }
+  buf->data = data;
+  buf->capacity = capacity;
+  return 0;
+}
+
+static int WireBuffer_PutUVarint(WireBuffer *buf, unsigned long long value) {
+  if (WireBuffer_Reserve(buf, 10) < 0) {
+    return -1;
+  }
+  while (value > 0x7F) {
+    buf->data[buf->size++] = (char)((value & 0x7F) | 0x80);
+    value >>= 7;
+  }
+  buf->data[buf->size++] = (char)value;
+  return 0;
+}
+
+static int WireBuffer_PutVarint(WireBuffer *buf, long long value) {
+  // zigzag keeps small negative numbers short
+  return WireBuffer_PutUVarint(
+      buf, ((unsigned long long)value << 1) ^ (unsigned long long)(value >> 63));
+}
+
+static int WireBuffer_PutBytes(WireBuffer *buf, const char *data,
+                               Py_ssize_t size) {
+  if (WireBuffer_Reserve(buf, size) < 0) {
+    return -1;
+  }
+  memcpy(buf->data + buf->size, data, size);
+  buf->size += size;
+  return 0;
+}
+
+static int WireBuffer_PutString(WireBuffer *buf, const char *data,
+                                Py_ssize_t size) {
+  if (WireBuffer_PutUVarint(buf, WIRE_STR_NEW) < 0 ||
+      WireBuffer_PutUVarint(buf, size) < 0) {
+    return -1;
+  }
+  return WireBuffer_PutBytes(buf, data, size);
+}
+
+static int WireBuffer_PutDouble(WireBuffer *buf, double value) {
+  // little endian, as struct '<d' of wire_format.py
+  union {
+    double d;
+    unsigned long long u;
+  } bits;
+  bits.d = value;
+  if (WireBuffer_Reserve(buf, 8) < 0) {
+    return -1;
+  }
+  for (int i = 0; i < 8; i++) {
+    buf->data[buf->size++] = (char)((bits.u >> (i * 8)) & 0xFF);
+  }
+  return 0;
+}
+
+/**
+ * writes #value as string slot, #strings maps strings written in the record
+ * to their index in the string table
+ */
+static int _encode_str(WireBuffer *buf, PyObject *strings, PyObject *value) {
+  if (value == Py_None) {
+    return WireBuffer_PutUVarint(buf, WIRE_STR_NONE);
+  }
+  if (!PyUnicode_Check(value)) {
+    PyErr_Format(PyExc_TypeError, "expected str, got %.200s",
+                 Py_TYPE(value)->tp_name);
+    return -1;
+  }
+  PyObject *index = PyDict_GetItemWithError(strings, value);
+  if (index != NULL) {
+    return WireBuffer_PutUVarint(buf,
+                                 PyLong_AsSsize_t(index) + WIRE_STR_REF_BASE);
+  }
+  if (PyErr_Occurred()) {
+    return -1;
+  }
+  PyObject *new_index = PyLong_FromSsize_t(PyDict_GET_SIZE(strings));
+  if (new_index == NULL || PyDict_SetItem(strings, value, new_index) < 0) {
+    Py_XDECREF(new_index);
+    return -1;
+  }
+  Py_DECREF(new_index);
+  Py_ssize_t size;
+  const char *data = PyUnicode_AsUTF8AndSize(value, &size);
+  if (data != NULL) {
+    return WireBuffer_PutString(buf, data, size);
+  }
+  // lone surrogates, e.g. from undecodable file names
+  PyErr_Clear();
+  PyObject *encoded = PyUnicode_AsEncodedString(value, "utf-8", "surrogatepass");
+  if (encoded == NULL) {
+    return -1;
+  }
+  int ret = WireBuffer_PutString(buf, PyBytes_AS_STRING(encoded),
+                                 PyBytes_GET_SIZE(encoded));
+  Py_DECREF(encoded);
+  return ret;
+}
+
+static int _encode_field(WireBuffer *buf, PyObject *strings, PyObject *kind,
+                         PyObject *value);
+
+/**
+ * writes attributes of #obj in the order of #fields, a tuple of (attribute,
+ * kind) pairs. see RecordSchema in wire_format.py
+ */
+static int _encode_fields(WireBuffer *buf, PyObject *strings, PyObject *fields,
+                          PyObject *obj) {
+  if (!PyTuple_Check(fields)) {
+    PyErr_SetString(PyExc_TypeError, "record fields must be a tuple");
+    return -1;
+  }
+  for (Py_ssize_t i = 0; i < PyTuple_GET_SIZE(fields); i++) {
+    PyObject *field = PyTuple_GET_ITEM(fields, i);
+    if (!PyTuple_Check(field) || PyTuple_GET_SIZE(field) != 2) {
+      PyErr_SetString(PyExc_TypeError, "record field must be (name, kind)");
+      return -1;
+    }
+    PyObject *value = PyObject_GetAttr(obj, PyTuple_GET_ITEM(field, 0));
+    if (value == NULL) {
+      return -1;
+    }
+    int ret = _encode_field(buf, strings, PyTuple_GET_ITEM(field, 1), value);
+    Py_DECREF(value);
+    if (ret < 0) {
+      return -1;
+    }
+  }
+  return 0;
+}
+
+static int _encode_field(WireBuffer *buf, PyObject *strings, PyObject *kind,
+                         PyObject *value) {
+  if (PyTuple_Check(kind)) {
+    return _encode_fields(buf, strings, kind, value);
+  }
+  if (!PyUnicode_Check(kind) || PyUnicode_GET_LENGTH(kind) != 1) {
+    PyErr_SetString(PyExc_ValueError, "unknown record field kind");
+    return -1;
+  }
+  switch (PyUnicode_READ_CHAR(kind, 0)) {
+  case 'u': {
+    unsigned long long number = PyLong_AsUnsignedLongLong(value);
+    if (number == (unsigned long long)-1 && PyErr_Occurred()) {
+      return -1;
+    }
+    return WireBuffer_PutUVarint(buf, number);
+  }
+  case 'v': {
+    long long number = PyLong_AsLongLong(value);
+    if (number == -1 && PyErr_Occurred()) {
+      return -1;
+    }
+    return WireBuffer_PutVarint(buf, number);
+  }
+  case 'd': {
+    double number = PyFloat_AsDouble(value);
+    if (number == -1.0 && PyErr_Occurred()) {
+      return -1;
+    }
+    return WireBuffer_PutDouble(buf, number);
+  }
+  case 'b': {
+    int flag = value == Py_None ? 2 : PyObject_IsTrue(value);
+    if (flag < 0) {
+      return -1;
+    }
+    return WireBuffer_PutUVarint(buf, flag);
+  }
+  case 's':
+    return _encode_str(buf, strings, value);
+  default:
+    PyErr_SetString(PyExc_ValueError, "unknown record field kind");
+    return -1;
+  }
+}
+
+/**
+ * encode_record(header, fields, obj) writes one object, encode_record(header,
+ * fields, objs, True) writes the count of objs followed by each of them,
+ * strings are shared by all objects. header is the record header of
+ * wire_format.py.
+ */
+static PyObject *encode_record(PyObject *m, PyObject *args) {
+  PyObject *header;
+  PyObject *fields;
+  PyObject *obj;
+  int is_list = 0;
+  if (!PyArg_ParseTuple(args, "O!OO|p", &PyBytes_Type, &header, &fields, &obj,
+                        &is_list)) {
+    return NULL;
+  }
+  PyObject *objs = NULL;
+  if (is_list) {
+    objs = PySequence_Fast(obj, "objects of record must be a sequence");
+    if (objs == NULL) {
+      return NULL;
+    }
+  }
+  WireBuffer buf = {NULL, 0, 0};
+  PyObject *strings = PyDict_New();
+  PyObject *result = NULL;
+  if (strings == NULL || WireBuffer_Reserve(&buf, 256) < 0 ||
+      WireBuffer_PutBytes(&buf, PyBytes_AS_STRING(header),
+                          PyBytes_GET_SIZE(header)) < 0) {
+    goto done;
+  }
+  if (!is_list) {
+    if (_encode_fields(&buf, strings, fields, obj) < 0) {
+      goto done;
+    }
+  } else {
+    Py_ssize_t size = PySequence_Fast_GET_SIZE(objs);
+    if (WireBuffer_PutUVarint(&buf, size) < 0) {
+      goto done;
+    }
+    for (Py_ssize_t i = 0; i < size; i++) {
+      if (_encode_fields(&buf, strings, fields,
+                         PySequence_Fast_GET_ITEM(objs, i)) < 0) {
+        goto done;
+      }
+    }
+  }
+  result = PyBytes_FromStringAndSize(buf.data, buf.size);
+done:
+  Py_XDECREF(objs);
+  Py_XDECREF(strings);
+  PyMem_Free(buf.data);
+  return result;
+}
+
+///////////////////////////
+// Module initialization //
+///////////////////////////
+
+static PyMethodDef module_methods[] = {
+    {"encode_record", (PyCFunction)encode_record, METH_VARARGS,
+     "encode attributes of objects into binary record."},
+    {NULL} /* Sentinel */
+};
+
+PyMODINIT_FUNC PyInit_wire_format_C(void) {
+  static struct PyModuleDef moduledef = {
+      PyModuleDef_HEAD_INIT, "wire_format_C", "PyFlight binary records.", -1,
+      module_methods};
+  return PyModule_Create(&moduledef);
+}
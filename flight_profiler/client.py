@@ -1,4 +1,5 @@
 import argparse
+import contextlib
 import importlib
 import json
 import os
@@ -8,12 +9,13 @@ import signal
 import socket
 import sys
 import tempfile
+import threading
 import time
 import traceback
 from importlib.metadata import version
 from pathlib import Path
 from subprocess import PIPE, Popen
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Set, Union
 
 from flight_profiler.common.global_store import (
     FORBIDDEN_COMMANDS_IN_PY314,
@@ -21,14 +23,24 @@ from flight_profiler.common.global_store import (
     set_inject_server_pid,
 )
 from flight_profiler.common.system_logger import logger
+from flight_profiler.communication.agent_registry import AgentRecord, load_agent_record
 from flight_profiler.communication.flight_client import FlightClient
+from flight_profiler.communication.unix_socket import (
+    agent_socket_path,
+    unix_socket_enabled,
+)
 from flight_profiler.plugins.help.help_agent import HELP_COMMANDS_NAMES
 from flight_profiler.utils.cli_util import (
     show_error_info,
     show_normal_info,
     verify_exit_code,
 )
-from flight_profiler.utils.env_util import is_linux, is_mac, py_higher_than_314
+from flight_profiler.utils.env_util import (
+    is_linux,
+    is_mac,
+    is_pid_namespaced,
+    py_higher_than_314,
+)
 from flight_profiler.utils.render_util import (
     COLOR_END,
     COLOR_GREEN,
@@ -47,11 +59,21 @@ try:
 except ImportError:
     READLINE_AVAILABLE = False
 
+# guards ports reserved by concurrent attaches
+_reserved_ports_lock = threading.Lock()
+# guards lib/inject_params.data, shared by agents that can't find their per-pid file
+_shared_inject_params_lock = threading.Lock()
+
+
 class ProfilerCli(object):
 
-    def __init__(self, port: int,
-                 target_executable: str):
+    def __init__(self, port: Union[int, str],
+                 target_executable: str,
+                 unix_socket_path: Optional[str] = None):
+        # tcp port, or path of agent's unix domain socket
         self.port = port
+        # preferred over tcp port once the agent listens on it
+        self.unix_socket_path = unix_socket_path
         self.server_pid = None
         self.target_executable = target_executable
         home = str(Path.home())
@@ -145,8 +167,11 @@ class ProfilerCli(object):
         if timeout is None:
             timeout = 5
         while time.time() - s < timeout:
+            address = self.port
+            if self.unix_socket_path is not None and os.path.exists(self.unix_socket_path):
+                address = self.unix_socket_path
             try:
-                client = FlightClient("localhost", self.port)
+                client = FlightClient("localhost", address)
             except:
                 time.sleep(0.5)
                 continue
@@ -157,6 +182,7 @@ class ProfilerCli(object):
                 if server_resp["app_type"] != "py_flight_profiler":
                     continue
                 self.server_pid = server_resp["pid"]
+                self.port = address
                 set_inject_server_pid(self.server_pid)
                 check_preload = True
                 client.close()
@@ -167,6 +193,47 @@ class ProfilerCli(object):
         return check_preload
 
 
+def is_agent_of(pid: str, address: Union[int, str]) -> bool:
+    """
+    check the flight agent listening on #address is attached to #pid
+
+    :param address: tcp port or unix socket path of the agent
+    """
+    try:
+        client = FlightClient("localhost", address)
+    except:
+        return False
+    try:
+        server_resp: Dict[str, Any] = json.loads(
+            client.request({"target": "status", "is_plugin_calling": False})
+        )
+        return server_resp["app_type"] == "py_flight_profiler" and str(server_resp["pid"]) == pid
+    except:
+        return False
+    finally:
+        client.close()
+
+
+def check_registered_agent(pid: str) -> Union[int, str, None]:
+    """
+    find the agent attached to pid by the record it published, only recorded addresses are probed
+
+    :param pid: target pid
+    :return unix socket path or port of the agent, None if no live agent is registered
+    """
+    record: Optional[AgentRecord] = load_agent_record(int(pid))
+    if record is None:
+        return None
+    addresses = [record.port]
+    if record.unix_socket_path is not None and unix_socket_enabled():
+        addresses.insert(0, record.unix_socket_path)
+    for address in addresses:
+        if is_agent_of(pid, address):
+            return address
+    # agent is gone without removing its record
+    return None
+
+
 def check_server_injected(
     pid: str, start_port: int, end_port: int, timeout: int
 ) -> int:
@@ -232,12 +299,16 @@ def completer(text, state):
         return None
 
 
-def find_port_available(start_port: int, end_port: int) -> int:
+def find_port_available(
+    start_port: int, end_port: int, excluded: Optional[Set[int]] = None
+) -> int:
     """
     find available port for client/server communicate in range[start_port, end_port]
     returns -1 if not find
     """
     for port in range(start_port, end_port + 1):
+        if excluded is not None and port in excluded:
+            continue
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
             try:
                 s.bind(("127.0.0.1", port))
@@ -299,8 +370,16 @@ def do_inject_on_linux(free_port: int, server_pid: str, debug: bool = False) ->
     base_addr = get_base_addr(current_directory, server_pid, "linux")
 
     code_inject_py: str = os.path.join(current_directory, "code_inject.py")
-    with open(os.path.join(current_directory, "lib/inject_params.data"), "w") as f:
-        f.write(f"{code_inject_py.strip()},{free_port},{base_addr}\n")
+    inject_params = f"{code_inject_py.strip()},{free_port},{base_addr}\n"
+    # agent prefers the per-pid file, so that processes can be attached concurrently. A
+    # process in another pid namespace looks up its own pid and falls back to the shared
+    # file, those injections run one at a time
+    pid_params_path = os.path.join(current_directory, f"lib/inject_params_{server_pid}.data")
+    params_paths = [pid_params_path]
+    lock = contextlib.nullcontext()
+    if is_pid_namespaced(int(server_pid)):
+        params_paths.append(os.path.join(current_directory, "lib/inject_params.data"))
+        lock = _shared_inject_params_lock
 
     shell_path = os.path.join(current_directory, "lib/inject")
     # Add debug flag to the command if enabled
@@ -308,15 +387,23 @@ def do_inject_on_linux(free_port: int, server_pid: str, debug: bool = False) ->
     if debug:
         cmd_args.append("--debug")
 
-    ps = Popen(
-        cmd_args,
-        stdin=PIPE,
-        stdout=None,
-        stderr=None,
-        bufsize=1,
-        text=True,
-    )
-    exit_code = ps.wait()
+    with lock:
+        for params_path in params_paths:
+            with open(params_path, "w") as f:
+                f.write(inject_params)
+        ps = Popen(
+            cmd_args,
+            stdin=PIPE,
+            stdout=None,
+            stderr=None,
+            bufsize=1,
+            text=True,
+        )
+        exit_code = ps.wait()
+    try:
+        os.remove(pid_params_path)
+    except OSError:
+        pass
     verify_exit_code(exit_code, server_pid)
     return free_port
 
@@ -453,6 +540,94 @@ def show_pre_attach_info(server_pid: str, debug: bool = False):
     else:
         print(f"[INFO] Permission information not available on this platform.")
 
+def attach_process(
+    server_pid: str, debug: bool = False, reserved_ports: Optional[Set[int]] = None
+) -> Union[int, str]:
+    """
+    reuse the agent already attached to server_pid, or inject a new one
+
+    :param server_pid: target pid
+    :param debug: enable debug logging for attachment
+    :param reserved_ports: ports picked by concurrent attaches, never handed out twice
+    :return unix socket path or port of the agent, exits abnormally if injection fails
+    """
+    inject_start_port = int(os.getenv("PYFLIGHT_INJECT_START_PORT", 16000))
+    inject_end_port = int(os.getenv("PYFLIGHT_INJECT_END_PORT", 16500))
+    inject_timeout = int(os.getenv("PYFLIGHT_INJECT_TIMEOUT", 5))
+
+    registered_address = check_registered_agent(server_pid)
+    if registered_address is not None:
+        print(
+            f"[INFO] Process {server_pid} was attached through {registered_address} already, so keep reusing it."
+        )
+        return registered_address
+    connect_port: int = check_server_injected(
+        server_pid, inject_start_port, inject_end_port, inject_timeout
+    )
+    if connect_port >= 0:
+        print(
+            f"[INFO] Process {server_pid} was attached through port {connect_port} already, so keep reusing the same port."
+        )
+        return connect_port
+    with _reserved_ports_lock:
+        free_port: int = find_port_available(inject_start_port, inject_end_port, reserved_ports)
+        if reserved_ports is not None:
+            reserved_ports.add(free_port)
+    if free_port < 0:
+        print(
+            f"No available debug port between range: {inject_start_port} {inject_end_port}"
+        )
+    if sys.version_info >= (3, 14):
+        if not is_linux() and not is_mac():
+            print(f"flight profiler is not enabled on platform: {platform.system()}.")
+            exit(1)
+        # sys.remote_exec is provided in CPython 3.14, we can just use it to inject agent code
+        connect_port = do_inject_with_sys_remote_exec(free_port, server_pid, debug)
+    else:
+        if is_linux():
+            connect_port = do_inject_on_linux(free_port, server_pid, debug)
+        elif is_mac():
+            connect_port = do_inject_on_mac(free_port, server_pid, debug)
+        else:
+            print(f"flight profiler is not enabled on platform: {platform.system()}.")
+            exit(1)
+    return connect_port
+
+
+def create_fanout_cli(parser: argparse.ArgumentParser, args: argparse.Namespace) -> "ProfilerCli":
+    """
+    attach all processes given by --pids or --parent, exits if none of them is attached
+    """
+    from flight_profiler.fanout_cli import (
+        FanoutProfilerCli,
+        attach_processes,
+        discover_worker_pids,
+        parse_pid_list,
+    )
+
+    if args.pids is not None:
+        try:
+            pids = parse_pid_list(args.pids)
+        except argparse.ArgumentTypeError as e:
+            parser.print_usage()
+            print(e)
+            exit(1)
+    else:
+        pids = discover_worker_pids(args.parent)
+        if not pids:
+            print(f"[ERROR]❌ No child process of {args.parent} is found.")
+            exit(1)
+    workers: Dict[str, Union[int, str]] = attach_processes(pids, args.debug)
+    if not workers:
+        print(f"[ERROR]❌ PyFlightProfiler attach failed, none of processes {','.join(pids)} is attached.")
+        exit(1)
+    cli = FanoutProfilerCli(workers, get_py_bin_path(next(iter(workers))))
+    if not cli.check_status(timeout=5):
+        verify_exit_code(16, ",".join(workers))
+    print(f"\nPyFlightProfiler: 🌟 attach target processes {','.join(cli.workers)} successfully!")
+    return cli
+
+
 def run():
     # Handle subcommands
     if len(sys.argv) > 1:
@@ -467,65 +642,51 @@ def run():
             return
 
     parser = argparse.ArgumentParser(
-        usage="%(prog)s <pid> [options]\n       %(prog)s install-skills\n       %(prog)s uninstall-skills\n\n"
+        usage="%(prog)s <pid> [options]\n       %(prog)s --pids <pid,pid,...> [options]\n       %(prog)s --parent <pid> [options]\n"
+              "       %(prog)s install-skills\n       %(prog)s uninstall-skills\n\n"
               "A realtime analysis tool for profiling Python programs."
     )
     parser.add_argument(
         "pid",
         type=int,
+        nargs="?",
         help="python process id to analyze."
     )
+    parser.add_argument("--pids", required=False, type=str, help="comma separated process ids, commands run on all of them.")
+    parser.add_argument("--parent", required=False, type=int, help="run commands on all child processes of this pid, such as gunicorn workers.")
     parser.add_argument("--cmd", required=False, type=str, help="One-time profile, primarily used for unit testing.")
     parser.add_argument("--debug", required=False, action="store_true", help="enable debug logging for attachment.")
     try:
         args = parser.parse_args()
     except:
         exit(1)
-    server_pid = str(args.pid)
-    inject_start_port = int(os.getenv("PYFLIGHT_INJECT_START_PORT", 16000))
-    inject_end_port = int(os.getenv("PYFLIGHT_INJECT_END_PORT", 16500))
-    inject_timeout = int(os.getenv("PYFLIGHT_INJECT_TIMEOUT", 5))
-    show_pre_attach_info(server_pid, args.debug)
 
-    connect_port: int = check_server_injected(
-        server_pid, inject_start_port, inject_end_port, inject_timeout
-    )
-    if connect_port < 0:
-        free_port: int = find_port_available(inject_start_port, inject_end_port)
-        if free_port < 0:
-            print(
-                f"No available debug port between range: {inject_start_port} {inject_end_port}"
-            )
-        if sys.version_info >= (3, 14):
-            if not is_linux() and not is_mac():
-                print(f"flight profiler is not enabled on platform: {platform.system()}.")
-                exit(1)
-            # sys.remote_exec is provided in CPython 3.14, we can just use it to inject agent code
-            connect_port = do_inject_with_sys_remote_exec(free_port, server_pid, args.debug)
-        else:
-            if is_linux():
-                connect_port = do_inject_on_linux(free_port, server_pid, args.debug)
-            elif is_mac():
-                connect_port = do_inject_on_mac(free_port, server_pid, args.debug)
-            else:
-                print(f"flight profiler is not enabled on platform: {platform.system()}.")
-                exit(1)
+    if args.pids is not None or args.parent is not None:
+        cli = create_fanout_cli(parser, args)
     else:
-        print(
-            f"[INFO] Process {server_pid} was attached through port {connect_port} already, so keep reusing the same port."
+        if args.pid is None:
+            parser.print_usage()
+            exit(1)
+        server_pid = str(args.pid)
+        show_pre_attach_info(server_pid, args.debug)
+
+        connect_port: Union[int, str] = attach_process(server_pid, args.debug)
+        cli = ProfilerCli(
+            port=connect_port,
+            target_executable=get_py_bin_path(server_pid),
+            unix_socket_path=agent_socket_path(int(server_pid)) if unix_socket_enabled() else None,
         )
+        check_preload = cli.check_status(timeout=5)
+        if check_preload:
+            print(f"\nPyFlightProfiler: 🌟 attach target process {server_pid} successfully!")
+        else:
+            # here the injection routine is done successfully, but server has no chance to respond
+            verify_exit_code(16, server_pid)
 
     # add tab complete
     if READLINE_AVAILABLE:
         readline.set_completer(completer)
         readline.parse_and_bind("tab: complete")
-    cli = ProfilerCli(port=connect_port, target_executable=get_py_bin_path(server_pid))
-    check_preload = cli.check_status(timeout=5)
-    if check_preload:
-        print(f"\nPyFlightProfiler: 🌟 attach target process {server_pid} successfully!")
-    else:
-        # here the injection routine is done successfully, but server has no chance to respond
-        verify_exit_code(16, server_pid)
 
     # load history cmd
     if os.path.exists(cli.history_file) and READLINE_AVAILABLE:
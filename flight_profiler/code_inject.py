@@ -16,6 +16,11 @@ else:
     current_file_abspath = os.path.abspath(__file__)
 
 sys.path.append(os.path.dirname(current_file_abspath))
+from flight_profiler.common.enter_exit_command import mark_agent_thread
+from flight_profiler.communication.unix_socket import (
+    prepare_agent_socket_path,
+    unix_socket_enabled,
+)
 from flight_profiler.server_flight_profiler import FlightProfilerServer
 
 
@@ -39,7 +44,14 @@ logger.info("pyFlightProfiler: will use listen port " + str(listen_port))
 
 
 def run_app():
-    profiler = FlightProfilerServer("localhost", listen_port)
+    mark_agent_thread()
+    unix_socket_path = None
+    if unix_socket_enabled():
+        try:
+            unix_socket_path = prepare_agent_socket_path(os.getpid())
+        except OSError:
+            logger.exception("pyFlightProfiler: unix socket disabled, fallback to tcp only")
+    profiler = FlightProfilerServer("localhost", listen_port, unix_socket_path)
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     tasks = [loop.create_task(profiler.run())]
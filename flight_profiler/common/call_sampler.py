@@ -0,0 +1,82 @@
+import random
+import re
+import time
+from typing import Optional, Tuple
+
+from flight_profiler.common.enter_exit_command import is_agent_thread
+
+RATE_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_rate(value: str) -> Tuple[float, float]:
+    """
+    Parse rate limit expression like 5/s, 100/m or 2 (per second).
+
+    Returns:
+        Tuple[float, float]: (tokens, period seconds)
+    """
+    matched = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*(?:/\s*([smh]))?\s*", value)
+    if matched is None:
+        raise ValueError(f"rate {value} should be formatted like 5/s, 100/m or 1/h")
+    tokens = float(matched.group(1))
+    if tokens <= 0:
+        raise ValueError(f"rate {value} should be positive")
+    return tokens, RATE_UNIT_SECONDS[matched.group(2) or "s"]
+
+
+class CallSampler:
+    """
+    Decides whether an invocation of instrumented method should be observed, called
+    before any filter or serialization work so that skipped calls stay cheap.
+
+    Combines a sampling probability with a token bucket rate limit, both optional.
+    """
+
+    def __init__(self, sample_rate: Optional[float] = None, rate_limit: Optional[str] = None):
+        self.sample_rate = sample_rate
+        self.rate_limit = rate_limit
+        self.seen = 0
+        self.sampled = 0
+        self.__tokens_per_sec: float = 0
+        self.__capacity: float = 0
+        self.__tokens: float = 0
+        self.__last_refill: float = 0
+        if rate_limit is not None:
+            tokens, period = parse_rate(rate_limit)
+            self.__tokens_per_sec = tokens / period
+            # allow a burst of at most one period worth of calls, at least one call
+            self.__capacity = max(tokens, 1.0)
+            self.__tokens = self.__capacity
+            self.__last_refill = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate is not None or self.rate_limit is not None
+
+    def should_sample(self, exhausted: bool = False) -> bool:
+        """
+        #exhausted tells the count limit of command is used up. Those calls and calls
+        from agent threads are refused by enter anyway, so they never take a token.
+        """
+        if exhausted or is_agent_thread():
+            return False
+        self.seen += 1
+        if self.sample_rate is not None and random.random() >= self.sample_rate:
+            return False
+        if self.rate_limit is not None and not self.__acquire_token():
+            return False
+        self.sampled += 1
+        return True
+
+    def __acquire_token(self) -> bool:
+        # races between threads only make the bucket slightly over/under admit, no lock needed
+        now = time.monotonic()
+        self.__tokens = min(
+            self.__capacity,
+            self.__tokens + (now - self.__last_refill) * self.__tokens_per_sec,
+        )
+        self.__last_refill = now
+        if self.__tokens >= 1:
+            self.__tokens -= 1
+            return True
+        return False
@@ -0,0 +1,109 @@
+import copy
+import queue
+import threading
+from typing import Any, Callable, Optional
+
+from flight_profiler.common.enter_exit_command import mark_agent_thread
+from flight_profiler.common.system_logger import logger
+
+# snapshot policies of objects handed to a DumpWorker
+# ref: keep references, objects mutated after the call are dumped in their later state
+# copy: shallow copy builtin containers, elements and other objects are still shared
+SNAPSHOT_REF = "ref"
+SNAPSHOT_COPY = "copy"
+SNAPSHOT_POLICIES = (SNAPSHOT_REF, SNAPSHOT_COPY)
+
+DUMP_QUEUE_SIZE = 1024
+# how often an idle worker checks whether it is closed
+CLOSE_CHECK_INTERVAL = 0.1
+
+_SHALLOW_COPIED_TYPES = (list, dict, set, bytearray)
+
+
+def snapshot(value: Any, policy: str) -> Any:
+    """
+    cheap enough for application thread, never deep copies
+    """
+    if policy == SNAPSHOT_COPY and type(value) in _SHALLOW_COPIED_TYPES:
+        try:
+            return copy.copy(value)
+        except Exception:
+            return value
+    return value
+
+
+class DumpWorker:
+    """
+    Runs expression evaluation and encoding of captured invocations on a background thread,
+    so that the instrumented method returns without paying for serialization.
+    Tasks submitted while the queue is full are dropped and reported by #on_dropped.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        on_dropped: Optional[Callable[[int], None]] = None,
+        capacity: int = DUMP_QUEUE_SIZE,
+    ):
+        self.name = name
+        self.on_dropped = on_dropped
+        self.tasks: queue.Queue = queue.Queue(capacity)
+        self.dropped = 0
+        self.reported_dropped = 0
+        self.drop_lock = threading.Lock()
+        self.closing = False
+        self.on_closed: Optional[Callable[[], None]] = None
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.thread is not None:
+            # shared by all methods of a pattern command, started once
+            return
+        self.thread = threading.Thread(target=self.__run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def submit(self, func: Callable, *args, **kwargs) -> bool:
+        try:
+            self.tasks.put_nowait((func, args, kwargs))
+            return True
+        except queue.Full:
+            with self.drop_lock:
+                self.dropped += 1
+            return False
+
+    def close(self, on_closed: Optional[Callable[[], None]] = None) -> None:
+        """
+        #on_closed runs after tasks already submitted are done, in worker thread if started
+        """
+        self.on_closed = on_closed
+        self.closing = True
+        if self.thread is None and on_closed is not None:
+            on_closed()
+
+    def __report_dropped(self) -> None:
+        dropped = self.dropped - self.reported_dropped
+        if dropped > 0 and self.on_dropped is not None:
+            self.reported_dropped += dropped
+            self.on_dropped(dropped)
+
+    def __run(self) -> None:
+        mark_agent_thread()
+        tasks = self.tasks
+        while True:
+            try:
+                func, args, kwargs = tasks.get(timeout=CLOSE_CHECK_INTERVAL)
+            except queue.Empty:
+                if self.closing:
+                    break
+                continue
+            self.__report_dropped()
+            try:
+                func(*args, **kwargs)
+            except:
+                logger.exception(f"[DumpWorker] {self.name} task failed.")
+        self.__report_dropped()
+        if self.on_closed is not None:
+            try:
+                self.on_closed()
+            except:
+                logger.exception(f"[DumpWorker] {self.name} close failed.")
@@ -1,61 +1,117 @@
 import importlib
+import itertools
 import sys
-from typing import Optional
+import threading
+from types import CodeType
+from typing import Dict, List, Optional
 
 from flight_profiler.common import aop_decorator
 from flight_profiler.common.system_logger import logger
 from flight_profiler.plugins.server_plugin import Message, ServerQueue
 
 
+class _AgentThreadState(threading.local):
+    inside_agent = False
+
+
+_agent_thread_state = _AgentThreadState()
+
+# caller code object -> whether it belongs to flight profiler. Code compiled at runtime,
+# like templates or exec'ed snippets, keeps coming, so the cache is emptied once full
+# instead of pinning those code objects forever
+MAX_VERDICT_CACHE_SIZE = 4096
+_self_injected_verdicts: Dict[CodeType, bool] = {}
+
+
+def mark_agent_thread() -> None:
+    """
+    called by threads owned by the agent, instrumented methods invoked by them are never recorded
+    """
+    _agent_thread_state.inside_agent = True
+
+
+def is_agent_thread() -> bool:
+    return _agent_thread_state.inside_agent
+
+
+def is_profiler_code(code: CodeType) -> bool:
+    filename = code.co_filename
+    return "flight_profiler" in filename and "test" not in filename
+
+
 class EnterExitCommand:
 
     def __init__(self, limit: int):
-        self.__count = 0
-        self.__finished = 0
+        # next() of itertools.count is atomic under gil, unlike += on an attribute
+        self.__tickets = itertools.count()
+        self.__finished = itertools.count()
+        self.exhausted = False
         self.limit = limit
         self.out_q: Optional[ServerQueue] = None
         self.origin_code = None
         self.module_name = None
         self.method_name = None
         self.class_name = None
+        # commands sharing limit and output stream, see join_group
+        self.members: List["EnterExitCommand"] = [self]
+        # unique key of the pattern command the members were resolved from, see group_key
+        self.pattern_key: Optional[str] = None
+
+    def join_group(self, leader: "EnterExitCommand") -> None:
+        """
+        commands instrumenting methods matched by one pattern share the limit of #leader,
+        the whole group is recovered with a single end message once the limit is reached
+        """
+        self.__tickets = leader.__tickets
+        self.__finished = leader.__finished
+        self.members = leader.members
+        self.members.append(self)
+        self.pattern_key = leader.pattern_key
 
     def enter(self) -> bool:
         """
         only execute method only and avoids self inject
         """
-        self_injected: bool = False
+        if self.exhausted or _agent_thread_state.inside_agent:
+            return False
         try:
-            # f_back must be non-null because enter is called by flight-profiler internal method
-            f = sys._getframe().f_back.f_back
-            if f is None or (
-                "flight_profiler" in f.f_code.co_filename
-                and "test" not in f.f_code.co_filename
-            ):
-                self_injected = True
-        except:
-            self_injected = True
-        if self_injected:
+            # frame 1 is the wrapper, frame 2 is the caller of instrumented method
+            code = sys._getframe(2).f_code
+        except ValueError:
+            return False
+        verdict = _self_injected_verdicts.get(code)
+        if verdict is None:
+            verdict = is_profiler_code(code)
+            if len(_self_injected_verdicts) >= MAX_VERDICT_CACHE_SIZE:
+                _self_injected_verdicts.clear()
+            _self_injected_verdicts[code] = verdict
+        if verdict:
             return False
 
-        if self.__count < self.limit:
-            self.__count += 1
+        if next(self.__tickets) < self.limit:
             return True
-        else:
-            return False
+        self.exhausted = True
+        return False
 
     def exit(self):
         """
         calls on target method exit
         """
         try:
-            self.__finished += 1
-            if self.__finished >= self.limit:
+            # exactly one thread observes the last finished invocation
+            if next(self.__finished) == self.limit - 1:
                 self.recover_origin_code()
-                self.child_clear_action()
+                for member in self.members:
+                    member.child_clear_action()
         except:
             logger.exception("error on exit")
 
     def recover_origin_code(self):
+        for member in self.members:
+            member.restore_origin_code()
+        self.end_output()
+
+    def restore_origin_code(self):
         if self.origin_code is not None:
             try:
                 module = importlib.import_module(self.module_name)
@@ -66,12 +122,22 @@ class EnterExitCommand:
                 logger.exception("clear func wrapper failed.")
             self.origin_code = None
 
+    def end_output(self):
+        """
+        tells client that no more result follows
+        """
         if self.out_q is not None:
             self.out_q.output_msg_nowait(Message(is_end=True, msg=None))
 
     def child_clear_action(self):
         pass
 
+    def group_key(self) -> str:
+        """
+        key of the command as typed, off finds the group by it without resolving patterns again
+        """
+        return self.pattern_key if self.pattern_key is not None else self.unique_key()
+
     def unique_key(self):
         if hasattr(self, "nested_method"):
             return f"{self.module_name}&{self.class_name}&{self.method_name}&{self.nested_method}"
@@ -1,5 +1,39 @@
+import functools
 import uuid
-from typing import Any
+from typing import Any, Callable, Optional
+
+# signatures of generated expression functions, keyed by resolver kind
+METHOD_INVOCATION_PARAMS = "target, return_obj, *args, **kwargs"
+INSTANCE_PARAMS = "target"
+INSTANCE_LIST_PARAMS = "instances"
+FILTER_PARAMS = "target, return_obj, cost, *args, **kwargs"
+
+
+@functools.lru_cache(maxsize=256)
+def compile_expression(params: str, expr: str) -> Callable:
+    """
+    Compile expression as the return statement of a function with #params signature.
+    Compiled functions are cached by (params, expr), so commands sharing the same
+    expression text reuse one function object instead of calling exec on every invocation.
+
+    Args:
+        params (str): function parameter list, e.g. "target, return_obj, *args, **kwargs"
+        expr (str): python right value statement
+
+    Returns:
+        Callable: compiled expression function
+
+    Raises:
+        SyntaxError: if expr is not a valid python expression
+    """
+    uid = str(uuid.uuid4())
+    func_name = f"expr_func_{uid.replace('-', '_')}"
+    code = compile(
+        f"def {func_name}({params}): return {expr}", f"<expr: {expr}>", "exec"
+    )
+    namespace = {}
+    exec(code, globals(), namespace)
+    return namespace[func_name]
 
 
 class ExpressionResolver:
@@ -36,14 +70,10 @@ class MethodInvocationExprResolver(ExpressionResolver):
         """
 
         self.__expr = expr
-        uid = str(uuid.uuid4())
-        self.__func_name = f"expr_func_{uid.replace('-', '_')}"
-        self.__code = f"def {self.__func_name}(target, return_obj, *args, **kwargs): return {self.__expr}"
+        self.__func: Callable = compile_expression(METHOD_INVOCATION_PARAMS, self.__expr)
 
     def eval(self, target_obj: Any, return_obj: Any, *args, **kwargs) -> Any:
-        namespace = {}
-        exec(self.__code, globals(), namespace)
-        return namespace[self.__func_name](target_obj, return_obj, *args, **kwargs)
+        return self.__func(target_obj, return_obj, *args, **kwargs)
 
 
 class InstanceExprResolver(ExpressionResolver):
@@ -54,14 +84,10 @@ class InstanceExprResolver(ExpressionResolver):
         """
 
         self.__expr = expr
-        uid = str(uuid.uuid4())
-        self.__func_name = f"expr_func_{uid.replace('-', '_')}"
-        self.__code = f"def {self.__func_name}(target): return {self.__expr}"
+        self.__func: Callable = compile_expression(INSTANCE_PARAMS, self.__expr)
 
     def eval_target(self, target_obj: Any) -> Any:
-        namespace = {}
-        exec(self.__code, globals(), namespace)
-        return namespace[self.__func_name](target_obj)
+        return self.__func(target_obj)
 
 
 class InstanceListExprResolver(ExpressionResolver):
@@ -72,14 +98,10 @@ class InstanceListExprResolver(ExpressionResolver):
         """
 
         self.__expr = expr
-        uid = str(uuid.uuid4())
-        self.__func_name = f"expr_func_{uid.replace('-', '_')}"
-        self.__code = f"def {self.__func_name}(instances): return {self.__expr}"
+        self.__func: Callable = compile_expression(INSTANCE_LIST_PARAMS, self.__expr)
 
     def eval_target(self, target_obj: Any) -> Any:
-        namespace = {}
-        exec(self.__code, globals(), namespace)
-        return namespace[self.__func_name](target_obj)
+        return self.__func(target_obj)
 
 
 class FilterExprResolver(ExpressionResolver):
@@ -90,20 +112,16 @@ class FilterExprResolver(ExpressionResolver):
         """
 
         self.__expr = expr
-        uid = str(uuid.uuid4())
-        self.__func_name = f"expr_func_{uid.replace('-', '_')}"
-        self.__code = f"def {self.__func_name}(target, return_obj, cost, *args, **kwargs): return {self.__expr}"
+        self.__func: Optional[Callable] = None
+        if self.__expr is not None:
+            self.__func = compile_expression(FILTER_PARAMS, self.__expr)
 
     def eval_filter(
         self, target_obj: Any, return_obj: Any, cost: float, *args, **kwargs
     ) -> False:
 
-        if self.__expr is not None:
-            namespace = {}
-            exec(self.__code, globals(), namespace)
-            ok = namespace[self.__func_name](
-                target_obj, return_obj, cost, *args, **kwargs
-            )
+        if self.__func is not None:
+            ok = self.__func(target_obj, return_obj, cost, *args, **kwargs)
             if not ok:
                 return False
         return True
@@ -0,0 +1,72 @@
+from typing import Dict, Iterable, Optional
+
+# each power of two range is split into 2^SUB_BUCKET_BITS linear buckets,
+# bounding the relative error of percentiles to about 1 / 2^SUB_BUCKET_BITS
+SUB_BUCKET_BITS = 4
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+
+
+def bucket_index(value: int) -> int:
+    """
+    log-linear bucket index of a non-negative integer value
+    """
+    if value < SUB_BUCKET_COUNT:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKET_COUNT + (value >> shift) - SUB_BUCKET_COUNT
+
+
+def bucket_lower_bound(index: int) -> int:
+    if index < SUB_BUCKET_COUNT:
+        return index
+    shift = index // SUB_BUCKET_COUNT - 1
+    return (index % SUB_BUCKET_COUNT + SUB_BUCKET_COUNT) << shift
+
+
+def bucket_upper_bound(index: int) -> int:
+    return bucket_lower_bound(index + 1) - 1
+
+
+class LatencyHistogram:
+    """
+    Sparse log-linear histogram of latencies recorded in microseconds.
+    Buckets are kept in a dict so that histograms are compact to transfer and mergeable.
+    """
+
+    def __init__(self, buckets: Optional[Dict[int, int]] = None):
+        self.buckets: Dict[int, int] = buckets if buckets is not None else {}
+        self.count: int = sum(self.buckets.values())
+
+    def record_us(self, value_us: int) -> None:
+        idx = bucket_index(value_us if value_us > 0 else 0)
+        self.buckets[idx] = self.buckets.get(idx, 0) + 1
+        self.count += 1
+
+    def record_ms(self, value_ms: float) -> None:
+        self.record_us(int(value_ms * 1000))
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        for idx, cnt in other.buckets.items():
+            self.buckets[idx] = self.buckets.get(idx, 0) + cnt
+        self.count += other.count
+        return self
+
+    def percentile_us(self, quantile: float) -> int:
+        """
+        returns the upper bound of bucket which contains #quantile, 0 if histogram is empty
+        """
+        if self.count == 0:
+            return 0
+        rank = max(1, int(round(quantile * self.count)))
+        seen = 0
+        for idx in sorted(self.buckets):
+            seen += self.buckets[idx]
+            if seen >= rank:
+                return bucket_upper_bound(idx)
+        return bucket_upper_bound(max(self.buckets))
+
+    def percentile_ms(self, quantile: float) -> float:
+        return self.percentile_us(quantile) / 1000
+
+    def percentiles_ms(self, quantiles: Iterable[float]) -> Dict[float, float]:
+        return {q: self.percentile_ms(q) for q in quantiles}
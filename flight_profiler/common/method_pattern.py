@@ -0,0 +1,177 @@
+import argparse
+import fnmatch
+import inspect
+import re
+import sys
+from typing import List, Optional, Pattern
+
+# methods instrumented by one pattern command at most, unless raised by --max-targets
+MAX_PATTERN_TARGETS = 50
+
+# glob is used by default, "re:" prefix switches a name to a python regular expression
+REGEX_PREFIX = "re:"
+_GLOB_CHARS = ("*", "?", "[")
+
+
+class MethodTarget:
+
+    def __init__(self, module_name: str, class_name: Optional[str], method_name: str):
+        self.module_name = module_name
+        self.class_name = class_name
+        self.method_name = method_name
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, MethodTarget)
+            and self.module_name == other.module_name
+            and self.class_name == other.class_name
+            and self.method_name == other.method_name
+        )
+
+    def __repr__(self):
+        if self.class_name is None:
+            return f"{self.module_name}.{self.method_name}"
+        return f"{self.module_name}.{self.class_name}.{self.method_name}"
+
+
+def check_max_targets(value):
+    """
+    argparse type of --max-targets, shared by commands accepting method patterns
+    """
+    try:
+        i_value = int(value)
+    except:
+        raise argparse.ArgumentTypeError(f"max-targets: {value} is not a integer.")
+    if i_value < 1:
+        raise argparse.ArgumentTypeError(f"max-targets: {value} should be positive.")
+    return i_value
+
+
+def is_name_pattern(name: Optional[str]) -> bool:
+    if name is None:
+        return False
+    return name.startswith(REGEX_PREFIX) or any(c in name for c in _GLOB_CHARS)
+
+
+def is_method_pattern(
+    module_name: Optional[str], class_name: Optional[str], method_name: Optional[str]
+) -> bool:
+    return (
+        is_name_pattern(module_name)
+        or is_name_pattern(class_name)
+        or is_name_pattern(method_name)
+    )
+
+
+def compile_name_pattern(name: str) -> Pattern:
+    """
+    Raises:
+        ValueError: if regular expression is malformed
+    """
+    if name.startswith(REGEX_PREFIX):
+        try:
+            return re.compile(name[len(REGEX_PREFIX) :])
+        except re.error as e:
+            raise ValueError(f"illegal regular expression {name}: {e}")
+    return re.compile(fnmatch.translate(name))
+
+
+def split_class_method(class_name: Optional[str], method_name: str):
+    """
+    "*Repo.get_*" given as method means class pattern *Repo and method pattern get_*
+    """
+    if (
+        class_name is None
+        and not method_name.startswith(REGEX_PREFIX)
+        and "." in method_name
+    ):
+        class_name, method_name = method_name.rsplit(".", 1)
+    return class_name, method_name
+
+
+def _is_profiler_module(module_name: str) -> bool:
+    return module_name.startswith("flight_profiler") and "test" not in module_name
+
+
+class _NamePattern:
+    """
+    matches class or method names, dunder methods are only matched by patterns asking
+    for them explicitly, such as "__init__" or "_*"
+    """
+
+    def __init__(self, name: str):
+        self.pattern = compile_name_pattern(name)
+        source = name[len(REGEX_PREFIX) :] if name.startswith(REGEX_PREFIX) else name
+        self.match_dunder = source.lstrip("^").startswith("_")
+
+    def matches(self, name: str) -> bool:
+        if name.startswith("__") and not self.match_dunder:
+            return False
+        return self.pattern.fullmatch(name) is not None
+
+
+def _function_names(namespace: dict, owner_module: str) -> List[str]:
+    names = []
+    for name, value in namespace.items():
+        if isinstance(value, (staticmethod, classmethod)):
+            value = value.__func__
+        if inspect.isfunction(value) and getattr(value, "__module__", None) == owner_module:
+            names.append(name)
+    return names
+
+
+def resolve_method_pattern(
+    module_pattern: str,
+    class_pattern: Optional[str],
+    method_pattern: str,
+    max_targets: int = MAX_PATTERN_TARGETS,
+) -> List[MethodTarget]:
+    """
+    resolve patterns against modules loaded by target process, only methods defined by
+    the matched module or class themselves are returned, flight profiler is never matched
+
+    Raises:
+        ValueError: if nothing matches, or more than #max_targets methods match
+    """
+    class_pattern, method_pattern = split_class_method(class_pattern, method_pattern)
+    module_re = compile_name_pattern(module_pattern)
+    class_re = _NamePattern(class_pattern) if class_pattern is not None else None
+    method_re = _NamePattern(method_pattern)
+
+    targets: List[MethodTarget] = []
+    # sorted so that targets are stable between "on" and "off" of the same pattern
+    for module_name in sorted(sys.modules):
+        module = sys.modules.get(module_name)
+        if (
+            module is None
+            or _is_profiler_module(module_name)
+            or module_re.fullmatch(module_name) is None
+        ):
+            continue
+        try:
+            namespace = dict(vars(module))
+        except TypeError:
+            continue
+        if class_re is None:
+            for name in sorted(_function_names(namespace, module_name)):
+                if method_re.matches(name):
+                    targets.append(MethodTarget(module_name, None, name))
+        else:
+            for class_name in sorted(namespace):
+                cls = namespace[class_name]
+                if (
+                    not inspect.isclass(cls)
+                    or cls.__module__ != module_name
+                    or not class_re.matches(class_name)
+                ):
+                    continue
+                for name in sorted(_function_names(dict(vars(cls)), module_name)):
+                    if method_re.matches(name):
+                        targets.append(MethodTarget(module_name, class_name, name))
+        if len(targets) > max_targets:
+            raise ValueError(
+                f"more than {max_targets} methods match the pattern, narrow it or raise --max-targets."
+            )
+    if not targets:
+        raise ValueError("no loaded method matches the pattern.")
+    return targets
@@ -0,0 +1,227 @@
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from flight_profiler.ext.wire_format_C import encode_record as c_encode_record
+except ImportError:
+    # extensions failed to build, records are encoded by RecordEncoder
+    c_encode_record = None
+
+# every binary record starts with magic, format version and record type.
+# magic never collides with pickle payloads, which start with b"\x80"
+WIRE_MAGIC = 0xFB
+WIRE_VERSION = 1
+RECORD_HEADER = struct.Struct("<BBB")
+
+RECORD_TRACE_FRAMES = 1
+RECORD_WATCH_RESULT = 2
+RECORD_TT_RECORD = 3
+RECORD_TT_RECORD_LIST = 4
+RECORD_TT_FULL_RECORD = 5
+RECORD_DROP_NOTICE = 6
+RECORD_TRACE_AGGREGATE = 7
+
+_DOUBLE = struct.Struct("<d")
+
+# string slots: 0 is None, 1 introduces a new string, n >= 2 references string n - 2
+_STR_NONE = 0
+_STR_NEW = 1
+_STR_REF_BASE = 2
+
+
+class WireFormatError(ValueError):
+    pass
+
+
+def is_wire_record(data: bytes) -> bool:
+    return len(data) >= RECORD_HEADER.size and data[0] == WIRE_MAGIC
+
+
+class RecordEncoder:
+    """
+    Append-only encoder of one record, numbers are varint encoded and repeated strings
+    are written once then referenced by their index in the record's string table.
+    """
+
+    __slots__ = ("buffer", "strings")
+
+    def __init__(self, record_type: int):
+        self.buffer = bytearray(RECORD_HEADER.pack(WIRE_MAGIC, WIRE_VERSION, record_type))
+        self.strings: Dict[str, int] = {}
+
+    def write_uvarint(self, value: int) -> None:
+        buffer = self.buffer
+        while value > 0x7F:
+            buffer.append((value & 0x7F) | 0x80)
+            value >>= 7
+        buffer.append(value)
+
+    def write_varint(self, value: int) -> None:
+        # zigzag keeps small negative numbers short
+        self.write_uvarint((value << 1) if value >= 0 else ((-value << 1) - 1))
+
+    def write_double(self, value: float) -> None:
+        self.buffer += _DOUBLE.pack(value)
+
+    def write_bool(self, value: Optional[bool]) -> None:
+        self.buffer.append(2 if value is None else int(bool(value)))
+
+    def write_str(self, value: Optional[str]) -> None:
+        if value is None:
+            self.buffer.append(_STR_NONE)
+            return
+        index = self.strings.get(value)
+        if index is not None:
+            self.write_uvarint(index + _STR_REF_BASE)
+            return
+        self.strings[value] = len(self.strings)
+        data = value.encode("utf-8", "surrogatepass")
+        self.buffer.append(_STR_NEW)
+        self.write_uvarint(len(data))
+        self.buffer += data
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.buffer)
+
+
+_FIELD_WRITERS = {
+    "u": RecordEncoder.write_uvarint,
+    "v": RecordEncoder.write_varint,
+    "d": RecordEncoder.write_double,
+    "b": RecordEncoder.write_bool,
+    "s": RecordEncoder.write_str,
+}
+
+
+class RecordSchema:
+    """
+    Fields of a record written from attributes of an object, as (attribute, kind) pairs.
+    Kinds are "u" uvarint, "v" varint, "d" double, "b" bool, "s" str, or the fields of
+    an attribute written inline. Encoded by wire_format_C, RecordEncoder is the fallback
+    when extensions aren't built.
+    """
+
+    __slots__ = ("record_type", "header", "fields")
+
+    def __init__(self, record_type: int, fields: Tuple[Tuple[str, Any], ...]):
+        self.record_type = record_type
+        self.header = RECORD_HEADER.pack(WIRE_MAGIC, WIRE_VERSION, record_type)
+        self.fields = fields
+
+    def encode(self, obj: Any) -> bytes:
+        if c_encode_record is not None:
+            return c_encode_record(self.header, self.fields, obj)
+        encoder = RecordEncoder(self.record_type)
+        _write_fields(encoder, self.fields, obj)
+        return encoder.to_bytes()
+
+    def encode_list(self, objs: List[Any]) -> bytes:
+        """
+        count of #objs followed by each of them, strings are shared by all objects
+        """
+        if c_encode_record is not None:
+            return c_encode_record(self.header, self.fields, objs, True)
+        encoder = RecordEncoder(self.record_type)
+        encoder.write_uvarint(len(objs))
+        for obj in objs:
+            _write_fields(encoder, self.fields, obj)
+        return encoder.to_bytes()
+
+
+def _write_fields(
+    encoder: RecordEncoder, fields: Tuple[Tuple[str, Any], ...], obj: Any
+) -> None:
+    for name, kind in fields:
+        value = getattr(obj, name)
+        if isinstance(kind, tuple):
+            _write_fields(encoder, kind, value)
+        else:
+            _FIELD_WRITERS[kind](encoder, value)
+
+
+class RecordDecoder:
+    """
+    Reads fields in the same order as they were written by RecordEncoder.
+    """
+
+    __slots__ = ("data", "offset", "strings", "record_type")
+
+    def __init__(self, data: bytes):
+        if not is_wire_record(data):
+            raise WireFormatError("not a flight profiler binary record")
+        magic, version, record_type = RECORD_HEADER.unpack_from(data)
+        if version != WIRE_VERSION:
+            raise WireFormatError(
+                f"unsupported record version {version}, expected {WIRE_VERSION}"
+            )
+        self.data = memoryview(data)
+        self.offset = RECORD_HEADER.size
+        self.strings: List[str] = []
+        self.record_type = record_type
+
+    def expect(self, record_type: int) -> "RecordDecoder":
+        if self.record_type != record_type:
+            raise WireFormatError(
+                f"unexpected record type {self.record_type}, expected {record_type}"
+            )
+        return self
+
+    def read_uvarint(self) -> int:
+        data = self.data
+        offset = self.offset
+        result = 0
+        shift = 0
+        while True:
+            byte = data[offset]
+            offset += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        self.offset = offset
+        return result
+
+    def read_varint(self) -> int:
+        value = self.read_uvarint()
+        return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+
+    def read_double(self) -> float:
+        value = _DOUBLE.unpack_from(self.data, self.offset)[0]
+        self.offset += _DOUBLE.size
+        return value
+
+    def read_bool(self) -> Optional[bool]:
+        value = self.data[self.offset]
+        self.offset += 1
+        return None if value == 2 else bool(value)
+
+    def read_str(self) -> Optional[str]:
+        slot = self.read_uvarint()
+        if slot == _STR_NONE:
+            return None
+        if slot >= _STR_REF_BASE:
+            return self.strings[slot - _STR_REF_BASE]
+        length = self.read_uvarint()
+        value = str(
+            self.data[self.offset : self.offset + length], "utf-8", "surrogatepass"
+        )
+        self.offset += length
+        self.strings.append(value)
+        return value
+
+
+def encode_drop_notice(dropped: int) -> bytes:
+    """
+    tells client that #dropped messages were discarded because it could not keep up
+    """
+    encoder = RecordEncoder(RECORD_DROP_NOTICE)
+    encoder.write_uvarint(dropped)
+    return encoder.to_bytes()
+
+
+def is_drop_notice(data: bytes) -> bool:
+    return is_wire_record(data) and data[2] == RECORD_DROP_NOTICE
+
+
+def decode_drop_notice(data: bytes) -> int:
+    return RecordDecoder(data).expect(RECORD_DROP_NOTICE).read_uvarint()
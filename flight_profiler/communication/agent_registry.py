@@ -0,0 +1,129 @@
+import json
+import os
+import stat
+import time
+from importlib.metadata import PackageNotFoundError, version
+from typing import Any, Dict, Optional
+
+# fixed root instead of TMPDIR/XDG_RUNTIME_DIR, which may differ between the
+# target process and a cli started by another user such as root
+AGENT_RUNTIME_ROOT = "/tmp"
+AGENT_RECORD_NAME = "agent.json"
+
+
+def agent_runtime_dir(pid: int) -> str:
+    return os.path.join(AGENT_RUNTIME_ROOT, f"pyflight-{pid}")
+
+
+def agent_record_path(pid: int) -> str:
+    return os.path.join(agent_runtime_dir(pid), AGENT_RECORD_NAME)
+
+
+def prepare_agent_runtime_dir(pid: int) -> str:
+    """
+    create the per-pid runtime directory, accessible by current user only
+
+    Raises:
+        OSError: if the directory exists but is not a private directory of current user
+    """
+    runtime_dir = agent_runtime_dir(pid)
+    try:
+        os.mkdir(runtime_dir, 0o700)
+    except FileExistsError:
+        # left by a former process with the same pid, or planted by someone else
+        st = os.lstat(runtime_dir)
+        if (
+            not stat.S_ISDIR(st.st_mode)
+            or st.st_uid != os.geteuid()
+            or stat.S_IMODE(st.st_mode) & 0o077
+        ):
+            raise OSError(f"{runtime_dir} is not a private directory of current user")
+    return runtime_dir
+
+
+def remove_agent_runtime_file(path: str) -> None:
+    """
+    remove a file of the runtime directory, and the directory itself once it is empty
+    """
+    try:
+        os.unlink(path)
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        pass
+
+
+def agent_version() -> str:
+    try:
+        return version("flight_profiler")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+class AgentRecord:
+    """
+    Published by an attached agent so that cli finds it without scanning ports.
+    """
+
+    def __init__(
+        self,
+        pid: int,
+        port: int,
+        unix_socket_path: Optional[str] = None,
+        version: Optional[str] = None,
+        start_time: Optional[float] = None,
+    ):
+        self.pid = pid
+        self.port = port
+        self.unix_socket_path = unix_socket_path
+        self.version = version if version is not None else agent_version()
+        self.start_time = start_time if start_time is not None else time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "pid": self.pid,
+            "port": self.port,
+            "unix_socket_path": self.unix_socket_path,
+            "version": self.version,
+            "start_time": self.start_time,
+        }
+
+    @staticmethod
+    def from_dict(record: Dict[str, Any]) -> "AgentRecord":
+        return AgentRecord(
+            pid=int(record["pid"]),
+            port=int(record["port"]),
+            unix_socket_path=record.get("unix_socket_path"),
+            version=record.get("version"),
+            start_time=record.get("start_time"),
+        )
+
+
+def publish_agent_record(record: AgentRecord) -> str:
+    """
+    Returns:
+        str: path of the record file
+
+    Raises:
+        OSError: if the runtime directory is not usable
+    """
+    prepare_agent_runtime_dir(record.pid)
+    record_path = agent_record_path(record.pid)
+    tmp_path = f"{record_path}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump(record.to_dict(), f)
+    # readers never see a partially written record
+    os.replace(tmp_path, record_path)
+    return record_path
+
+
+def load_agent_record(pid: int) -> Optional[AgentRecord]:
+    """
+    returns None if no agent published its record for #pid, the record may be stale
+    if the agent is gone without cleaning up
+    """
+    try:
+        with open(agent_record_path(pid), "r") as f:
+            return AgentRecord.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
@@ -2,7 +2,7 @@ import json
 import socket
 import struct
 from collections.abc import Iterator
-from typing import Any
+from typing import Any, Union
 
 from flight_profiler.communication.base import ClientProtocol, TargetProcessExitError
 
@@ -24,15 +24,24 @@ def is_socket_closed(sock: socket.socket) -> bool:
         return True
 
 class FlightClient(ClientProtocol):
+    """
+    Connects to flight server by tcp port, or by unix domain socket if port is a socket path.
+    """
 
-    def __init__(self, host: str, port: int):
+    def __init__(self, host: str, port: Union[int, str]):
         self.host = host
         self.port = port
         self.running = True
         self.sock = None
         self.connect(self.host, self.port)
 
-    def connect(self, address: str, port: int) -> None:
+    def connect(self, address: str, port: Union[int, str]) -> None:
+        if isinstance(port, str):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            if self.sock.connect_ex(port) == 0:
+                return
+            self.sock.close()
+            raise TargetProcessExitError
         for res in socket.getaddrinfo(
             address, port, socket.AF_INET, socket.SOCK_STREAM
         ):
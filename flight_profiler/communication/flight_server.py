@@ -1,52 +1,144 @@
 import asyncio
+import atexit
 import json
+import os
 import socket
 import struct
 from abc import abstractmethod
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from flight_profiler.common.system_logger import logger
+from flight_profiler.communication.agent_registry import remove_agent_runtime_file
 from flight_profiler.communication.base import ServerProtocol
+from flight_profiler.communication.flight_session import (
+    CONTROL_STREAM_ID,
+    FRAME_CANCEL,
+    FRAME_DATA,
+    FRAME_END,
+    FRAME_OPEN,
+    FRAME_PING,
+    FRAME_PONG,
+    SESSION_IDLE_TIMEOUT,
+    SESSION_TARGET,
+    pack_frame,
+    unpack_frame,
+)
+from flight_profiler.communication.unix_socket import is_peer_trusted
+
+
+class SessionStreamWriter:
+    """
+    Writes frames of one command stream into the connection shared by a session.
+    """
+
+    def __init__(
+        self, writer: asyncio.StreamWriter, stream_id: int, drain_lock: asyncio.Lock
+    ):
+        self.writer = writer
+        self.stream_id = stream_id
+        self.drain_lock = drain_lock
+        self.cancelled = False
+
+    def is_closing(self) -> bool:
+        return self.cancelled or self.writer.is_closing()
+
+    async def send_frame(self, frame_type: int, payload: bytes = b"") -> None:
+        await self.send_frames(frame_type, [payload])
+
+    async def send_frames(self, frame_type: int, payloads: List[bytes]) -> None:
+        if self.cancelled:
+            return
+        chunks = []
+        for payload in payloads:
+            frame = pack_frame(frame_type, self.stream_id, payload)
+            chunks.append(struct.pack("<L", len(frame)))
+            chunks.append(frame)
+        # single write keeps frames of concurrent streams from interleaving
+        self.writer.write(b"".join(chunks))
+        async with self.drain_lock:
+            await self.writer.drain()
 
 
 class FlightServer(ServerProtocol):
 
     def __init__(self, interactive_commands: Dict[str, Any]):
         self.server_socket = None
+        self.unix_server_socket = None
+        # path of unix domain socket actually listened on
+        self.unix_listen_path: Optional[str] = None
         self.loop = None
         self.interactive_commands = interactive_commands
 
-    async def start_server(self, host: str, port: int):
+    async def start_server(self, host: str, port: int, unix_socket_path: Optional[str] = None):
         if self.loop is None:
             self.loop = asyncio.get_event_loop()
+        if unix_socket_path is not None:
+            # bound before tcp, so cli waiting for the agent finds the socket file first
+            self.bind_unix_socket(unix_socket_path)
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.server_socket.bind((host, port))
         self.server_socket.listen(100)  # Larger backlog
         self.server_socket.setblocking(False)  # Key: non-blocking mode
 
+        self.on_listening()
         await self.accept_connections()
 
+    def on_listening(self) -> None:
+        """
+        called once all listening sockets are bound, before any connection is accepted
+        """
+        pass
+
+    def bind_unix_socket(self, unix_socket_path: str) -> None:
+        try:
+            server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            server_socket.bind(unix_socket_path)
+            os.chmod(unix_socket_path, 0o600)
+            server_socket.listen(100)
+            server_socket.setblocking(False)
+        except OSError:
+            # tcp transport still works
+            logger.exception(f"[FlightServer] listen on {unix_socket_path} failed.")
+            return
+        self.unix_server_socket = server_socket
+        self.unix_listen_path = unix_socket_path
+        atexit.register(remove_agent_runtime_file, unix_socket_path)
+
     async def accept_connections(self):
         # Create a thread pool for handling client connections
         import concurrent.futures
         executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="flight-profiler-recv-", max_workers=200)  # Match socket listen backlog
 
+        server_sockets = [self.server_socket]
+        if self.unix_server_socket is not None:
+            server_sockets.append(self.unix_server_socket)
         try:
-            while True:
-                try:
-                    client_socket, addr = await self.loop.sock_accept(
-                        self.server_socket
-                    )
-                    # Submit the client handling to thread pool while maintaining async behavior
-                    self.loop.run_in_executor(executor, self._sync_handle_client, client_socket, addr)
-                except Exception as e:
-                    logger.exception(f"Error accepting connection: {e}")
-
+            await asyncio.gather(
+                *[self.accept_from(server_socket, executor) for server_socket in server_sockets]
+            )
         except asyncio.CancelledError:
             logger.exception(f"FlightServer ShutDown exceptionally!")
         finally:
             executor.shutdown(wait=True)
+            if self.unix_listen_path is not None:
+                remove_agent_runtime_file(self.unix_listen_path)
+
+    async def accept_from(self, server_socket: socket.socket, executor) -> None:
+        is_unix = server_socket.family == getattr(socket, "AF_UNIX", None)
+        while True:
+            try:
+                client_socket, addr = await self.loop.sock_accept(server_socket)
+                if is_unix and not is_peer_trusted(client_socket):
+                    logger.warning("[FlightServer] reject connection from untrusted user.")
+                    client_socket.close()
+                    continue
+                # Submit the client handling to thread pool while maintaining async behavior
+                self.loop.run_in_executor(executor, self._sync_handle_client, client_socket, addr)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Error accepting connection: {e}")
 
     def _sync_handle_client(self, client_socket, addr):
         """Synchronous wrapper for handling client connections"""
@@ -67,22 +159,13 @@ class FlightServer(ServerProtocol):
             request_bytes = await self.handle_read(reader)
             request_json: Dict[str, Any] = json.loads(request_bytes)
 
-            target = request_json["target"]
-            is_plugin_calling = request_json.get("is_plugin_calling", True)
-            param = request_json.get("param", "")
-
-            logger.info(
-                f"[PyFlightProfiler] Cmd: {target} Param: {param} is_plugin_calling: {is_plugin_calling}"
-            )
-            if is_plugin_calling:
-                if target in self.interactive_commands:
-                    await self.execute_plugin_interactively(
-                        target, param, reader, writer
-                    )
-                else:
-                    await self.execute_plugin(target, param, writer)
+            if (
+                request_json["target"] == SESSION_TARGET
+                and not request_json.get("is_plugin_calling", True)
+            ):
+                await self.handle_session(reader, writer)
             else:
-                await self.special_calling(target, param, writer)
+                await self.dispatch_request(request_json, reader, writer)
         except:
             logger.exception(f"[FlightServer] error in execute plugin")
         finally:
@@ -90,6 +173,91 @@ class FlightServer(ServerProtocol):
                 writer.close()
                 await writer.wait_closed()
 
+    async def dispatch_request(
+        self,
+        request_json: Dict[str, Any],
+        reader: Optional[asyncio.StreamReader],
+        writer: Union[asyncio.StreamWriter, SessionStreamWriter],
+    ) -> None:
+        target = request_json["target"]
+        is_plugin_calling = request_json.get("is_plugin_calling", True)
+        param = request_json.get("param", "")
+
+        logger.info(
+            f"[PyFlightProfiler] Cmd: {target} Param: {param} is_plugin_calling: {is_plugin_calling}"
+        )
+        if is_plugin_calling:
+            if target in self.interactive_commands:
+                await self.execute_plugin_interactively(
+                    target, param, reader, writer
+                )
+            else:
+                await self.execute_plugin(target, param, writer)
+        else:
+            await self.special_calling(target, param, writer)
+
+    async def handle_session(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """
+        Serve a multiplexed session until client disconnects or stops sending heartbeats,
+        commands run as concurrent tasks on this connection's event loop.
+        """
+        await self.send(json.dumps({"session": True}).encode("utf-8"), writer)
+        loop = asyncio.get_event_loop()
+        drain_lock = asyncio.Lock()
+        control_writer = SessionStreamWriter(writer, CONTROL_STREAM_ID, drain_lock)
+        streams: Dict[int, Tuple[asyncio.Task, SessionStreamWriter]] = {}
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(
+                        self.handle_read(reader), SESSION_IDLE_TIMEOUT
+                    )
+                except asyncio.TimeoutError:
+                    logger.warning("[FlightServer] session heartbeat timeout, closed.")
+                    break
+                if not frame:
+                    break
+                frame_type, stream_id, payload = unpack_frame(frame)
+                if frame_type == FRAME_OPEN:
+                    stream_writer = SessionStreamWriter(writer, stream_id, drain_lock)
+                    task = loop.create_task(
+                        self.handle_stream(json.loads(payload), stream_writer)
+                    )
+                    streams[stream_id] = (task, stream_writer)
+                    task.add_done_callback(
+                        lambda _, sid=stream_id: streams.pop(sid, None)
+                    )
+                elif frame_type == FRAME_CANCEL:
+                    if stream_id in streams:
+                        task, stream_writer = streams[stream_id]
+                        stream_writer.cancelled = True
+                        task.cancel()
+                elif frame_type == FRAME_PING:
+                    await control_writer.send_frame(FRAME_PONG)
+        finally:
+            for task, stream_writer in list(streams.values()):
+                stream_writer.cancelled = True
+                task.cancel()
+
+    async def handle_stream(
+        self, request_json: Dict[str, Any], writer: SessionStreamWriter
+    ) -> None:
+        try:
+            if request_json.get("target") in self.interactive_commands:
+                # interactive commands need a dedicated connection
+                logger.warning(
+                    f"[FlightServer] interactive {request_json['target']} is not supported in session."
+                )
+            else:
+                await self.dispatch_request(request_json, None, writer)
+        except asyncio.CancelledError:
+            return
+        except:
+            logger.exception(f"[FlightServer] error in execute plugin")
+        await writer.send_frame(FRAME_END)
+
     @abstractmethod
     async def execute_plugin(
         self, cmd: str, param: str, writer: asyncio.StreamWriter
@@ -132,7 +300,30 @@ class FlightServer(ServerProtocol):
             data += chunk
         return data
 
-    async def send(self, data: bytes, writer: asyncio.StreamWriter) -> None:
+    async def send(
+        self, data: bytes, writer: Union[asyncio.StreamWriter, SessionStreamWriter]
+    ) -> None:
+        if isinstance(writer, SessionStreamWriter):
+            await writer.send_frame(FRAME_DATA, data)
+            return
         header = struct.pack("<L", len(data))
         writer.write(header + data)
         await writer.drain()
+
+    async def send_batch(
+        self,
+        datas: List[bytes],
+        writer: Union[asyncio.StreamWriter, SessionStreamWriter],
+    ) -> None:
+        """
+        write several messages with one syscall and one drain, framing is the same as send
+        """
+        if isinstance(writer, SessionStreamWriter):
+            await writer.send_frames(FRAME_DATA, datas)
+            return
+        chunks = []
+        for data in datas:
+            chunks.append(struct.pack("<L", len(data)))
+            chunks.append(data)
+        writer.write(b"".join(chunks))
+        await writer.drain()
@@ -0,0 +1,221 @@
+import itertools
+import json
+import queue
+import socket
+import struct
+import threading
+import time
+from collections.abc import Iterator
+from typing import Any, Dict, Optional, Union
+
+from flight_profiler.common.system_logger import logger
+from flight_profiler.communication.base import ClientProtocol, TargetProcessExitError
+from flight_profiler.communication.flight_client import FlightClient
+
+# request target which upgrades a plain connection into a multiplexed session
+SESSION_TARGET = "session"
+
+# every session frame starts with frame type and stream id after the length prefix
+SESSION_HEADER = struct.Struct("<BL")
+FRAME_OPEN = 1
+FRAME_DATA = 2
+FRAME_END = 3
+FRAME_CANCEL = 4
+FRAME_PING = 5
+FRAME_PONG = 6
+
+# stream id used by heartbeat frames, never allocated to a command
+CONTROL_STREAM_ID = 0
+
+HEARTBEAT_INTERVAL = 5
+# server closes a session which sends nothing, not even heartbeats, for this long
+SESSION_IDLE_TIMEOUT = HEARTBEAT_INTERVAL * 3
+
+
+def pack_frame(frame_type: int, stream_id: int, payload: bytes = b"") -> bytes:
+    return SESSION_HEADER.pack(frame_type, stream_id) + payload
+
+
+def unpack_frame(frame: bytes):
+    """
+    Returns:
+        Tuple[int, int, bytes]: (frame type, stream id, payload)
+    """
+    frame_type, stream_id = SESSION_HEADER.unpack_from(frame)
+    return frame_type, stream_id, frame[SESSION_HEADER.size :]
+
+
+class FlightSession(FlightClient):
+    """
+    Long-lived connection to the flight server shared by all commands of a cli session,
+    each command exchanges frames on its own stream id.
+    """
+
+    def __init__(
+        self, host: str, port: Union[int, str], heartbeat_interval: float = HEARTBEAT_INTERVAL
+    ):
+        super().__init__(host, port)
+        self.send(
+            json.dumps({"target": SESSION_TARGET, "is_plugin_calling": False}).encode(
+                "utf-8"
+            )
+        )
+        try:
+            ack = self.recv()
+        except OSError:
+            ack = b""
+        if not ack or not json.loads(ack).get("session", False):
+            self.close()
+            raise TargetProcessExitError
+        self.heartbeat_interval = heartbeat_interval
+        self.send_lock = threading.Lock()
+        self.stream_ids = itertools.count(CONTROL_STREAM_ID + 1)
+        self.streams: Dict[int, queue.Queue] = {}
+        self.last_pong = time.time()
+        self.reader = threading.Thread(
+            target=self.__read_frames, name="flight-session-reader", daemon=True
+        )
+        self.reader.start()
+        self.heartbeat = threading.Thread(
+            target=self.__send_heartbeats, name="flight-session-heartbeat", daemon=True
+        )
+        self.heartbeat.start()
+
+    def open_stream(self) -> "SessionStream":
+        stream_id = next(self.stream_ids)
+        self.streams[stream_id] = queue.Queue()
+        return SessionStream(self, stream_id)
+
+    def send_frame(self, frame_type: int, stream_id: int, payload: bytes = b"") -> None:
+        with self.send_lock:
+            self.send(pack_frame(frame_type, stream_id, payload))
+
+    def release_stream(self, stream_id: int) -> None:
+        self.streams.pop(stream_id, None)
+
+    def __read_frames(self):
+        try:
+            while self.running:
+                frame = self.recv()
+                if not frame:
+                    break
+                frame_type, stream_id, payload = unpack_frame(frame)
+                if frame_type == FRAME_PONG:
+                    self.last_pong = time.time()
+                    continue
+                stream_q: Optional[queue.Queue] = self.streams.get(stream_id)
+                if stream_q is None:
+                    # stream is cancelled by client, late frames are discarded
+                    continue
+                if frame_type == FRAME_DATA:
+                    stream_q.put(payload)
+                elif frame_type == FRAME_END:
+                    stream_q.put(None)
+        except:
+            if self.running:
+                logger.exception("[FlightSession] read frames failed.")
+        finally:
+            self.running = False
+            for stream_q in list(self.streams.values()):
+                stream_q.put(None)
+
+    def __send_heartbeats(self):
+        while self.running:
+            time.sleep(self.heartbeat_interval)
+            try:
+                self.send_frame(FRAME_PING, CONTROL_STREAM_ID)
+            except:
+                self.running = False
+                break
+            if time.time() - self.last_pong > SESSION_IDLE_TIMEOUT:
+                # server is alive at tcp level but stuck, reconnect on next command
+                logger.warning("[FlightSession] heartbeat timeout, close session.")
+                self.close()
+                break
+
+    def close(self):
+        self.running = False
+        try:
+            # wake up reader thread blocking in recv
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except:
+            pass
+        super().close()
+
+
+class SessionStream(ClientProtocol):
+    """
+    One command exchange on a FlightSession, provides the same request methods as FlightClient.
+    Closing a stream before server ends it sends a cancel frame instead of closing the connection.
+    """
+
+    def __init__(self, session: FlightSession, stream_id: int):
+        self.session = session
+        self.stream_id = stream_id
+        self.finished = False
+
+    def connect(self, address: str, port: int) -> None:
+        pass
+
+    def request(self, data: Any) -> bytes:
+        for content in self.request_stream(data):
+            return content
+        return b""
+
+    def request_stream(self, data: Any) -> Iterator:
+        if type(data) is not bytes:
+            data = json.dumps(data).encode("utf-8")
+        try:
+            self.session.send_frame(FRAME_OPEN, self.stream_id, data)
+        except OSError:
+            raise TargetProcessExitError
+        stream_q: queue.Queue = self.session.streams[self.stream_id]
+        while True:
+            try:
+                # wake up periodically so that KeyboardInterrupt is delivered promptly
+                content = stream_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if content is None:
+                self.finished = True
+                return
+            yield content
+
+    def close(self) -> None:
+        if not self.finished and self.session.running:
+            try:
+                self.session.send_frame(FRAME_CANCEL, self.stream_id)
+            except:
+                pass
+        self.finished = True
+        self.session.release_stream(self.stream_id)
+
+
+_flight_sessions: Dict[Union[int, str], FlightSession] = {}
+_flight_sessions_lock = threading.Lock()
+
+
+def open_flight_client(port: Union[int, str], host: str = "localhost") -> ClientProtocol:
+    """
+    Open a command stream on the session shared by this cli process, the session is
+    (re)connected lazily. Falls back to a plain FlightClient if server does not support sessions.
+
+    Raises:
+        TargetProcessExitError: if the server is not reachable
+    """
+    with _flight_sessions_lock:
+        session = _flight_sessions.get(port)
+        if session is None or not session.running:
+            try:
+                session = FlightSession(host, port)
+            except TargetProcessExitError:
+                return FlightClient(host, port)
+            _flight_sessions[port] = session
+    return session.open_stream()
+
+
+def close_flight_sessions() -> None:
+    with _flight_sessions_lock:
+        for session in _flight_sessions.values():
+            session.close()
+        _flight_sessions.clear()
@@ -0,0 +1,61 @@
+import os
+import socket
+import struct
+
+from flight_profiler.communication.agent_registry import (
+    agent_runtime_dir,
+    prepare_agent_runtime_dir,
+)
+from flight_profiler.utils.env_util import is_linux
+
+AGENT_SOCKET_NAME = "agent.sock"
+
+# struct ucred returned by SO_PEERCRED: pid, uid, gid
+_UCRED = struct.Struct("3i")
+
+
+def unix_socket_enabled() -> bool:
+    """
+    unix domain socket is the default transport on linux, PYFLIGHT_TRANSPORT=tcp
+    makes the cli connect through tcp port only
+    """
+    return (
+        is_linux()
+        and hasattr(socket, "AF_UNIX")
+        and hasattr(socket, "SO_PEERCRED")
+        and os.getenv("PYFLIGHT_TRANSPORT", "unix").lower() != "tcp"
+    )
+
+
+def agent_socket_path(pid: int) -> str:
+    return os.path.join(agent_runtime_dir(pid), AGENT_SOCKET_NAME)
+
+
+def prepare_agent_socket_path(pid: int) -> str:
+    """
+    Raises:
+        OSError: if the runtime directory is not a private directory of current user
+    """
+    socket_path = os.path.join(prepare_agent_runtime_dir(pid), AGENT_SOCKET_NAME)
+    if os.path.lexists(socket_path):
+        os.unlink(socket_path)
+    return socket_path
+
+
+def peer_uid(sock: socket.socket) -> int:
+    _, uid, _ = _UCRED.unpack(
+        sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, _UCRED.size)
+    )
+    return uid
+
+
+def is_peer_trusted(sock: socket.socket) -> bool:
+    """
+    only the user running target process and root may talk to the agent
+    """
+    try:
+        uid = peer_uid(sock)
+    except OSError:
+        return False
+    return uid == os.geteuid() or uid == 0
+
@@ -1,13 +1,28 @@
-from typing import Any, Callable, List, Optional
+from typing import Any, Callable, List, Optional, Union
 
 from flight_profiler.plugins.server_plugin import ServerQueue
 from flight_profiler.plugins.trace.trace_profiler import TraceProfiler
 
 def set_trace_profile(
-    target: Callable[[ServerQueue, List[Any]], Any] | None,
+    target: Callable[[ServerQueue, Union[List[Any], bytes]], Any] | None,
     out_q: ServerQueue,
     interval: int,
     async_func: bool,
-    depth: int
+    depth: int,
+    max_frames: int = 0,
+    max_bytes: int = 0,
+    encoded: bool = False,
+) -> TraceProfiler: ...
+def set_trace_monitoring(
+    target: Callable[[ServerQueue, Union[List[Any], bytes]], Any] | None,
+    out_q: ServerQueue,
+    interval: int,
+    async_func: bool,
+    depth: int,
+    max_frames: int = 0,
+    max_bytes: int = 0,
+    encoded: bool = False,
 ) -> TraceProfiler: ...
 def remove_trace_profile(profiler: Optional[TraceProfiler]) -> None: ...
+def release_trace_monitoring() -> None: ...
+def encode_trace_frames(frames: List[Optional[str]]) -> bytes: ...
@@ -0,0 +1,3 @@
+from typing import Any
+
+def encode_record(header: bytes, fields: tuple, obj: Any, is_list: bool = False) -> bytes: ...
@@ -0,0 +1,456 @@
+import argparse
+import importlib
+import os
+import pickle
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, TextIO, Union
+
+from flight_profiler.client import (
+    ProfilerCli,
+    attach_process,
+    is_agent_of,
+    show_pre_attach_info,
+)
+from flight_profiler.common.global_store import FORBIDDEN_COMMANDS_IN_PY314
+from flight_profiler.common.wire_format import is_wire_record
+from flight_profiler.communication.flight_session import open_flight_client
+from flight_profiler.communication.unix_socket import (
+    agent_socket_path,
+    unix_socket_enabled,
+)
+from flight_profiler.utils.cli_util import (
+    common_plugin_execute_routine,
+    show_drop_notice,
+    show_error_info,
+    show_normal_info,
+)
+from flight_profiler.utils.env_util import get_child_pids, is_linux, py_higher_than_314
+from flight_profiler.utils.render_util import COLOR_GREEN
+
+# injections running at the same time, each one stops its target for a while
+MAX_PARALLEL_ATTACH = 16
+
+# commands handled by the cli itself, never sent to workers
+LOCAL_COMMANDS = {"quit", "exit", "stop", "help", "history"}
+
+# commands profiling a pid given by --pid, which defaults to the first worker only
+PID_OPTION_COMMANDS = {"stack"}
+
+
+def parse_pid_list(value: str) -> List[str]:
+    """
+    parse comma separated pids such as "1,2,3", duplicates are removed and order is kept
+
+    Raises:
+        argparse.ArgumentTypeError: if any item is not a positive number
+    """
+    pids: List[str] = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if not item.isdigit() or int(item) <= 0:
+            raise argparse.ArgumentTypeError(f"pids: {item} is not a valid pid.")
+        if item not in pids:
+            pids.append(item)
+    if not pids:
+        raise argparse.ArgumentTypeError("pids: no pid is given.")
+    return pids
+
+
+def discover_worker_pids(parent_pid: int) -> List[str]:
+    return [str(pid) for pid in get_child_pids(parent_pid)]
+
+
+def merge_folded_stacks(paths: List[str]) -> Dict[str, int]:
+    """
+    sum samples of identical stacks in collapsed stack files, one "frame;frame count" per line
+    """
+    merged: Dict[str, int] = defaultdict(int)
+    for path in paths:
+        try:
+            with open(path, "r") as f:
+                for line in f:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    if stack and count.isdigit():
+                        merged[stack] += int(count)
+        except OSError:
+            continue
+    return merged
+
+
+class TaggedStdout:
+    """
+    Replaces sys.stdout while a command runs on several workers, each line printed by a
+    worker thread is prefixed by its tag so that interleaved streams stay readable.
+    """
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def set_tag(self, tag: Optional[str]) -> None:
+        self.local.tag = tag
+        self.local.pending = ""
+
+    def write(self, data: str) -> int:
+        tag = getattr(self.local, "tag", None)
+        if tag is None:
+            with self.lock:
+                return self.stream.write(data)
+        lines = (self.local.pending + data).split("\n")
+        self.local.pending = lines.pop()
+        if lines:
+            with self.lock:
+                for line in lines:
+                    self.stream.write(f"[{tag}] {line}\n")
+        return len(data)
+
+    def flush(self) -> None:
+        tag = getattr(self.local, "tag", None)
+        if tag is not None and self.local.pending:
+            with self.lock:
+                self.stream.write(f"[{tag}] {self.local.pending}")
+            self.local.pending = ""
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class MonitorMerger:
+    """
+    Collects watch monitor summaries of all workers, a cycle is merged once every worker
+    still streaming has reported it.
+    """
+
+    def __init__(self, workers: List[str]):
+        self.lock = threading.Lock()
+        self.live: Set[str] = set(workers)
+        self.reported: Dict[str, int] = defaultdict(int)
+        self.cycles: Dict[int, list] = defaultdict(list)
+        self.next_cycle = 0
+
+    def add(self, worker: str, summary) -> list:
+        with self.lock:
+            self.cycles[self.reported[worker]].append(summary)
+            self.reported[worker] += 1
+            return self.__pop_completed()
+
+    def finish(self, worker: str) -> list:
+        with self.lock:
+            self.live.discard(worker)
+            return self.__pop_completed()
+
+    def __pop_completed(self) -> list:
+        from flight_profiler.plugins.watch.watch_monitor import MonitorSummary
+
+        completed = []
+        while self.next_cycle in self.cycles:
+            summaries = self.cycles[self.next_cycle]
+            if len(self.live) > 0 and len(summaries) < len(self.live):
+                break
+            completed.append(MonitorSummary.merge(summaries))
+            del self.cycles[self.next_cycle]
+            self.next_cycle += 1
+        return completed
+
+
+def attach_processes(pids: List[str], debug: bool = False) -> Dict[str, Union[int, str]]:
+    """
+    inject agents into all pids concurrently, workers failing to attach are skipped
+
+    :return agent address of every attached worker, in the order of pids
+    """
+    # executable and permission checks differ between processes, e.g. workers owned by
+    # another user
+    for pid in pids:
+        print(f"[INFO] Target process {pid}:")
+        show_pre_attach_info(pid, debug)
+    reserved_ports: Set[int] = set()
+
+    def attach(pid: str) -> Optional[Union[int, str]]:
+        try:
+            return attach_process(pid, debug, reserved_ports)
+        except SystemExit:
+            # injection failure has been reported by attach routine
+            return None
+        except Exception:
+            show_error_info(f"attach process {pid} failed, {traceback.format_exc()}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_ATTACH, len(pids))) as executor:
+        addresses = list(executor.map(attach, pids))
+    return {
+        pid: address for pid, address in zip(pids, addresses) if address is not None
+    }
+
+
+class FanoutProfilerCli(ProfilerCli):
+    """
+    Runs every command on all attached workers in parallel, streams are tagged by worker pid,
+    watch monitor summaries and perf samples are merged into one result.
+    """
+
+    def __init__(self, workers: Dict[str, Union[int, str]], target_executable: str):
+        super().__init__(next(iter(workers.values())), target_executable)
+        self.workers = workers
+        self.server_pid = f"{len(workers)} processes"
+        self.current_plugins = []
+
+    def check_status(self, timeout=None):
+        if timeout is None:
+            timeout = 5
+
+        def check(pid: str) -> Optional[Union[int, str]]:
+            addresses = [self.workers[pid]]
+            if unix_socket_enabled():
+                addresses.insert(0, agent_socket_path(int(pid)))
+            for address in addresses:
+                if is_agent_of(pid, address):
+                    return address
+            return None
+
+        # worker which has just been injected may need a while to start its server
+        pending = dict(self.workers)
+        alive: Dict[str, Union[int, str]] = {}
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_ATTACH, len(pending))) as executor:
+            for _ in range(max(1, int(timeout / 0.5))):
+                for pid, address in zip(pending, executor.map(check, pending)):
+                    if address is not None:
+                        alive[pid] = address
+                pending = {pid: v for pid, v in pending.items() if pid not in alive}
+                if not pending:
+                    break
+                time.sleep(0.5)
+        for pid in pending:
+            show_error_info(f"Process {pid} does not respond, skip it.")
+        self.workers = {pid: alive[pid] for pid in self.workers if pid in alive}
+        if not self.workers:
+            return False
+        self.port = next(iter(self.workers.values()))
+        self.server_pid = f"{len(self.workers)} processes"
+        return True
+
+    def do_action(self, cmd: str):
+        cmd = cmd.strip()
+        parts = re.split(r"\s", cmd)
+        if parts[0] in LOCAL_COMMANDS or self.check_need_help(cmd):
+            super().do_action(cmd)
+            return
+        if py_higher_than_314() and parts[0] in FORBIDDEN_COMMANDS_IN_PY314:
+            super().do_action(cmd)
+            return
+        param = cmd[cmd.find(parts[0]) + len(parts[0]) :]
+        try:
+            if parts[0] == "perf":
+                self.__merge_perf(param)
+            elif parts[0] == "watch" and self.__is_monitor(param):
+                self.__merge_watch_monitor(param)
+            else:
+                self.__run_on_workers(parts[0], param)
+        except Exception:
+            show_error_info(traceback.format_exc())
+
+    def __run_on_workers(self, command: str, param: str) -> None:
+        module_name = "flight_profiler.plugins." + command + ".cli_plugin_" + command
+        try:
+            module = importlib.import_module(module_name)
+        except ModuleNotFoundError:
+            super().do_action(command + param)
+            return
+        self.current_plugins = []
+        tasks = []
+        for pid, address in self.workers.items():
+            worker_param = param
+            if command in PID_OPTION_COMMANDS and "--pid" not in param:
+                worker_param = f"{param} --pid {pid}"
+            plugin = module.get_instance(address, pid)
+            self.current_plugins.append(plugin)
+            tasks.append((pid, plugin.do_action, (worker_param,)))
+        try:
+            self.__run_tagged(tasks)
+        except KeyboardInterrupt:
+            self.__run_tagged(
+                [(pid, plugin.on_interrupted, ()) for pid, plugin in zip(self.workers, self.current_plugins)]
+            )
+            print()
+
+    def __run_tagged(self, tasks: list) -> None:
+        """
+        run (tag, func, args) tasks in threads and wait for all of them, stdout is only tagged
+        during the run because readline needs the real stdout to prompt
+        """
+        tagged = TaggedStdout(sys.stdout)
+
+        def run_task(tag: str, func, args):
+            tagged.set_tag(tag)
+            try:
+                func(*args)
+            except SystemExit:
+                pass
+            except Exception:
+                show_error_info(traceback.format_exc())
+            finally:
+                tagged.flush()
+
+        threads = [
+            threading.Thread(target=run_task, args=task, daemon=True) for task in tasks
+        ]
+        sys.stdout = tagged
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                # join with timeout so that KeyboardInterrupt reaches main thread
+                while thread.is_alive():
+                    thread.join(0.5)
+        finally:
+            sys.stdout = tagged.stream
+
+    def __is_monitor(self, param: str) -> bool:
+        from flight_profiler.plugins.watch.watch_parser import WatchArgumentParser
+
+        try:
+            setting = WatchArgumentParser().parse_watch_setting(param)
+        except Exception:
+            # let watch plugin of each worker report the error
+            return False
+        return setting.monitor_interval is not None
+
+    def __merge_watch_monitor(self, param: str) -> None:
+        from flight_profiler.plugins.watch.watch_render import WatchRender
+
+        merger = MonitorMerger(list(self.workers))
+        render = WatchRender()
+
+        def stream_summaries(pid: str, address: Union[int, str]):
+            try:
+                client = open_flight_client(address)
+            except:
+                show_error_info("Target process exited!")
+                return
+            try:
+                for content in client.request_stream(
+                    {"target": "watch", "param": "on " + param}
+                ):
+                    if show_drop_notice(content) or is_wire_record(content):
+                        continue
+                    result = pickle.loads(content)
+                    if type(result) is str:
+                        print(result)
+                        continue
+                    for merged in merger.add(pid, result):
+                        self.__print_untagged(render.show_monitor_summary(merged))
+            finally:
+                client.close()
+                for merged in merger.finish(pid):
+                    self.__print_untagged(render.show_monitor_summary(merged))
+
+        try:
+            self.__run_tagged(
+                [(pid, stream_summaries, (pid, address)) for pid, address in self.workers.items()]
+            )
+        except KeyboardInterrupt:
+            self.__run_tagged(
+                [
+                    (
+                        pid,
+                        common_plugin_execute_routine,
+                        ("watch", "off " + param, address),
+                    )
+                    for pid, address in self.workers.items()
+                ]
+            )
+            print()
+
+    @staticmethod
+    def __print_untagged(line: str) -> None:
+        stdout = sys.stdout
+        if isinstance(stdout, TaggedStdout):
+            with stdout.lock:
+                stdout.stream.write(line + "\n")
+        else:
+            print(line)
+
+    def __merge_perf(self, param: str) -> None:
+        """
+        sample every worker with py-spy in raw format, then sum identical stacks into one
+        collapsed stack file, which is rendered by flamegraph.pl or speedscope
+        """
+        from flight_profiler.plugins.perf.perf_parser import global_perf_parser
+
+        try:
+            perf_params = global_perf_parser.parse_perf_params(param)
+        except Exception as e:
+            show_error_info(f"Perf command parsed failed, {e}")
+            return
+        filepath = perf_params.filepath
+        if filepath.endswith(".svg"):
+            if perf_params.filepath_given:
+                show_error_info(
+                    "Perf of several processes writes collapsed stacks, py-spy can't render"
+                    " an svg from merged samples. Please pass a .txt filepath."
+                )
+                return
+            filepath = filepath[: -len(".svg")] + ".txt"
+
+        tmp_dir = tempfile.mkdtemp(prefix="pyflight-perf-")
+        processes: Dict[str, subprocess.Popen] = {}
+        for pid in self.workers:
+            command = [
+                "py-spy",
+                "record",
+                "--pid",
+                pid,
+                "--format",
+                "raw",
+                "--output",
+                os.path.join(tmp_dir, f"{pid}.txt"),
+                "--rate",
+                str(perf_params.sample_rate),
+            ]
+            if perf_params.duration > 0:
+                command.extend(["--duration", str(perf_params.duration)])
+            if not is_linux():
+                # OSX need root privilege to do py-spy
+                command.insert(0, "sudo")
+            processes[pid] = subprocess.Popen(
+                command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+        show_normal_info(f"Press Control-C to exit.")
+        try:
+            for process in processes.values():
+                process.wait()
+        except KeyboardInterrupt:
+            for process in processes.values():
+                if process.poll() is None:
+                    process.send_signal(signal.SIGINT)
+        paths = []
+        for pid, process in processes.items():
+            _, stderr = process.communicate()
+            if process.returncode == 0:
+                paths.append(os.path.join(tmp_dir, f"{pid}.txt"))
+            else:
+                show_error_info(f"[{pid}] {stderr.decode()}")
+        merged = merge_folded_stacks(paths)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not merged:
+            return
+        with open(filepath, "w") as f:
+            for stack, count in merged.items():
+                f.write(f"{stack} {count}\n")
+        show_normal_info(
+            f" Collapsed stacks of {len(paths)} processes have been successfully written to {COLOR_GREEN}{filepath}!"
+        )
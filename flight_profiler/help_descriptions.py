@@ -236,6 +236,8 @@ else:
 TRACE_COMMAND_DESCRIPTION = CommandDescription(
     usage=[
         "trace module [class] method [-i <value>] [-nm <value>] [-et <value>] [-d <value>] [-n <value>] [-f <value>]"
+        " [--overflow <value>] [--output <value>] [--aggregate] [--follow-threads]"
+        " [--max-frames <value>] [--max-memory <value>] [--monitoring]"
     ],
     summary="Trace the execution time of specified method invocation.",
     examples=[
@@ -243,6 +245,10 @@ TRACE_COMMAND_DESCRIPTION = CommandDescription(
         "trace __main__ func --interval 1",
         "trace __main__ func -et 30 -i 1",
         "trace __main__ classA func",
+        "trace __main__ func -n 100 --aggregate",
+        "trace __main__ func --follow-threads",
+        "trace __main__ func -i 0 --max-frames 10000",
+        "trace __main__ func -n 100 --output trace.json",
     ],
     wiki="https://github.com/alibaba/PyFlightProfiler/blob/main/docs/WIKI.md",
     options=[
@@ -272,6 +278,36 @@ TRACE_COMMAND_DESCRIPTION = CommandDescription(
             " (target, *args, **kwargs), eg: args[0]=='hello'.",
         ),
         ("-n, --limits <value>", "threshold of trace method times, default is 10."),
+        (
+            "--overflow <value>",
+            "block|drop-oldest|drop-newest|sample, how traces are dropped when client can't keep up,"
+            " default is sample.",
+        ),
+        (
+            "--output <value>",
+            "write traces to a .ndjson/.jsonl or .bin file, or a .json chrome trace opened by ui.perfetto.dev,"
+            " .gz suffix compresses it. terminal only shows a counter.",
+        ),
+        (
+            "--aggregate",
+            "merge traces of all invocations by call path, show calls/total/self/min/max once tracing ends.",
+        ),
+        (
+            "--follow-threads",
+            "also trace work submitted to thread pools or run in threads started by the traced call.",
+        ),
+        (
+            "--max-frames <value>",
+            "frames kept per invocation, cheapest are elided beyond it, default 100000, 0 for no limit.",
+        ),
+        (
+            "--max-memory <value>",
+            "MB of frames kept per invocation, cheapest are elided beyond it, default 64, 0 for no limit.",
+        ),
+        (
+            "--monitoring",
+            "trace through sys.monitoring instead of the profile hook on Python 3.12+.",
+        ),
     ],
     option_offset=35,
 )
@@ -279,7 +315,10 @@ TRACE_COMMAND_DESCRIPTION = CommandDescription(
 TIME_TUNNEL_COMMAND_DESCRIPTION = CommandDescription(
     usage=[
         "tt [-t module [class] method] [-n <value>] [-l] [-i <value>] [-d <value>] [-nm <value>] [-da] [-x <value>] [-p] [-f <value>] [-r] [-v]"
-        " [-m <value>]"
+        " [-m <value>] [--output <value>] [-s] [--max-records <value>] [--max-bytes <value>] [--evict <value>]"
+        " [--sort <value>] [--desc] [--top <value>] [--since <value>] [--until <value>] [--exception] [--min-cost <value>]"
+        " [--page <value>] [--page-size <value>] [--spill <value>] [--spill-max-bytes <value>]"
+        " [--times <value>] [--concurrency <value>] [--max-targets <value>]"
     ],
     summary="Time tunnel, records contexts of method invocation at different times in execution history.",
     examples=[
@@ -291,6 +330,13 @@ TIME_TUNNEL_COMMAND_DESCRIPTION = CommandDescription(
         "tt -i 1000 -p",
         "tt -t __main__ func -f \"return_obj['success']==True and cost>10\"",
         "tt -t __main__ func -f args[0][\"query\"]=='hello'",
+        "tt -t __main__ func -n 100000 --max-records 5000 --max-bytes 64m",
+        "tt -s",
+        "tt -l --top 20 --since 10m",
+        "tt -l -m __main__.None.func --exception --sort time --desc --page 2",
+        "tt -t __main__ func -n 1000000 --max-records 1000000 --spill /tmp/tt --spill-max-bytes 10g",
+        "tt -i 1000 -p --times 1000 --concurrency 8",
+        "tt -t myapp.services.* *Repo.get_* -n 200",
     ],
     wiki="https://github.com/alibaba/PyFlightProfiler/blob/main/docs/WIKI.md",
     options=[
@@ -326,6 +372,31 @@ TIME_TUNNEL_COMMAND_DESCRIPTION = CommandDescription(
             "-m, --method <value>",
             "specify method locator, default format is module.class.method, fill in None if method belongs to module.",
         ),
+        (
+            "--output <value>",
+            "write records of -t to a .ndjson/.jsonl or .bin file, .gz suffix compresses it. terminal only shows a counter.",
+        ),
+        ("-s, --stats", "show recorded count, estimated memory and evictions of recorded invocations."),
+        ("--max-records <value>", "keep at most ${value} recorded invocations, default is 10000."),
+        ("--max-bytes <value>", "estimated memory budget of recorded invocations like 64m, default is 256m."),
+        ("--evict <value>", "fifo|lru, which invocations are evicted first when bounds are exceeded, default is fifo."),
+        ("--sort <value>", "index|time|cost, order of -l, default is index."),
+        ("--desc", "list in descending order."),
+        ("--top <value>", "list only the ${value} slowest invocations."),
+        ("--since <value>", "list invocations started within duration like 30s/5m/1h/1d."),
+        ("--until <value>", "list invocations started before duration like 30s/5m/1h/1d."),
+        ("--exception", "list only invocations raising exceptions."),
+        ("--min-cost <value>", "list only invocations costing at least ${value} ms."),
+        ("--page <value>", "list only the ${value}th page, starts from 1."),
+        ("--page-size <value>", "invocations of one page, default is 500."),
+        ("--spill <value>", "keep args/return/exception of later invocations in segment files under directory ${value}, off stops it."),
+        ("--spill-max-bytes <value>", "disk budget of spilled invocations like 10g, oldest are dropped beyond it, default is 1g."),
+        ("--times <value>", "with -i -p, replay the invocation ${value} times and report throughput and latency histogram."),
+        ("--concurrency <value>", "replays running at the same time with --times, default is 1, max is 256."),
+        (
+            "--max-targets <value>",
+            "max methods a glob or re: pattern of -t may record, default is 50. -n limits records of all of them.",
+        ),
     ],
     option_offset=35,
 )
@@ -405,6 +476,8 @@ VMTOOL_COMMAND_DESCRIPTION = CommandDescription(
 WATCH_COMMAND_DESCRIPTION = CommandDescription(
     usage=[
         "watch module [class] method [--expr <value>] [-nm <value] [-e] [-r] [-v] [-n <value>] [-x <value>] [-f <value>]"
+        " [--sample <value>] [--rate <value>] [--monitor <value>] [--overflow <value>] [--offload <value>]"
+        " [--slow <value>] [--stack] [--max-targets <value>] [--output <value>]"
     ],
     summary="Display the input/output args, return object and cost time of method invocation.",
     examples=[
@@ -413,12 +486,18 @@ WATCH_COMMAND_DESCRIPTION = CommandDescription(
         "watch __main__ func -f return_obj['success']==True",
         "watch __main__ func --expr return_obj,args -f cost>10",
         "watch __main__ classA func",
+        "watch __main__ func --sample 0.01 --rate 5/s -n 100",
+        "watch __main__ func --monitor 5 -n 12",
+        "watch __main__ func --offload copy",
+        "watch __main__ func --slow p99 --stack -n 5",
+        "watch myapp.services.* *Repo.get_* --monitor 5",
+        "watch __main__ func --offload ref -n 100000 --output watch.ndjson.gz",
     ],
     wiki="https://github.com/alibaba/PyFlightProfiler/blob/main/docs/WIKI.md",
     options=[
-        ("<module>", "the module that method locates."),
-        ("<class>", "the class name if method belongs to class."),
-        ("<method>", "target method name."),
+        ("<module>", "the module that method locates, glob like myapp.* or re:<regex> watches many methods."),
+        ("<class>", "the class name if method belongs to class, glob or re:<regex> is allowed."),
+        ("<method>", "target method name, glob or re:<regex> is allowed, *Repo.get_* matches class and method."),
         (
             "--expr <value>",
             "contents you want to watch,  write python bool statement like input func args is "
@@ -440,13 +519,51 @@ WATCH_COMMAND_DESCRIPTION = CommandDescription(
         ("-v, --verbose", "display all the nested items in target list or dict."),
         (
             "-n, --limits <value>",
-            "limit the the upperbound of display watched result, default is 10.",
+            "limit the the upperbound of display watched result, default is 10."
+            " limit the report cycles in monitor mode.",
         ),
         (
             "-f, --filter <value>",
             "filter method params&args&return_obj&cost&target, expressions according to --expr"
             "eg: args[0]=='hello'.",
         ),
+        (
+            "--sample <value>",
+            "only watch invocations sampled with probability ${value}, eg: 0.01.",
+        ),
+        (
+            "--rate <value>",
+            "watch at most ${value} invocations per time unit, eg: 5/s, 100/m.",
+        ),
+        (
+            "--monitor <value>",
+            "report count, fail rate, avg/min/max and p50/p90/p99/p999 cost every ${value} seconds"
+            " instead of each invocation.",
+        ),
+        (
+            "--overflow <value>",
+            "block|drop-oldest|drop-newest|sample, how results are dropped when client can't keep up,"
+            " default is drop-oldest.",
+        ),
+        (
+            "--offload <value>",
+            "ref|copy, evaluate --expr and serialize in background instead of the watched call."
+            " ref dumps objects as they are at serialization time, copy shallow copies list/dict/set args first.",
+        ),
+        (
+            "--slow <value>",
+            "only dump calls slower than p${percent} of recent calls like p99, or ${k} times of recent median"
+            " like 3x. -n limits dumped slow calls.",
+        ),
+        ("--stack", "dump the call stack of watched method too."),
+        (
+            "--max-targets <value>",
+            "max methods a pattern may watch, default is 50. -n limits results of all of them.",
+        ),
+        (
+            "--output <value>",
+            "write results to a .ndjson/.jsonl or .bin file, .gz suffix compresses it. terminal only shows a counter.",
+        ),
     ],
     option_offset=35,
 )
@@ -17,6 +17,8 @@ class PerfParams:
         self.filepath = filepath
         self.duration = duration
         self.sample_rate = sample_rate
+        # default flamegraph.svg is written as collapsed stacks when perf merges processes
+        self.filepath_given = filepath is not None
 
         if self.filepath is None:
             cwd_path: str = os.getcwd()
@@ -1,7 +1,40 @@
 import asyncio
 import queue
+import threading
 from asyncio import Queue
-from typing import Optional, Union
+from collections import deque
+from typing import Deque, Optional, Union
+
+from flight_profiler.common.system_logger import logger
+from flight_profiler.common.wire_format import (
+    decode_drop_notice,
+    encode_drop_notice,
+    is_drop_notice,
+    is_wire_record,
+)
+
+# producers are coalesced into one loop wakeup per batch, which is flushed
+# after FLUSH_LATENCY seconds or as soon as FLUSH_BATCH_SIZE messages pile up
+FLUSH_LATENCY = 0.002
+FLUSH_BATCH_SIZE = 64
+
+# what ServerQueue does with new messages once the client falls behind
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP_OLDEST = "drop-oldest"
+OVERFLOW_DROP_NEWEST = "drop-newest"
+OVERFLOW_SAMPLE = "sample"
+OVERFLOW_POLICIES = (
+    OVERFLOW_BLOCK,
+    OVERFLOW_DROP_OLDEST,
+    OVERFLOW_DROP_NEWEST,
+    OVERFLOW_SAMPLE,
+)
+
+# payload bytes a command may hold in memory waiting for its client
+MAX_BUFFERED_BYTES = 32 * 1024 * 1024
+# a blocked producer gives up and drops its message after this many seconds,
+# so that a stuck client can never hang the profiled threads forever
+BLOCK_TIMEOUT = 5
 
 
 class Message:
@@ -16,24 +49,238 @@ class Message:
         self.is_newline = is_newline
 
 
+def message_size(msg: Message) -> int:
+    return len(msg.msg) if msg.msg is not None else 0
+
+
+def is_record_message(msg: Message) -> bool:
+    """
+    wire records are the results streamed by commands, the only messages overflow may lose
+    """
+    return isinstance(msg.msg, bytes) and is_wire_record(msg.msg)
+
+
 class ServerQueue:
-    def __init__(self, out_q: Queue, loop: Optional[asyncio.AbstractEventLoop] = None):
+    """
+    Thread-safe producer side of a command's output queue. Messages are buffered in a
+    deque and moved into out_q by the event loop in batches, so producers never allocate
+    coroutines or futures per message.
+
+    Buffered messages are bounded by out_q's maxsize and by #max_bytes of payload, beyond
+    that the overflow policy decides which messages are lost:
+        block: producer threads wait for the client, at most BLOCK_TIMEOUT seconds
+        drop-oldest: evict the oldest undelivered messages
+        drop-newest: discard new messages until the client catches up
+        sample: once half full, keep a shrinking fraction of new messages
+    Policies only apply to wire records. Other messages, like the sys.path sent first by
+    trace or error and hint text, are never dropped: records are evicted to make room for
+    them, and those evicted themselves are held ahead of out_q. Lost messages are counted
+    and reported to client by a drop notice, the end message is never dropped.
+    """
+
+    def __init__(
+        self,
+        out_q: Queue,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        flush_latency: float = FLUSH_LATENCY,
+        flush_batch_size: int = FLUSH_BATCH_SIZE,
+        overflow_policy: str = OVERFLOW_DROP_NEWEST,
+        max_bytes: int = MAX_BUFFERED_BYTES,
+    ):
         self.out_q = out_q
         self.loop = loop
+        self.flush_latency = flush_latency
+        self.flush_batch_size = flush_batch_size
+        self.pending: Deque[Message] = deque()
+        # messages that aren't records evicted from out_q, delivered before it in order
+        self.held: Deque[Message] = deque()
+        self.flush_scheduled = False
+        self.overflow_policy = OVERFLOW_DROP_NEWEST
+        self.set_overflow_policy(overflow_policy)
+        self.max_bytes = max_bytes
+        # payload bytes in out_q, only touched by loop thread
+        self.buffered_bytes = 0
+        self.dropped = 0
+        self.notified_dropped = 0
+        self.sample_seq = 0
+        self.space = threading.Condition()
+        self.blocked_producers = 0
+
+    def set_overflow_policy(self, overflow_policy: str) -> None:
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"overflow policy {overflow_policy} should be one of {', '.join(OVERFLOW_POLICIES)}"
+            )
+        self.overflow_policy = overflow_policy
 
     # for c extension
     def output_msgstr_nowait(self, is_end: int, msg: str):
-        # self.out_q.put_nowait(Message(is_end=(True if is_end != 0 else False), msg=msg))
-        asyncio.run_coroutine_threadsafe(
-            self.out_q.put(Message(is_end=(True if is_end != 0 else False), msg=msg)),
-            self.loop,
-        )
+        self.output_msg_nowait(Message(is_end=(True if is_end != 0 else False), msg=msg))
 
     def output_msg_nowait(self, msg: Message):
-        asyncio.run_coroutine_threadsafe(self.out_q.put(msg), self.loop)
+        if (
+            self.overflow_policy == OVERFLOW_BLOCK
+            and not msg.is_end
+            and self.__is_full()
+        ):
+            self.__wait_for_space()
+        pending = self.pending
+        pending.append(msg)
+        if msg.is_end or len(pending) >= self.flush_batch_size:
+            self.loop.call_soon_threadsafe(self.flush)
+        elif not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.loop.call_soon_threadsafe(
+                self.loop.call_later, self.flush_latency, self.flush
+            )
 
     async def output_msg(self, msg: Message):
-        asyncio.run_coroutine_threadsafe(self.out_q.put(msg), self.loop)
+        self.output_msg_nowait(msg)
+
+    def count_dropped(self, dropped: int) -> None:
+        """
+        messages lost by producers before reaching this queue, client is told with the next notice
+        """
+        self.loop.call_soon_threadsafe(self.__add_dropped, dropped)
+
+    def __add_dropped(self, dropped: int) -> None:
+        self.dropped += dropped
+
+    async def get(self) -> Message:
+        """
+        consumer side, must be used instead of reading out_q directly so that buffer is released
+        """
+        if self.held:
+            return self.held.popleft()
+        msg = await self.out_q.get()
+        self.__release(msg)
+        return msg
+
+    def get_nowait(self) -> Message:
+        if self.held:
+            return self.held.popleft()
+        msg = self.out_q.get_nowait()
+        self.__release(msg)
+        return msg
+
+    def empty(self) -> bool:
+        return not self.held and self.out_q.empty()
+
+    def flush(self) -> None:
+        """
+        move pending messages into out_q, must run in loop thread
+        """
+        # reset before draining, messages appended meanwhile schedule another flush
+        self.flush_scheduled = False
+        pending = self.pending
+        while pending:
+            msg = pending.popleft()
+            if (
+                self.overflow_policy == OVERFLOW_BLOCK
+                and not self.__has_room(msg)
+                and (msg.is_end or len(pending) < self.out_q.maxsize)
+            ):
+                # keep waiting messages in pending, flushed again once client takes some
+                pending.appendleft(msg)
+                break
+            if msg.is_end:
+                self.__put_end(msg)
+            elif not is_record_message(msg):
+                self.__put_control(msg)
+            elif self.__admit(msg):
+                self.__put(msg)
+                self.__notify_dropped()
+
+    def __is_full(self) -> bool:
+        return (
+            len(self.pending) + self.out_q.qsize() >= self.out_q.maxsize > 0
+            or self.buffered_bytes >= self.max_bytes
+        )
+
+    def __wait_for_space(self) -> None:
+        with self.space:
+            self.blocked_producers += 1
+            try:
+                # message is dropped by flush if client is still stuck after timeout
+                self.space.wait_for(lambda: not self.__is_full(), BLOCK_TIMEOUT)
+            finally:
+                self.blocked_producers -= 1
+
+    def __has_room(self, msg: Message) -> bool:
+        return (
+            not self.out_q.full()
+            and self.buffered_bytes + message_size(msg) <= self.max_bytes
+        )
+
+    def __admit(self, msg: Message) -> bool:
+        out_q = self.out_q
+        if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+            while out_q.qsize() > 0 and not self.__has_room(msg):
+                self.__evict_oldest()
+        if not self.__has_room(msg):
+            self.dropped += 1
+            return False
+        if self.overflow_policy == OVERFLOW_SAMPLE and out_q.maxsize > 0:
+            # keep 1 of 2^k messages, k grows as queue fills up past its half
+            over_half = out_q.qsize() * 2 - out_q.maxsize
+            if over_half > 0:
+                self.sample_seq += 1
+                stride = 1 << (over_half * 8 // out_q.maxsize + 1)
+                if self.sample_seq % stride != 0:
+                    self.dropped += 1
+                    return False
+        return True
+
+    def __put(self, msg: Message) -> None:
+        self.out_q.put_nowait(msg)
+        self.buffered_bytes += message_size(msg)
+
+    def __put_control(self, msg: Message) -> None:
+        while self.out_q.qsize() > 0 and not self.__has_room(msg):
+            self.__evict_oldest()
+        self.__put(msg)
+        self.__notify_dropped()
+
+    def __put_end(self, msg: Message) -> None:
+        # end message must be delivered, otherwise client waits forever
+        reserved = 2 if self.dropped > self.notified_dropped else 1
+        while self.out_q.maxsize - self.out_q.qsize() < reserved and self.out_q.qsize() > 0:
+            self.__evict_oldest()
+            reserved = 2
+        self.__notify_dropped()
+        self.__put(msg)
+        if self.dropped > 0:
+            logger.warning(
+                f"[ServerQueue] {self.dropped} messages dropped, client can't keep up."
+            )
+
+    def __notify_dropped(self) -> None:
+        if self.dropped == self.notified_dropped or self.out_q.full():
+            return
+        self.__put(Message(False, encode_drop_notice(self.dropped - self.notified_dropped)))
+        self.notified_dropped = self.dropped
+
+    def __evict_oldest(self) -> None:
+        msg = self.out_q.get_nowait()
+        self.__release(msg)
+        if msg.msg is not None and is_drop_notice(msg.msg):
+            # notice is merged into the next one rather than lost
+            self.notified_dropped -= decode_drop_notice(msg.msg)
+        elif not is_record_message(msg):
+            self.held.append(msg)
+        else:
+            self.dropped += 1
+
+    def __release(self, msg: Message) -> None:
+        self.buffered_bytes -= message_size(msg)
+        if self.overflow_policy != OVERFLOW_BLOCK:
+            return
+        if self.pending and not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.loop.call_soon(self.flush)
+        if self.blocked_producers > 0:
+            with self.space:
+                self.space.notify_all()
 
 
 class ServerPlugin:
@@ -1,7 +1,7 @@
 import sys
 from typing import List
 
-from flight_profiler.communication.flight_client import FlightClient
+from flight_profiler.communication.flight_session import open_flight_client
 from flight_profiler.help_descriptions import STACK_COMMAND_DESCRIPTION
 from flight_profiler.plugins.cli_plugin import BaseCliPlugin
 from flight_profiler.plugins.stack.stack_parser import StackParams, global_stack_parser
@@ -74,7 +74,7 @@ class StackCliPlugin(BaseCliPlugin):
         else:
             body = {"target": "stack", "param": ""}
             try:
-                client = FlightClient(host="localhost", port=self.port)
+                client = open_flight_client(self.port)
             except:
                 show_error_info("Target process exited!")
                 return
@@ -1,24 +1,45 @@
 import argparse
+import functools
 import pickle
 import sys
-from typing import Union
+from typing import Optional
 
-from flight_profiler.communication.flight_client import FlightClient
+from flight_profiler.common.wire_format import is_wire_record
+from flight_profiler.communication.flight_session import open_flight_client
 from flight_profiler.help_descriptions import TRACE_COMMAND_DESCRIPTION
 from flight_profiler.plugins.cli_plugin import BaseCliPlugin
 from flight_profiler.plugins.trace.trace_agent import TracePoint
+from flight_profiler.plugins.trace.trace_export import ChromeTraceExporter
 from flight_profiler.plugins.trace.trace_frame import (
+    AggregatedTraceNode,
     WrapTraceFrame,
-    deserialize_string_frames,
+    decode_trace_aggregate,
+    decode_trace_frames,
 )
 from flight_profiler.plugins.trace.trace_parser import TraceArgumentParser
 from flight_profiler.plugins.trace.trace_render import TraceRender
 from flight_profiler.utils.cli_util import (
     common_plugin_execute_routine,
+    show_drop_notice,
     show_error_info,
     show_normal_info,
 )
 from flight_profiler.utils.frame_util import global_filepath_operator
+from flight_profiler.utils.record_file import (
+    FORMAT_CHROME_TRACE,
+    TRACE_SUFFIX_FORMATS,
+    RecordFileWriter,
+    parse_output_path,
+)
+
+
+def is_displayed_trace(trace_point: TracePoint, wrap: WrapTraceFrame) -> bool:
+    """
+    traces skipped by terminal display are not written to output file either
+    """
+    if len(wrap.frames) == 0 or wrap.frames[0] is None:
+        return False
+    return wrap.frames[0].cost_ns >= trace_point.entrance_time * 1_000_000
 
 
 class TraceCliPlugin(BaseCliPlugin):
@@ -34,6 +55,9 @@ class TraceCliPlugin(BaseCliPlugin):
         except argparse.ArgumentError as e:
             show_error_info(f" Trace command parsed failed, {e}")
             return
+        except SyntaxError as e:
+            show_error_info(f" Trace expression compile failed, {e}")
+            return
         except:
             show_normal_info(self.get_help())
             return
@@ -41,23 +65,59 @@ class TraceCliPlugin(BaseCliPlugin):
         self.last_cmd = cmd
         body = {"target": "trace", "param": "on " + cmd}
         try:
-            client = FlightClient(host="localhost", port=self.port)
+            client = open_flight_client(self.port)
         except:
             show_error_info("Target process exited!")
             raise
+        writer: Optional[RecordFileWriter] = None
+        exporter: Optional[ChromeTraceExporter] = None
+        if (
+            trace_point.output is not None
+            and parse_output_path(trace_point.output, TRACE_SUFFIX_FORMATS)[0]
+            == FORMAT_CHROME_TRACE
+        ):
+            exporter = ChromeTraceExporter(self.server_pid)
         try:
+            if trace_point.output is not None and trace_point.aggregate:
+                writer = RecordFileWriter(
+                    trace_point.output,
+                    decode_trace_aggregate,
+                    to_events=exporter.aggregate_events if exporter else None,
+                )
+                if not writer.start():
+                    return
+            elif trace_point.output is not None:
+                writer = RecordFileWriter(
+                    trace_point.output,
+                    decode_trace_frames,
+                    functools.partial(is_displayed_trace, trace_point),
+                    to_events=exporter.trace_events if exporter else None,
+                )
+                if not writer.start():
+                    return
             first_chunk = True
             for content in client.request_stream(body):
                 sys.stdout.flush()
-                if first_chunk:
+                if show_drop_notice(content):
+                    continue
+                if first_chunk and not is_wire_record(content):
+                    # sys.path of target process, sent before any record
                     global_filepath_operator.set_sys_path(pickle.loads(content))
                     first_chunk = False
                 else:
-                    wrap: Union[WrapTraceFrame, str] = pickle.loads(content)
-                    if type(wrap) == str:
+                    first_chunk = False
+                    if not is_wire_record(content):
                         # error
-                        show_error_info(wrap)
+                        show_error_info(pickle.loads(content))
+                        continue
+                    if writer is not None:
+                        writer.write(content)
+                        continue
+                    if trace_point.aggregate:
+                        root: AggregatedTraceNode = decode_trace_aggregate(content)
+                        show_normal_info(TraceRender(root.total_ns).display_aggregate(root))
                         continue
+                    wrap: WrapTraceFrame = decode_trace_frames(content)
                     if (
                         len(wrap.frames) > 0
                         and wrap.frames[0] is None
@@ -68,7 +128,6 @@ class TraceCliPlugin(BaseCliPlugin):
                             f"Trace method cost is below {trace_point.interval}ms, skip display."
                         )
                         continue
-                    wrap = deserialize_string_frames(wrap)
                     if (
                         wrap.frames[0].cost_ns
                         < trace_point.entrance_time * 1_000_000
@@ -80,6 +139,8 @@ class TraceCliPlugin(BaseCliPlugin):
                     show_normal_info(show_msg)
         finally:
             client.close()
+            if writer is not None:
+                writer.close()
 
     def on_interrupted(self):
         common_plugin_execute_routine(
@@ -20,6 +20,8 @@ class TraceServerPlugin(ServerPlugin):
             new_param = param[len(splits[0]) :]
             try:
                 point: TracePoint = TraceArgumentParser().parse_trace_point(new_param)
+                if point.overflow_policy is not None:
+                    self.out_q.set_overflow_policy(point.overflow_policy)
                 point.out_q = self.out_q
                 global_trace_agent.set_point(point)
                 # will not return end message, server request will block
@@ -14,9 +14,27 @@ from flight_profiler.common.code_wrapper_entity import CodeWrapperResult
 from flight_profiler.common.enter_exit_command import EnterExitCommand
 from flight_profiler.common.expression_resolver import FilterExprResolver
 from flight_profiler.common.system_logger import logger
-from flight_profiler.ext.trace_profile_C import remove_trace_profile, set_trace_profile
+from flight_profiler.ext.trace_profile_C import (
+    release_trace_monitoring,
+    remove_trace_profile,
+    set_trace_monitoring,
+    set_trace_profile,
+)
 from flight_profiler.plugins.server_plugin import Message, ServerQueue
-from flight_profiler.plugins.trace.trace_frame import WrapTraceFrame
+from flight_profiler.plugins.trace.trace_frame import (
+    TraceAggregator,
+    WrapTraceFrame,
+    current_thread_infos,
+    encode_trace_aggregate,
+    encode_trace_frames,
+    encode_trace_record,
+)
+from flight_profiler.plugins.trace.trace_threads import (
+    begin_follow,
+    end_follow,
+    install_thread_hooks,
+    uninstall_thread_hooks,
+)
 from flight_profiler.utils.render_util import (
     COLOR_END,
     COLOR_ORANGE,
@@ -29,6 +47,10 @@ from flight_profiler.utils.render_util import (
 #     set_trace_profile,
 # )
 
+# PEP 669 events on 3.12+ when asked by --monitoring. Falls back to the profile hook
+# while another tool, e.g. cProfile, holds the profiler tool id
+USE_SYS_MONITORING = sys.version_info >= (3, 12)
+
 
 class TracePoint(EnterExitCommand):
 
@@ -45,7 +67,14 @@ class TracePoint(EnterExitCommand):
         out_q: ServerQueue = None,
         nested_method: str = None,
         need_wrap_nested_inplace: bool = False,
-        nested_code_obj: CodeType = None
+        nested_code_obj: CodeType = None,
+        overflow_policy: Optional[str] = None,
+        output: Optional[str] = None,
+        aggregate: bool = False,
+        follow_threads: bool = False,
+        max_frames: int = 0,
+        max_bytes: int = 0,
+        monitoring: bool = False,
     ):
         super().__init__(limit=limits)
         self.module_name = module_name
@@ -62,7 +91,62 @@ class TracePoint(EnterExitCommand):
         self.nested_method = nested_method
         self.need_wrap_nested_inplace = need_wrap_nested_inplace
         self.nested_code_obj = nested_code_obj
+        # None keeps the command's default overflow policy of server queue
+        self.overflow_policy = overflow_policy
+        # client side only, traces are written to this file instead of terminal
+        self.output = output
+        # invocations are merged by call path and sent as one tree when tracing ends
+        self.aggregate = aggregate
+        self.aggregator: Optional[TraceAggregator] = (
+            TraceAggregator(int(entrance_time * 1_000_000)) if aggregate else None
+        )
+        # work handed to executors and threads inside traced calls is traced as well
+        self.follow_threads = follow_threads
+        # per invocation budget of profiler, cheapest frames are elided beyond it, 0 is unlimited
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        # traced through sys.monitoring instead of the profile hook on Python 3.12+
+        self.monitoring = monitoring
+        # set by agent, profiler setter and frames output of traced calls
+        self.set_trace: Optional[Callable] = None
+        self.output_frames: Optional[Callable[[ServerQueue, List[str]], None]] = None
 
+    def begin_follow_threads(self) -> None:
+        begin_follow(
+            self.set_trace,
+            int(self.interval * 1000000),
+            self.depth,
+            self.max_frames,
+            self.max_bytes,
+        )
+
+    def follow_frames(self, out_q: ServerQueue, sending_frames: List[str]) -> None:
+        """
+        stitches frames of followed threads before output
+        """
+        self.output_frames(out_q, end_follow(sending_frames))
+
+    def aggregate_frames(self, out_q: ServerQueue, sending_frames: List[str]) -> None:
+        """
+        replaces c_bind_output_trace_frames in aggregate mode
+        """
+        aggregator = self.aggregator
+        if aggregator is not None:
+            aggregator.merge(sending_frames)
+
+    def send_aggregate(self) -> None:
+        """
+        sends the merged tree at most once, invocations finishing afterwards are ignored
+        """
+        aggregator, self.aggregator = self.aggregator, None
+        if aggregator is not None and aggregator.invocations > 0 and self.out_q is not None:
+            self.out_q.output_msg_nowait(
+                Message(False, msg=encode_trace_aggregate(aggregator))
+            )
+
+    def end_output(self):
+        self.send_aggregate()
+        super().end_output()
 
     def child_clear_action(self):
         global_trace_agent.clear_auto_close(self.unique_key())
@@ -70,19 +154,29 @@ class TracePoint(EnterExitCommand):
 
 def c_bind_output_trace_frames(out_q: ServerQueue, sending_frames: List[str]) -> None:
     """
-    response trace frames to client side
+    response trace frames to client side, frames are strings stitched with followed threads
     """
     out_q.output_msg_nowait(
         Message(
-            False, msg=pickle.dumps(WrapTraceFrame(sending_frames))
+            False, msg=encode_trace_frames(WrapTraceFrame(sending_frames))
         )
     )
 
 
+def c_bind_output_trace_record(out_q: ServerQueue, frames_section: bytes) -> None:
+    """
+    response trace frames to client side, profiler encoded the frames section itself
+    """
+    out_q.output_msg_nowait(
+        Message(False, msg=encode_trace_record(frames_section, *current_thread_infos()))
+    )
+
+
 def generate_trace_wrapper(func_args: List[Union[Callable, Any]]) -> Callable:
     """
     func_args: [set_trace_profile, output_frames_function, trace_point,
-                interval_ns, watch_filter, is_class_method, remove_trace_function]
+                interval_ns, watch_filter, is_class_method, remove_trace_function,
+                encoded]
     """
 
     def trace_decorator(func):
@@ -121,8 +215,11 @@ def generate_trace_wrapper(func_args: List[Union[Callable, Any]]) -> Callable:
                         else:
                             target_func = func
                         if can_pass:
+                            if trace_point.follow_threads:
+                                trace_point.begin_follow_threads()
                             trace_profiler = func_args[0](
-                                func_args[1], out_q, func_args[3], True, trace_point.depth
+                                func_args[1], out_q, func_args[3], True, trace_point.depth,
+                                trace_point.max_frames, trace_point.max_bytes, func_args[7]
                             )
                         return await target_func(*args, **kwargs)
                     except:
@@ -168,8 +265,11 @@ def generate_trace_wrapper(func_args: List[Union[Callable, Any]]) -> Callable:
                         else:
                             target_func = func
                         if can_pass:
+                            if trace_point.follow_threads:
+                                trace_point.begin_follow_threads()
                             trace_profiler = func_args[0](
-                                func_args[1], out_q, func_args[3], False, trace_point.depth
+                                func_args[1], out_q, func_args[3], False, trace_point.depth,
+                                trace_point.max_frames, trace_point.max_bytes, func_args[7]
                             )
                         return target_func(*args, **kwargs)
                     except:
@@ -217,19 +317,36 @@ class TraceAgent:
             )
             return
 
+        point.set_trace = (
+            set_trace_monitoring
+            if USE_SYS_MONITORING and point.monitoring
+            else set_trace_profile
+        )
+        point.output_frames = (
+            point.aggregate_frames if point.aggregate else c_bind_output_trace_frames
+        )
+        # profiler encodes frames itself unless python consumers need them as strings
+        encoded = not point.aggregate and not point.follow_threads
+        if point.follow_threads:
+            output_frames = point.follow_frames
+        elif encoded:
+            output_frames = c_bind_output_trace_record
+        else:
+            output_frames = point.output_frames
         wrapper_result: CodeWrapperResult = aop_decorator.add_func_wrapper(
             module,
             point.class_name,
             point.method_name,
             generate_trace_wrapper,
             [
-                set_trace_profile,
-                c_bind_output_trace_frames,
+                point.set_trace,
+                output_frames,
                 point,
                 int(point.interval * 1000000),
                 point.filter,
                 point.class_name is not None,
                 remove_trace_profile,
+                encoded,
             ],
             ["sys", "traceback", "inspect", "types"],
             nested_method=point.nested_method,
@@ -259,6 +376,8 @@ class TraceAgent:
                     ),
                 )
             )
+            if point.follow_threads:
+                install_thread_hooks()
             self.aop_points[key] = point
 
     def clear_point(self, point: TracePoint) -> None:
@@ -273,6 +392,8 @@ class TraceAgent:
             )
             return None
         self.aop_points.pop(point.unique_key())
+        if old_point.follow_threads:
+            uninstall_thread_hooks()
 
         if old_point.origin_code is not None:
             module = importlib.import_module(old_point.module_name)
@@ -283,9 +404,21 @@ class TraceAgent:
                 old_point.origin_code,
             )
             old_point.origin_code = None
+            old_point.send_aggregate()
             old_point.out_q.output_msg_nowait(Message(is_end=True, msg=""))
+        self.__release_monitoring()
 
     def clear_auto_close(self, unique_key: str):
-        self.aop_points.pop(unique_key, None)
+        point = self.aop_points.pop(unique_key, None)
+        if point is not None and point.follow_threads:
+            uninstall_thread_hooks()
+        self.__release_monitoring()
+
+    def __release_monitoring(self) -> None:
+        """
+        the tool id is held while any trace is set and freed with the last one
+        """
+        if USE_SYS_MONITORING and len(self.aop_points) == 0:
+            release_trace_monitoring()
 
 global_trace_agent: TraceAgent = TraceAgent()
@@ -0,0 +1,200 @@
+"""
+Converts traces into Chrome Trace Event Format, the json read by chrome://tracing and
+ui.perfetto.dev. Every frame becomes a complete ('X') event on the track of the thread
+it ran in, work followed into other threads is put on a track named after that thread.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from flight_profiler.plugins.trace.trace_frame import (
+    AggregatedTraceNode,
+    FlattenTreeTraceFrame,
+    WrapTraceFrame,
+    build_frame_stack,
+)
+
+RUNNING_SUFFIX = " (running)"
+QUEUED_TRACK_NAME = "queued"
+
+
+def _event_category(frame: Any) -> str:
+    if frame.await_frame:
+        return "await"
+    if frame.thread_frame:
+        return "thread"
+    if frame.elided_frame:
+        return "elided"
+    return "builtin" if frame.c_frame else "python"
+
+
+def _event_name(frame: Any) -> str:
+    if frame.thread_frame or frame.elided_frame:
+        return f"{frame.method_name} {frame.filename}"
+    return frame.method_name
+
+
+def _event_args(frame: Any) -> Dict[str, Any]:
+    if frame.c_frame or frame.await_frame or frame.thread_frame or frame.elided_frame:
+        return {}
+    return {"file": frame.filename, "line": int(frame.line_no)}
+
+
+class ChromeTraceExporter:
+    """
+    Keeps the tracks of one output file. Invocations overlapping in time on the same
+    thread, like asyncio tasks of one event loop, are spread over extra tracks, since
+    events of one track must nest.
+    """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        # track key -> [(tid, end_us of last event)]
+        self.lanes: Dict[Any, List[List[Any]]] = {}
+        self.next_tid = 1
+        self.process_named = False
+
+    def trace_events(self, wrap: WrapTraceFrame) -> List[Dict[str, Any]]:
+        """
+        events of one traced invocation, frames are TraceFrame decoded by decode_trace_frames
+        """
+        events: List[Dict[str, Any]] = self.__process_events()
+        if len(wrap.frames) == 0 or wrap.frames[0] is None:
+            return events
+        root = build_frame_stack(wrap.frames)
+        thread_name = wrap.thread_name or str(wrap.thread_id)
+        tid = self.__lane(
+            ("thread", wrap.thread_id), thread_name, wrap.thread_id, root, events
+        )
+        stack: List[Tuple[FlattenTreeTraceFrame, int]] = [(root, tid)]
+        while stack:
+            frame, tid = stack.pop()
+            if frame.thread_frame:
+                # work handed to another thread runs concurrently with its caller
+                name = frame.filename
+                if name.endswith(RUNNING_SUFFIX):
+                    name = name[: -len(RUNNING_SUFFIX)]
+                elif name.startswith(QUEUED_TRACK_NAME + " ("):
+                    name = QUEUED_TRACK_NAME
+                tid = self.__lane(("followed", name), name, None, frame, events)
+            events.append(
+                {
+                    "name": _event_name(frame),
+                    "cat": _event_category(frame),
+                    "ph": "X",
+                    "ts": frame.start_ns / 1000,
+                    "dur": frame.cost_ns / 1000,
+                    "pid": self.pid,
+                    "tid": tid,
+                    "args": _event_args(frame),
+                }
+            )
+            stack.extend((sub_frame, tid) for sub_frame in reversed(frame.sub_frames))
+        return events
+
+    def aggregate_events(self, root: AggregatedTraceNode) -> List[Dict[str, Any]]:
+        """
+        merged tree laid out as a flame graph on one track: children start where their
+        previous sibling ends, the most expensive first, timestamps aren't wall clock
+        """
+        events: List[Dict[str, Any]] = self.__process_events()
+        tid = self.__allocate_tid()
+        events.append(
+            self.__thread_name_event(tid, f"{root.count} invocations merged")
+        )
+        widths: Dict[int, int] = {}
+        # children are wider than their parent if followed threads run concurrently
+        order: List[AggregatedTraceNode] = []
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(node.sub_frames)
+        for node in reversed(order):
+            widths[id(node)] = max(
+                node.total_ns, sum(widths[id(sub)] for sub in node.sub_frames)
+            )
+        layout: List[Tuple[AggregatedTraceNode, int]] = [(root, 0)]
+        while layout:
+            node, start_ns = layout.pop()
+            if node is not root:
+                args = _event_args(node)
+                args.update(
+                    {
+                        "calls": node.count,
+                        "total_ms": node.total_ns / 1_000_000,
+                        "self_ms": node.self_ns / 1_000_000,
+                        "avg_ms": node.total_ns / node.count / 1_000_000,
+                        "min_ms": node.min_ns / 1_000_000,
+                        "max_ms": node.max_ns / 1_000_000,
+                    }
+                )
+                events.append(
+                    {
+                        "name": _event_name(node),
+                        "cat": _event_category(node),
+                        "ph": "X",
+                        "ts": start_ns / 1000,
+                        "dur": widths[id(node)] / 1000,
+                        "pid": self.pid,
+                        "tid": tid,
+                        "args": args,
+                    }
+                )
+            for sub in sorted(node.sub_frames, key=lambda n: -n.total_ns):
+                layout.append((sub, start_ns))
+                start_ns += widths[id(sub)]
+        return events
+
+    def __process_events(self) -> List[Dict[str, Any]]:
+        if self.process_named:
+            return []
+        self.process_named = True
+        return [
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": self.pid,
+                "args": {"name": f"flight_profiler {self.pid}"},
+            }
+        ]
+
+    def __thread_name_event(self, tid: int, name: str) -> Dict[str, Any]:
+        return {
+            "name": "thread_name",
+            "ph": "M",
+            "pid": self.pid,
+            "tid": tid,
+            "args": {"name": name},
+        }
+
+    def __allocate_tid(self) -> int:
+        tid = self.next_tid
+        self.next_tid += 1
+        return tid
+
+    def __lane(
+        self,
+        key: Any,
+        name: str,
+        tid: Optional[int],
+        frame: FlattenTreeTraceFrame,
+        events: List[Dict[str, Any]],
+    ) -> int:
+        """
+        first track of #key whose events end before #frame starts, a new track named
+        after #name is added otherwise. #tid is the id of the first track, if known.
+        """
+        start_us = frame.start_ns / 1000
+        end_us = (frame.start_ns + frame.cost_ns) / 1000
+        lanes = self.lanes.setdefault(key, [])
+        for lane in lanes:
+            if lane[1] <= start_us:
+                lane[1] = max(lane[1], end_us)
+                return lane[0]
+        if len(lanes) > 0 or tid is None:
+            tid = self.__allocate_tid()
+        if len(lanes) > 0:
+            name = f"{name} #{len(lanes) + 1}"
+        lanes.append([tid, end_us])
+        events.append(self.__thread_name_event(tid, name))
+        return tid
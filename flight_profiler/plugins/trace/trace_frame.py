@@ -1,5 +1,26 @@
 import threading
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from flight_profiler.common.wire_format import (
+    RECORD_HEADER,
+    RECORD_TRACE_AGGREGATE,
+    RECORD_TRACE_FRAMES,
+    RecordDecoder,
+    RecordEncoder,
+)
+
+try:
+    from flight_profiler.ext.trace_profile_C import (
+        encode_trace_frames as c_encode_trace_frames,
+    )
+except ImportError:
+    # extensions failed to build, frames are encoded by encode_frames_section
+    c_encode_trace_frames = None
+
+# frame above work a traced call handed to another thread, file name holds the thread name
+THREAD_FRAME_NAME = "[thread]"
+# frames dropped by profiler beyond its budget, file name holds the number of frames
+ELIDED_FRAME_NAME = "[elided]"
 
 
 class TraceFrame:
@@ -15,6 +36,18 @@ class TraceFrame:
         self.pid = 0
 
 
+def current_thread_infos() -> Tuple[int, Optional[str], Optional[bool]]:
+    """
+    id, name and daemon flag of current thread, name and flag are None for threads
+    not started by threading
+    """
+    thread_id = threading.get_ident()
+    for thread in threading.enumerate():
+        if thread.ident == thread_id:
+            return thread_id, thread.name, thread.daemon
+    return thread_id, None, None
+
+
 class WrapTraceFrame:
     """
     server sent frame list, contains frame level infos
@@ -22,13 +55,7 @@ class WrapTraceFrame:
 
     def __init__(self, frames: List[Union[str, TraceFrame]]):
         self.frames = frames
-        self.thread_id = threading.get_ident()
-        self.thread_name = None
-        self.is_daemon = None
-        for thread in threading.enumerate():
-            if thread.ident == self.thread_id:
-                self.thread_name = thread.name
-                self.is_daemon = thread.daemon
+        self.thread_id, self.thread_name, self.is_daemon = current_thread_infos()
 
 
 class FlattenTreeTraceFrame:
@@ -47,6 +74,8 @@ class FlattenTreeTraceFrame:
         self.cost_ns = cost_ns
         self.c_frame = self.filename == "<built-in>"
         self.await_frame = self.method_name == "[await]"
+        self.thread_frame = self.method_name == THREAD_FRAME_NAME
+        self.elided_frame = self.method_name == ELIDED_FRAME_NAME
         self.sub_frames: List[FlattenTreeTraceFrame] = []
 
     def append_child(self, frame) -> None:
@@ -87,3 +116,234 @@ def deserialize_string_frames(wrap: WrapTraceFrame) -> WrapTraceFrame:
         deserialized_frames.append(t)
     wrap.frames = deserialized_frames
     return wrap
+
+
+def encode_trace_frames(wrap: WrapTraceFrame) -> bytes:
+    """
+    encode server string frames into binary record, only used for frames python
+    consumers need as strings, e.g. stitched with followed threads. Profilers of
+    other traces send their frames section encoded already.
+    """
+    if c_encode_trace_frames is not None:
+        frames_section = c_encode_trace_frames(wrap.frames)
+    else:
+        frames_section = encode_frames_section(wrap.frames)
+    return encode_trace_record(
+        frames_section,
+        wrap.thread_id,
+        wrap.thread_name,
+        wrap.is_daemon,
+    )
+
+
+def encode_frames_section(frames: List[Optional[str]]) -> bytes:
+    """
+    frames section of string frames as trace_profile_C writes it, used when extensions
+    aren't built.
+    """
+    encoder = RecordEncoder(RECORD_TRACE_FRAMES)
+    encoder.write_uvarint(len(frames))
+    last_start_ns = 0
+    for frame in frames:
+        if frame is None:
+            encoder.write_str(None)
+            continue
+        description, start_ns, cost_ns, pid = frame.split("\x01")
+        encoder.write_str(description)
+        encoder.write_varint(int(start_ns) - last_start_ns)
+        last_start_ns = int(start_ns)
+        encoder.write_uvarint(int(cost_ns))
+        encoder.write_varint(int(pid))
+    return encoder.to_bytes()[RECORD_HEADER.size :]
+
+
+def encode_trace_record(
+    frames_section: bytes,
+    thread_id: int,
+    thread_name: Optional[str],
+    is_daemon: Optional[bool],
+) -> bytes:
+    """
+    binary record of frames section encoded by trace_profile_C: descriptions repeated
+    in loops are written once, start_ns is delta encoded against previous frame.
+    The section comes first so its strings take the first indexes of the string
+    table, the thread name is written after it as a new string.
+    """
+    encoder = RecordEncoder(RECORD_TRACE_FRAMES)
+    encoder.buffer += frames_section
+    encoder.write_uvarint(thread_id)
+    encoder.write_str(thread_name)
+    encoder.write_bool(is_daemon)
+    return encoder.to_bytes()
+
+
+def decode_trace_frames(data: bytes) -> WrapTraceFrame:
+    """
+    decode binary record produced by encode_trace_frames, frames are TraceFrame already.
+    """
+    decoder = RecordDecoder(data).expect(RECORD_TRACE_FRAMES)
+    # bypass __init__, thread infos belong to server process
+    wrap = WrapTraceFrame.__new__(WrapTraceFrame)
+    frames: List[TraceFrame] = []
+    last_start_ns = 0
+    for _ in range(decoder.read_uvarint()):
+        description = decoder.read_str()
+        if description is None:
+            frames.append(None)
+            continue
+        last_start_ns += decoder.read_varint()
+        frame = TraceFrame(description, last_start_ns)
+        frame.cost_ns = decoder.read_uvarint()
+        frame.pid = decoder.read_varint()
+        frames.append(frame)
+    wrap.frames = frames
+    wrap.thread_id = decoder.read_uvarint()
+    wrap.thread_name = decoder.read_str()
+    wrap.is_daemon = decoder.read_bool()
+    return wrap
+
+
+class AggregatedTraceNode:
+    """
+    calls of one call path merged across invocations, children are keyed by description
+    """
+
+    def __init__(self, description: Optional[str]):
+        self.description = description
+        infos: List[Any] = (description or "\x00\x000").split("\x00")
+        self.method_name = infos[0]
+        self.filename = infos[1]
+        self.line_no = str(infos[2])
+        self.c_frame = self.filename == "<built-in>"
+        self.await_frame = self.method_name == "[await]"
+        self.thread_frame = self.method_name == THREAD_FRAME_NAME
+        self.elided_frame = self.method_name == ELIDED_FRAME_NAME
+        self.count = 0
+        self.total_ns = 0
+        # cost not covered by traced children, includes children below -i interval
+        self.self_ns = 0
+        self.min_ns = 0
+        self.max_ns = 0
+        self.sub_frames: List[AggregatedTraceNode] = []
+        self.children: Dict[str, AggregatedTraceNode] = {}
+
+    def add(self, cost_ns: int, self_ns: int) -> None:
+        if self.count == 0 or cost_ns < self.min_ns:
+            self.min_ns = cost_ns
+        if cost_ns > self.max_ns:
+            self.max_ns = cost_ns
+        self.count += 1
+        self.total_ns += cost_ns
+        self.self_ns += self_ns
+
+    def child(self, description: str) -> "AggregatedTraceNode":
+        node = self.children.get(description)
+        if node is None:
+            node = AggregatedTraceNode(description)
+            self.children[description] = node
+            self.sub_frames.append(node)
+        return node
+
+
+class TraceAggregator:
+    """
+    Merges string frames of traced invocations by call path, so that one tree tells
+    which child call dominates. Invocations finish on application threads concurrently.
+    """
+
+    def __init__(self, entrance_time_ns: int = 0):
+        self.entrance_time_ns = entrance_time_ns
+        # virtual node above traced method, its count is the number of merged invocations
+        self.root = AggregatedTraceNode(None)
+        self.lock = threading.Lock()
+
+    def merge(self, frames: List[Optional[str]]) -> None:
+        """
+        #frames are 'description\x01start_ns\x01cost_ns\x01parent_id' sent by profiler,
+        invocations faster than entrance time are skipped like in normal trace display
+        """
+        parsed: Dict[int, Tuple[str, int]] = {}
+        children: Dict[int, List[int]] = {}
+        for idx, frame in enumerate(frames):
+            if frame is None:
+                continue
+            parts = frame.split("\x01")
+            description = parts[0]
+            if description.startswith(ELIDED_FRAME_NAME + "\x00"):
+                # elided count differs between invocations
+                description = f"{ELIDED_FRAME_NAME}\x00frames elided\x000"
+            parsed[idx] = (description, int(parts[2]))
+            children.setdefault(int(parts[3]), []).append(idx)
+        if 0 not in parsed or parsed[0][1] < self.entrance_time_ns:
+            return
+        with self.lock:
+            self.root.add(parsed[0][1], 0)
+            stack = [(self.root, 0)]
+            while stack:
+                parent, idx = stack.pop()
+                description, cost_ns = parsed[idx]
+                node = parent.child(description)
+                sub_indexes = [i for i in children.get(idx, ()) if i in parsed]
+                # followed threads run concurrently, their cost is not part of the caller's
+                children_ns = sum(
+                    parsed[i][1]
+                    for i in sub_indexes
+                    if not parsed[i][0].startswith(THREAD_FRAME_NAME + "\x00")
+                )
+                node.add(cost_ns, max(0, cost_ns - children_ns))
+                stack.extend((node, i) for i in sub_indexes)
+
+    @property
+    def invocations(self) -> int:
+        return self.root.count
+
+
+def encode_trace_aggregate(aggregator: TraceAggregator) -> bytes:
+    """
+    nodes are written in pre-order, each followed by its children count
+    """
+    encoder = RecordEncoder(RECORD_TRACE_AGGREGATE)
+    with aggregator.lock:
+        stack = [aggregator.root]
+        while stack:
+            node = stack.pop()
+            encoder.write_str(node.description)
+            encoder.write_uvarint(node.count)
+            encoder.write_uvarint(node.total_ns)
+            encoder.write_uvarint(node.self_ns)
+            encoder.write_uvarint(node.min_ns)
+            encoder.write_uvarint(node.max_ns)
+            encoder.write_uvarint(len(node.sub_frames))
+            stack.extend(reversed(node.sub_frames))
+    return encoder.to_bytes()
+
+
+def decode_trace_aggregate(data: bytes) -> AggregatedTraceNode:
+    """
+    returns the virtual root, its count is the number of merged invocations
+    """
+    decoder = RecordDecoder(data).expect(RECORD_TRACE_AGGREGATE)
+    root: Optional[AggregatedTraceNode] = None
+    # (node, children still to read)
+    pending: List[List[Any]] = []
+    while True:
+        node = AggregatedTraceNode(decoder.read_str())
+        node.count = decoder.read_uvarint()
+        node.total_ns = decoder.read_uvarint()
+        node.self_ns = decoder.read_uvarint()
+        node.min_ns = decoder.read_uvarint()
+        node.max_ns = decoder.read_uvarint()
+        sub_count = decoder.read_uvarint()
+        if root is None:
+            root = node
+        else:
+            parent = pending[-1]
+            parent[0].sub_frames.append(node)
+            parent[0].children[node.description] = node
+            parent[1] -= 1
+        if sub_count > 0:
+            pending.append([node, sub_count])
+        while pending and pending[-1][1] == 0:
+            pending.pop()
+        if not pending:
+            return root
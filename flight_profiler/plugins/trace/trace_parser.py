@@ -2,8 +2,10 @@ import argparse
 from argparse import RawTextHelpFormatter
 
 from flight_profiler.help_descriptions import TRACE_COMMAND_DESCRIPTION
+from flight_profiler.plugins.server_plugin import OVERFLOW_POLICIES
 from flight_profiler.plugins.trace.trace_agent import TracePoint
 from flight_profiler.utils.args_util import rewrite_args
+from flight_profiler.utils.record_file import check_trace_output_path
 
 
 def check_interval(value):
@@ -23,6 +25,15 @@ def check_depth(value):
     except:
         raise argparse.ArgumentTypeError(f"{value} is not a integer above 1 or -1")
 
+def check_budget(value):
+    try:
+        i_value = int(value)
+    except:
+        raise argparse.ArgumentTypeError(f"{value} is not a integer.")
+    if i_value < 0:
+        raise argparse.ArgumentTypeError(f"{value} should be above 0, or 0 for no limit")
+    return i_value
+
 
 class TraceArgumentParser(argparse.ArgumentParser):
 
@@ -77,6 +88,56 @@ class TraceArgumentParser(argparse.ArgumentParser):
             default=None,
             help="filter expression",
         )
+        self.add_argument(
+            "--overflow",
+            required=False,
+            choices=OVERFLOW_POLICIES,
+            default=None,
+            help="what to do with traces when client can't keep up, default is sample.",
+        )
+        self.add_argument(
+            "--output",
+            required=False,
+            type=check_trace_output_path,
+            default=None,
+            help="write traces to a .ndjson, .bin or chrome trace .json file, optionally .gz compressed,"
+            " instead of terminal.",
+        )
+        self.add_argument(
+            "--aggregate",
+            required=False,
+            default=False,
+            action="store_true",
+            help="merge the traces of all -n invocations by call path and show one tree.",
+        )
+        self.add_argument(
+            "--follow-threads",
+            required=False,
+            default=False,
+            action="store_true",
+            help="also trace work the traced call submits to thread pools or threads it starts.",
+        )
+        self.add_argument(
+            "--max-frames",
+            type=check_budget,
+            required=False,
+            default=100000,
+            help="frames kept per invocation, cheapest frames beyond are elided, 0 for no limit.",
+        )
+        self.add_argument(
+            "--max-memory",
+            type=check_budget,
+            required=False,
+            default=64,
+            help="MB of frames kept per invocation, cheapest frames beyond are elided, 0 for no limit.",
+        )
+        self.add_argument(
+            "--monitoring",
+            required=False,
+            default=False,
+            action="store_true",
+            help="trace through sys.monitoring instead of the profile hook on Python 3.12+.",
+        )
 
     def error(self, message):
         raise Exception(message)
@@ -96,5 +157,12 @@ class TraceArgumentParser(argparse.ArgumentParser):
             entrance_time=getattr(args, "entrance_time"),
             limits=getattr(args, "limits"),
             filter_expr=getattr(args, "filter_expr"),
+            overflow_policy=getattr(args, "overflow"),
+            output=getattr(args, "output"),
+            aggregate=getattr(args, "aggregate"),
+            follow_threads=getattr(args, "follow_threads"),
+            max_frames=getattr(args, "max_frames"),
+            max_bytes=getattr(args, "max_memory") * 1024 * 1024,
+            monitoring=getattr(args, "monitoring"),
         )
         return point
@@ -2,6 +2,7 @@ import traceback
 from typing import List, Optional
 
 from flight_profiler.plugins.trace.trace_frame import (
+    AggregatedTraceNode,
     FlattenTreeTraceFrame,
     WrapTraceFrame,
     build_frame_stack,
@@ -87,6 +88,53 @@ class TraceRender(SkipStrategy):
         except:
             return traceback.format_exc()
 
+    def display_aggregate(self, root: AggregatedTraceNode) -> str:
+        """
+        concat merged call tree, children are ordered by total cost
+        """
+        try:
+            title: str = (
+                f"{COLOR_WHITE_255}aggregated invocations={root.count};"
+                f"avg={root.total_ns / root.count / 1000000:.3f}ms;"
+                f"min={root.min_ns / 1000000:.3f}ms;max={root.max_ns / 1000000:.3f}ms{COLOR_END}\n"
+            )
+            show_msg = title
+            for frame in root.sub_frames:
+                if not self.should_skip(frame):
+                    show_msg += self.render_aggregated_frame(self.preprocess_frame(frame))
+            return show_msg
+        except:
+            return traceback.format_exc()
+
+    def render_aggregated_frame(
+        self, frame: AggregatedTraceNode, indent: str = "", child_indent: str = ""
+    ) -> str:
+        time_color: str = self.get_color_by_time(frame.total_ns)
+        share = frame.total_ns * 100 / self.total_cost_ns if self.total_cost_ns > 0 else 0
+        location = (
+            frame.filename
+            if frame.c_frame or frame.await_frame or frame.thread_frame or frame.elided_frame
+            else f"{frame.filename}:{frame.line_no}"
+        )
+        show_msg = indent + (
+            f"[{time_color}{share:.1f}% total={frame.total_ns / 1000000:.3f}ms{COLOR_END}"
+            f" self={frame.self_ns / 1000000:.3f}ms calls={frame.count}"
+            f" avg={frame.total_ns / frame.count / 1000000:.3f}ms"
+            f" min={frame.min_ns / 1000000:.3f}ms max={frame.max_ns / 1000000:.3f}ms] "
+            f"{COLOR_AWAIT if frame.await_frame or frame.thread_frame or frame.elided_frame else COLOR_FUNCTION}"
+            f"{frame.method_name}{COLOR_END}    {COLOR_FAINT}{location}{COLOR_END}\n"
+        )
+        sub_frames = sorted(frame.sub_frames, key=lambda f: f.total_ns, reverse=True)
+        for i, sub_frame in enumerate(sub_frames):
+            if i < len(sub_frames) - 1:
+                c_indent = child_indent + INDENT[0]
+                cc_indent = child_indent + INDENT[1]
+            else:
+                c_indent = child_indent + INDENT[2]
+                cc_indent = child_indent + INDENT[3]
+            show_msg = show_msg + self.render_aggregated_frame(sub_frame, c_indent, cc_indent)
+        return show_msg
+
     def get_color_by_time(self, time: float) -> str:
         """
         output different color based on frame cost weight
@@ -114,7 +162,7 @@ class TraceRender(SkipStrategy):
 
         show_msg = indent
         time_color: str = self.get_color_by_time(frame.cost_ns)
-        if frame.await_frame:
+        if frame.await_frame or frame.thread_frame or frame.elided_frame:
             show_msg = show_msg + (
                 f"[{time_color}{frame.cost_ns / 1000000}ms{COLOR_END}]  "
                 f"{COLOR_AWAIT}{frame.method_name}{COLOR_END}    "
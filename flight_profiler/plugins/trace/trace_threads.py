@@ -0,0 +1,253 @@
+"""
+Follows work a traced call hands to other threads. While a point with --follow-threads
+is set, ThreadPoolExecutor.submit and threading.Thread.start are hooked: work started
+inside a traced call runs with its own profiler, and its frames are stitched under the
+frame that submitted it when the traced call sends its frames.
+"""
+
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from types import FrameType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flight_profiler.ext.trace_profile_C import remove_trace_profile
+from flight_profiler.plugins.trace.trace_frame import THREAD_FRAME_NAME
+
+# context of the traced call running in current thread or asyncio task
+_follow_context: ContextVar[Optional["FollowContext"]] = ContextVar(
+    "flight_profiler_follow_context", default=None
+)
+
+_hook_lock = threading.Lock()
+_hook_count = 0
+_origin_submit: Optional[Callable] = None
+_origin_start: Optional[Callable] = None
+
+
+class FollowedThread:
+    """
+    one unit of work submitted to an executor or one thread started inside a traced call
+    """
+
+    def __init__(self, parent: "FollowContext", via: str, caller: Optional[FrameType]):
+        self.parent = parent
+        self.via = via
+        self.submit_ns = time.time_ns()
+        self.caller_description: Optional[str] = None
+        if caller is not None:
+            code = caller.f_code
+            self.caller_description = (
+                f"{code.co_name}\x00{code.co_filename}\x00{code.co_firstlineno}"
+            )
+        self.thread_name: Optional[str] = None
+        self.start_ns = 0
+        self.end_ns = 0
+        self.frames: Optional[List[Optional[str]]] = None
+        # work this thread hands to other threads in turn
+        self.context = FollowContext(
+            parent.set_trace,
+            parent.interval_ns,
+            parent.depth,
+            parent.max_frames,
+            parent.max_bytes,
+        )
+
+    def run(self, fn: Callable, args: Tuple, kwargs: Dict[str, Any]) -> Any:
+        """
+        runs in the followed thread
+        """
+        self.thread_name = threading.current_thread().name
+        self.start_ns = time.time_ns()
+        token = _follow_context.set(self.context)
+        parent = self.parent
+        profiler = parent.set_trace(
+            self.collect,
+            None,
+            parent.interval_ns,
+            False,
+            parent.depth,
+            parent.max_frames,
+            parent.max_bytes,
+        )
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            remove_trace_profile(profiler)
+            _follow_context.reset(token)
+
+    def collect(self, out_q: Any, frames: List[Optional[str]]) -> None:
+        frames = self.context.stitch(list(frames))
+        with self.parent.lock:
+            self.end_ns = time.time_ns()
+            self.frames = frames
+
+
+class FollowContext:
+    """
+    work spawned in other threads by one traced call
+    """
+
+    def __init__(
+        self,
+        set_trace: Callable,
+        interval_ns: int,
+        depth: int,
+        max_frames: int = 0,
+        max_bytes: int = 0,
+    ):
+        self.set_trace = set_trace
+        self.interval_ns = interval_ns
+        self.depth = depth
+        # each followed thread has the budget of traced call
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.threads: List[FollowedThread] = []
+        # context of an enclosing traced call, restored when this one ends
+        self.previous: Optional[FollowContext] = None
+
+    def spawn(self, via: str, caller: Optional[FrameType]) -> FollowedThread:
+        followed = FollowedThread(self, via, caller)
+        with self.lock:
+            self.threads.append(followed)
+        return followed
+
+    def stitch(self, frames: List[Optional[str]]) -> List[Optional[str]]:
+        """
+        appends frames of followed threads to #frames, each below a thread frame whose
+        parent is the deepest frame running the submitting function at submission time.
+        Threads still running are shown without children.
+        """
+        with self.lock:
+            threads, self.threads = self.threads, []
+        if len(threads) == 0 or len(frames) == 0 or frames[0] is None:
+            return frames
+        parsed: List[Optional[Tuple[str, int, int]]] = []
+        for frame in frames:
+            if frame is None:
+                parsed.append(None)
+                continue
+            parts = frame.split("\x01")
+            parsed.append((parts[0], int(parts[1]), int(parts[2])))
+        now_ns = time.time_ns()
+        for followed in threads:
+            with self.lock:
+                child_frames = followed.frames
+                end_ns = followed.end_ns
+            if followed.thread_name is None:
+                location = f"queued ({followed.via})"
+                start_ns, end_ns = followed.submit_ns, now_ns
+            elif child_frames is None:
+                location = f"{followed.thread_name} (running)"
+                start_ns, end_ns = followed.start_ns, now_ns
+            else:
+                location, start_ns = followed.thread_name, followed.start_ns
+            thread_idx = len(frames)
+            frames.append(
+                f"{THREAD_FRAME_NAME}\x00{location}\x000\x01{start_ns}\x01{end_ns - start_ns}"
+                f"\x01{self.__submitting_frame(parsed, followed)}"
+            )
+            offset = len(frames)
+            for frame in child_frames or ():
+                if frame is None:
+                    frames.append(None)
+                    continue
+                description, start, cost, child_pid = frame.split("\x01")
+                child_pid = int(child_pid)
+                frames.append(
+                    f"{description}\x01{start}\x01{cost}\x01"
+                    f"{thread_idx if child_pid == -1 else child_pid + offset}"
+                )
+        return frames
+
+    @staticmethod
+    def __submitting_frame(
+        parsed: List[Optional[Tuple[str, int, int]]], followed: FollowedThread
+    ) -> int:
+        # siblings never overlap in time, so the last frame running at submission is the deepest
+        deepest, submitter = 0, -1
+        for idx, frame in enumerate(parsed):
+            if frame is None or not frame[1] <= followed.submit_ns <= frame[1] + frame[2]:
+                continue
+            deepest = idx
+            if frame[0] == followed.caller_description:
+                submitter = idx
+        return submitter if submitter >= 0 else deepest
+
+
+def begin_follow(
+    set_trace: Callable,
+    interval_ns: int,
+    depth: int,
+    max_frames: int = 0,
+    max_bytes: int = 0,
+) -> None:
+    """
+    called by traced call right before its profiler is set
+    """
+    context = FollowContext(set_trace, interval_ns, depth, max_frames, max_bytes)
+    context.previous = _follow_context.get()
+    _follow_context.set(context)
+
+
+def end_follow(frames: List[Optional[str]]) -> List[Optional[str]]:
+    """
+    called with frames of traced call, returns them with followed threads stitched
+    """
+    context = _follow_context.get()
+    if context is None:
+        return frames
+    _follow_context.set(context.previous)
+    return context.stitch(list(frames))
+
+
+def _submit(executor: ThreadPoolExecutor, fn: Callable, *args, **kwargs):
+    context = _follow_context.get()
+    if context is None:
+        return _origin_submit(executor, fn, *args, **kwargs)
+    followed = context.spawn("submit", sys._getframe(1))
+    # worker threads started by the executor itself aren't followed
+    token = _follow_context.set(None)
+    try:
+        return _origin_submit(executor, followed.run, fn, args, kwargs)
+    finally:
+        _follow_context.reset(token)
+
+
+def _start(thread: threading.Thread) -> None:
+    context = _follow_context.get()
+    if context is not None:
+        followed = context.spawn("start", sys._getframe(1))
+        run = thread.run
+        thread.run = lambda: followed.run(run, (), {})
+    _origin_start(thread)
+
+
+def install_thread_hooks() -> None:
+    """
+    hooks stay installed until each install is paired with an uninstall
+    """
+    global _hook_count, _origin_submit, _origin_start
+    with _hook_lock:
+        _hook_count += 1
+        if _hook_count > 1:
+            return
+        _origin_submit = ThreadPoolExecutor.submit
+        _origin_start = threading.Thread.start
+        ThreadPoolExecutor.submit = _submit
+        threading.Thread.start = _start
+
+
+def uninstall_thread_hooks() -> None:
+    global _hook_count
+    with _hook_lock:
+        if _hook_count == 0:
+            return
+        _hook_count -= 1
+        if _hook_count > 0:
+            return
+        ThreadPoolExecutor.submit = _origin_submit
+        threading.Thread.start = _origin_start
@@ -1,11 +1,13 @@
 import argparse
 import pickle
 import sys
-from typing import Union
+from typing import Optional, Union
 
-from flight_profiler.communication.flight_client import FlightClient
+from flight_profiler.common.wire_format import is_wire_record
+from flight_profiler.communication.flight_session import open_flight_client
 from flight_profiler.help_descriptions import TIME_TUNNEL_COMMAND_DESCRIPTION
 from flight_profiler.plugins.cli_plugin import BaseCliPlugin
+from flight_profiler.plugins.tt.time_tunnel_benchmark import BenchmarkSummary
 from flight_profiler.plugins.tt.time_tunnel_parser import (
     TimeTunnelArgumentParser,
     TimeTunnelCmd,
@@ -13,13 +15,17 @@ from flight_profiler.plugins.tt.time_tunnel_parser import (
 from flight_profiler.plugins.tt.time_tunnel_recorder import (
     BaseInvocationRecord,
     FullInvocationRecord,
+    decode_base_record,
+    decode_full_record,
 )
 from flight_profiler.plugins.tt.time_tunnel_render import TimeTunnelRender
 from flight_profiler.utils.cli_util import (
     common_plugin_execute_routine,
+    show_drop_notice,
     show_error_info,
     show_normal_info,
 )
+from flight_profiler.utils.record_file import RecordFileWriter
 from flight_profiler.utils.render_util import COLOR_END, COLOR_RED
 
 
@@ -39,6 +45,9 @@ class TimeTunnelCliPlugin(BaseCliPlugin):
         except argparse.ArgumentTypeError as e:
             show_error_info(f" Trace command parsed failed, {e}")
             return
+        except SyntaxError as e:
+            show_error_info(f" Time tunnel expression compile failed, {e}")
+            return
         except:
             show_normal_info(self.get_help())
             return
@@ -46,16 +55,26 @@ class TimeTunnelCliPlugin(BaseCliPlugin):
         self.last_cmd = cmd
         body = {"target": "tt", "param": "on " + cmd}
         try:
-            client = FlightClient(host="localhost", port=self.port)
+            client = open_flight_client(self.port)
         except:
             show_error_info("Target process exited!")
             return
+        writer: Optional[RecordFileWriter] = None
         try:
             render = TimeTunnelRender()
             if tt_cmd.time_tunnel is not None:
+                if tt_cmd.output is not None:
+                    writer = RecordFileWriter(tt_cmd.output, decode_base_record)
+                    if not writer.start():
+                        return
                 first_chunk = True
                 spy_chunk = True
                 for content in client.request_stream(body):
+                    if show_drop_notice(content):
+                        continue
+                    if is_wire_record(content) and writer is not None:
+                        writer.write(content)
+                        continue
                     is_first = False
                     if spy_chunk:
                         spy_chunk = False
@@ -63,26 +82,30 @@ class TimeTunnelCliPlugin(BaseCliPlugin):
                         is_first = True
                         first_chunk = False
 
-                    cli_base_record: Union[BaseInvocationRecord, str] = (
-                        pickle.loads(content)
-                    )
-                    if type(cli_base_record) == str:
-                        print(cli_base_record)
-                    else:
+                    if is_wire_record(content):
+                        cli_base_record: BaseInvocationRecord = decode_base_record(
+                            content
+                        )
                         render.render_tt_record(cli_base_record, is_first=is_first)
+                    else:
+                        print(pickle.loads(content))
                     sys.stdout.flush()
 
             elif tt_cmd.index is not None:
                 received_response: bool = False
                 for content in client.request_stream(body):
                     received_response = True
-                    full_record: Union[FullInvocationRecord, str] = (
-                        pickle.loads(content)
-                    )
-                    if type(full_record) is str:
-                        print(f"{COLOR_RED}{full_record}{COLOR_END}")
-                    else:
+                    if show_drop_notice(content):
+                        continue
+                    if is_wire_record(content):
+                        full_record: FullInvocationRecord = decode_full_record(content)
                         render.render_indexed_record(full_record)
+                        continue
+                    result: Union[BenchmarkSummary, str] = pickle.loads(content)
+                    if isinstance(result, BenchmarkSummary):
+                        render.render_benchmark_summary(result)
+                    else:
+                        print(f"{COLOR_RED}{result}{COLOR_END}")
                     sys.stdout.flush()
                 if not received_response:
                     print(
@@ -90,8 +113,16 @@ class TimeTunnelCliPlugin(BaseCliPlugin):
                     )
 
             elif tt_cmd.show_list:
+                # records arrive in pages, header is printed once
+                is_first = True
                 for content in client.request_stream(body):
-                    render.render_records_list(content)
+                    if show_drop_notice(content):
+                        continue
+                    if not is_wire_record(content):
+                        print(f"{COLOR_RED}{pickle.loads(content)}{COLOR_END}")
+                        continue
+                    render.render_records_list(content, is_first=is_first)
+                    is_first = False
                     sys.stdout.flush()
             else:
                 for line in client.request_stream(body):
@@ -101,6 +132,8 @@ class TimeTunnelCliPlugin(BaseCliPlugin):
                     sys.stdout.flush()
         finally:
             client.close()
+            if writer is not None:
+                writer.close()
 
     def on_interrupted(self):
         common_plugin_execute_routine(
@@ -1,4 +1,6 @@
+import pickle
 import traceback
+from typing import List
 
 from flight_profiler.plugins.server_plugin import Message, ServerPlugin, ServerQueue
 from flight_profiler.plugins.tt.time_tunnel_agent import global_tt_agent
@@ -7,6 +9,7 @@ from flight_profiler.plugins.tt.time_tunnel_parser import (
     TimeTunnelCmd,
 )
 from flight_profiler.utils.args_util import split_regex
+from flight_profiler.utils.render_util import COLOR_END, COLOR_RED
 
 
 class TimeTunnelServerPlugin(ServerPlugin):
@@ -21,11 +24,17 @@ class TimeTunnelServerPlugin(ServerPlugin):
         if splits[0] == "on":
             new_param = param[len(splits[0]) :]
             try:
-                time_tunnel_cmd: TimeTunnelCmd = (
-                    TimeTunnelArgumentParser().parse_time_tunnel_cmd(new_param)
+                time_tunnel_cmds: List[TimeTunnelCmd] = (
+                    TimeTunnelArgumentParser().parse_time_tunnel_cmds(new_param)
+                )
+                for time_tunnel_cmd in time_tunnel_cmds:
+                    time_tunnel_cmd.out_q = self.out_q
+                # members of a -t pattern are reached through the first command
+                global_tt_agent.on_action(time_tunnel_cmds[0])
+            except ValueError as e:
+                await self.out_q.output_msg(
+                    Message(True, pickle.dumps(f"{COLOR_RED}{e}{COLOR_END}"))
                 )
-                time_tunnel_cmd.out_q = self.out_q
-                global_tt_agent.on_action(time_tunnel_cmd)
             except:
                 await self.out_q.output_msg(Message(True, traceback.format_exc()))
         elif splits[0] == "off":
@@ -6,7 +6,7 @@ import pickle
 import time
 import traceback
 import types
-from typing import Dict
+from typing import Dict, List, Optional
 
 from flight_profiler.common import aop_decorator
 from flight_profiler.common.code_wrapper_entity import CodeWrapperResult
@@ -22,6 +22,7 @@ from flight_profiler.utils.render_util import (
     COLOR_ORANGE,
     COLOR_RED,
     build_long_spy_command_hint,
+    build_pattern_spy_command_hint,
 )
 
 
@@ -132,69 +133,25 @@ class TimeTunnelAgent:
 
     def __init__(self):
         self.aop_points: Dict[str, TimeTunnelCmd] = dict()
+        # group leaders by group_key, off clears the methods resolved when recorded
+        self.groups: Dict[str, TimeTunnelCmd] = dict()
 
     def on_action(self, tt_cmd: TimeTunnelCmd):
         """
-        supports time_tunnel/show_list/index three kinds actions
+        supports time_tunnel/show_list/index/delete/stats actions
         """
+        try:
+            global_time_tunnel_recorder.configure(tt_cmd)
+        except OSError as e:
+            text = f"{COLOR_RED}Spill to {tt_cmd.spill} failed: {e}{COLOR_END}"
+            # -t/-l/-i clients read pickled messages, other actions plain text
+            if tt_cmd.time_tunnel is not None or tt_cmd.show_list or tt_cmd.index is not None:
+                text = pickle.dumps(text)
+            tt_cmd.out_q.output_msg_nowait(Message(True, text))
+            return
         if tt_cmd.time_tunnel is not None:
             # records method invocation within time fragments
-            if tt_cmd.unique_key() in self.aop_points:
-                self.clear_tt_point(tt_cmd)
-
-            tt_cmd.global_instance = global_tt_agent
-            try:
-                module = importlib.import_module(tt_cmd.module_name)
-            except Exception as e:
-                tt_cmd.out_q.output_msg_nowait(
-                    Message(
-                        True,
-                        pickle.dumps(
-                            f"{COLOR_RED}Error in locating module named "
-                            f"{COLOR_ORANGE}{tt_cmd.module_name}{COLOR_END}{COLOR_RED}. Type: {type(e)}, details: {str(e)}!{COLOR_END}"
-                        ),
-                    )
-                )
-                return
-
-            wrapper_result: CodeWrapperResult = aop_decorator.add_func_wrapper(
-                module,
-                tt_cmd.class_name,
-                tt_cmd.method_name,
-                generate_time_tunnel_wrapper,
-                tt_cmd,
-                ["sys", "time", "traceback", "logging", "inspect", "types"],
-                module_name=tt_cmd.module_name,
-                nested_method=tt_cmd.nested_method,
-            )
-            if wrapper_result.failed:
-                tt_cmd.out_q.output_msg_nowait(
-                    Message(
-                        True,
-                        pickle.dumps(f"{COLOR_RED}{wrapper_result.failed_reason}{COLOR_END}"),
-                    )
-                )
-                return
-            else:
-                if tt_cmd.nested_method is not None and wrapper_result.value.need_wrap_nested_inplace:
-                    # used to construct new code at runtime
-                    tt_cmd.need_wrap_nested_inplace = True
-                    tt_cmd.nested_code_obj = wrapper_result.value.nested_code_obj
-                tt_cmd.origin_code = wrapper_result.value
-                tt_cmd.out_q.output_msg_nowait(
-                    Message(
-                        False,
-                        pickle.dumps(
-                            build_long_spy_command_hint(
-                                tt_cmd.module_name,
-                                tt_cmd.class_name,
-                                tt_cmd.method_name,
-                                tt_cmd.nested_method
-                            )
-                        ),
-                    )
-                )
-                self.aop_points[tt_cmd.unique_key()] = tt_cmd
+            self.add_tt_group(tt_cmd.members)
         elif tt_cmd.show_list:
             global_time_tunnel_recorder.show_list_records(tt_cmd)
         elif tt_cmd.index is not None:
@@ -220,6 +177,8 @@ class TimeTunnelAgent:
                         msg=f"{COLOR_RED}Index {tt_cmd.delete_id} is not recorded.{COLOR_END}",
                     )
                 )
+        elif tt_cmd.show_stats:
+            global_time_tunnel_recorder.show_store_stats(tt_cmd)
         elif tt_cmd.delete_all:
             global_time_tunnel_recorder.delete_all_records()
             tt_cmd.out_q.output_msg_nowait(
@@ -228,30 +187,121 @@ class TimeTunnelAgent:
                 )
             )
 
+    def add_tt_group(self, tt_cmds: List[TimeTunnelCmd]):
+        """
+        methods matched by one -t pattern are recorded all or none, failing to instrument
+        any of them restores those already instrumented
+        """
+        leader = tt_cmds[0]
+        old_leader: Optional[TimeTunnelCmd] = self.groups.get(leader.group_key(), None)
+        if old_leader is not None:
+            self.clear_tt_point(old_leader)
+        for tt_cmd in tt_cmds:
+            if tt_cmd.unique_key() in self.aop_points:
+                self.clear_tt_point(tt_cmd)
+
+        installed = []
+        for tt_cmd in tt_cmds:
+            tt_cmd.global_instance = global_tt_agent
+            failed_reason = self.__install(tt_cmd)
+            if failed_reason is not None:
+                for member in installed:
+                    member.restore_origin_code()
+                leader.out_q.output_msg_nowait(Message(True, pickle.dumps(failed_reason)))
+                return
+            installed.append(tt_cmd)
+
+        if len(tt_cmds) == 1:
+            hint = build_long_spy_command_hint(
+                leader.module_name,
+                leader.class_name,
+                leader.method_name,
+                leader.nested_method
+            )
+        else:
+            hint = build_pattern_spy_command_hint(
+                [
+                    ".".join(
+                        name
+                        for name in (cmd.module_name, cmd.class_name, cmd.method_name)
+                        if name is not None
+                    )
+                    for cmd in tt_cmds
+                ]
+            )
+        leader.out_q.output_msg_nowait(Message(False, pickle.dumps(hint)))
+        self.groups[leader.group_key()] = leader
+        for tt_cmd in tt_cmds:
+            self.aop_points[tt_cmd.unique_key()] = tt_cmd
+
+    def __install(self, tt_cmd: TimeTunnelCmd) -> Optional[str]:
+        """
+        Returns:
+            Optional[str]: failed reason, None if method is instrumented
+        """
+        try:
+            module = importlib.import_module(tt_cmd.module_name)
+        except Exception as e:
+            return (
+                f"{COLOR_RED}Error in locating module named "
+                f"{COLOR_ORANGE}{tt_cmd.module_name}{COLOR_END}{COLOR_RED}. Type: {type(e)}, details: {str(e)}!{COLOR_END}"
+            )
+
+        wrapper_result: CodeWrapperResult = aop_decorator.add_func_wrapper(
+            module,
+            tt_cmd.class_name,
+            tt_cmd.method_name,
+            generate_time_tunnel_wrapper,
+            tt_cmd,
+            ["sys", "time", "traceback", "logging", "inspect", "types"],
+            module_name=tt_cmd.module_name,
+            nested_method=tt_cmd.nested_method,
+        )
+        if wrapper_result.failed:
+            return f"{COLOR_RED}{wrapper_result.failed_reason}{COLOR_END}"
+        if tt_cmd.nested_method is not None and wrapper_result.value.need_wrap_nested_inplace:
+            # used to construct new code at runtime
+            tt_cmd.need_wrap_nested_inplace = True
+            tt_cmd.nested_code_obj = wrapper_result.value.nested_code_obj
+        tt_cmd.origin_code = wrapper_result.value
+        return None
+
     def clear_tt_point(self, cmd: TimeTunnelCmd):
+        """
+        clears the whole group #cmd was added with
+        """
         if cmd.time_tunnel is None:
             raise ValueError("Trying to remove not existing tt point!")
 
         origin_tt_cmd = self.aop_points.pop(cmd.unique_key())
         if origin_tt_cmd is not None:
-            if origin_tt_cmd.origin_code is not None:
-                module = importlib.import_module(origin_tt_cmd.module_name)
-                aop_decorator.clear_func_wrapper(
-                    module,
-                    origin_tt_cmd.class_name,
-                    origin_tt_cmd.method_name,
-                    origin_tt_cmd.origin_code,
-                )
+            self.__forget_group(origin_tt_cmd)
+            for member in origin_tt_cmd.members:
+                self.aop_points.pop(member.unique_key(), None)
+                member.restore_origin_code()
             origin_tt_cmd.out_q.output_msg_nowait(Message(is_end=True, msg=""))
 
     def off_action(self, tt_cmd: TimeTunnelCmd):
         """
-        current only stop recording tt
+        stops recording tt, or a running replay benchmark
         """
-        self.clear_tt_point(tt_cmd)
+        if tt_cmd.play and tt_cmd.index is not None:
+            global_time_tunnel_recorder.stop_benchmark(tt_cmd.index)
+            return
+        # a pattern isn't resolved again, exactly the methods resolved when it was
+        # recorded are restored
+        leader: Optional[TimeTunnelCmd] = self.groups.get(tt_cmd.group_key(), None)
+        self.clear_tt_point(leader if leader is not None else tt_cmd)
 
     def clear_auto_close(self, unique_key):
-        self.aop_points.pop(unique_key)
+        tt_cmd: Optional[TimeTunnelCmd] = self.aop_points.pop(unique_key, None)
+        if tt_cmd is not None:
+            self.__forget_group(tt_cmd)
+
+    def __forget_group(self, tt_cmd: TimeTunnelCmd) -> None:
+        leader = tt_cmd.members[0]
+        if self.groups.get(leader.group_key(), None) is leader:
+            self.groups.pop(leader.group_key())
 
 
 global_tt_agent: TimeTunnelAgent = TimeTunnelAgent()
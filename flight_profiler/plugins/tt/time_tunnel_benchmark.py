@@ -0,0 +1,215 @@
+import asyncio
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from flight_profiler.common.enter_exit_command import mark_agent_thread
+from flight_profiler.common.latency_histogram import LatencyHistogram
+
+BENCHMARK_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+# seconds between two progress summaries of a running benchmark
+BENCHMARK_REPORT_INTERVAL = 1.0
+MAX_CONCURRENCY = 256
+
+
+class BenchmarkSummary:
+    """
+    statistics of replaying a recorded invocation, sent to client while running and once finished
+    """
+
+    def __init__(
+        self,
+        index: int,
+        method_identifier: str,
+        times: int,
+        concurrency: int,
+        completed: int,
+        error_count: int,
+        elapsed_ms: float,
+        total_ms: float,
+        min_ms: float,
+        max_ms: float,
+        histogram: LatencyHistogram,
+        first_error: Optional[str],
+        finished: bool,
+    ):
+        self.index = index
+        self.method_identifier = method_identifier
+        self.times = times
+        self.concurrency = concurrency
+        self.completed = completed
+        self.error_count = error_count
+        self.elapsed_ms = elapsed_ms
+        self.total_ms = total_ms
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.histogram = histogram
+        self.first_error = first_error
+        self.finished = finished
+
+    @property
+    def throughput(self) -> float:
+        """
+        completed replays per second
+        """
+        return self.completed * 1000 / self.elapsed_ms if self.elapsed_ms > 0 else 0
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.completed if self.completed > 0 else 0
+
+    def percentile_ms(self, quantile: float) -> float:
+        # bucket upper bound may exceed the exact max latency observed
+        return min(self.histogram.percentile_ms(quantile), self.max_ms)
+
+
+class ReplayBenchmark:
+    """
+    Replays a method with the same args #times times on #concurrency workers. Plain methods
+    run on a pool of #concurrency threads, coroutine functions as #concurrency tasks of one
+    event loop. Worker threads are agent threads, so tt/watch on the method don't record replays.
+    """
+
+    def __init__(
+        self,
+        index: int,
+        method_identifier: str,
+        method: Callable,
+        args: Any,
+        kwargs: Dict[str, Any],
+        times: int,
+        concurrency: int,
+    ):
+        self.index = index
+        self.method_identifier = method_identifier
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.times = times
+        self.concurrency = min(concurrency, times)
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.issued = 0
+        self.completed = 0
+        self.error_count = 0
+        self.total_ms = 0.0
+        self.min_ms = float("inf")
+        self.max_ms = 0.0
+        self.histogram = LatencyHistogram()
+        self.first_error: Optional[str] = None
+        self.start_time = 0.0
+
+    def run(
+        self,
+        report: Optional[Callable[[BenchmarkSummary], None]] = None,
+        interval: float = BENCHMARK_REPORT_INTERVAL,
+    ) -> BenchmarkSummary:
+        """
+        blocks until all replays finish or stop is called, #report receives progress every #interval seconds
+        """
+        is_coroutine = asyncio.iscoroutinefunction(self.method)
+        workers = 1 if is_coroutine else self.concurrency
+        pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="flight-profiler-replay"
+        )
+        self.start_time = time.perf_counter()
+        try:
+            if is_coroutine:
+                futures = [pool.submit(self.__run_loop)]
+            else:
+                futures = [pool.submit(self.__run_worker) for _ in range(workers)]
+            while True:
+                _, not_done = wait(futures, timeout=interval)
+                if not not_done:
+                    break
+                if report is not None:
+                    report(self.summary(finished=False))
+        finally:
+            pool.shutdown(wait=True)
+        return self.summary(finished=True)
+
+    def stop(self) -> None:
+        """
+        replays already started still complete
+        """
+        self.stop_event.set()
+
+    def summary(self, finished: bool) -> BenchmarkSummary:
+        elapsed_ms = (time.perf_counter() - self.start_time) * 1000
+        with self.lock:
+            return BenchmarkSummary(
+                index=self.index,
+                method_identifier=self.method_identifier,
+                times=self.times,
+                concurrency=self.concurrency,
+                completed=self.completed,
+                error_count=self.error_count,
+                elapsed_ms=elapsed_ms,
+                total_ms=self.total_ms,
+                min_ms=self.min_ms if self.completed > 0 else 0,
+                max_ms=self.max_ms,
+                histogram=LatencyHistogram(dict(self.histogram.buckets)),
+                first_error=self.first_error,
+                finished=finished,
+            )
+
+    def __acquire(self) -> bool:
+        with self.lock:
+            if self.stop_event.is_set() or self.issued >= self.times:
+                return False
+            self.issued += 1
+            return True
+
+    def __record(self, cost_ms: float, error: Optional[str]) -> None:
+        with self.lock:
+            self.completed += 1
+            if error is not None:
+                self.error_count += 1
+                if self.first_error is None:
+                    self.first_error = error
+            self.total_ms += cost_ms
+            if cost_ms < self.min_ms:
+                self.min_ms = cost_ms
+            if cost_ms > self.max_ms:
+                self.max_ms = cost_ms
+            self.histogram.record_ms(cost_ms)
+
+    def __run_worker(self) -> None:
+        mark_agent_thread()
+        method = self.method
+        args = self.args
+        kwargs = self.kwargs
+        while self.__acquire():
+            error = None
+            s = time.perf_counter()
+            try:
+                method(*args, **kwargs)
+            except Exception:
+                error = traceback.format_exc()
+            self.__record((time.perf_counter() - s) * 1000, error)
+
+    def __run_loop(self) -> None:
+        mark_agent_thread()
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            tasks: List[Any] = [self.__run_task() for _ in range(self.concurrency)]
+            loop.run_until_complete(asyncio.gather(*tasks))
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    async def __run_task(self) -> None:
+        method = self.method
+        args = self.args
+        kwargs = self.kwargs
+        while self.__acquire():
+            error = None
+            s = time.perf_counter()
+            try:
+                await method(*args, **kwargs)
+            except Exception:
+                error = traceback.format_exc()
+            self.__record((time.perf_counter() - s) * 1000, error)
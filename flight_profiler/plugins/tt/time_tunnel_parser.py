@@ -1,9 +1,29 @@
 import argparse
 from argparse import RawTextHelpFormatter
+from typing import List
 
+from flight_profiler.common.method_pattern import (
+    MAX_PATTERN_TARGETS,
+    check_max_targets,
+    is_method_pattern,
+    resolve_method_pattern,
+)
 from flight_profiler.help_descriptions import TIME_TUNNEL_COMMAND_DESCRIPTION
-from flight_profiler.plugins.tt.time_tunnel_recorder import TimeTunnelCmd
+from flight_profiler.plugins.tt.time_tunnel_benchmark import MAX_CONCURRENCY
+from flight_profiler.plugins.tt.time_tunnel_recorder import (
+    LIST_PAGE_SIZE,
+    TimeTunnelCmd,
+)
+from flight_profiler.plugins.tt.time_tunnel_store import (
+    EVICT_POLICIES,
+    SORT_INDEX,
+    SORT_ORDERS,
+    TT_MAX_RECORDS,
+    parse_duration,
+    parse_size,
+)
 from flight_profiler.utils.args_util import rewrite_args
+from flight_profiler.utils.record_file import check_output_path
 
 
 def check_expand(value):
@@ -19,6 +39,47 @@ def check_expand(value):
         raise argparse.ArgumentError(f"{value} is not a integer between 1 and 4.")
 
 
+def check_max_records(value):
+    try:
+        i_value = int(value)
+    except:
+        raise argparse.ArgumentTypeError(f"max-records: {value} is not a integer.")
+    if i_value < 1:
+        raise argparse.ArgumentTypeError(f"max-records: {value} should be positive.")
+    return i_value
+
+
+def check_positive(value):
+    try:
+        i_value = int(value)
+    except:
+        raise argparse.ArgumentTypeError(f"{value} is not a integer.")
+    if i_value < 1:
+        raise argparse.ArgumentTypeError(f"{value} should be positive.")
+    return i_value
+
+
+def check_concurrency(value):
+    i_value = check_positive(value)
+    if i_value > MAX_CONCURRENCY:
+        raise argparse.ArgumentTypeError(f"concurrency: {value} should be at most {MAX_CONCURRENCY}.")
+    return i_value
+
+
+def check_duration(value):
+    try:
+        return parse_duration(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def check_size(value):
+    try:
+        return parse_size(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
 class TimeTunnelArgumentParser(argparse.ArgumentParser):
 
     def __init__(self):
@@ -123,21 +184,201 @@ class TimeTunnelArgumentParser(argparse.ArgumentParser):
             default=None,
             help="method filter expression",
         )
+        self.add_argument(
+            "--output",
+            required=False,
+            type=check_output_path,
+            default=None,
+            help="write records of -t to a .ndjson or .bin file, optionally .gz compressed, instead of terminal.",
+        )
+        self.add_argument(
+            "-s",
+            "--stats",
+            required=False,
+            default=False,
+            action="store_true",
+            help="show recorded count, estimated memory and evictions of record store.",
+        )
+        self.add_argument(
+            "--max-records",
+            required=False,
+            default=None,
+            type=check_max_records,
+            help=f"max records kept, older ones are evicted, default {TT_MAX_RECORDS}.",
+        )
+        self.add_argument(
+            "--max-bytes",
+            required=False,
+            default=None,
+            type=check_size,
+            help="estimated memory budget of records like 64m, default 256m.",
+        )
+        self.add_argument(
+            "--evict",
+            required=False,
+            default=None,
+            choices=EVICT_POLICIES,
+            help="which records are evicted first, default fifo.",
+        )
+
+        self.add_argument(
+            "--sort",
+            required=False,
+            default=SORT_INDEX,
+            choices=SORT_ORDERS,
+            help="order of -l records, default index.",
+        )
+        self.add_argument(
+            "--desc",
+            required=False,
+            default=False,
+            action="store_true",
+            help="list records in descending order.",
+        )
+        self.add_argument(
+            "--top",
+            required=False,
+            default=None,
+            type=check_positive,
+            help="list only the k slowest records.",
+        )
+        self.add_argument(
+            "--since",
+            required=False,
+            default=None,
+            type=check_duration,
+            help="list records started within the duration like 30s, 5m, 1h or 1d.",
+        )
+        self.add_argument(
+            "--until",
+            required=False,
+            default=None,
+            type=check_duration,
+            help="list records started before the duration like 30s, 5m, 1h or 1d.",
+        )
+        self.add_argument(
+            "--exception",
+            required=False,
+            default=False,
+            action="store_true",
+            help="list only records raising exceptions.",
+        )
+        self.add_argument(
+            "--min-cost",
+            required=False,
+            default=None,
+            type=float,
+            help="list only records costing at least the milliseconds.",
+        )
+        self.add_argument(
+            "--page",
+            required=False,
+            default=None,
+            type=check_positive,
+            help="list only the page of records, starts from 1.",
+        )
+        self.add_argument(
+            "--page-size",
+            required=False,
+            default=LIST_PAGE_SIZE,
+            type=check_positive,
+            help=f"records of one page, default {LIST_PAGE_SIZE}.",
+        )
+
+        self.add_argument(
+            "--spill",
+            required=False,
+            default=None,
+            help="keep objects of later records in segment files under the directory, off stops it.",
+        )
+        self.add_argument(
+            "--spill-max-bytes",
+            required=False,
+            default=None,
+            type=check_size,
+            help="disk budget of spilled records like 10g, default 1g.",
+        )
+
+        self.add_argument(
+            "--times",
+            required=False,
+            default=None,
+            type=check_positive,
+            help="replay the time fragment of -i -p this many times and report latency.",
+        )
+        self.add_argument(
+            "--concurrency",
+            required=False,
+            default=1,
+            type=check_concurrency,
+            help=f"replays running at the same time with --times, default 1, at most {MAX_CONCURRENCY}.",
+        )
+        self.add_argument(
+            "--max-targets",
+            required=False,
+            type=check_max_targets,
+            default=MAX_PATTERN_TARGETS,
+            help=f"max methods a glob or re: pattern of -t may match, default is {MAX_PATTERN_TARGETS}.",
+        )
 
     def error(self, message):
         raise Exception(message)
 
     def parse_time_tunnel_cmd(self, arg_string: str) -> TimeTunnelCmd:
+        """
+        parse without resolving patterns of -t, validates the command on client side and
+        identifies the group to turn off on server side
+        """
+        args = self.__parse_args(arg_string)
+        return self.__build_cmd(args, getattr(args, "time_tunnel"))
+
+    def parse_time_tunnel_cmds(self, arg_string: str) -> List[TimeTunnelCmd]:
+        """
+        used by server, -t with glob or regex names is expanded to one command per
+        matched method, all of them in one group led by the first one
+
+        Raises:
+            ValueError: if pattern matches no method, or too many methods
+        """
+        args = self.__parse_args(arg_string)
+        cmd = self.__build_cmd(args, getattr(args, "time_tunnel"))
+        if cmd.time_tunnel is None or not is_method_pattern(
+            cmd.module_name, cmd.class_name, cmd.method_name
+        ):
+            return [cmd]
+        if cmd.nested_method is not None:
+            raise argparse.ArgumentError(None, "--nested-method can't be used with pattern")
+        targets = resolve_method_pattern(
+            cmd.module_name, cmd.class_name, cmd.method_name, cmd.max_targets
+        )
+        cmds = [
+            self.__build_cmd(
+                args,
+                " ".join(
+                    name
+                    for name in (target.module_name, target.class_name, target.method_name)
+                    if name is not None
+                ),
+            )
+            for target in targets
+        ]
+        cmds[0].pattern_key = cmd.unique_key()
+        for member in cmds[1:]:
+            member.join_group(cmds[0])
+        return cmds
+
+    def __parse_args(self, arg_string: str) -> argparse.Namespace:
         new_args = rewrite_args(
             arg_string,
             unspec_names=[],
             omit_column=None,
             dash_combine_identifier_group={"t": True, "time_tunnel": True},
         )
-        args = self.parse_args(args=new_args)
+        return self.parse_args(args=new_args)
 
+    def __build_cmd(self, args: argparse.Namespace, time_tunnel: str) -> TimeTunnelCmd:
         cmd: TimeTunnelCmd = TimeTunnelCmd(
-            time_tunnel=getattr(args, "time_tunnel"),
+            time_tunnel=time_tunnel,
             limits=getattr(args, "limits"),
             show_list=getattr(args, "list"),
             index=getattr(args, "index"),
@@ -150,5 +391,24 @@ class TimeTunnelArgumentParser(argparse.ArgumentParser):
             filter_expr=getattr(args, "filter"),
             method_filter=getattr(args, "method"),
             nested_method=getattr(args, "nested_method"),
+            output=getattr(args, "output"),
+            show_stats=getattr(args, "stats"),
+            max_records=getattr(args, "max_records"),
+            max_bytes=getattr(args, "max_bytes"),
+            evict_policy=getattr(args, "evict"),
+            sort=getattr(args, "sort"),
+            descending=getattr(args, "desc"),
+            top=getattr(args, "top"),
+            since=getattr(args, "since"),
+            until=getattr(args, "until"),
+            exception_only=getattr(args, "exception"),
+            min_cost=getattr(args, "min_cost"),
+            page=getattr(args, "page"),
+            page_size=getattr(args, "page_size"),
+            spill=getattr(args, "spill"),
+            spill_max_bytes=getattr(args, "spill_max_bytes"),
+            times=getattr(args, "times"),
+            concurrency=getattr(args, "concurrency"),
+            max_targets=getattr(args, "max_targets"),
         )
         return cmd
@@ -1,5 +1,6 @@
 import asyncio
 import importlib
+import os
 import pickle
 import time
 import traceback
@@ -15,9 +16,45 @@ from flight_profiler.common.aop_decorator import (
 from flight_profiler.common.dumps import encode_obj_to_transfer
 from flight_profiler.common.enter_exit_command import EnterExitCommand
 from flight_profiler.common.expression_resolver import FilterExprResolver
-from flight_profiler.plugins.server_plugin import Message, ServerQueue
+from flight_profiler.common.method_pattern import MAX_PATTERN_TARGETS
+from flight_profiler.common.wire_format import (
+    RECORD_TT_FULL_RECORD,
+    RECORD_TT_RECORD,
+    RECORD_TT_RECORD_LIST,
+    RecordDecoder,
+    RecordSchema,
+)
+from flight_profiler.plugins.server_plugin import OVERFLOW_BLOCK, Message, ServerQueue
+from flight_profiler.plugins.tt.time_tunnel_benchmark import (
+    BenchmarkSummary,
+    ReplayBenchmark,
+)
+from flight_profiler.plugins.tt.time_tunnel_spill import (
+    SPILL_MAX_BYTES,
+    SPILL_OFF,
+    SpilledRecord,
+    TimeTunnelSpill,
+    dump_payload,
+    has_unpicklable,
+    load_payload,
+)
+from flight_profiler.plugins.tt.time_tunnel_store import (
+    SORT_COST,
+    SORT_INDEX,
+    TimeTunnelQuery,
+    TimeTunnelStats,
+    TimeTunnelStore,
+    estimate_size,
+    format_bytes,
+    method_identity,
+)
 from flight_profiler.utils.args_util import split_regex
 
+# base record, containers of a full record and index keys
+RECORD_OVERHEAD_BYTES = 512
+# records of one -l response message
+LIST_PAGE_SIZE = 500
+
 
 class TimeTunnelCmd(EnterExitCommand):
 
@@ -38,7 +75,26 @@ class TimeTunnelCmd(EnterExitCommand):
         verbose: bool = False,
         nested_method: str = None,
         need_wrap_nested_inplace: bool = False,
-        nested_code_obj: CodeType = None
+        nested_code_obj: CodeType = None,
+        output: Optional[str] = None,
+        show_stats: bool = False,
+        max_records: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        evict_policy: Optional[str] = None,
+        sort: str = SORT_INDEX,
+        descending: bool = False,
+        top: Optional[int] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        exception_only: bool = False,
+        min_cost: Optional[float] = None,
+        page: Optional[int] = None,
+        page_size: int = LIST_PAGE_SIZE,
+        spill: Optional[str] = None,
+        spill_max_bytes: Optional[int] = None,
+        times: Optional[int] = None,
+        concurrency: int = 1,
+        max_targets: int = MAX_PATTERN_TARGETS,
     ):
         super().__init__(limit=limits)
         self.time_tunnel = time_tunnel
@@ -62,6 +118,34 @@ class TimeTunnelCmd(EnterExitCommand):
         self.nested_method = nested_method
         self.need_wrap_nested_inplace = need_wrap_nested_inplace
         self.nested_code_obj = nested_code_obj
+        # client side only, records are written to this file instead of terminal
+        self.output = output
+        self.show_stats = show_stats
+        # bounds of global record store, None keeps current ones
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.evict_policy = evict_policy
+        # conditions of -l, since/until are seconds before now
+        self.sort = sort
+        self.descending = descending
+        self.top = top
+        if self.top is not None:
+            self.sort = SORT_COST
+            self.descending = True
+        self.since = since
+        self.until = until
+        self.exception_only = exception_only
+        self.min_cost = min_cost
+        self.page = page
+        self.page_size = page_size
+        # directory that later records are spilled to, or "off"
+        self.spill = spill
+        self.spill_max_bytes = spill_max_bytes
+        # -p replays this many times as a benchmark instead of once
+        self.times = times
+        self.concurrency = concurrency
+        # methods a glob or regex -t may match
+        self.max_targets = max_targets
 
         if self.time_tunnel is not None:
             func_location = split_regex(self.time_tunnel)
@@ -83,12 +167,31 @@ class TimeTunnelCmd(EnterExitCommand):
         violation += 1 if self.index is not None else 0
         violation += 1 if self.delete_id is not None else 0
         violation += 1 if self.delete_all else 0
+        violation += 1 if self.show_stats else 0
 
         if violation != 1:
             raise ArgumentTypeError(
-                "Invalid tt command format, you can only specify -t/-l/-i/-d/-da option!"
+                "Invalid tt command format, you can only specify -t/-l/-i/-d/-da/-s option!"
+            )
+        if (self.times is not None or self.concurrency != 1) and (
+            self.index is None or not self.play or self.times is None
+        ):
+            raise ArgumentTypeError(
+                "Invalid tt command format, --times/--concurrency benchmark needs -i <index> -p --times <value>!"
             )
 
+    def list_query(self) -> TimeTunnelQuery:
+        now_ms = int(time.time() * 1000)
+        return TimeTunnelQuery(
+            method=self.method_filter,
+            exception_only=self.exception_only,
+            start_ms=None if self.since is None else now_ms - int(self.since * 1000),
+            end_ms=None if self.until is None else now_ms - int(self.until * 1000),
+            min_cost_ms=self.min_cost,
+            sort=self.sort,
+            descending=self.descending,
+        )
+
     def dump_invocation(
         self,
         start_timestamp: int,
@@ -124,7 +227,7 @@ class TimeTunnelCmd(EnterExitCommand):
             if self.out_q is not None:
                 self.out_q.output_msg_nowait(
                     Message(
-                        False, msg=pickle.dumps(record.base_record)
+                        False, msg=encode_base_record(record.base_record)
                     )
                 )
 
@@ -163,7 +266,7 @@ class TimeTunnelCmd(EnterExitCommand):
             if self.out_q is not None:
                 self.out_q.output_msg_nowait(
                     Message(
-                        False, msg=pickle.dumps(record.base_record)
+                        False, msg=encode_base_record(record.base_record)
                     )
                 )
 
@@ -213,6 +316,81 @@ class FullInvocationRecord:
         self.exp_obj = exp_obj
 
 
+BASE_RECORD_FIELDS = (
+    ("index", "u"),
+    ("timestamp", "v"),
+    ("cost_ms", "d"),
+    ("is_ret", "b"),
+    ("is_exp", "b"),
+    ("module_name", "s"),
+    ("class_name", "s"),
+    ("method_name", "s"),
+)
+BASE_RECORD_SCHEMA = RecordSchema(RECORD_TT_RECORD, BASE_RECORD_FIELDS)
+BASE_RECORD_LIST_SCHEMA = RecordSchema(RECORD_TT_RECORD_LIST, BASE_RECORD_FIELDS)
+FULL_RECORD_SCHEMA = RecordSchema(
+    RECORD_TT_FULL_RECORD,
+    (
+        ("base_record", BASE_RECORD_FIELDS),
+        ("args", "s"),
+        ("kwargs", "s"),
+        ("return_obj", "s"),
+        ("exp_obj", "s"),
+    ),
+)
+
+
+def _read_base_record(decoder: RecordDecoder) -> BaseInvocationRecord:
+    return BaseInvocationRecord(
+        index=decoder.read_uvarint(),
+        timestamp=decoder.read_varint(),
+        cost_ms=decoder.read_double(),
+        is_ret=decoder.read_bool(),
+        is_exp=decoder.read_bool(),
+        module_name=decoder.read_str(),
+        class_name=decoder.read_str(),
+        method_name=decoder.read_str(),
+    )
+
+
+def encode_base_record(record: BaseInvocationRecord) -> bytes:
+    return BASE_RECORD_SCHEMA.encode(record)
+
+
+def decode_base_record(data: bytes) -> BaseInvocationRecord:
+    return _read_base_record(RecordDecoder(data).expect(RECORD_TT_RECORD))
+
+
+def encode_base_records(records: List[BaseInvocationRecord]) -> bytes:
+    """
+    module/class/method names shared by records are written only once
+    """
+    return BASE_RECORD_LIST_SCHEMA.encode_list(records)
+
+
+def decode_base_records(data: bytes) -> List[BaseInvocationRecord]:
+    decoder = RecordDecoder(data).expect(RECORD_TT_RECORD_LIST)
+    return [_read_base_record(decoder) for _ in range(decoder.read_uvarint())]
+
+
+def encode_full_record(record: FullInvocationRecord) -> bytes:
+    """
+    args/kwargs/return_obj/exp_obj must be transfer strings already
+    """
+    return FULL_RECORD_SCHEMA.encode(record)
+
+
+def decode_full_record(data: bytes) -> FullInvocationRecord:
+    decoder = RecordDecoder(data).expect(RECORD_TT_FULL_RECORD)
+    return FullInvocationRecord(
+        base_record=_read_base_record(decoder),
+        args=decoder.read_str(),
+        kwargs=decoder.read_str(),
+        return_obj=decoder.read_str(),
+        exp_obj=decoder.read_str(),
+    )
+
+
 class TimeTunnelIndexer:
 
     def __init__(self):
@@ -263,7 +441,82 @@ global_replay_executor = TimeTuneReplayExecutor()
 class TimeTunnelRecorder:
 
     def __init__(self):
-        self.invocation_records: Dict[int, FullInvocationRecord] = {}
+        self.invocation_records: TimeTunnelStore = TimeTunnelStore()
+        # records are kept as SpilledRecord and their objects on disk while set
+        self.spill: Optional[TimeTunnelSpill] = None
+        # running replay benchmarks by record index, stopped when client interrupts
+        self.benchmarks: Dict[int, ReplayBenchmark] = {}
+
+    def configure(self, cmd: TimeTunnelCmd) -> None:
+        """
+        Raises:
+            OSError: if segment file can't be created in spill directory
+        """
+        self.invocation_records.configure(
+            max_records=cmd.max_records,
+            max_bytes=cmd.max_bytes,
+            policy=cmd.evict_policy,
+        )
+        if cmd.spill == SPILL_OFF:
+            self.__close_spill()
+        elif cmd.spill is not None and (
+            self.spill is None or self.spill.directory != os.path.abspath(cmd.spill)
+        ):
+            self.__close_spill()
+            self.spill = TimeTunnelSpill(
+                cmd.spill,
+                max_bytes=cmd.spill_max_bytes or SPILL_MAX_BYTES,
+            )
+        elif cmd.spill_max_bytes is not None and self.spill is not None:
+            self.spill.max_bytes = cmd.spill_max_bytes
+
+    def __close_spill(self) -> None:
+        spill = self.spill
+        if spill is None:
+            return
+        self.spill = None
+        for record in self.invocation_records.values():
+            if isinstance(record, SpilledRecord):
+                self.invocation_records.pop(record.base_record.index)
+        spill.close()
+
+    def __spill(self, full_record: FullInvocationRecord) -> bool:
+        spill = self.spill
+        if spill is None:
+            return False
+        index = full_record.base_record.index
+        try:
+            location, dropped = spill.write(
+                index,
+                dump_payload(
+                    full_record.args,
+                    full_record.kwargs,
+                    full_record.return_obj,
+                    full_record.exp_obj,
+                ),
+            )
+        except Exception:
+            # disk full or objects failing even per item pickling, kept in memory
+            return False
+        self.invocation_records.put(
+            index, SpilledRecord(full_record.base_record, location), RECORD_OVERHEAD_BYTES
+        )
+        for dropped_index in dropped:
+            self.invocation_records.pop(dropped_index)
+        return True
+
+    def load(self, record: Any) -> Optional[FullInvocationRecord]:
+        """
+        full record of a stored one, objects of spilled records are unpickled as copies
+        """
+        if not isinstance(record, SpilledRecord):
+            return record
+        spill = self.spill
+        data = None if spill is None else spill.read(record.location)
+        if data is None:
+            return None
+        args, kwargs, return_obj, exp_obj = load_payload(data)
+        return FullInvocationRecord(record.base_record, args, kwargs, return_obj, exp_obj)
 
     def records(
         self,
@@ -296,36 +549,86 @@ class TimeTunnelRecorder:
             return_obj,
             exp_obj,
         )
-        self.invocation_records[index] = full_record
+        if self.__spill(full_record):
+            return full_record
+        self.invocation_records.put(
+            index,
+            full_record,
+            RECORD_OVERHEAD_BYTES
+            + estimate_size(args)
+            + estimate_size(kwargs)
+            + estimate_size(return_obj)
+            + estimate_size(exp_obj),
+        )
         return full_record
 
     def show_list_records(self, cmd: TimeTunnelCmd) -> None:
-        base_records = []
-        for r in self.invocation_records.values():
-            filter_args = r.args
-            method_names = f"{r.base_record.module_name}.{r.base_record.class_name}.{r.base_record.method_name}"
-            if cmd.method_filter is not None and cmd.method_filter != method_names:
-                continue
-
-            target_obj = None
-            if r.base_record.class_name is not None:
-                filter_args = r.args[1:]
-                target_obj = r.args[0]
-
-            if cmd.tt_filter.eval_filter(
-                target_obj,
-                r.return_obj,
-                r.base_record.cost_ms,
-                *filter_args,
-                **r.kwargs,
+        """
+        Streams matched base records in pages of cmd.page_size, the last page ends the
+        response. Indexed conditions narrow candidates first, -f expression is only
+        evaluated on them, and evaluation stops once the requested page or top-K is filled.
+        """
+        # pages are paced by client instead of dropped, this runs outside server loop
+        cmd.out_q.set_overflow_policy(OVERFLOW_BLOCK)
+        skip = 0 if cmd.page is None else (cmd.page - 1) * cmd.page_size
+        remain = cmd.page_size if cmd.page is not None else cmd.top
+        if cmd.page is not None and cmd.top is not None:
+            remain = max(0, min(remain, cmd.top - skip))
+        page: List[BaseInvocationRecord] = []
+        pending: Optional[List[BaseInvocationRecord]] = None
+        for r in self.invocation_records.query(cmd.list_query()):
+            if remain is not None and remain <= 0:
+                break
+            if cmd.filter_expr is not None and not self.__eval_list_filter(
+                cmd, self.load(r)
             ):
-                base_records.append(r.base_record)
-        cmd.out_q.output_msg_nowait(
-            Message(True, msg=pickle.dumps(base_records))
+                continue
+            if skip > 0:
+                skip -= 1
+                continue
+            page.append(r.base_record)
+            if remain is not None:
+                remain -= 1
+            if len(page) >= cmd.page_size:
+                # one page is held back, so that the end flag rides on the last one
+                if pending is not None:
+                    cmd.out_q.output_msg_nowait(
+                        Message(False, msg=encode_base_records(pending))
+                    )
+                pending = page
+                page = []
+        if pending is not None:
+            if page:
+                cmd.out_q.output_msg_nowait(
+                    Message(False, msg=encode_base_records(pending))
+                )
+            else:
+                page = pending
+        cmd.out_q.output_msg_nowait(Message(True, msg=encode_base_records(page)))
+
+    def __eval_list_filter(
+        self, cmd: TimeTunnelCmd, r: Optional[FullInvocationRecord]
+    ) -> bool:
+        if r is None:
+            return False
+        filter_args = r.args
+        target_obj = None
+        if r.base_record.class_name is not None:
+            filter_args = r.args[1:]
+            target_obj = r.args[0]
+        return cmd.tt_filter.eval_filter(
+            target_obj,
+            r.return_obj,
+            r.base_record.cost_ms,
+            *filter_args,
+            **r.kwargs,
         )
 
     def show_indexed_record(self, cmd: TimeTunnelCmd) -> None:
-        if cmd.index not in self.invocation_records:
+        full_record: Optional[FullInvocationRecord] = self.load(
+            self.invocation_records.get(cmd.index)
+        )
+        if full_record is None:
             cmd.out_q.output_msg_nowait(
                 Message(
                     True,
@@ -333,7 +636,6 @@ class TimeTunnelRecorder:
                 )
             )
             return
-        full_record: FullInvocationRecord = self.invocation_records[cmd.index]
         self.__send_full_record_directly(full_record, cmd.out_q, cmd.expand_level,
                                          raw_output=cmd.raw_output, verbose=cmd.verbose)
 
@@ -349,7 +651,7 @@ class TimeTunnelRecorder:
         out_q.output_msg_nowait(
             Message(
                 True,
-                msg=pickle.dumps(
+                msg=encode_full_record(
                     FullInvocationRecord(
                         base_record=full_record.base_record,
                         args=encode_obj_to_transfer(full_record.args, max_depth=expand_level,
@@ -368,7 +670,10 @@ class TimeTunnelRecorder:
             full_record.args = origin_args
 
     def replay_time_fragment(self, cmd: TimeTunnelCmd) -> None:
-        if cmd.index not in self.invocation_records:
+        record: Optional[FullInvocationRecord] = self.load(
+            self.invocation_records.get(cmd.index)
+        )
+        if record is None:
             cmd.out_q.output_msg_nowait(
                 Message(
                     True,
@@ -376,8 +681,17 @@ class TimeTunnelRecorder:
                 )
             )
             return
+        if has_unpicklable(record.args) or has_unpicklable(record.kwargs):
+            cmd.out_q.output_msg_nowait(
+                Message(
+                    True,
+                    pickle.dumps(
+                        f"Args of index {cmd.index} couldn't be pickled when spilled, replay is not supported!"
+                    ),
+                )
+            )
+            return
 
-        record: FullInvocationRecord = self.invocation_records[cmd.index]
         cls_name: str = record.base_record.class_name
         module_name = record.base_record.module_name
         method_name = record.base_record.method_name
@@ -403,6 +717,9 @@ class TimeTunnelRecorder:
                 )
             )
             return
+        if cmd.times is not None:
+            self.__benchmark(cmd, record, method)
+            return
         # current in coroutine, if execute in here, may not satisfy async constrains
         is_exp, start_ms, cost_ms, ret_obj = (
             global_replay_executor.execute_in_new_thread(
@@ -444,15 +761,67 @@ class TimeTunnelRecorder:
             )
             self.__send_full_record_directly(new_record, cmd.out_q, cmd.expand_level, cmd.raw_output, cmd.verbose)
 
+    def __benchmark(
+        self, cmd: TimeTunnelCmd, record: FullInvocationRecord, method: Any
+    ) -> None:
+        benchmark = ReplayBenchmark(
+            cmd.index,
+            method_identity(record.base_record),
+            method,
+            record.args,
+            record.kwargs,
+            cmd.times,
+            cmd.concurrency,
+        )
+        self.benchmarks[cmd.index] = benchmark
+
+        def report(summary: BenchmarkSummary) -> None:
+            cmd.out_q.output_msg_nowait(Message(False, pickle.dumps(summary)))
+
+        try:
+            summary = benchmark.run(report)
+        finally:
+            if self.benchmarks.get(cmd.index) is benchmark:
+                del self.benchmarks[cmd.index]
+        cmd.out_q.output_msg_nowait(Message(True, pickle.dumps(summary)))
+
+    def stop_benchmark(self, index: int) -> None:
+        benchmark = self.benchmarks.get(index)
+        if benchmark is not None:
+            benchmark.stop()
+
     def delete_specified_record(self, id) -> bool:
-        if id in self.invocation_records:
-            self.invocation_records.pop(id)
-            return True
-        return False
+        return self.invocation_records.pop(id) is not None
 
     def delete_all_records(self):
         self.invocation_records.clear()
+        if self.spill is not None:
+            self.spill.clear()
         global_tt_indexer.refresh()
 
+    def show_store_stats(self, cmd: TimeTunnelCmd) -> None:
+        stats: TimeTunnelStats = self.invocation_records.stats()
+        cmd.out_q.output_msg_nowait(
+            Message(
+                True,
+                msg=(
+                    f"records: {stats.records}/{stats.max_records}, "
+                    f"estimated memory: {format_bytes(stats.estimated_bytes)}/{format_bytes(stats.max_bytes)}, "
+                    f"evict policy: {stats.policy}, "
+                    f"evicted: {stats.evicted} records, {format_bytes(stats.evicted_bytes)}"
+                    + self.__spill_stats()
+                ),
+            )
+        )
+
+    def __spill_stats(self) -> str:
+        spill = self.spill
+        if spill is None:
+            return ""
+        return (
+            f", spilled to: {spill.directory}, "
+            f"disk: {format_bytes(spill.disk_bytes())}/{format_bytes(spill.max_bytes)}"
+        )
+
 
 global_time_tunnel_recorder = TimeTunnelRecorder()
@@ -1,14 +1,24 @@
-import pickle
 import shutil
-from typing import List
+from typing import List, Tuple
 
+from flight_profiler.common.latency_histogram import (
+    bucket_lower_bound,
+    bucket_upper_bound,
+)
+from flight_profiler.plugins.tt.time_tunnel_benchmark import (
+    BENCHMARK_QUANTILES,
+    BenchmarkSummary,
+)
 from flight_profiler.plugins.tt.time_tunnel_recorder import (
     BaseInvocationRecord,
     FullInvocationRecord,
+    decode_base_records,
 )
 from flight_profiler.utils.render_util import (
     COLOR_END,
+    COLOR_GREEN,
     COLOR_ORANGE,
+    COLOR_RED,
     COLOR_WHITE_255,
     align_json_lines,
 )
@@ -60,6 +70,52 @@ class TimeTunnelRender:
             f"{exception_msg}"
         )
 
+    def render_benchmark_summary(self, summary: BenchmarkSummary) -> None:
+        percentiles = " ".join(
+            f"p{str(q * 100).rstrip('0').rstrip('.').replace('.', '')}={summary.percentile_ms(q):.3f}ms"
+            for q in BENCHMARK_QUANTILES
+        )
+        state = "finished" if summary.finished else "running"
+        print(
+            f"{COLOR_WHITE_255}replay {state} index={summary.index} method={summary.method_identifier}"
+            f" completed={summary.completed}/{summary.times} concurrency={summary.concurrency}"
+            f" fail={COLOR_RED if summary.error_count > 0 else COLOR_GREEN}{summary.error_count}{COLOR_END}"
+            f"{COLOR_WHITE_255} elapsed={summary.elapsed_ms / 1000:.3f}s qps={summary.throughput:.1f}"
+            f" avg={summary.mean_ms:.3f}ms min={summary.min_ms:.3f}ms max={summary.max_ms:.3f}ms"
+            f" {percentiles}{COLOR_END}"
+        )
+        if not summary.finished:
+            return
+        self.__print_histogram(summary)
+        if summary.first_error is not None:
+            print(f"{COLOR_RED}first error:\n{summary.first_error}{COLOR_END}")
+
+    def __print_histogram(self, summary: BenchmarkSummary, max_rows: int = 16) -> None:
+        buckets = sorted(summary.histogram.buckets.items())
+        if not buckets:
+            return
+        # neighbouring buckets are merged so that the histogram fits in #max_rows lines
+        per_row = (len(buckets) + max_rows - 1) // max_rows
+        rows: List[Tuple[float, float, int]] = []
+        for start in range(0, len(buckets), per_row):
+            group = buckets[start : start + per_row]
+            rows.append(
+                (
+                    bucket_lower_bound(group[0][0]) / 1000,
+                    min(bucket_upper_bound(group[-1][0]) / 1000, summary.max_ms),
+                    sum(count for _, count in group),
+                )
+            )
+        peak = max(count for _, _, count in rows)
+        bar_width = max(10, min(50, shutil.get_terminal_size().columns - 50))
+        print(f' {"LATENCY(ms)".ljust(28)}{"COUNT".ljust(10)}')
+        for lower, upper, count in rows:
+            bar = "#" * max(1, count * bar_width // peak)
+            print(
+                f" {f'{lower:.3f} ~ {upper:.3f}'.ljust(28)}{str(count).ljust(10)}"
+                f"{COLOR_ORANGE}{bar}{COLOR_END}"
+            )
+
     def render_tt_record(
         self, cli_base_record: BaseInvocationRecord, is_first: bool
     ) -> None:
@@ -67,9 +123,10 @@ class TimeTunnelRender:
             self.__print_header()
         self.__print_base_record(cli_base_record)
 
-    def render_records_list(self, list_records: bytes):
-        list_records: List[BaseInvocationRecord] = pickle.loads(list_records)
-        self.__print_header()
+    def render_records_list(self, list_records: bytes, is_first: bool = True):
+        list_records: List[BaseInvocationRecord] = decode_base_records(list_records)
+        if is_first:
+            self.__print_header()
         for cli_base_record in list_records:
             self.__print_base_record(cli_base_record)
 
@@ -0,0 +1,229 @@
+import mmap
+import os
+import pickle
+import struct
+import threading
+from typing import Any, List, Optional, Tuple
+
+from flight_profiler.common.dumps import encode_obj_to_transfer
+
+# a segment stops taking records once it reaches this size, a new one is opened
+SPILL_SEGMENT_BYTES = 64 * 1024 * 1024
+# disk budget of all segments, the oldest segment and its records are dropped beyond it
+SPILL_MAX_BYTES = 1024 * 1024 * 1024
+# depth of text kept for values pickle can't serialize
+SPILL_TEXT_DEPTH = 4
+# value of --spill that stops spilling
+SPILL_OFF = "off"
+
+SEGMENT_MAGIC = b"FPTTSEG\x01"
+_RECORD_LENGTH = struct.Struct("<I")
+
+
+class UnpicklableValue:
+    """
+    Text of a value that pickle can't serialize. Shown as is by -i, such records
+    can't be replayed.
+    """
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __repr__(self) -> str:
+        return self.text
+
+
+def _spillable(value: Any, depth: int = 1) -> Any:
+    try:
+        pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        return value
+    except Exception:
+        pass
+    # containers of args/kwargs keep their picklable items
+    if depth > 0 and isinstance(value, (list, tuple)):
+        return type(value)(_spillable(item, depth - 1) for item in value)
+    if depth > 0 and isinstance(value, dict):
+        return {key: _spillable(item, depth - 1) for key, item in value.items()}
+    try:
+        return UnpicklableValue(encode_obj_to_transfer(value, max_depth=SPILL_TEXT_DEPTH))
+    except Exception as e:
+        return UnpicklableValue(f"<unpicklable {type(value).__name__}: {e}>")
+
+
+def dump_payload(args: Any, kwargs: Any, return_obj: Any, exp_obj: Any) -> bytes:
+    """
+    pickle the objects of a record, values pickle rejects are replaced by their text
+    """
+    payload = (args, kwargs, return_obj, exp_obj)
+    try:
+        return pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return pickle.dumps(
+            tuple(_spillable(value) for value in payload),
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+
+
+def load_payload(data: bytes) -> Tuple[Any, Any, Any, Any]:
+    return pickle.loads(data)
+
+
+def has_unpicklable(value: Any) -> bool:
+    if isinstance(value, UnpicklableValue):
+        return True
+    if isinstance(value, (list, tuple)):
+        return any(isinstance(item, UnpicklableValue) for item in value)
+    if isinstance(value, dict):
+        return any(isinstance(item, UnpicklableValue) for item in value.values())
+    return False
+
+
+class SpillSegment:
+    """
+    Append-only file of length prefixed payloads, read through a memory map that is
+    remapped when reads reach past the mapped size.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "w+b")
+        self.file.write(SEGMENT_MAGIC)
+        self.size = len(SEGMENT_MAGIC)
+        self.map: Optional[mmap.mmap] = None
+        # records written to this segment, dropped together with it
+        self.indexes: List[int] = []
+
+    def append(self, index: int, data: bytes) -> int:
+        offset = self.size + _RECORD_LENGTH.size
+        self.file.write(_RECORD_LENGTH.pack(len(data)))
+        self.file.write(data)
+        self.size = offset + len(data)
+        self.indexes.append(index)
+        return offset
+
+    def read(self, offset: int, length: int) -> bytes:
+        if self.map is None or offset + length > len(self.map):
+            self.file.flush()
+            if self.map is not None:
+                self.map.close()
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.map[offset : offset + length]
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class SpillLocation:
+
+    __slots__ = ("segment", "offset", "length")
+
+    def __init__(self, segment: SpillSegment, offset: int, length: int):
+        self.segment = segment
+        self.offset = offset
+        self.length = length
+
+
+class SpilledRecord:
+    """
+    In memory part of a spilled record, objects are loaded from segment on demand.
+    """
+
+    __slots__ = ("base_record", "location")
+
+    def __init__(self, base_record: Any, location: SpillLocation):
+        self.base_record = base_record
+        self.location = location
+
+
+class TimeTunnelSpill:
+    """
+    Segment files of spilled records under #directory, removed when records are
+    deleted or spilling is turned off. Files are named after the pid, so several
+    processes may spill to one directory.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = SPILL_MAX_BYTES,
+        segment_bytes: int = SPILL_SEGMENT_BYTES,
+    ):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.segments: List[SpillSegment] = []
+        self.sequence = 0
+        self.written = 0
+        # records are written by application threads, read by server thread
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self.__roll()
+
+    def write(self, index: int, data: bytes) -> Tuple[SpillLocation, List[int]]:
+        """
+        Returns:
+            Tuple[SpillLocation, List[int]]: location of #data, and indexes of records
+            dropped with segments beyond disk budget, which callers must forget
+        """
+        with self.lock:
+            segment = self.segments[-1]
+            if segment.size >= self.segment_bytes:
+                segment = self.__roll()
+            offset = segment.append(index, data)
+            self.written += 1
+            return SpillLocation(segment, offset, len(data)), self.__drop_oldest()
+
+    def read(self, location: SpillLocation) -> Optional[bytes]:
+        """
+        None if the segment of #location was already dropped
+        """
+        with self.lock:
+            if location.segment.file.closed:
+                return None
+            return location.segment.read(location.offset, location.length)
+
+    def disk_bytes(self) -> int:
+        with self.lock:
+            return sum(segment.size for segment in self.segments)
+
+    def clear(self) -> None:
+        """
+        removes all segments, spilling goes on in a new one
+        """
+        self.close()
+        with self.lock:
+            self.__roll()
+
+    def close(self) -> None:
+        with self.lock:
+            for segment in self.segments:
+                segment.close()
+            self.segments.clear()
+
+    def __roll(self) -> SpillSegment:
+        self.sequence += 1
+        segment = SpillSegment(
+            os.path.join(self.directory, f"tt-{os.getpid()}-{self.sequence}.seg")
+        )
+        self.segments.append(segment)
+        return segment
+
+    def __drop_oldest(self) -> List[int]:
+        dropped: List[int] = []
+        total = sum(segment.size for segment in self.segments)
+        # the segment being written is always kept
+        while total > self.max_bytes and len(self.segments) > 1:
+            segment = self.segments.pop(0)
+            total -= segment.size
+            dropped.extend(segment.indexes)
+            segment.close()
+        return dropped
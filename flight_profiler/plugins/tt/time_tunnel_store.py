@@ -0,0 +1,415 @@
+import bisect
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from flight_profiler.common.latency_histogram import bucket_index
+
+# default bounds of recorded invocations, tt -t can change them
+TT_MAX_RECORDS = 10000
+TT_MAX_BYTES = 256 * 1024 * 1024
+
+# fifo: evict the oldest recorded invocation
+# lru: evict the invocation least recently shown or replayed
+EVICT_FIFO = "fifo"
+EVICT_LRU = "lru"
+EVICT_POLICIES = (EVICT_FIFO, EVICT_LRU)
+
+# size estimation visits at most SIZE_SAMPLE items of a container and extrapolates,
+# and stops descending after SIZE_DEPTH levels, so recording stays cheap for huge objects
+SIZE_SAMPLE = 8
+SIZE_DEPTH = 3
+
+# orders of listed records
+SORT_INDEX = "index"
+SORT_TIME = "time"
+SORT_COST = "cost"
+SORT_ORDERS = (SORT_INDEX, SORT_TIME, SORT_COST)
+
+# stale entries of lazily cleaned time index are dropped once they outnumber live ones
+_TIME_INDEX_COMPACT_MIN = 1024
+
+_SIZE_UNITS = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_ATOMIC_TYPES = (int, float, bool, complex, str, bytes, bytearray, type(None))
+
+
+def parse_size(value: str) -> int:
+    """
+    parse "512k" / "64m" / "1g" or plain bytes
+
+    Raises:
+        ValueError: if #value is malformed or not positive
+    """
+    text = value.strip().lower()
+    multiplier = 1
+    if text and text[-1] in _SIZE_UNITS:
+        multiplier = _SIZE_UNITS[text[-1]]
+        text = text[:-1]
+    try:
+        size = int(float(text) * multiplier)
+    except ValueError:
+        raise ValueError(f"size: {value} should be like 512k, 64m or 1g.")
+    if size <= 0:
+        raise ValueError(f"size: {value} should be positive.")
+    return size
+
+
+def parse_duration(value: str) -> float:
+    """
+    parse "30s" / "5m" / "1h" / "1d" to seconds
+
+    Raises:
+        ValueError: if #value is malformed or negative
+    """
+    text = value.strip().lower()
+    if not text or text[-1] not in _DURATION_UNITS:
+        raise ValueError(f"duration: {value} should be like 30s, 5m, 1h or 1d.")
+    try:
+        seconds = float(text[:-1]) * _DURATION_UNITS[text[-1]]
+    except ValueError:
+        raise ValueError(f"duration: {value} should be like 30s, 5m, 1h or 1d.")
+    if seconds < 0:
+        raise ValueError(f"duration: {value} should not be negative.")
+    return seconds
+
+
+def method_identity(base_record: Any) -> str:
+    """
+    module.class.method, class is None for module functions, same as tt -m
+    """
+    return f"{base_record.module_name}.{base_record.class_name}.{base_record.method_name}"
+
+
+def cost_bucket(cost_ms: float) -> int:
+    return bucket_index(int(cost_ms * 1000) if cost_ms > 0 else 0)
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+def estimate_size(obj: Any, depth: int = SIZE_DEPTH) -> int:
+    """
+    approximate deep size of #obj in bytes, objects shared with the application are
+    counted as well since a record keeps them alive
+    """
+    try:
+        size = sys.getsizeof(obj)
+    except Exception:
+        return 0
+    if depth <= 0 or isinstance(obj, _ATOMIC_TYPES):
+        return size
+    if isinstance(obj, dict):
+        items = obj.items()
+        count = len(obj)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        items = obj
+        count = len(obj)
+    else:
+        state = getattr(obj, "__dict__", None)
+        if isinstance(state, dict):
+            size += estimate_size(state, depth - 1)
+        return size
+    if count == 0:
+        return size
+    sampled = 0
+    sampled_size = 0
+    for item in items:
+        if isinstance(item, tuple) and isinstance(obj, dict):
+            sampled_size += estimate_size(item[0], depth - 1) + estimate_size(item[1], depth - 1)
+        else:
+            sampled_size += estimate_size(item, depth - 1)
+        sampled += 1
+        if sampled >= SIZE_SAMPLE:
+            break
+    return size + sampled_size * count // sampled
+
+
+class TimeTunnelStats:
+
+    def __init__(
+        self,
+        records: int,
+        estimated_bytes: int,
+        max_records: int,
+        max_bytes: int,
+        policy: str,
+        evicted: int,
+        evicted_bytes: int,
+    ):
+        self.records = records
+        self.estimated_bytes = estimated_bytes
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.evicted = evicted
+        self.evicted_bytes = evicted_bytes
+
+
+class TimeTunnelQuery:
+    """
+    conditions and order of listed records, None means no condition
+    """
+
+    def __init__(
+        self,
+        method: Optional[str] = None,
+        exception_only: bool = False,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        min_cost_ms: Optional[float] = None,
+        sort: str = SORT_INDEX,
+        descending: bool = False,
+    ):
+        self.method = method
+        self.exception_only = exception_only
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.min_cost_ms = min_cost_ms
+        self.sort = sort
+        self.descending = descending
+
+    def matches(self, base_record: Any) -> bool:
+        if self.exception_only and not base_record.is_exp:
+            return False
+        if self.start_ms is not None and base_record.timestamp < self.start_ms:
+            return False
+        if self.end_ms is not None and base_record.timestamp > self.end_ms:
+            return False
+        if self.min_cost_ms is not None and base_record.cost_ms < self.min_cost_ms:
+            return False
+        return self.method is None or method_identity(base_record) == self.method
+
+
+class TimeTunnelStore:
+    """
+    Recorded invocations keyed by index, bounded by record count and an estimated byte
+    budget. Exceeding either bound evicts records in fifo or lru order.
+    Supports the dict operations tt used on its former unbounded dict.
+
+    Records are indexed on insert by method, exception flag, start time and cost bucket,
+    so that queries only visit records that may match. Records must have a base_record.
+    """
+
+    def __init__(
+        self,
+        max_records: int = TT_MAX_RECORDS,
+        max_bytes: int = TT_MAX_BYTES,
+        policy: str = EVICT_FIFO,
+    ):
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.records: "OrderedDict[int, Any]" = OrderedDict()
+        self.sizes: Dict[int, int] = {}
+        self.total_bytes = 0
+        self.evicted = 0
+        self.evicted_bytes = 0
+        # secondary indexes, dicts are used as insertion ordered sets of record index
+        self.by_method: Dict[str, Dict[int, None]] = {}
+        self.by_exception: Dict[int, None] = {}
+        self.by_cost: Dict[int, Dict[int, None]] = {}
+        # (start timestamp, index) sorted, removed entries are skipped and compacted lazily
+        self.by_time: List[Tuple[int, int]] = []
+        # records are added by application threads, listed by server thread
+        self.lock = threading.Lock()
+
+    def configure(
+        self,
+        max_records: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        policy: Optional[str] = None,
+    ) -> None:
+        """
+        None keeps the current value, shrinking bounds evicts at once
+        """
+        with self.lock:
+            if max_records is not None:
+                self.max_records = max_records
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if policy is not None:
+                if policy not in EVICT_POLICIES:
+                    raise ValueError(
+                        f"evict policy {policy} should be one of {', '.join(EVICT_POLICIES)}"
+                    )
+                self.policy = policy
+            self.__evict()
+
+    def put(self, index: int, record: Any, size: int) -> None:
+        with self.lock:
+            self.__discard(index)
+            self.records[index] = record
+            self.sizes[index] = size
+            self.total_bytes += size
+            self.__index(index, record.base_record)
+            self.__evict()
+
+    def get(self, index: int) -> Optional[Any]:
+        with self.lock:
+            record = self.records.get(index)
+            if record is not None and self.policy == EVICT_LRU:
+                self.records.move_to_end(index)
+            return record
+
+    def __getitem__(self, index: int) -> Any:
+        record = self.get(index)
+        if record is None:
+            raise KeyError(index)
+        return record
+
+    def __contains__(self, index: int) -> bool:
+        return index in self.records
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def values(self) -> List[Any]:
+        """
+        snapshot in insertion order, safe to iterate while recording goes on
+        """
+        with self.lock:
+            return list(self.records.values())
+
+    def pop(self, index: int) -> Optional[Any]:
+        with self.lock:
+            record = self.records.get(index)
+            self.__discard(index)
+            return record
+
+    def clear(self) -> None:
+        with self.lock:
+            self.records.clear()
+            self.sizes.clear()
+            self.total_bytes = 0
+            self.by_method.clear()
+            self.by_exception.clear()
+            self.by_cost.clear()
+            self.by_time.clear()
+
+    def query(self, query: TimeTunnelQuery) -> Iterator[Any]:
+        """
+        Lazily yields records matching #query in its order, callers stop early for top-K
+        or pagination. Candidate indexes are taken under lock, records evicted meanwhile
+        are skipped.
+        """
+        with self.lock:
+            candidates = self.__candidates(query)
+        records = self.records
+        for index in candidates:
+            record = records.get(index)
+            if record is not None and query.matches(record.base_record):
+                yield record
+
+    def __candidates(self, query: TimeTunnelQuery) -> Iterable[int]:
+        if query.sort == SORT_COST:
+            return self.__cost_ordered(query)
+        if query.sort == SORT_TIME or (
+            query.method is None
+            and not query.exception_only
+            and (query.start_ms is not None or query.end_ms is not None)
+        ):
+            indexes = self.__time_ranged(query)
+        elif query.method is not None:
+            indexes = list(self.by_method.get(query.method, ()))
+        elif query.exception_only:
+            indexes = list(self.by_exception)
+        else:
+            indexes = list(self.records)
+            if self.policy == EVICT_LRU:
+                # lru reorders records on access, index order is restored here
+                indexes.sort()
+        if query.descending:
+            indexes.reverse()
+        return indexes
+
+    def __time_ranged(self, query: TimeTunnelQuery) -> List[int]:
+        by_time = self.by_time
+        low = 0
+        high = len(by_time)
+        if query.start_ms is not None:
+            low = bisect.bisect_left(by_time, (query.start_ms, -1))
+        if query.end_ms is not None:
+            high = bisect.bisect_right(by_time, (query.end_ms, sys.maxsize))
+        return [index for _, index in by_time[low:high]]
+
+    def __cost_ordered(self, query: TimeTunnelQuery) -> List[int]:
+        buckets = sorted(self.by_cost, reverse=query.descending)
+        if query.min_cost_ms is not None:
+            lowest = cost_bucket(query.min_cost_ms)
+            buckets = [bucket for bucket in buckets if bucket >= lowest]
+        records = self.records
+        indexes = []
+        for bucket in buckets:
+            # exact order within a bucket, only records of visited buckets are compared
+            indexes.extend(
+                sorted(
+                    self.by_cost[bucket],
+                    key=lambda i: records[i].base_record.cost_ms,
+                    reverse=query.descending,
+                )
+            )
+        return indexes
+
+    def __index(self, index: int, base_record: Any) -> None:
+        self.by_method.setdefault(method_identity(base_record), {})[index] = None
+        if base_record.is_exp:
+            self.by_exception[index] = None
+        self.by_cost.setdefault(cost_bucket(base_record.cost_ms), {})[index] = None
+        # calls mostly finish in start order, so this is nearly always an append
+        bisect.insort(self.by_time, (base_record.timestamp, index))
+
+    def __unindex(self, index: int, base_record: Any) -> None:
+        identity = method_identity(base_record)
+        indexes = self.by_method.get(identity)
+        if indexes is not None:
+            indexes.pop(index, None)
+            if not indexes:
+                del self.by_method[identity]
+        self.by_exception.pop(index, None)
+        bucket = cost_bucket(base_record.cost_ms)
+        indexes = self.by_cost.get(bucket)
+        if indexes is not None:
+            indexes.pop(index, None)
+            if not indexes:
+                del self.by_cost[bucket]
+        if len(self.by_time) > 2 * len(self.records) + _TIME_INDEX_COMPACT_MIN:
+            records = self.records
+            self.by_time = [entry for entry in self.by_time if entry[1] in records]
+
+    def stats(self) -> TimeTunnelStats:
+        with self.lock:
+            return TimeTunnelStats(
+                records=len(self.records),
+                estimated_bytes=self.total_bytes,
+                max_records=self.max_records,
+                max_bytes=self.max_bytes,
+                policy=self.policy,
+                evicted=self.evicted,
+                evicted_bytes=self.evicted_bytes,
+            )
+
+    def __discard(self, index: int) -> None:
+        record = self.records.pop(index, None)
+        if record is not None:
+            self.total_bytes -= self.sizes.pop(index)
+            self.__unindex(index, record.base_record)
+
+    def __evict(self) -> None:
+        records = self.records
+        # the newest record is kept even if it exceeds the byte budget alone
+        while len(records) > self.max_records or (
+            self.total_bytes > self.max_bytes and len(records) > 1
+        ):
+            index, record = records.popitem(last=False)
+            size = self.sizes.pop(index)
+            self.total_bytes -= size
+            self.__unindex(index, record.base_record)
+            self.evicted += 1
+            self.evicted_bytes += size
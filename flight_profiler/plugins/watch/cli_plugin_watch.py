@@ -1,19 +1,26 @@
 import argparse
 import pickle
-from typing import Union
+from typing import Optional, Union
 
-from flight_profiler.communication.flight_client import FlightClient
+from flight_profiler.common.wire_format import is_wire_record
+from flight_profiler.communication.flight_session import open_flight_client
 from flight_profiler.help_descriptions import WATCH_COMMAND_DESCRIPTION
 from flight_profiler.plugins.cli_plugin import BaseCliPlugin
 from flight_profiler.plugins.watch.watch_agent import WatchSetting
-from flight_profiler.plugins.watch.watch_displayer import WatchResult
+from flight_profiler.plugins.watch.watch_displayer import (
+    WatchResult,
+    decode_watch_result,
+)
+from flight_profiler.plugins.watch.watch_monitor import MonitorSummary
 from flight_profiler.plugins.watch.watch_parser import WatchArgumentParser
 from flight_profiler.plugins.watch.watch_render import WatchRender
 from flight_profiler.utils.cli_util import (
     common_plugin_execute_routine,
+    show_drop_notice,
     show_error_info,
     show_normal_info,
 )
+from flight_profiler.utils.record_file import RecordFileWriter
 
 
 class WatchCliPlugin(BaseCliPlugin):
@@ -31,6 +38,9 @@ class WatchCliPlugin(BaseCliPlugin):
         except argparse.ArgumentError as e:
             show_error_info(f" Watch command parsed failed, {e}")
             return
+        except SyntaxError as e:
+            show_error_info(f" Watch expression compile failed, {e}")
+            return
         except Exception as e:
             show_normal_info(self.get_help())
             return
@@ -38,22 +48,38 @@ class WatchCliPlugin(BaseCliPlugin):
         self.last_cmd = cmd
         body = {"target": "watch", "param": "on " + cmd}
         try:
-            client = FlightClient(host="localhost", port=self.port)
+            client = open_flight_client(self.port)
         except:
             show_error_info("Target process exited!")
             return
+        writer: Optional[RecordFileWriter] = None
         try:
+            if watch_setting.output is not None:
+                writer = RecordFileWriter(watch_setting.output, decode_watch_result)
+                if not writer.start():
+                    return
             render: WatchRender = WatchRender()
             for content in client.request_stream(body):
-                result: Union[WatchResult, str] = pickle.loads(content)
-                if type(result) is str:
-                    print(result)
-                else:
+                if show_drop_notice(content):
+                    continue
+                if is_wire_record(content) and writer is not None:
+                    writer.write(content)
+                    continue
+                if is_wire_record(content):
+                    result: WatchResult = decode_watch_result(content)
                     print(
                         render.show_watch_result(result, watch_setting.raw_output)
                     )
+                    continue
+                result: Union[MonitorSummary, str] = pickle.loads(content)
+                if type(result) is str:
+                    print(result)
+                else:
+                    print(render.show_monitor_summary(result))
         finally:
             client.close()
+            if writer is not None:
+                writer.close()
 
     def on_interrupted(self):
         common_plugin_execute_routine(
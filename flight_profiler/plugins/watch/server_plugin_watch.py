@@ -1,11 +1,13 @@
 import pickle
 import traceback
+from typing import List
 
 from flight_profiler.plugins.server_plugin import Message, ServerPlugin, ServerQueue
 from flight_profiler.plugins.watch import watch_agent
 from flight_profiler.plugins.watch.watch_agent import global_watch_agent
 from flight_profiler.plugins.watch.watch_parser import WatchArgumentParser
 from flight_profiler.utils.args_util import split_regex
+from flight_profiler.utils.render_util import COLOR_END, COLOR_RED
 
 
 class WatchServerPlugin(ServerPlugin):
@@ -17,12 +19,19 @@ class WatchServerPlugin(ServerPlugin):
         if splits[0] == "on":
             new_param = param[len(splits[0]) :]
             try:
-                watch_setting: watch_agent.WatchSetting = (
-                    WatchArgumentParser().parse_watch_setting(new_param)
+                watch_settings: List[watch_agent.WatchSetting] = (
+                    WatchArgumentParser().parse_watch_settings(new_param)
                 )
-                watch_setting.out_q = self.out_q
-                global_watch_agent.add_watch(watch_setting)
+                if watch_settings[0].overflow_policy is not None:
+                    self.out_q.set_overflow_policy(watch_settings[0].overflow_policy)
+                for watch_setting in watch_settings:
+                    watch_setting.out_q = self.out_q
+                global_watch_agent.add_watch_group(watch_settings)
                 # will not return end message, server request will block
+            except ValueError as e:
+                await self.out_q.output_msg(
+                    Message(True, pickle.dumps(f"{COLOR_RED}{e}{COLOR_END}"))
+                )
             except:
                 await self.out_q.output_msg(Message(True, traceback.format_exc()))
         elif splits[0] == "off":
@@ -31,8 +40,7 @@ class WatchServerPlugin(ServerPlugin):
                 watch_setting: watch_agent.WatchSetting = (
                     WatchArgumentParser().parse_watch_setting(new_param)
                 )
-                watch_setting.out_q = self.out_q
-                global_watch_agent.clear_watch(watch_setting)
+                global_watch_agent.clear_watch_group(watch_setting)
                 await self.out_q.output_msg(Message(True, None))
             except:
                 await self.out_q.output_msg(Message(True, traceback.format_exc()))
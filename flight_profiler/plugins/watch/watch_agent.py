@@ -2,25 +2,37 @@ import asyncio
 import functools
 import importlib
 import inspect
+import itertools
 import json
 import pickle
+import sys
 import time
 import traceback
 import types
 from types import CodeType
+from typing import Dict, List, Optional
 
 from flight_profiler.common import aop_decorator
+from flight_profiler.common.call_sampler import CallSampler
 from flight_profiler.common.code_wrapper_entity import CodeWrapperResult
+from flight_profiler.common.dump_worker import DumpWorker, snapshot
 from flight_profiler.common.enter_exit_command import EnterExitCommand
 from flight_profiler.common.expression_resolver import FilterExprResolver
 from flight_profiler.common.system_logger import logger
 from flight_profiler.plugins.server_plugin import Message, ServerQueue
-from flight_profiler.plugins.watch.watch_displayer import WatchDisplayer, WatchResult
+from flight_profiler.plugins.watch.watch_displayer import (
+    WatchDisplayer,
+    WatchResult,
+    encode_watch_result,
+)
+from flight_profiler.plugins.watch.watch_monitor import MethodStats, MonitorReporter
+from flight_profiler.plugins.watch.watch_trigger import LatencyTrigger, parse_trigger
 from flight_profiler.utils.render_util import (
     COLOR_END,
     COLOR_ORANGE,
     COLOR_RED,
     build_long_spy_command_hint,
+    build_pattern_spy_command_hint,
 )
 
 
@@ -41,9 +53,21 @@ class WatchSetting(EnterExitCommand):
         max_count: int = 10,
         out_q: ServerQueue = None,
         need_wrap_nested_inplace: bool = False,
-        nested_code_obj: CodeType = None
+        nested_code_obj: CodeType = None,
+        sample_rate: float = None,
+        rate_limit: str = None,
+        monitor_interval: float = None,
+        overflow_policy: str = None,
+        offload: str = None,
+        slow_trigger: str = None,
+        capture_stack: bool = False,
+        output: str = None,
     ):
-        super().__init__(limit=max_count)
+        # in monitor mode, max_count limits report cycles instead of invocations,
+        # in slow mode it limits dumped slow calls
+        super().__init__(
+            limit=max_count if monitor_interval is None and slow_trigger is None else sys.maxsize
+        )
         self.module_name = module_name
         self.class_name = class_name
         self.method_name = method_name
@@ -78,6 +102,43 @@ class WatchSetting(EnterExitCommand):
             self.expand_level = None  # infinite
         self.out_q = out_q
         self.enable = True
+        self.sample_rate = sample_rate
+        self.rate_limit = rate_limit
+        self.sampler: CallSampler = CallSampler(sample_rate, rate_limit)
+        self.monitor_interval = monitor_interval
+        # None keeps the command's default overflow policy of server queue
+        self.overflow_policy = overflow_policy
+        self.monitor_stats: Optional[MethodStats] = None
+        self.monitor_reporter: Optional[MonitorReporter] = None
+        if monitor_interval is not None:
+            self.monitor_stats = MethodStats(self.method_identifier)
+            self.monitor_reporter = MonitorReporter(
+                self.monitor_stats, monitor_interval, max_count, self.finish
+            )
+        self.slow_trigger = slow_trigger
+        self.latency_trigger: Optional[LatencyTrigger] = None
+        self.dumped_slow_calls = itertools.count()
+        self.finishes = itertools.count()
+        if slow_trigger is not None:
+            self.latency_trigger = LatencyTrigger(*parse_trigger(slow_trigger))
+        self.capture_stack = capture_stack
+        # client side only, results are written to this file instead of terminal
+        self.output = output
+        # snapshot policy of invocations dumped in background, None dumps in caller thread.
+        # monitor mode only updates counters, which is cheaper than taking a snapshot
+        self.offload = offload if monitor_interval is None else None
+        self.dump_worker: Optional[DumpWorker] = None
+        if self.offload is not None:
+            self.dump_worker = DumpWorker(
+                "flight-profiler-watch-dump", self.__count_dropped
+            )
+
+    def sampled(self) -> bool:
+        """
+        unsampled invocations are skipped before filter & dump work happens,
+        must be checked before enter, which counts invocations towards limits
+        """
+        return not self.sampler.enabled or self.sampler.should_sample(self.exhausted)
 
     def import_module(self):
         if self.module_name is not None:
@@ -90,18 +151,103 @@ class WatchSetting(EnterExitCommand):
             raise Exception(f"watch setting needs method_name")
         return True
 
+    def join_group(self, leader: "WatchSetting") -> None:
+        super().join_group(leader)
+        # slow calls dumped and results queued are counted once for the whole group
+        self.dumped_slow_calls = leader.dumped_slow_calls
+        self.finishes = leader.finishes
+        self.dump_worker = leader.dump_worker
+
     def child_clear_action(self):
+        if self.monitor_reporter is not None:
+            self.monitor_reporter.stop()
         global_watch_agent.clear_auto_close(self.unique_key())
 
+    def finish(self):
+        """
+        all monitor cycles are reported, or enough slow calls are dumped
+        """
+        # every member of a group has its own monitor reporter, the first one finishes all
+        if next(self.finishes) > 0:
+            return
+        self.recover_origin_code()
+        for member in self.members:
+            member.child_clear_action()
+
     def __str__(self):
-        state = self.__dict__.copy()
-        del state["watch_displayer"]
-        del state["watch_filter"]
-        del state["out_q"]
-        del state["origin_code"]
+        # private counters of EnterExitCommand are not serializable either
+        state = {key: value for key, value in self.__dict__.items() if not key.startswith("_")}
+        for key in (
+            "watch_displayer", "watch_filter", "sampler", "monitor_stats",
+            "monitor_reporter", "out_q", "origin_code", "dump_worker",
+            "latency_trigger", "dumped_slow_calls", "finishes", "members",
+        ):
+            state.pop(key, None)
         return str(json.dumps(state))
 
+    def end_output(self):
+        if self.dump_worker is None:
+            super().end_output()
+        else:
+            # results still queued in dump worker are sent before end message
+            self.dump_worker.close(super().end_output)
+
+    def __count_dropped(self, dropped: int) -> None:
+        if self.out_q is not None:
+            self.out_q.count_dropped(dropped)
+
+    def __snapshot_args(self, args, kwargs):
+        policy = self.offload
+        return (
+            tuple(snapshot(arg, policy) for arg in args),
+            {key: snapshot(value, policy) for key, value in kwargs.items()},
+        )
+
+    def __capture_stack(self) -> Optional[str]:
+        if not self.capture_stack:
+            return None
+        # skip dump method and aop wrapper, stack ends at the caller of watched method
+        return "".join(traceback.format_stack(sys._getframe(3)))
+
+    def __dump_slow_call(self) -> None:
+        """
+        counts dumped slow calls, watch finishes once max_count calls are dumped
+        """
+        if self.latency_trigger is not None and next(self.dumped_slow_calls) == self.max_count - 1:
+            self.finish()
+
     def dump_result(self, start_ms, target_obj, time_cost, return_obj, *args, **kwargs):
+        if self.latency_trigger is not None and not self.latency_trigger.observe(time_cost):
+            return
+        stack = self.__capture_stack()
+        if self.dump_worker is not None:
+            args, kwargs = self.__snapshot_args(args, kwargs)
+            self.dump_worker.submit(
+                self.__dump_result, start_ms, target_obj, time_cost,
+                snapshot(return_obj, self.offload), args, kwargs, stack,
+            )
+            return
+        self.__dump_result(start_ms, target_obj, time_cost, return_obj, args, kwargs, stack)
+
+    def dump_error(self, start_ms, target_obj, time_cost, err_text, *args, **kwargs):
+        if self.latency_trigger is not None and not self.latency_trigger.observe(time_cost):
+            return
+        stack = self.__capture_stack()
+        if self.dump_worker is not None:
+            args, kwargs = self.__snapshot_args(args, kwargs)
+            self.dump_worker.submit(
+                self.__dump_error, start_ms, target_obj, time_cost, err_text, args, kwargs, stack,
+            )
+            return
+        self.__dump_error(start_ms, target_obj, time_cost, err_text, args, kwargs, stack)
+
+    def __dump_result(self, start_ms, target_obj, time_cost, return_obj, args, kwargs, stack=None):
+        if self.monitor_stats is not None:
+            if self.watch_filter.eval_filter(
+                target_obj, return_obj, time_cost, *args, **kwargs
+            ):
+                self.monitor_stats.record(time_cost, False)
+            return
         # filter params or return obj
         try:
             if self.watch_filter.eval_filter(
@@ -109,12 +255,13 @@ class WatchSetting(EnterExitCommand):
             ):
                 # dump watch params/return obj to json
                 json_str = self.watch_displayer.dump(
-                    start_ms, target_obj, time_cost, return_obj, *args, **kwargs
+                    start_ms, target_obj, time_cost, return_obj, args, kwargs, stack
                 )
                 if self.out_q is not None:
                     self.out_q.output_msg_nowait(
                         Message(False, json_str)
                     )
+                self.__dump_slow_call()
         except:
             if self.out_q is not None:
                 watch_result = WatchResult(
@@ -128,11 +275,17 @@ class WatchSetting(EnterExitCommand):
                 self.out_q.output_msg_nowait(
                     Message(
                         False,
-                        pickle.dumps(watch_result),
+                        encode_watch_result(watch_result),
                     )
                 )
 
-    def dump_error(self, start_ms, target_obj, time_cost, err_text, *args, **kwargs):
+    def __dump_error(self, start_ms, target_obj, time_cost, err_text, args, kwargs, stack=None):
+        if self.monitor_stats is not None:
+            if self.watch_filter.eval_filter(
+                target_obj, None, time_cost, *args, **kwargs
+            ):
+                self.monitor_stats.record(time_cost, True)
+            return
         # filter params or return obj
         try:
             if self.watch_filter.eval_filter(
@@ -140,12 +293,13 @@ class WatchSetting(EnterExitCommand):
             ):
                 # dump watch params/return obj to json
                 json_str = self.watch_displayer.dump_error(
-                    start_ms, target_obj, time_cost, err_text, *args, **kwargs
+                    start_ms, target_obj, time_cost, err_text, args, kwargs, stack
                 )
                 if self.out_q is not None:
                     self.out_q.output_msg_nowait(
                         Message(False, json_str)
                     )
+                self.__dump_slow_call()
         except:
             if self.out_q is not None:
                 watch_result = WatchResult(
@@ -159,7 +313,7 @@ class WatchSetting(EnterExitCommand):
                 self.out_q.output_msg_nowait(
                     Message(
                         False,
-                        pickle.dumps(watch_result),
+                        encode_watch_result(watch_result),
                     )
                 )
 
@@ -171,7 +325,7 @@ def wrapper_generator(watch_setting: WatchSetting):
 
             @functools.wraps(func)
             async def wrapped(*args, **kwargs):
-                if watch_setting.enter():
+                if watch_setting.sampled() and watch_setting.enter():
                     new_args = args
                     # filter class method self
                     target_obj = None
@@ -231,7 +385,7 @@ def wrapper_generator(watch_setting: WatchSetting):
 
             @functools.wraps(func)
             def wrapped(*args, **kwargs):
-                if watch_setting.enter():
+                if watch_setting.sampled() and watch_setting.enter():
                     new_args = args
                     # filter class method self
                     target_obj = None
@@ -296,27 +450,69 @@ class WatchAgent(object):
 
     def __init__(self):
         self.aop_points = dict()
+        # group leaders by group_key, off clears the methods resolved when watched
+        self.groups: Dict[str, WatchSetting] = dict()
 
     def add_watch(self, watch_setting: WatchSetting):
-        watch_setting.valid()
-        key = watch_setting.unique_key()
-        old_setting: WatchSetting = self.aop_points.get(key, None)
-        if old_setting is not None:
-            self.clear_watch(old_setting)
+        self.add_watch_group([watch_setting])
+
+    def add_watch_group(self, watch_settings: List[WatchSetting]):
+        """
+        methods matched by one pattern are watched all or none, failing to instrument
+        any of them restores those already instrumented
+        """
+        leader = watch_settings[0]
+        old_leader: WatchSetting = self.groups.get(leader.group_key(), None)
+        if old_leader is not None:
+            self.clear_watch(old_leader)
+        for watch_setting in watch_settings:
+            watch_setting.valid()
+            old_setting: WatchSetting = self.aop_points.get(watch_setting.unique_key(), None)
+            if old_setting is not None:
+                self.clear_watch(old_setting)
+
+        installed = []
+        for watch_setting in watch_settings:
+            failed_reason = self.__install(watch_setting)
+            if failed_reason is not None:
+                for member in installed:
+                    member.restore_origin_code()
+                leader.out_q.output_msg_nowait(Message(True, pickle.dumps(failed_reason)))
+                return
+            installed.append(watch_setting)
+
+        if len(watch_settings) == 1:
+            hint = build_long_spy_command_hint(
+                leader.module_name,
+                leader.class_name,
+                leader.method_name,
+                leader.nested_method
+            )
+        else:
+            hint = build_pattern_spy_command_hint(
+                [watch_setting.method_identifier for watch_setting in watch_settings]
+            )
+        leader.out_q.output_msg_nowait(Message(False, pickle.dumps(hint)))
+        self.groups[leader.group_key()] = leader
+        for watch_setting in watch_settings:
+            self.aop_points[watch_setting.unique_key()] = watch_setting
+            if watch_setting.dump_worker is not None:
+                watch_setting.dump_worker.start()
+            if watch_setting.monitor_reporter is not None:
+                watch_setting.monitor_reporter.start(watch_setting.out_q)
 
+    def __install(self, watch_setting: WatchSetting) -> Optional[str]:
+        """
+        Returns:
+            Optional[str]: failed reason, None if method is instrumented
+        """
         try:
             module = watch_setting.import_module()
         except Exception as e:
-            watch_setting.out_q.output_msg_nowait(
-                Message(
-                    True,
-                    pickle.dumps(
-                        f"{COLOR_RED}Error in locating module named "
-                        f"{COLOR_ORANGE}{watch_setting.module_name}{COLOR_END}{COLOR_RED}. Type: {type(e)}, details: {str(e)}!{COLOR_END}"
-                    ),
-                )
+            return (
+                f"{COLOR_RED}Error in locating module named "
+                f"{COLOR_ORANGE}{watch_setting.module_name}{COLOR_END}{COLOR_RED}. Type: {type(e)}, details: {str(e)}!{COLOR_END}"
             )
-            return
 
         wrapper_result: CodeWrapperResult = aop_decorator.add_func_wrapper(
             module,
@@ -330,35 +526,18 @@ class WatchAgent(object):
         )
 
         if wrapper_result.failed:
-            watch_setting.out_q.output_msg_nowait(
-                Message(
-                    True,
-                    pickle.dumps(f"{COLOR_RED}{wrapper_result.failed_reason}{COLOR_END}"),
-                )
-            )
-        else:
-            if watch_setting.nested_method is not None and wrapper_result.value.need_wrap_nested_inplace:
-                # used to construct new code at runtime
-                watch_setting.need_wrap_nested_inplace = True
-                watch_setting.nested_code_obj = wrapper_result.value.nested_code_obj
-
-            watch_setting.origin_code = wrapper_result.value
-            watch_setting.out_q.output_msg_nowait(
-                Message(
-                    False,
-                    pickle.dumps(
-                        build_long_spy_command_hint(
-                            watch_setting.module_name,
-                            watch_setting.class_name,
-                            watch_setting.method_name,
-                            watch_setting.nested_method
-                        )
-                    ),
-                )
-            )
-            self.aop_points[key] = watch_setting
+            return f"{COLOR_RED}{wrapper_result.failed_reason}{COLOR_END}"
+        if watch_setting.nested_method is not None and wrapper_result.value.need_wrap_nested_inplace:
+            # used to construct new code at runtime
+            watch_setting.need_wrap_nested_inplace = True
+            watch_setting.nested_code_obj = wrapper_result.value.nested_code_obj
+        watch_setting.origin_code = wrapper_result.value
+        return None
 
     def clear_watch(self, watch_setting: WatchSetting):
+        """
+        clears the whole group #watch_setting was added with
+        """
         watch_setting.valid()
         old_setting: WatchSetting = self.aop_points.get(watch_setting.unique_key(), None)
         if old_setting is None:
@@ -367,21 +546,32 @@ class WatchAgent(object):
                 f"not watched, will skip clear"
             )
             return None
-        self.aop_points.pop(old_setting.unique_key())
+        self.__forget_group(old_setting)
+        for member in old_setting.members:
+            self.aop_points.pop(member.unique_key(), None)
+            if member.monitor_reporter is not None:
+                member.monitor_reporter.stop()
         if old_setting.origin_code is not None:
-            module = old_setting.import_module()
-            aop_decorator.clear_func_wrapper(
-                module,
-                watch_setting.class_name,
-                watch_setting.method_name,
-                old_setting.origin_code,
-            )
-            old_setting.out_q.output_msg_nowait(Message(True, None))
+            for member in old_setting.members:
+                member.restore_origin_code()
+            old_setting.end_output()
         else:
             logger.warning(
                 f"old watch setting {old_setting.unique_key()} exists, but no origin function is stored"
             )
 
+    def clear_watch_group(self, watch_setting: WatchSetting):
+        """
+        clears the group added by the same command, a pattern isn't resolved again, so
+        exactly the methods resolved when it was watched are restored
+        """
+        leader: WatchSetting = self.groups.get(watch_setting.group_key(), None)
+        self.clear_watch(leader if leader is not None else watch_setting)
+
+    def __forget_group(self, watch_setting: WatchSetting) -> None:
+        leader = watch_setting.members[0]
+        if self.groups.get(leader.group_key(), None) is leader:
+            self.groups.pop(leader.group_key())
 
     def clear_auto_close(self, unique_key: str):
         """
@@ -394,6 +584,7 @@ class WatchAgent(object):
             )
             return None
         self.aop_points.pop(old_setting.unique_key())
+        self.__forget_group(old_setting)
 
 
 global_watch_agent = WatchAgent()
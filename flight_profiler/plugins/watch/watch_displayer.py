@@ -1,10 +1,14 @@
-import pickle
 import traceback
 from typing import Any, Optional
 
 from flight_profiler.common.dumps import encode_obj_to_transfer
 from flight_profiler.common.expression_resolver import MethodInvocationExprResolver
 from flight_profiler.common.system_logger import logger
+from flight_profiler.common.wire_format import (
+    RECORD_WATCH_RESULT,
+    RecordDecoder,
+    RecordSchema,
+)
 
 
 class WatchResult:
@@ -22,6 +26,7 @@ class WatchResult:
         filter_fail_info: Optional[str] = None,
         type: str = None,
         value: Any = None,
+        stack: Optional[str] = None,
     ):
         self.method_identifier = method_identifier
         self.cost_ms = cost_ms
@@ -34,6 +39,48 @@ class WatchResult:
         self.start_time = start_ms
         self.type = type
         self.expr = expr
+        self.stack = stack
+
+
+WATCH_RESULT_SCHEMA = RecordSchema(
+    RECORD_WATCH_RESULT,
+    (
+        ("method_identifier", "s"),
+        ("cost_ms", "d"),
+        ("is_exp", "b"),
+        ("start_time", "v"),
+        ("exception", "s"),
+        ("expr", "s"),
+        ("filter_expr", "s"),
+        ("watch_fail_info", "s"),
+        ("filter_fail_info", "s"),
+        ("type", "s"),
+        ("value", "s"),
+        ("stack", "s"),
+    ),
+)
+
+
+def encode_watch_result(result: WatchResult) -> bytes:
+    return WATCH_RESULT_SCHEMA.encode(result)
+
+
+def decode_watch_result(data: bytes) -> WatchResult:
+    decoder = RecordDecoder(data).expect(RECORD_WATCH_RESULT)
+    return WatchResult(
+        method_identifier=decoder.read_str(),
+        cost_ms=decoder.read_double(),
+        is_exp=decoder.read_bool(),
+        start_ms=decoder.read_varint(),
+        exception=decoder.read_str(),
+        expr=decoder.read_str(),
+        filter_expr=decoder.read_str(),
+        watch_fail_info=decoder.read_str(),
+        filter_fail_info=decoder.read_str(),
+        type=decoder.read_str(),
+        value=decoder.read_str(),
+        stack=decoder.read_str(),
+    )
 
 
 class WatchDisplayer(object):
@@ -48,7 +95,7 @@ class WatchDisplayer(object):
         self.raw_output = raw_output
         self.method_identifier: str = method_identifier
 
-    def dump(self, start_time, target_obj, time_cost, return_obj, *args, **kwargs):
+    def dump(self, start_time, target_obj, time_cost, return_obj, args, kwargs, stack=None):
         value = None
         failed_info = None
         try:
@@ -66,10 +113,11 @@ class WatchDisplayer(object):
             type=str(type(value)),
             value=encode_obj_to_transfer(value, self.expand_level, self.raw_output,
                                          verbose=self.verbose),
+            stack=stack,
         )
-        return pickle.dumps(watch_result)
+        return encode_watch_result(watch_result)
 
-    def dump_error(self, start_time, target_obj, time_cost, err_text, *args, **kwargs):
+    def dump_error(self, start_time, target_obj, time_cost, err_text, args, kwargs, stack=None):
         value = None
         failed_info = None
         try:
@@ -88,5 +136,6 @@ class WatchDisplayer(object):
             type=str(type(value)),
             value=encode_obj_to_transfer(value, self.expand_level, self.raw_output,
                                          verbose=self.verbose),
+            stack=stack,
         )
-        return pickle.dumps(watch_result)
+        return encode_watch_result(watch_result)
@@ -0,0 +1,166 @@
+import pickle
+import threading
+import time
+from typing import Callable, List, Optional
+
+from flight_profiler.common.enter_exit_command import mark_agent_thread
+from flight_profiler.common.latency_histogram import LatencyHistogram
+from flight_profiler.common.system_logger import logger
+from flight_profiler.plugins.server_plugin import Message, ServerQueue
+
+MONITOR_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class MonitorSummary:
+    """
+    compact statistics of one monitor cycle, sent to client instead of per call results
+    """
+
+    def __init__(
+        self,
+        method_identifier: str,
+        start_ms: int,
+        end_ms: int,
+        count: int,
+        error_count: int,
+        total_ms: float,
+        min_ms: float,
+        max_ms: float,
+        histogram: LatencyHistogram,
+    ):
+        self.method_identifier = method_identifier
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.count = count
+        self.error_count = error_count
+        self.total_ms = total_ms
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.histogram = histogram
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.count if self.count > 0 else 0
+
+    @property
+    def error_rate(self) -> float:
+        return self.error_count / self.count if self.count > 0 else 0
+
+    def percentile_ms(self, quantile: float) -> float:
+        # bucket upper bound may exceed the exact max latency observed
+        return min(self.histogram.percentile_ms(quantile), self.max_ms)
+
+    @staticmethod
+    def merge(summaries: List["MonitorSummary"]) -> "MonitorSummary":
+        """
+        combine summaries of the same cycle reported by different processes
+        """
+        histogram = LatencyHistogram()
+        for summary in summaries:
+            histogram.merge(summary.histogram)
+        observed = [summary for summary in summaries if summary.count > 0]
+        return MonitorSummary(
+            method_identifier=summaries[0].method_identifier,
+            start_ms=min(summary.start_ms for summary in summaries),
+            end_ms=max(summary.end_ms for summary in summaries),
+            count=sum(summary.count for summary in summaries),
+            error_count=sum(summary.error_count for summary in summaries),
+            total_ms=sum(summary.total_ms for summary in summaries),
+            min_ms=min((summary.min_ms for summary in observed), default=0),
+            max_ms=max((summary.max_ms for summary in observed), default=0),
+            histogram=histogram,
+        )
+
+
+class MethodStats:
+    """
+    in-process counters of a monitored method, updated by aop wrapper on every invocation
+    """
+
+    def __init__(self, method_identifier: str):
+        self.method_identifier = method_identifier
+        self.lock = threading.Lock()
+        self.__reset(int(time.time() * 1000))
+
+    def __reset(self, start_ms: int) -> None:
+        self.start_ms = start_ms
+        self.count = 0
+        self.error_count = 0
+        self.total_ms = 0.0
+        self.min_ms = float("inf")
+        self.max_ms = 0.0
+        self.histogram = LatencyHistogram()
+
+    def record(self, cost_ms: float, is_exp: bool) -> None:
+        with self.lock:
+            self.count += 1
+            if is_exp:
+                self.error_count += 1
+            self.total_ms += cost_ms
+            if cost_ms < self.min_ms:
+                self.min_ms = cost_ms
+            if cost_ms > self.max_ms:
+                self.max_ms = cost_ms
+            self.histogram.record_ms(cost_ms)
+
+    def snapshot_and_reset(self) -> MonitorSummary:
+        end_ms = int(time.time() * 1000)
+        with self.lock:
+            summary = MonitorSummary(
+                method_identifier=self.method_identifier,
+                start_ms=self.start_ms,
+                end_ms=end_ms,
+                count=self.count,
+                error_count=self.error_count,
+                total_ms=self.total_ms,
+                min_ms=self.min_ms if self.count > 0 else 0,
+                max_ms=self.max_ms,
+                histogram=self.histogram,
+            )
+            self.__reset(end_ms)
+        return summary
+
+
+class MonitorReporter:
+    """
+    pushes a MonitorSummary to client every #interval seconds, at most #cycles times
+    """
+
+    def __init__(
+        self,
+        stats: MethodStats,
+        interval: float,
+        cycles: int,
+        on_finished: Optional[Callable[[], None]] = None,
+    ):
+        self.stats = stats
+        self.interval = interval
+        self.cycles = cycles
+        self.on_finished = on_finished
+        self.out_q: Optional[ServerQueue] = None
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self, out_q: ServerQueue) -> None:
+        self.out_q = out_q
+        self.thread = threading.Thread(
+            target=self.__run, name="flight-profiler-monitor", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def __run(self) -> None:
+        mark_agent_thread()
+        reported = 0
+        while reported < self.cycles and not self.stop_event.wait(self.interval):
+            try:
+                summary = self.stats.snapshot_and_reset()
+                self.out_q.output_msg_nowait(Message(False, pickle.dumps(summary)))
+            except:
+                logger.exception("[MonitorReporter] report summary failed.")
+            reported += 1
+        if not self.stop_event.is_set() and self.on_finished is not None:
+            self.on_finished()
+
@@ -1,9 +1,21 @@
 import argparse
 from argparse import RawTextHelpFormatter
+from typing import List
 
+from flight_profiler.common.call_sampler import parse_rate
+from flight_profiler.common.dump_worker import SNAPSHOT_POLICIES
+from flight_profiler.common.method_pattern import (
+    MAX_PATTERN_TARGETS,
+    check_max_targets,
+    is_method_pattern,
+    resolve_method_pattern,
+)
 from flight_profiler.help_descriptions import WATCH_COMMAND_DESCRIPTION
+from flight_profiler.plugins.server_plugin import OVERFLOW_POLICIES
 from flight_profiler.plugins.watch import watch_agent
+from flight_profiler.plugins.watch.watch_trigger import parse_trigger
 from flight_profiler.utils.args_util import rewrite_args
+from flight_profiler.utils.record_file import check_output_path
 
 
 def check_expand(value):
@@ -19,6 +31,42 @@ def check_expand(value):
         raise argparse.ArgumentTypeError(f"{value} is not a integer between 1 and 4.")
 
 
+def check_sample(value):
+    try:
+        f_value = float(value)
+    except:
+        raise argparse.ArgumentTypeError(f"sample: {value} is not a float.")
+    if f_value <= 0 or f_value > 1:
+        raise argparse.ArgumentTypeError(f"sample: {value} should be in range (0, 1].")
+    return f_value
+
+
+def check_monitor(value):
+    try:
+        f_value = float(value)
+    except:
+        raise argparse.ArgumentTypeError(f"monitor: {value} is not a number.")
+    if f_value <= 0:
+        raise argparse.ArgumentTypeError(f"monitor: {value} should be positive.")
+    return f_value
+
+
+def check_slow(value):
+    try:
+        parse_trigger(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def check_rate(value):
+    try:
+        parse_rate(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
 class WatchArgumentParser(argparse.ArgumentParser):
 
     def __init__(self):
@@ -73,21 +121,133 @@ class WatchArgumentParser(argparse.ArgumentParser):
             required=False,
             type=int,
             default=10,
-            help="max display count",
+            help="max display count, or max report cycles in monitor mode",
+        )
+        self.add_argument(
+            "--sample",
+            required=False,
+            type=check_sample,
+            default=None,
+            help="sampling probability of method invocation, in range (0, 1].",
+        )
+        self.add_argument(
+            "--rate",
+            required=False,
+            type=check_rate,
+            default=None,
+            help="rate limit of watched invocations, like 5/s, 100/m.",
+        )
+        self.add_argument(
+            "--monitor",
+            required=False,
+            type=check_monitor,
+            default=None,
+            help="report aggregated latency statistics every #value seconds instead of each invocation.",
+        )
+        self.add_argument(
+            "--overflow",
+            required=False,
+            choices=OVERFLOW_POLICIES,
+            default=None,
+            help="what to do with results when client can't keep up, default is drop-oldest.",
+        )
+        self.add_argument(
+            "--offload",
+            required=False,
+            choices=SNAPSHOT_POLICIES,
+            default=None,
+            help="evaluate and serialize results in background, objects are referenced or shallow copied.",
+        )
+        self.add_argument(
+            "--slow",
+            required=False,
+            type=check_slow,
+            default=None,
+            help="only dump calls slower than a percentile of recent calls like p99, or a multiple of median like 3x.",
+        )
+        self.add_argument(
+            "--stack",
+            required=False,
+            action="store_true",
+            help="dump the call stack of watched method too.",
+        )
+        self.add_argument(
+            "--max-targets",
+            required=False,
+            type=check_max_targets,
+            default=MAX_PATTERN_TARGETS,
+            help=f"max methods a glob or re: pattern may match, default is {MAX_PATTERN_TARGETS}.",
+        )
+        self.add_argument(
+            "--output",
+            required=False,
+            type=check_output_path,
+            default=None,
+            help="write results to a .ndjson or .bin file, optionally .gz compressed, instead of terminal.",
         )
 
     def error(self, message):
         raise Exception(message)
 
-    def parse_watch_setting(self, arg_string: str):
+    def parse_watch_setting(self, arg_string: str) -> watch_agent.WatchSetting:
+        """
+        parse without resolving patterns, validates the command on client side and
+        identifies the group to turn off on server side
+        """
+        args = self.__parse_args(arg_string)
+        return self.__build_watch_setting(
+            args, getattr(args, "pkg"), getattr(args, "cls"), getattr(args, "func")
+        )
+
+    def parse_watch_settings(self, arg_string: str) -> List[watch_agent.WatchSetting]:
+        """
+        used by server, a command with glob or regex names is expanded to one setting
+        per matched method, all of them in one group led by the first one
+
+        Raises:
+            ValueError: if pattern matches no method, or too many methods
+        """
+        args = self.__parse_args(arg_string)
+        module_name, class_name, method_name = (
+            getattr(args, "pkg"), getattr(args, "cls"), getattr(args, "func")
+        )
+        if not is_method_pattern(module_name, class_name, method_name):
+            return [self.__build_watch_setting(args, module_name, class_name, method_name)]
+        if getattr(args, "nested_method") is not None:
+            raise argparse.ArgumentError(None, "--nested-method can't be used with pattern")
+        targets = resolve_method_pattern(
+            module_name, class_name, method_name, getattr(args, "max_targets")
+        )
+        pattern_key = self.__build_watch_setting(
+            args, module_name, class_name, method_name
+        ).unique_key()
+        watch_settings = [
+            self.__build_watch_setting(
+                args, target.module_name, target.class_name, target.method_name
+            )
+            for target in targets
+        ]
+        watch_settings[0].pattern_key = pattern_key
+        for watch_setting in watch_settings[1:]:
+            watch_setting.join_group(watch_settings[0])
+        return watch_settings
+
+    def __parse_args(self, arg_string: str) -> argparse.Namespace:
         new_args = rewrite_args(
             arg_string, unspec_names=["pkg", "cls", "func"], omit_column="cls"
         )
         args = self.parse_args(args=new_args)
-        watch_setting = watch_agent.WatchSetting(
-            module_name=getattr(args, "pkg"),
-            class_name=getattr(args, "cls"),
-            method_name=getattr(args, "func"),
+        if getattr(args, "slow") is not None and getattr(args, "monitor") is not None:
+            raise argparse.ArgumentError(None, "--slow can't be used with --monitor")
+        return args
+
+    def __build_watch_setting(
+        self, args: argparse.Namespace, module_name: str, class_name: str, method_name: str
+    ) -> watch_agent.WatchSetting:
+        return watch_agent.WatchSetting(
+            module_name=module_name,
+            class_name=class_name,
+            method_name=method_name,
             nested_method=getattr(args, "nested_method"),
             watch_expr=getattr(args, "expr"),
             raw_output=getattr(args, "raw"),
@@ -96,5 +256,12 @@ class WatchArgumentParser(argparse.ArgumentParser):
             expand_level=getattr(args, "expand"),
             verbose=getattr(args, "verbose"),
             max_count=getattr(args, "limits"),
+            sample_rate=getattr(args, "sample"),
+            rate_limit=getattr(args, "rate"),
+            monitor_interval=getattr(args, "monitor"),
+            overflow_policy=getattr(args, "overflow"),
+            offload=getattr(args, "offload"),
+            slow_trigger=getattr(args, "slow"),
+            capture_stack=getattr(args, "stack"),
+            output=getattr(args, "output"),
         )
-        return watch_setting
@@ -1,4 +1,8 @@
 from flight_profiler.plugins.watch.watch_displayer import WatchResult
+from flight_profiler.plugins.watch.watch_monitor import (
+    MONITOR_QUANTILES,
+    MonitorSummary,
+)
 from flight_profiler.utils.render_util import (
     COLOR_BOLD,
     COLOR_END,
@@ -39,7 +43,7 @@ class WatchRender:
             value_str += f"{COLOR_WHITE_255}}}{COLOR_END}"
             return f"{title}{value_str}"
 
-        if result.exception is None:
+        if result.exception is None and result.stack is None:
             left_offset = 8
         else:
             left_offset = 12
@@ -54,6 +58,11 @@ class WatchRender:
                 f"{COLOR_WHITE_255}  {'EXCEPTION:'.ljust(left_offset)}{COLOR_END}"
                 f"{COLOR_RED}{align_json_lines(left_offset + 2, result.exception, True)}{COLOR_END}\n"
             )
+        if result.stack is not None:
+            value_str += (
+                f"{COLOR_WHITE_255}  {'STACK:'.ljust(left_offset)}"
+                f"{align_json_lines(left_offset + 2, result.stack, True)}{COLOR_END}\n"
+            )
         value_str += f"{COLOR_WHITE_255}}}{COLOR_END}"
         return f"{title}{value_str}"
 
@@ -64,3 +73,16 @@ class WatchRender:
             f" cost={formated_cost}ms is_exp={COLOR_BOLD}{COLOR_RED if result.is_exp else COLOR_GREEN}{result.is_exp}{COLOR_END}{COLOR_WHITE_255}"
             f" result={{{COLOR_END}\n"
         )
+
+    def show_monitor_summary(self, summary: MonitorSummary):
+        percentiles = " ".join(
+            f"p{str(q * 100).rstrip('0').rstrip('.').replace('.', '')}={summary.percentile_ms(q):.3f}ms"
+            for q in MONITOR_QUANTILES
+        )
+        return (
+            f"{COLOR_WHITE_255}{time_ms_to_formatted_string(summary.end_ms)} method={summary.method_identifier}"
+            f" total={summary.count} fail={COLOR_RED if summary.error_count > 0 else COLOR_GREEN}{summary.error_count}"
+            f"{COLOR_END}{COLOR_WHITE_255} fail-rate={summary.error_rate * 100:.2f}%"
+            f" avg={summary.mean_ms:.3f}ms min={summary.min_ms:.3f}ms max={summary.max_ms:.3f}ms"
+            f" {percentiles}{COLOR_END}"
+        )
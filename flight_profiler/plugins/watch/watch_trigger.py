@@ -0,0 +1,73 @@
+import re
+from typing import Tuple
+
+from flight_profiler.common.latency_histogram import LatencyHistogram
+
+# calls observed before any call is considered slow
+TRIGGER_WARMUP = 100
+# calls per histogram window, threshold follows the latest one or two windows
+TRIGGER_WINDOW = 10000
+# calls between two threshold updates, percentile lookup is too costly for every call
+TRIGGER_REFRESH = 128
+
+_PERCENTILE_PATTERN = re.compile(r"^p(\d+(\.\d+)?)$")
+_MULTIPLE_PATTERN = re.compile(r"^(\d+(\.\d+)?)x$")
+
+
+def parse_trigger(value: str) -> Tuple[float, float]:
+    """
+    parse "p99" / "p99.9" as percentile of recent latency, "3x" as 3 times of recent median
+
+    Returns:
+        Tuple[float, float]: (quantile, multiplier)
+
+    Raises:
+        ValueError: if #value is malformed
+    """
+    text = value.strip().lower()
+    match = _PERCENTILE_PATTERN.match(text)
+    if match is not None:
+        percent = float(match.group(1))
+        if not 0 < percent < 100:
+            raise ValueError(f"slow: percentile {value} should be in range (p0, p100).")
+        return percent / 100, 1.0
+    match = _MULTIPLE_PATTERN.match(text)
+    if match is not None:
+        multiplier = float(match.group(1))
+        if multiplier <= 0:
+            raise ValueError(f"slow: multiplier {value} should be positive.")
+        return 0.5, multiplier
+    raise ValueError(f"slow: {value} should be like p99, p99.9 or 3x.")
+
+
+class LatencyTrigger:
+    """
+    Streaming latency estimate of a watched method, a call is slow if it costs more than
+    the configured percentile (times multiplier) of calls observed before it.
+    Histograms are updated without lock, counts lost by concurrent calls only blur the estimate.
+    """
+
+    def __init__(self, quantile: float, multiplier: float = 1.0):
+        self.quantile = quantile
+        self.multiplier = multiplier
+        self.current = LatencyHistogram()
+        self.previous = LatencyHistogram()
+        self.threshold_ms = float("inf")
+        self.observed = 0
+
+    def observe(self, cost_ms: float) -> bool:
+        slow = cost_ms > self.threshold_ms
+        self.current.record_ms(cost_ms)
+        self.observed += 1
+        if self.observed % TRIGGER_REFRESH == 0:
+            self.__refresh()
+        return slow
+
+    def __refresh(self) -> None:
+        recent = LatencyHistogram(dict(self.previous.buckets)).merge(self.current)
+        if recent.count >= TRIGGER_WARMUP:
+            self.threshold_ms = recent.percentile_ms(self.quantile) * self.multiplier
+        if self.current.count >= TRIGGER_WINDOW:
+            # forget latency older than two windows, so threshold adapts to load changes
+            self.previous = self.current
+            self.current = LatencyHistogram()
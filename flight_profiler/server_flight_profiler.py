@@ -1,4 +1,5 @@
 import asyncio
+import atexit
 import importlib
 import json
 import os
@@ -6,11 +7,20 @@ import traceback
 from asyncio import Queue
 from asyncio.exceptions import CancelledError
 from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 from flight_profiler.common.system_logger import logger
+from flight_profiler.communication.agent_registry import (
+    AgentRecord,
+    publish_agent_record,
+    remove_agent_runtime_file,
+)
 from flight_profiler.communication.flight_server import FlightServer
 from flight_profiler.plugins.server_plugin import (
+    OVERFLOW_BLOCK,
+    OVERFLOW_DROP_NEWEST,
+    OVERFLOW_DROP_OLDEST,
+    OVERFLOW_SAMPLE,
     InteractiveServerPlugin,
     Message,
     ServerPlugin,
@@ -19,6 +29,19 @@ from flight_profiler.plugins.server_plugin import (
 
 _global_task_executor = ThreadPoolExecutor(max_workers=200, thread_name_prefix="flight-profiler-worker-")
 
+# messages buffered for a slow client before overflow policy applies
+OUTPUT_QUEUE_SIZE = 1000
+# messages written to socket with a single drain
+OUTPUT_BATCH_SIZE = 256
+# streaming commands may lose output when client is slow, the others
+# produce bounded output and rather wait for the client, see ServerQueue
+OVERFLOW_POLICY_OF_COMMAND = {
+    "trace": OVERFLOW_SAMPLE,
+    "watch": OVERFLOW_DROP_OLDEST,
+    "tt": OVERFLOW_DROP_NEWEST,
+}
+
+
 def do_action_background(current_plugin: ServerPlugin, param: str):
     async def async_run():
         await current_plugin.do_action(param)
@@ -39,50 +62,74 @@ def status(ignored: str) -> Dict[str, str]:
 
 class FlightProfilerServer(FlightServer):
 
-    def __init__(self, host: str, port: int) -> None:
+    def __init__(self, host: str, port: int, unix_socket_path: Optional[str] = None) -> None:
         super().__init__({"console": True})
         self.special_method_dispatcher = {"status": status}
         self.host = host
         self.port = port
+        self.unix_socket_path = unix_socket_path
 
     async def run(self):
-        await super().start_server(self.host, self.port)
+        await super().start_server(self.host, self.port, self.unix_socket_path)
+
+    def on_listening(self) -> None:
+        record = AgentRecord(
+            pid=os.getpid(),
+            port=self.port,
+            unix_socket_path=self.unix_listen_path,
+        )
+        try:
+            record_path = publish_agent_record(record)
+        except OSError:
+            # cli falls back to scanning ports
+            logger.exception("[PyFlightProfiler] publish agent record failed.")
+            return
+        atexit.register(remove_agent_runtime_file, record_path)
 
     async def execute_plugin(
         self, cmd: str, param: str, writer: asyncio.StreamWriter
     ) -> None:
         module_name = "flight_profiler.plugins." + cmd + ".server_plugin_" + cmd
         module = importlib.import_module(module_name)
-        out_q = Queue(maxsize=200)
         loop = asyncio.get_event_loop()
-        current_plugin: ServerPlugin = module.get_instance(
-            cmd, ServerQueue(out_q, loop)
+        server_q = ServerQueue(
+            Queue(maxsize=OUTPUT_QUEUE_SIZE),
+            loop,
+            overflow_policy=OVERFLOW_POLICY_OF_COMMAND.get(cmd, OVERFLOW_BLOCK),
         )
+        current_plugin: ServerPlugin = module.get_instance(cmd, server_q)
         # do action in background
         _global_task_executor.submit(do_action_background, current_plugin, param)
 
-        async def iter_data():
+        async def iter_batches():
             while True:
                 try:
                     # unit: seconds
-                    msg: Optional[Message] = await out_q.get()
-                    if msg is None:
-                        continue
-                    if msg.msg is not None:
-                        yield msg.msg
-                    if msg.is_end:
-                        return
+                    msg: Optional[Message] = await server_q.get()
+                    batch: List[bytes] = []
+                    while True:
+                        if msg is not None and msg.msg is not None:
+                            content = msg.msg
+                            batch.append(
+                                content if type(content) is bytes else content.encode("utf-8")
+                            )
+                        if msg is not None and msg.is_end:
+                            yield batch
+                            return
+                        if server_q.empty() or len(batch) >= OUTPUT_BATCH_SIZE:
+                            break
+                        msg = server_q.get_nowait()
+                    if len(batch) > 0:
+                        yield batch
                 except CancelledError:
-                    pass
+                    # stream cancelled by client session
+                    raise
                 except:
                     logger.error(traceback.format_exc())
                     continue
 
-        async for content in iter_data():
-            if type(content) is bytes:
-                await super().send(content, writer)
-            else:
-                await super().send(content.encode("utf-8"), writer)
+        async for batch in iter_batches():
+            await super().send_batch(batch, writer)
 
     async def execute_plugin_interactively(
         self,
@@ -93,18 +140,19 @@ class FlightProfilerServer(FlightServer):
     ) -> None:
         module_name = "flight_profiler.plugins." + cmd + ".server_plugin_" + cmd
         module = importlib.import_module(module_name)
-        out_q = Queue(maxsize=200)
+        server_q = ServerQueue(
+            Queue(maxsize=200), asyncio.get_event_loop(), overflow_policy=OVERFLOW_BLOCK
+        )
         in_q = Queue(maxsize=200)
-        loop = asyncio.get_event_loop()
         current_plugin: InteractiveServerPlugin = module.get_instance(
-            cmd, in_q, ServerQueue(out_q, loop)
+            cmd, in_q, server_q
         )
         # do action in background
         _global_task_executor.submit(do_action_background_no_params, current_plugin)
 
         try:
             while True:
-                msg: Optional[Message] = await out_q.get()
+                msg: Optional[Message] = await server_q.get()
                 if msg is None:
                     break
                 # interactive cmd output must be str now
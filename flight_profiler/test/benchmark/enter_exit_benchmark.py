@@ -0,0 +1,85 @@
+"""
+Micro-benchmark of the per-call guard run by watch, trace, tt and torch wrappers.
+
+Compares the current EnterExitCommand.enter against the legacy guard which walked
+two frames and searched the caller's filename on every invocation.
+
+usage: python -m flight_profiler.test.benchmark.enter_exit_benchmark
+"""
+
+import sys
+import timeit
+
+from flight_profiler.common.enter_exit_command import EnterExitCommand
+
+ROUNDS = 200000
+REPEAT = 5
+
+
+class LegacyEnterExitCommand(EnterExitCommand):
+    """
+    frame walking guard with a plain counter, kept here only as benchmark baseline
+    """
+
+    def __init__(self, limit: int):
+        super().__init__(limit)
+        self.count = 0
+
+    def enter(self) -> bool:
+        self_injected: bool = False
+        try:
+            f = sys._getframe().f_back.f_back
+            if f is None or (
+                "flight_profiler" in f.f_code.co_filename
+                and "test" not in f.f_code.co_filename
+            ):
+                self_injected = True
+        except:
+            self_injected = True
+        if self_injected:
+            return False
+
+        if self.count < self.limit:
+            self.count += 1
+            return True
+        else:
+            return False
+
+
+def target(x):
+    return x
+
+
+def wrap(cmd: EnterExitCommand):
+    def wrapped(*args, **kwargs):
+        if cmd.enter():
+            return target(*args, **kwargs)
+        return target(*args, **kwargs)
+
+    return wrapped
+
+
+def bench(func, rounds: int) -> float:
+    """
+    returns per call cost in nanoseconds, best of #REPEAT runs to filter out noise
+    """
+    total = min(timeit.repeat(lambda: func(1), number=rounds, repeat=REPEAT))
+    return total / rounds * 1_000_000_000
+
+
+def main():
+    baseline_ns = bench(target, ROUNDS)
+    rows = [
+        ("exhausted, legacy", wrap(LegacyEnterExitCommand(0))),
+        ("exhausted", wrap(EnterExitCommand(0))),
+        ("counting, legacy", wrap(LegacyEnterExitCommand(sys.maxsize))),
+        ("counting", wrap(EnterExitCommand(sys.maxsize))),
+    ]
+    print(f"{'unwrapped call':<20}: {baseline_ns:.1f} ns/call")
+    for name, func in rows:
+        overhead_ns = bench(func, ROUNDS) - baseline_ns
+        print(f"{name:<20}: +{overhead_ns:.1f} ns/call")
+
+
+if __name__ == "__main__":
+    main()
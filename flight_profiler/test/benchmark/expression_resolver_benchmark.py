@@ -0,0 +1,58 @@
+"""
+Micro-benchmark of per-call filter expression cost.
+
+Compares the compiled expression engine against the legacy way of exec'ing the
+generated function source on every invocation.
+
+usage: python -m flight_profiler.test.benchmark.expression_resolver_benchmark
+"""
+
+import timeit
+
+from flight_profiler.common.expression_resolver import FilterExprResolver
+
+FILTER_EXPR = "cost > 50 and args[0]['query'] == 'hello'"
+ROUNDS = 100000
+
+
+class LegacyFilterExprResolver:
+    """
+    exec based resolver, kept here only as benchmark baseline
+    """
+
+    def __init__(self, expr: str):
+        self.expr = expr
+        self.code = (
+            f"def expr_func_legacy(target, return_obj, cost, *args, **kwargs): return {expr}"
+        )
+
+    def eval_filter(self, target_obj, return_obj, cost, *args, **kwargs):
+        namespace = {}
+        exec(self.code, globals(), namespace)
+        return bool(
+            namespace["expr_func_legacy"](target_obj, return_obj, cost, *args, **kwargs)
+        )
+
+
+def bench(resolver, rounds: int) -> float:
+    """
+    returns per call cost in microseconds
+    """
+    args = ({"query": "hello"},)
+    total = timeit.timeit(
+        lambda: resolver.eval_filter(None, None, 60, *args), number=rounds
+    )
+    return total / rounds * 1_000_000
+
+
+def main():
+    legacy_us = bench(LegacyFilterExprResolver(FILTER_EXPR), ROUNDS // 10)
+    compiled_us = bench(FilterExprResolver(FILTER_EXPR), ROUNDS)
+    print(f"filter expression: {FILTER_EXPR}")
+    print(f"exec per call : {legacy_us:.3f} us/call")
+    print(f"compiled once : {compiled_us:.3f} us/call")
+    print(f"speedup       : {legacy_us / compiled_us:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Round-trip latency of a command on a fresh connection versus a shared session,
+over tcp and, on linux, over the agent's unix domain socket.
+
+Starts an in-process flight server and issues the `status` special call, which
+does no plugin work, so the numbers are dominated by transport and dispatch cost.
+
+usage: python -m flight_profiler.test.benchmark.flight_session_benchmark
+"""
+
+import os
+import time
+from typing import Union
+
+from flight_profiler.communication.flight_client import FlightClient
+from flight_profiler.communication.flight_session import FlightSession
+from flight_profiler.communication.unix_socket import (
+    prepare_agent_socket_path,
+    remove_agent_socket_path,
+    unix_socket_enabled,
+)
+from flight_profiler.test.communication.flight_session_test import start_server
+
+STATUS_REQUEST = {"target": "status", "is_plugin_calling": False}
+ROUNDS = 2000
+
+
+def bench_connection_per_request(port: Union[int, str], rounds: int) -> float:
+    """
+    returns per request cost in microseconds
+    """
+    start = time.perf_counter()
+    for _ in range(rounds):
+        client = FlightClient("localhost", port)
+        client.request(STATUS_REQUEST)
+        client.close()
+    return (time.perf_counter() - start) / rounds * 1_000_000
+
+
+def bench_session(port: Union[int, str], rounds: int) -> float:
+    session = FlightSession("localhost", port)
+    try:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            stream = session.open_stream()
+            stream.request(STATUS_REQUEST)
+            stream.close()
+        return (time.perf_counter() - start) / rounds * 1_000_000
+    finally:
+        session.close()
+
+
+def main():
+    socket_path = prepare_agent_socket_path(os.getpid()) if unix_socket_enabled() else None
+    port = start_server(socket_path)
+    per_connection_us = bench_connection_per_request(port, ROUNDS // 4)
+    session_us = bench_session(port, ROUNDS)
+    print(f"connection per request : {per_connection_us:.1f} us/request")
+    print(f"shared session         : {session_us:.1f} us/request")
+    print(f"speedup                : {per_connection_us / session_us:.1f}x")
+    if socket_path is None:
+        return
+    unix_per_connection_us = bench_connection_per_request(socket_path, ROUNDS // 4)
+    unix_session_us = bench_session(socket_path, ROUNDS)
+    print(f"unix socket connection : {unix_per_connection_us:.1f} us/request")
+    print(f"unix socket session    : {unix_session_us:.1f} us/request")
+    remove_agent_socket_path(socket_path)
+
+
+if __name__ == "__main__":
+    main()
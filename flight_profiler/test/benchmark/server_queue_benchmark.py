@@ -0,0 +1,71 @@
+"""
+Micro-benchmark of pushing command output from a profiled thread to the event loop.
+
+Compares the batching ServerQueue against the legacy way of scheduling one
+coroutine per message with asyncio.run_coroutine_threadsafe.
+
+usage: python -m flight_profiler.test.benchmark.server_queue_benchmark
+"""
+
+import asyncio
+import threading
+import time
+from asyncio import Queue
+
+from flight_profiler.plugins.server_plugin import Message, ServerQueue
+
+MESSAGES = 50000
+
+
+class LegacyServerQueue:
+    """
+    one coroutine and future per message, kept here only as benchmark baseline
+    """
+
+    def __init__(self, out_q: Queue, loop: asyncio.AbstractEventLoop):
+        self.out_q = out_q
+        self.loop = loop
+
+    def output_msg_nowait(self, msg: Message):
+        asyncio.run_coroutine_threadsafe(self.out_q.put(msg), self.loop)
+
+
+def bench(queue_cls) -> float:
+    """
+    returns producer side cost per message in microseconds
+    """
+    loop = asyncio.new_event_loop()
+    out_q = Queue(maxsize=MESSAGES + 1)
+    server_q = queue_cls(out_q, loop)
+    cost = []
+
+    def produce():
+        start = time.perf_counter()
+        for i in range(MESSAGES):
+            server_q.output_msg_nowait(Message(False, b"x"))
+        server_q.output_msg_nowait(Message(True, None))
+        cost.append(time.perf_counter() - start)
+
+    async def consume():
+        while not (await out_q.get()).is_end:
+            pass
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    loop.run_until_complete(consume())
+    producer.join()
+    loop.close()
+    return cost[0] / MESSAGES * 1_000_000
+
+
+def main():
+    legacy_us = bench(LegacyServerQueue)
+    batched_us = bench(ServerQueue)
+    print(f"messages      : {MESSAGES}")
+    print(f"per message   : {legacy_us:.3f} us/msg")
+    print(f"batched       : {batched_us:.3f} us/msg")
+    print(f"speedup       : {legacy_us / batched_us:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
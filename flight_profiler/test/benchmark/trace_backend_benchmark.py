@@ -0,0 +1,119 @@
+"""
+Overhead of the trace backends on a call heavy workload: the profile hook installed by
+set_trace_profile against sys.monitoring events of set_trace_monitoring (Python 3.12+).
+Both run with the default 0.1ms interval, so nearly all frames are discarded, and the
+cost of a second thread running the workload while the invocation is traced is shown too.
+
+usage: python -m flight_profiler.test.benchmark.trace_backend_benchmark
+"""
+
+import sys
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+from flight_profiler.ext.trace_profile_C import (
+    release_trace_monitoring,
+    remove_trace_profile,
+    set_trace_monitoring,
+    set_trace_profile,
+)
+
+INTERVAL_NS = 100000
+WORKLOAD_SIZE = 2000
+REPEAT = 10
+
+
+def leaf(value: int) -> int:
+    return abs(value) + len(str(value))
+
+
+def branch(value: int) -> int:
+    total = 0
+    for i in range(10):
+        total += leaf(value + i)
+    return total
+
+
+def workload() -> int:
+    """
+    11 python and 31 c calls per branch
+    """
+    return sum(branch(i) for i in range(WORKLOAD_SIZE))
+
+
+def discard_frames(out_q: Any, frames: List[str]) -> None:
+    pass
+
+
+def traced(set_trace: Optional[Callable]) -> float:
+    """
+    returns cost of one traced workload in milliseconds, best of #REPEAT runs
+    """
+    best = float("inf")
+    for _ in range(REPEAT):
+        s = time.perf_counter()
+        profiler = None
+        if set_trace is not None:
+            profiler = set_trace(discard_frames, object(), INTERVAL_NS, False, 0)
+        try:
+            workload()
+        finally:
+            if set_trace is not None:
+                remove_trace_profile(profiler)
+        best = min(best, time.perf_counter() - s)
+    return best * 1000
+
+
+def untraced_thread(set_trace: Optional[Callable]) -> float:
+    """
+    cost of the workload in a thread that isn't traced while another one is
+    """
+    started = threading.Event()
+    finished = threading.Event()
+
+    def trace_forever():
+        profiler = set_trace(discard_frames, object(), INTERVAL_NS, False, 0)
+        started.set()
+        finished.wait()
+        remove_trace_profile(profiler)
+
+    thread = None
+    if set_trace is not None:
+        thread = threading.Thread(target=trace_forever)
+        thread.start()
+        started.wait()
+    try:
+        return traced(None)
+    finally:
+        finished.set()
+        if thread is not None:
+            thread.join()
+
+
+def main():
+    backends = [("profile hook", set_trace_profile)]
+    if sys.version_info >= (3, 12):
+        backends.append(("sys.monitoring", set_trace_monitoring))
+    else:
+        print("sys.monitoring needs Python 3.12+, only the profile hook is measured")
+
+    baseline_ms = traced(None)
+    print(f"{'untraced':<20}: {baseline_ms:.2f} ms/workload")
+    for name, set_trace in backends:
+        cost_ms = traced(set_trace)
+        print(
+            f"{name:<20}: {cost_ms:.2f} ms/workload, "
+            f"+{(cost_ms / baseline_ms - 1) * 100:.0f}%"
+        )
+    for name, set_trace in backends:
+        cost_ms = untraced_thread(set_trace)
+        print(
+            f"{name + ', other thread':<20}: {cost_ms:.2f} ms/workload, "
+            f"+{(cost_ms / baseline_ms - 1) * 100:.0f}%"
+        )
+    release_trace_monitoring()
+
+
+if __name__ == "__main__":
+    main()
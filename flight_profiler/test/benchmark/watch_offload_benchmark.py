@@ -0,0 +1,49 @@
+"""
+Micro-benchmark of the latency watch adds to the watched call when results are dumped.
+
+Compares dumping in the caller thread against --offload ref/copy, which only take a
+snapshot before handing expression evaluation and encoding to the dump worker.
+
+usage: python -m flight_profiler.test.benchmark.watch_offload_benchmark
+"""
+
+import threading
+import timeit
+
+from flight_profiler.plugins.watch.watch_parser import WatchArgumentParser
+
+ROUNDS = 500
+REQUEST = {
+    "query": "hello",
+    "items": [{"id": i, "name": f"item-{i}", "tags": ["a", "b"]} for i in range(200)],
+}
+
+
+def bench(offload: str) -> float:
+    """
+    returns caller side cost of dump_result in microseconds
+    """
+    cmd = "__main__ handler --expr args -x 4"
+    if offload is not None:
+        cmd += f" --offload {offload}"
+    watch_setting = WatchArgumentParser().parse_watch_setting(cmd)
+    if watch_setting.dump_worker is not None:
+        watch_setting.dump_worker.start()
+    total = timeit.timeit(
+        lambda: watch_setting.dump_result(0, None, 1.0, None, REQUEST), number=ROUNDS
+    )
+    if watch_setting.dump_worker is not None:
+        closed = threading.Event()
+        watch_setting.dump_worker.close(closed.set)
+        closed.wait()
+    return total / ROUNDS * 1_000_000
+
+
+def main():
+    print(f"{'caller thread':<15}: {bench(None):.1f} us/call")
+    print(f"{'offload ref':<15}: {bench('ref'):.1f} us/call")
+    print(f"{'offload copy':<15}: {bench('copy'):.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Payload size and encode cost of binary records versus pickle, for trace frames,
+watch results and tt record lists as they are produced in the target process.
+Traced calls include the cost of tracing, which is the same for both, and the frames
+are encoded by the profiler itself, string frames are only encoded for --follow-threads.
+
+usage: python -m flight_profiler.test.benchmark.wire_format_benchmark
+"""
+
+import pickle
+import timeit
+from typing import Callable, List
+
+from flight_profiler.ext.trace_profile_C import remove_trace_profile, set_trace_profile
+from flight_profiler.plugins.trace.trace_frame import (
+    WrapTraceFrame,
+    current_thread_infos,
+    encode_trace_frames,
+    encode_trace_record,
+)
+from flight_profiler.plugins.tt.time_tunnel_recorder import (
+    BaseInvocationRecord,
+    encode_base_records,
+)
+from flight_profiler.plugins.watch.watch_displayer import (
+    WatchResult,
+    encode_watch_result,
+)
+
+ROUNDS = 2000
+
+
+def build_trace_frames(calls: int) -> List[str]:
+    """
+    a root frame calling a few functions in a loop, like a typical traced request
+    """
+    start_ns = 1729678259710756000
+    frames = [f"handle\x00/srv/app/handler.py\x0011\x01{start_ns}\x01{calls * 4000}\x01-1"]
+    for i in range(calls):
+        name, filename, lineno = [
+            ("query", "/srv/app/dao.py", 40),
+            ("loads", "<built-in>", 0),
+            ("render", "/srv/app/view.py", 102),
+        ][i % 3]
+        frames.append(
+            f"{name}\x00{filename}\x00{lineno}\x01{start_ns + i * 4000 + 7}\x01{3000 + i % 17}\x010"
+        )
+    return frames
+
+
+def query(i: int) -> int:
+    return i
+
+
+def render(i: int) -> int:
+    return i
+
+
+def handle(calls: int) -> None:
+    for i in range(calls):
+        query(i)
+        abs(i)
+        render(i)
+
+
+def trace_handle(frames: int, encoded: bool) -> bytes:
+    """
+    traces a call making #frames calls and encodes its frames as server does
+    """
+    sent = []
+    profiler = set_trace_profile(
+        lambda q, sending: sent.append(sending), None, 0, False, 0, 0, 0, encoded
+    )
+    try:
+        handle(frames // 3)
+    finally:
+        remove_trace_profile(profiler)
+    if encoded:
+        return encode_trace_record(sent[0], *current_thread_infos())
+    return pickle.dumps(WrapTraceFrame(sent[0]))
+
+
+def build_watch_result() -> WatchResult:
+    return WatchResult(
+        method_identifier="app.handler.Handler.handle",
+        cost_ms=12.3456,
+        start_ms=1729678259710,
+        expr="args,kwargs",
+        type="<class 'tuple'>",
+        value='[\n  "hello",\n  {\n    "query": "select 1"\n  }\n]',
+    )
+
+
+def build_tt_records(count: int) -> List[BaseInvocationRecord]:
+    return [
+        BaseInvocationRecord(
+            1000 + i, 1729678259710 + i, 1.5, True, False, "app.handler", "Handler", "handle"
+        )
+        for i in range(count)
+    ]
+
+
+def bench(name: str, legacy: Callable[[], bytes], binary: Callable[[], bytes]) -> None:
+    legacy_us = timeit.timeit(legacy, number=ROUNDS) / ROUNDS * 1_000_000
+    binary_us = timeit.timeit(binary, number=ROUNDS) / ROUNDS * 1_000_000
+    legacy_size, binary_size = len(legacy()), len(binary())
+    print(
+        f"{name.ljust(22)} pickle: {legacy_size:>7} bytes {legacy_us:>8.2f} us"
+        f"   binary: {binary_size:>7} bytes {binary_us:>8.2f} us"
+        f"   size ratio: {binary_size / legacy_size:.2f}"
+    )
+
+
+def main():
+    for calls in (10, 300):
+        wrap = WrapTraceFrame(build_trace_frames(calls))
+        bench(
+            f"trace {calls} str frames",
+            lambda: pickle.dumps(wrap),
+            lambda: encode_trace_frames(wrap),
+        )
+    for calls in (30, 300):
+        bench(
+            f"traced call {calls}",
+            lambda: trace_handle(calls, False),
+            lambda: trace_handle(calls, True),
+        )
+    watch_result = build_watch_result()
+    bench(
+        "watch result",
+        lambda: pickle.dumps(watch_result),
+        lambda: encode_watch_result(watch_result),
+    )
+    records = build_tt_records(100)
+    bench(
+        "tt list 100 records",
+        lambda: pickle.dumps(records),
+        lambda: encode_base_records(records),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import threading
+import time
+import unittest
+
+from flight_profiler.common.call_sampler import CallSampler, parse_rate
+from flight_profiler.common.enter_exit_command import mark_agent_thread
+
+
+class CallSamplerTest(unittest.TestCase):
+
+    def test_parse_rate(self):
+        self.assertEqual((5, 1), parse_rate("5/s"))
+        self.assertEqual((100, 60), parse_rate("100/m"))
+        self.assertEqual((2, 1), parse_rate("2"))
+        with self.assertRaises(ValueError):
+            parse_rate("5/d")
+        with self.assertRaises(ValueError):
+            parse_rate("0/s")
+
+    def test_disabled_sampler(self):
+        sampler = CallSampler()
+        self.assertFalse(sampler.enabled)
+
+    def test_sample_rate(self):
+        sampler = CallSampler(sample_rate=0.1)
+        hits = sum(1 for _ in range(20000) if sampler.should_sample())
+        self.assertEqual(20000, sampler.seen)
+        self.assertEqual(hits, sampler.sampled)
+        self.assertTrue(1000 < hits < 3000)
+
+    def test_rate_limit(self):
+        sampler = CallSampler(rate_limit="5/s")
+        hits = sum(1 for _ in range(1000) if sampler.should_sample())
+        self.assertEqual(5, hits)
+        time.sleep(0.25)
+        self.assertTrue(sampler.should_sample())
+
+    def test_refused_calls_keep_tokens(self):
+        sampler = CallSampler(rate_limit="5/s")
+        self.assertFalse(sampler.should_sample(exhausted=True))
+
+        def agent_thread():
+            mark_agent_thread()
+            for _ in range(10):
+                sampler.should_sample()
+
+        thread = threading.Thread(target=agent_thread)
+        thread.start()
+        thread.join()
+        self.assertEqual(0, sampler.seen)
+        hits = sum(1 for _ in range(1000) if sampler.should_sample())
+        self.assertEqual(5, hits)
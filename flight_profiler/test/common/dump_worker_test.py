@@ -0,0 +1,59 @@
+import threading
+import unittest
+
+from flight_profiler.common.dump_worker import (
+    SNAPSHOT_COPY,
+    SNAPSHOT_REF,
+    DumpWorker,
+    snapshot,
+)
+
+
+class DumpWorkerTest(unittest.TestCase):
+
+    def test_snapshot(self):
+        items = [[1], 2]
+        copied = snapshot(items, SNAPSHOT_COPY)
+        self.assertIsNot(items, copied)
+        # shallow copy shares nested objects
+        self.assertIs(items[0], copied[0])
+        self.assertIs(items, snapshot(items, SNAPSHOT_REF))
+        obj = object()
+        self.assertIs(obj, snapshot(obj, SNAPSHOT_COPY))
+
+    def test_close_after_tasks(self):
+        done = []
+        closed = threading.Event()
+        worker = DumpWorker("test-dump-worker")
+        worker.start()
+        for i in range(100):
+            worker.submit(done.append, i)
+        worker.close(lambda: closed.set() if len(done) == 100 else None)
+        self.assertTrue(closed.wait(5))
+        self.assertEqual(list(range(100)), done)
+
+    def test_drop_when_full(self):
+        dropped = []
+        release = threading.Event()
+        closed = threading.Event()
+        worker = DumpWorker("test-dump-worker", dropped.append, capacity=2)
+        worker.start()
+        worker.submit(release.wait)
+        # wait until worker blocks in the first task
+        while not worker.tasks.empty():
+            pass
+        results = [worker.submit(lambda: None) for _ in range(5)]
+        self.assertEqual([True, True, False, False, False], results)
+        release.set()
+        worker.close(closed.set)
+        self.assertTrue(closed.wait(5))
+        self.assertEqual(3, sum(dropped))
+
+    def test_close_before_start(self):
+        closed = []
+        DumpWorker("test-dump-worker").close(lambda: closed.append(True))
+        self.assertEqual([True], closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
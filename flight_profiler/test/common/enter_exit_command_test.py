@@ -0,0 +1,98 @@
+import gc
+import threading
+import unittest
+import weakref
+
+from flight_profiler.common import enter_exit_command
+from flight_profiler.common.enter_exit_command import (
+    MAX_VERDICT_CACHE_SIZE,
+    EnterExitCommand,
+    mark_agent_thread,
+)
+
+
+class CountingCommand(EnterExitCommand):
+
+    def __init__(self, limit: int):
+        super().__init__(limit)
+        self.cleared = 0
+
+    def child_clear_action(self):
+        self.cleared += 1
+
+
+def call_through_wrapper(cmd: EnterExitCommand) -> bool:
+    # enter inspects the caller of the wrapper, same as aop wrappers do
+    def wrapped():
+        entered = cmd.enter()
+        if entered:
+            cmd.exit()
+        return entered
+
+    return wrapped()
+
+
+def enter_and_exit(cmd: EnterExitCommand) -> bool:
+    entered = cmd.enter()
+    if entered:
+        cmd.exit()
+    return entered
+
+
+class EnterExitCommandTest(unittest.TestCase):
+
+    def test_limit_across_threads(self):
+        cmd = CountingCommand(1000)
+        entered = []
+
+        def run():
+            count = 0
+            for _ in range(500):
+                if call_through_wrapper(cmd):
+                    count += 1
+            entered.append(count)
+
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1000, sum(entered))
+        self.assertEqual(1, cmd.cleared)
+        self.assertTrue(cmd.exhausted)
+
+    def test_skip_agent_thread(self):
+        cmd = CountingCommand(10)
+        entered = []
+
+        def run():
+            mark_agent_thread()
+            entered.append(call_through_wrapper(cmd))
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        self.assertEqual([False], entered)
+        # flag is bound to the agent thread only
+        self.assertTrue(call_through_wrapper(cmd))
+
+    def test_verdict_cache_bounded(self):
+        cmd = CountingCommand(MAX_VERDICT_CACHE_SIZE * 3)
+        first_code = None
+        # callers compiled at runtime, each with its own code object
+        for i in range(MAX_VERDICT_CACHE_SIZE * 2):
+            source = f"def caller(cmd):\n    return wrapper(cmd) and {i} >= 0\n"
+            namespace = {"wrapper": enter_and_exit}
+            exec(compile(source, "<generated>", "exec"), namespace)
+            self.assertTrue(namespace["caller"](cmd))
+            if first_code is None:
+                first_code = weakref.ref(namespace["caller"].__code__)
+        self.assertLessEqual(
+            len(enter_exit_command._self_injected_verdicts), MAX_VERDICT_CACHE_SIZE
+        )
+        gc.collect()
+        self.assertIsNone(first_code())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+from flight_profiler.common.expression_resolver import (
+    FILTER_PARAMS,
+    FilterExprResolver,
+    InstanceExprResolver,
+    InstanceListExprResolver,
+    MethodInvocationExprResolver,
+    compile_expression,
+)
+
+
+class ExpressionResolverTest(unittest.TestCase):
+
+    def test_method_invocation_expr(self):
+        resolver = MethodInvocationExprResolver("return_obj, args[0], kwargs['k']")
+        self.assertEqual(("ret", 1, 2), resolver.eval(None, "ret", 1, k=2))
+
+    def test_instance_expr(self):
+        self.assertEqual(3, InstanceExprResolver("len(target)").eval_target("abc"))
+        self.assertEqual(
+            2, InstanceListExprResolver("len(instances)").eval_target([1, 2])
+        )
+
+    def test_filter_expr(self):
+        resolver = FilterExprResolver("cost > 50 and args[0] == 'hello'")
+        self.assertTrue(resolver.eval_filter(None, None, 51, "hello"))
+        self.assertFalse(resolver.eval_filter(None, None, 49, "hello"))
+        self.assertTrue(FilterExprResolver(None).eval_filter(None, None, 0))
+
+    def test_syntax_error_on_creation(self):
+        with self.assertRaises(SyntaxError):
+            FilterExprResolver("cost >")
+        with self.assertRaises(SyntaxError):
+            MethodInvocationExprResolver("args[0")
+
+    def test_compiled_expression_cached(self):
+        func = compile_expression(FILTER_PARAMS, "cost > 10")
+        self.assertIs(func, compile_expression(FILTER_PARAMS, "cost > 10"))
+        self.assertIsNot(func, compile_expression(FILTER_PARAMS, "cost > 20"))
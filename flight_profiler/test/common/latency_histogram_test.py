@@ -0,0 +1,41 @@
+import unittest
+
+from flight_profiler.common.latency_histogram import (
+    LatencyHistogram,
+    bucket_index,
+    bucket_lower_bound,
+    bucket_upper_bound,
+)
+
+
+class LatencyHistogramTest(unittest.TestCase):
+
+    def test_bucket_bounds(self):
+        for value in [0, 1, 15, 16, 17, 31, 32, 1000, 123456, 10**9]:
+            idx = bucket_index(value)
+            self.assertTrue(bucket_lower_bound(idx) <= value <= bucket_upper_bound(idx))
+            # relative error is bounded by sub bucket resolution
+            self.assertTrue(
+                bucket_upper_bound(idx) - bucket_lower_bound(idx) <= max(1, value / 16)
+            )
+
+    def test_percentile(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(0, histogram.percentile_us(0.99))
+        for value in range(1, 1001):
+            histogram.record_us(value)
+        self.assertEqual(1000, histogram.count)
+        self.assertAlmostEqual(500, histogram.percentile_us(0.5), delta=500 / 16)
+        self.assertAlmostEqual(990, histogram.percentile_us(0.99), delta=990 / 16)
+        self.assertAlmostEqual(1.0, histogram.percentile_ms(1.0), delta=1.0 / 16)
+
+    def test_merge(self):
+        left, right = LatencyHistogram(), LatencyHistogram()
+        for _ in range(90):
+            left.record_ms(1)
+        for _ in range(10):
+            right.record_ms(100)
+        left.merge(right)
+        self.assertEqual(100, left.count)
+        self.assertAlmostEqual(1, left.percentile_ms(0.9), delta=1 / 16)
+        self.assertAlmostEqual(100, left.percentile_ms(0.95), delta=100 / 16)
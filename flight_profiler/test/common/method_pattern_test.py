@@ -0,0 +1,101 @@
+import unittest
+
+from flight_profiler.common.method_pattern import (
+    MethodTarget,
+    compile_name_pattern,
+    is_method_pattern,
+    resolve_method_pattern,
+    split_class_method,
+)
+
+MODULE = "flight_profiler.test.common.method_pattern_test"
+
+
+class UserRepo:
+    def __init__(self):
+        pass
+
+    def get_user(self):
+        pass
+
+    @staticmethod
+    def get_static():
+        pass
+
+    def save(self):
+        pass
+
+
+class OrderRepo:
+    def get_order(self):
+        pass
+
+
+def handle_query():
+    pass
+
+
+def handle_update():
+    pass
+
+
+class MethodPatternTest(unittest.TestCase):
+
+    def test_is_method_pattern(self):
+        self.assertFalse(is_method_pattern("__main__", None, "handler"))
+        self.assertTrue(is_method_pattern("myapp.*", None, "handler"))
+        self.assertTrue(is_method_pattern("__main__", "*Repo", "get"))
+        self.assertTrue(is_method_pattern("__main__", None, "re:get_.+"))
+
+    def test_compile_name_pattern(self):
+        self.assertIsNotNone(compile_name_pattern("get_*").fullmatch("get_user"))
+        self.assertIsNone(compile_name_pattern("get_*").fullmatch("save"))
+        self.assertIsNotNone(compile_name_pattern("re:get_(user|order)").fullmatch("get_order"))
+        with self.assertRaises(ValueError):
+            compile_name_pattern("re:get_(")
+
+    def test_split_class_method(self):
+        self.assertEqual(("*Repo", "get_*"), split_class_method(None, "*Repo.get_*"))
+        self.assertEqual(("Repo", "get_*"), split_class_method("Repo", "get_*"))
+        self.assertEqual((None, "re:a.b"), split_class_method(None, "re:a.b"))
+
+    def test_resolve_functions(self):
+        self.assertEqual(
+            [
+                MethodTarget(MODULE, None, "handle_query"),
+                MethodTarget(MODULE, None, "handle_update"),
+            ],
+            resolve_method_pattern(MODULE, None, "handle_*"),
+        )
+
+    def test_resolve_class_methods(self):
+        self.assertEqual(
+            [
+                MethodTarget(MODULE, "OrderRepo", "get_order"),
+                MethodTarget(MODULE, "UserRepo", "get_static"),
+                MethodTarget(MODULE, "UserRepo", "get_user"),
+            ],
+            resolve_method_pattern(MODULE, None, "*Repo.get_*"),
+        )
+        # dunder methods only match patterns asking for them
+        self.assertNotIn(
+            MethodTarget(MODULE, "UserRepo", "__init__"),
+            resolve_method_pattern(MODULE, "UserRepo", "*"),
+        )
+        self.assertIn(
+            MethodTarget(MODULE, "UserRepo", "__init__"),
+            resolve_method_pattern(MODULE, "UserRepo", "__*"),
+        )
+
+    def test_resolve_limits(self):
+        with self.assertRaises(ValueError):
+            resolve_method_pattern(MODULE, "*Repo", "*", max_targets=2)
+        with self.assertRaises(ValueError):
+            resolve_method_pattern(MODULE, "*Repo", "delete_*")
+        # profiler itself is never instrumented
+        with self.assertRaises(ValueError):
+            resolve_method_pattern("flight_profiler.common.*", None, "*")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import pickle
+import unittest
+from unittest import mock
+
+from flight_profiler.common import wire_format
+from flight_profiler.common.wire_format import (
+    RECORD_TRACE_FRAMES,
+    RECORD_TT_RECORD_LIST,
+    RECORD_WATCH_RESULT,
+    RecordDecoder,
+    RecordEncoder,
+    RecordSchema,
+    WireFormatError,
+    decode_drop_notice,
+    encode_drop_notice,
+    is_drop_notice,
+    is_wire_record,
+)
+
+
+class Call:
+
+    def __init__(self, index, name, cost, parent=None):
+        self.index = index
+        self.delta = -index
+        self.cost = cost
+        # truthy values other than True are written as True
+        self.ok = None if index == 0 else index % 3
+        self.name = name
+        self.parent = parent
+
+
+CALL_FIELDS = (
+    ("index", "u"),
+    ("delta", "v"),
+    ("cost", "d"),
+    ("ok", "b"),
+    ("name", "s"),
+)
+CALL_SCHEMA = RecordSchema(RECORD_WATCH_RESULT, CALL_FIELDS + (("parent", CALL_FIELDS),))
+
+
+def read_call(decoder):
+    return (
+        decoder.read_uvarint(),
+        decoder.read_varint(),
+        decoder.read_double(),
+        decoder.read_bool(),
+        decoder.read_str(),
+    )
+
+
+def call_fields(call):
+    ok = None if call.ok is None else bool(call.ok)
+    return call.index, call.delta, call.cost, ok, call.name
+
+
+class WireFormatTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        encoder = RecordEncoder(RECORD_WATCH_RESULT)
+        for value in (0, 127, 128, 1 << 63):
+            encoder.write_uvarint(value)
+        for value in (0, -1, 1, -(1 << 40)):
+            encoder.write_varint(value)
+        encoder.write_double(3.25)
+        encoder.write_bool(True)
+        encoder.write_bool(None)
+        for value in ("func", None, "函数", "func"):
+            encoder.write_str(value)
+        data = encoder.to_bytes()
+
+        self.assertTrue(is_wire_record(data))
+        decoder = RecordDecoder(data).expect(RECORD_WATCH_RESULT)
+        self.assertEqual([0, 127, 128, 1 << 63], [decoder.read_uvarint() for _ in range(4)])
+        self.assertEqual([0, -1, 1, -(1 << 40)], [decoder.read_varint() for _ in range(4)])
+        self.assertEqual(3.25, decoder.read_double())
+        self.assertTrue(decoder.read_bool())
+        self.assertIsNone(decoder.read_bool())
+        self.assertEqual(["func", None, "函数", "func"], [decoder.read_str() for _ in range(4)])
+        self.assertEqual(len(data), decoder.offset)
+
+    def test_schema(self):
+        parent = Call(1 << 40, "parent", 0.5)
+        calls = [Call(i, ["query", None, "\udcff", "函数"][i % 4], i / 3, parent) for i in range(9)]
+        list_schema = RecordSchema(RECORD_TT_RECORD_LIST, CALL_SCHEMA.fields)
+        encoded = (CALL_SCHEMA.encode(calls[2]), list_schema.encode_list(calls))
+        # extension and RecordEncoder write the same bytes
+        with mock.patch.object(wire_format, "c_encode_record", None):
+            self.assertEqual(
+                encoded, (CALL_SCHEMA.encode(calls[2]), list_schema.encode_list(calls))
+            )
+
+        decoder = RecordDecoder(encoded[1]).expect(RECORD_TT_RECORD_LIST)
+        self.assertEqual(9, decoder.read_uvarint())
+        for call in calls:
+            self.assertEqual(call_fields(call), read_call(decoder))
+            self.assertEqual(call_fields(parent), read_call(decoder))
+        self.assertEqual(len(encoded[1]), decoder.offset)
+
+        with self.assertRaises(TypeError):
+            CALL_SCHEMA.encode(Call(1, b"bytes", 0.0, parent))
+        with self.assertRaises(AttributeError):
+            CALL_SCHEMA.encode(object())
+
+    def test_repeated_string_written_once(self):
+        encoder = RecordEncoder(RECORD_TRACE_FRAMES)
+        for _ in range(10):
+            encoder.write_str("a_long_function_name\x00/path/to/module.py\x0010")
+        self.assertTrue(len(encoder.to_bytes()) < 60)
+
+    def test_reject_invalid_record(self):
+        self.assertFalse(is_wire_record(pickle.dumps("error")))
+        with self.assertRaises(WireFormatError):
+            RecordDecoder(pickle.dumps("error"))
+        with self.assertRaises(WireFormatError):
+            RecordDecoder(RecordEncoder(RECORD_TRACE_FRAMES).to_bytes()).expect(
+                RECORD_WATCH_RESULT
+            )
+
+    def test_drop_notice(self):
+        notice = encode_drop_notice(1000)
+        self.assertTrue(is_drop_notice(notice))
+        self.assertEqual(1000, decode_drop_notice(notice))
+        self.assertFalse(is_drop_notice(RecordEncoder(RECORD_WATCH_RESULT).to_bytes()))
+        self.assertFalse(is_drop_notice(pickle.dumps("error")))
@@ -0,0 +1,49 @@
+import os
+import unittest
+
+from flight_profiler.client import check_registered_agent
+from flight_profiler.communication.agent_registry import (
+    AgentRecord,
+    agent_record_path,
+    load_agent_record,
+    publish_agent_record,
+    remove_agent_runtime_file,
+)
+from flight_profiler.test.communication.flight_session_test import start_server
+
+# pid numbers never allocated by linux or macos
+UNUSED_PID = (1 << 30) + 1
+
+
+class AgentRegistryTest(unittest.TestCase):
+
+    def test_publish_and_load(self):
+        record_path = publish_agent_record(
+            AgentRecord(pid=UNUSED_PID, port=16001, unix_socket_path="/tmp/agent.sock")
+        )
+        try:
+            self.assertEqual(agent_record_path(UNUSED_PID), record_path)
+            self.assertEqual(0o600, os.stat(record_path).st_mode & 0o777)
+            record = load_agent_record(UNUSED_PID)
+            self.assertEqual(UNUSED_PID, record.pid)
+            self.assertEqual(16001, record.port)
+            self.assertEqual("/tmp/agent.sock", record.unix_socket_path)
+            self.assertIsNotNone(record.version)
+        finally:
+            remove_agent_runtime_file(record_path)
+        self.assertIsNone(load_agent_record(UNUSED_PID))
+        self.assertFalse(os.path.exists(os.path.dirname(record_path)))
+
+    def test_stale_record_is_ignored(self):
+        record_path = publish_agent_record(AgentRecord(pid=UNUSED_PID, port=1))
+        try:
+            self.assertIsNone(check_registered_agent(str(UNUSED_PID)))
+        finally:
+            remove_agent_runtime_file(record_path)
+
+    def test_find_registered_agent(self):
+        port = start_server()
+        record = load_agent_record(os.getpid())
+        self.assertIsNotNone(record)
+        self.assertEqual(port, record.port)
+        self.assertEqual(port, check_registered_agent(str(os.getpid())))
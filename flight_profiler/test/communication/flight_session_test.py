@@ -0,0 +1,99 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+import unittest
+from typing import Optional
+
+from flight_profiler.communication.flight_client import FlightClient
+from flight_profiler.communication.flight_session import (
+    FlightSession,
+    SessionStream,
+    close_flight_sessions,
+    open_flight_client,
+)
+from flight_profiler.server_flight_profiler import FlightProfilerServer
+
+
+def start_server(unix_socket_path: Optional[str] = None) -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("localhost", 0))
+        port = s.getsockname()[1]
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(
+            FlightProfilerServer("localhost", port, unix_socket_path).run()
+        )
+
+    threading.Thread(target=run, daemon=True).start()
+    for _ in range(50):
+        try:
+            client = FlightClient("localhost", port)
+        except:
+            time.sleep(0.1)
+            continue
+        client.request({"target": "status", "is_plugin_calling": False})
+        client.close()
+        return port
+    raise RuntimeError("flight server not started")
+
+
+class FlightSessionTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.port = start_server()
+
+    @classmethod
+    def tearDownClass(cls):
+        close_flight_sessions()
+
+    def test_requests_share_one_connection(self):
+        first = open_flight_client(self.port)
+        second = open_flight_client(self.port)
+        self.assertTrue(isinstance(first, SessionStream))
+        self.assertIs(first.session, second.session)
+        for client in (first, second):
+            resp = json.loads(
+                client.request({"target": "status", "is_plugin_calling": False})
+            )
+            self.assertEqual("py_flight_profiler", resp["app_type"])
+            client.close()
+        self.assertEqual({}, first.session.streams)
+
+    def test_cancel_stream(self):
+        session = FlightSession("localhost", self.port)
+        try:
+            stream = session.open_stream()
+            # test plugin streams one message per second, cancel after the first
+            for content in stream.request_stream({"target": "test", "param": ""}):
+                self.assertEqual(b"message-1", content)
+                break
+            stream.close()
+            status_stream = session.open_stream()
+            start = time.time()
+            resp = json.loads(
+                status_stream.request({"target": "status", "is_plugin_calling": False})
+            )
+            status_stream.close()
+            self.assertEqual("py_flight_profiler", resp["app_type"])
+            self.assertTrue(time.time() - start < 1)
+            self.assertTrue(session.running)
+        finally:
+            session.close()
+
+    def test_heartbeat(self):
+        session = FlightSession("localhost", self.port, heartbeat_interval=0.05)
+        try:
+            last_pong = session.last_pong
+            time.sleep(0.3)
+            self.assertTrue(session.last_pong > last_pong)
+        finally:
+            session.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import os
+import socket
+import stat
+import unittest
+
+from flight_profiler.communication import unix_socket
+from flight_profiler.communication.agent_registry import agent_runtime_dir
+from flight_profiler.communication.flight_client import FlightClient
+from flight_profiler.communication.flight_session import (
+    SessionStream,
+    close_flight_sessions,
+    open_flight_client,
+)
+from flight_profiler.communication.unix_socket import (
+    is_peer_trusted,
+    prepare_agent_socket_path,
+)
+from flight_profiler.test.communication.flight_session_test import start_server
+
+STATUS = {"target": "status", "is_plugin_calling": False}
+
+
+@unittest.skipUnless(unix_socket.unix_socket_enabled(), "unix socket transport is linux only")
+class UnixSocketTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.socket_path = prepare_agent_socket_path(os.getpid())
+        start_server(cls.socket_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        close_flight_sessions()
+
+    def test_runtime_dir_is_private(self):
+        st = os.stat(agent_runtime_dir(os.getpid()))
+        self.assertEqual(0o700, stat.S_IMODE(st.st_mode))
+        self.assertEqual(self.socket_path, unix_socket.agent_socket_path(os.getpid()))
+
+    def test_request_through_unix_socket(self):
+        client = FlightClient("localhost", self.socket_path)
+        try:
+            resp = json.loads(client.request(STATUS))
+        finally:
+            client.close()
+        self.assertEqual(str(os.getpid()), resp["pid"])
+
+        stream = open_flight_client(self.socket_path)
+        try:
+            self.assertTrue(isinstance(stream, SessionStream))
+            self.assertEqual(str(os.getpid()), json.loads(stream.request(STATUS))["pid"])
+        finally:
+            stream.close()
+
+    def test_peer_credential(self):
+        left, right = socket.socketpair(socket.AF_UNIX)
+        try:
+            self.assertTrue(is_peer_trusted(left))
+        finally:
+            left.close()
+            right.close()
+
+    def test_reject_shared_runtime_dir(self):
+        fake_pid = 1 << 30
+        runtime_dir = agent_runtime_dir(fake_pid)
+        os.mkdir(runtime_dir, 0o755)
+        try:
+            os.chmod(runtime_dir, 0o755)
+            with self.assertRaises(OSError):
+                prepare_agent_socket_path(fake_pid)
+        finally:
+            os.rmdir(runtime_dir)
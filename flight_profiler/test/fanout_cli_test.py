@@ -0,0 +1,163 @@
+import argparse
+import io
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from flight_profiler.common.latency_histogram import LatencyHistogram
+from flight_profiler.fanout_cli import (
+    MonitorMerger,
+    TaggedStdout,
+    attach_processes,
+    merge_folded_stacks,
+    parse_pid_list,
+)
+from flight_profiler.plugins.watch.watch_monitor import MonitorSummary
+from flight_profiler.utils.env_util import get_child_pids, is_linux, is_pid_namespaced
+
+
+def build_summary(latencies, error_count=0, start_ms=0, end_ms=1000) -> MonitorSummary:
+    histogram = LatencyHistogram()
+    for latency in latencies:
+        histogram.record_ms(latency)
+    return MonitorSummary(
+        method_identifier="m",
+        start_ms=start_ms,
+        end_ms=end_ms,
+        count=len(latencies),
+        error_count=error_count,
+        total_ms=sum(latencies),
+        min_ms=min(latencies) if latencies else 0,
+        max_ms=max(latencies) if latencies else 0,
+        histogram=histogram,
+    )
+
+
+class FanoutCliTest(unittest.TestCase):
+
+    def test_parse_pid_list(self):
+        self.assertEqual(["1", "2", "3"], parse_pid_list("1, 2,3,2,"))
+        with self.assertRaises(argparse.ArgumentTypeError):
+            parse_pid_list("1,abc")
+        with self.assertRaises(argparse.ArgumentTypeError):
+            parse_pid_list(",")
+
+    @unittest.skipIf(not is_linux(), "reads /proc")
+    def test_get_child_pids(self):
+        import subprocess
+
+        child = subprocess.Popen(["sleep", "10"])
+        try:
+            self.assertIn(child.pid, get_child_pids(os.getpid()))
+        finally:
+            child.kill()
+            child.wait()
+
+    @unittest.skipIf(not is_linux(), "reads /proc")
+    def test_is_pid_namespaced(self):
+        with open("/proc/self/status") as f:
+            status = f.read()
+        if "NSpid:" in status:
+            # client runs in its own namespace here, so it sees its own pid
+            self.assertFalse(is_pid_namespaced(os.getpid()))
+        # unknown processes are assumed namespaced, their injection is serialized
+        self.assertTrue(is_pid_namespaced(2**22 + 1))
+
+    def test_attach_processes_checks_every_pid(self):
+        with mock.patch(
+            "flight_profiler.fanout_cli.show_pre_attach_info"
+        ) as pre_attach, mock.patch(
+            "flight_profiler.fanout_cli.attach_process",
+            side_effect=lambda pid, debug, ports: None if pid == "2" else int(pid),
+        ), mock.patch("builtins.print"):
+            addresses = attach_processes(["1", "2", "3"])
+        self.assertEqual(["1", "2", "3"], [c.args[0] for c in pre_attach.call_args_list])
+        self.assertEqual({"1": 1, "3": 3}, addresses)
+
+    def test_merge_folded_stacks(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            first = os.path.join(tmp_dir, "1.txt")
+            second = os.path.join(tmp_dir, "2.txt")
+            with open(first, "w") as f:
+                f.write("main (a.py:1);work (a.py:5) 10\nmain (a.py:1) 2\n")
+            with open(second, "w") as f:
+                f.write("main (a.py:1);work (a.py:5) 5\nmain (a.py:1);idle (a.py:9) 1\n")
+            merged = merge_folded_stacks([first, second, os.path.join(tmp_dir, "missing")])
+        self.assertEqual(
+            {
+                "main (a.py:1);work (a.py:5)": 15,
+                "main (a.py:1)": 2,
+                "main (a.py:1);idle (a.py:9)": 1,
+            },
+            dict(merged),
+        )
+
+    def test_merge_monitor_summary(self):
+        merged = MonitorSummary.merge(
+            [
+                build_summary([1.0, 2.0], error_count=1, start_ms=10, end_ms=1000),
+                build_summary([], start_ms=5, end_ms=1010),
+                build_summary([0.5] * 97 + [100.0], start_ms=20, end_ms=990),
+            ]
+        )
+        self.assertEqual(100, merged.count)
+        self.assertEqual(1, merged.error_count)
+        self.assertEqual(5, merged.start_ms)
+        self.assertEqual(1010, merged.end_ms)
+        self.assertEqual(0.5, merged.min_ms)
+        self.assertEqual(100.0, merged.max_ms)
+        self.assertEqual(100, merged.histogram.count)
+        self.assertAlmostEqual(0.5, merged.percentile_ms(0.9), delta=0.5 / 16)
+        self.assertEqual(100.0, merged.percentile_ms(1.0))
+
+    def test_monitor_merger(self):
+        merger = MonitorMerger(["1", "2"])
+        self.assertEqual([], merger.add("1", build_summary([1.0])))
+        self.assertEqual([], merger.add("1", build_summary([2.0])))
+        merged = merger.add("2", build_summary([3.0]))
+        self.assertEqual(1, len(merged))
+        self.assertEqual(2, merged[0].count)
+        # worker 2 stops streaming, pending cycle of worker 1 is flushed
+        merged = merger.finish("2")
+        self.assertEqual(1, len(merged))
+        self.assertEqual(1, merged[0].count)
+        self.assertEqual([], merger.finish("1"))
+
+    def test_tagged_stdout(self):
+        stream = io.StringIO()
+        tagged = TaggedStdout(stream)
+
+        def write(tag: str):
+            tagged.set_tag(tag)
+            for i in range(100):
+                # a line written in pieces is never interleaved with other threads
+                tagged.write("line ")
+                tagged.write(f"{i}\nline {i}")
+                tagged.write(" again\n")
+            tagged.flush()
+
+        threads = [threading.Thread(target=write, args=(str(pid),)) for pid in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        tagged.write("untagged\n")
+
+        lines = stream.getvalue().split("\n")
+        self.assertEqual(["untagged", ""], lines[-2:])
+        self.assertEqual(801, len(lines) - 1)
+        for pid in range(4):
+            prefix = f"[{pid}] "
+            expected = []
+            for i in range(100):
+                expected.extend([f"line {i}", f"line {i} again"])
+            self.assertEqual(
+                expected,
+                [line[len(prefix) :] for line in lines if line.startswith(prefix)],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,200 @@
+import asyncio
+import pickle
+import threading
+import unittest
+from asyncio import Queue
+
+from flight_profiler.common.wire_format import (
+    RECORD_HEADER,
+    RECORD_WATCH_RESULT,
+    WIRE_MAGIC,
+    WIRE_VERSION,
+    decode_drop_notice,
+    is_drop_notice,
+    is_wire_record,
+)
+from flight_profiler.plugins.server_plugin import (
+    OVERFLOW_BLOCK,
+    OVERFLOW_DROP_NEWEST,
+    OVERFLOW_DROP_OLDEST,
+    OVERFLOW_SAMPLE,
+    Message,
+    ServerQueue,
+)
+
+
+class ServerQueueTest(unittest.TestCase):
+
+    def drain(self, loop: asyncio.AbstractEventLoop, out_q: Queue):
+        async def collect():
+            msgs = []
+            while True:
+                msg = await out_q.get()
+                msgs.append(msg)
+                if msg.is_end:
+                    return msgs
+
+        return loop.run_until_complete(asyncio.wait_for(collect(), 5))
+
+    def test_messages_from_threads_keep_order(self):
+        loop = asyncio.new_event_loop()
+        try:
+            out_q = Queue(maxsize=1000)
+            server_q = ServerQueue(out_q, loop)
+
+            def produce():
+                for i in range(500):
+                    server_q.output_msg_nowait(Message(False, str(i)))
+                server_q.output_msgstr_nowait(1, "end")
+
+            producer = threading.Thread(target=produce)
+            producer.start()
+            msgs = self.drain(loop, out_q)
+            producer.join()
+            self.assertEqual([str(i) for i in range(500)] + ["end"], [m.msg for m in msgs])
+            self.assertEqual(0, server_q.dropped)
+        finally:
+            loop.close()
+
+    def record(self, index: int, size: int = 1) -> bytes:
+        header = RECORD_HEADER.pack(WIRE_MAGIC, WIRE_VERSION, RECORD_WATCH_RESULT)
+        return header + str(index).rjust(size, "0").encode("utf-8")
+
+    def record_index(self, msg: Message) -> int:
+        return int(msg.msg[RECORD_HEADER.size :])
+
+    def fill(self, server_q: ServerQueue, count: int, size: int = 1):
+        for i in range(count):
+            server_q.output_msg_nowait(Message(False, self.record(i, size)))
+        server_q.output_msg_nowait(Message(True, None))
+
+    def split_notices(self, msgs):
+        data, dropped = [], 0
+        for msg in msgs[:-1]:
+            if is_drop_notice(msg.msg):
+                dropped += decode_drop_notice(msg.msg)
+            else:
+                data.append(self.record_index(msg))
+        return data, dropped
+
+    def test_drop_newest_keeps_end_and_notifies(self):
+        loop = asyncio.new_event_loop()
+        try:
+            out_q = Queue(maxsize=10)
+            server_q = ServerQueue(out_q, loop, overflow_policy=OVERFLOW_DROP_NEWEST)
+            self.fill(server_q, 100)
+            msgs = self.drain(loop, out_q)
+            self.assertTrue(msgs[-1].is_end)
+            self.assertEqual(10, len(msgs))
+            data, dropped = self.split_notices(msgs)
+            self.assertEqual(list(range(2, 10)), data)
+            self.assertEqual(92, dropped)
+            self.assertEqual(92, server_q.dropped)
+        finally:
+            loop.close()
+
+    def test_drop_oldest_keeps_latest(self):
+        loop = asyncio.new_event_loop()
+        try:
+            out_q = Queue(maxsize=10)
+            server_q = ServerQueue(out_q, loop, overflow_policy=OVERFLOW_DROP_OLDEST)
+            self.fill(server_q, 100)
+            data, dropped = self.split_notices(self.drain(loop, out_q))
+            self.assertEqual(99, data[-1])
+            self.assertEqual(100, len(data) + dropped)
+        finally:
+            loop.close()
+
+    def test_sample_thins_out_messages(self):
+        loop = asyncio.new_event_loop()
+        try:
+            out_q = Queue(maxsize=100)
+            server_q = ServerQueue(out_q, loop, overflow_policy=OVERFLOW_SAMPLE)
+            self.fill(server_q, 1000)
+            data, dropped = self.split_notices(self.drain(loop, out_q))
+            self.assertEqual(list(range(50)), data[:50])
+            # sampled messages are spread over the whole stream
+            self.assertGreater(data[-1], 500)
+            self.assertEqual(1000, len(data) + dropped)
+        finally:
+            loop.close()
+
+    def test_memory_cap(self):
+        loop = asyncio.new_event_loop()
+        try:
+            out_q = Queue(maxsize=1000)
+            server_q = ServerQueue(out_q, loop, max_bytes=1024)
+            self.fill(server_q, 100, size=100 - RECORD_HEADER.size)
+            data, dropped = self.split_notices(self.drain(loop, out_q))
+            self.assertEqual(list(range(10)), data)
+            self.assertEqual(90, dropped)
+        finally:
+            loop.close()
+
+    def test_block_waits_for_client(self):
+        loop = asyncio.new_event_loop()
+        try:
+            out_q = Queue(maxsize=5)
+            server_q = ServerQueue(out_q, loop, overflow_policy=OVERFLOW_BLOCK)
+            producer = threading.Thread(target=self.fill, args=(server_q, 200))
+            producer.start()
+
+            async def collect():
+                msgs = []
+                while True:
+                    msg = await server_q.get()
+                    msgs.append(msg)
+                    if msg.is_end:
+                        return msgs
+
+            msgs = loop.run_until_complete(asyncio.wait_for(collect(), 5))
+            producer.join()
+            self.assertEqual(list(range(200)), [self.record_index(m) for m in msgs[:-1]])
+            self.assertEqual(0, server_q.dropped)
+        finally:
+            loop.close()
+
+    def test_flood_keeps_messages_other_than_records(self):
+        for policy in (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_SAMPLE):
+            loop = asyncio.new_event_loop()
+            try:
+                out_q = Queue(maxsize=10)
+                server_q = ServerQueue(out_q, loop, overflow_policy=policy)
+                # trace sends sys.path first, then records flood in before client reads
+                server_q.output_msg_nowait(Message(False, pickle.dumps(["/app"])))
+                for i in range(50):
+                    server_q.output_msg_nowait(Message(False, self.record(i)))
+                server_q.output_msg_nowait(Message(False, pickle.dumps("hint")))
+                self.fill(server_q, 100)
+
+                async def collect():
+                    msgs = []
+                    while True:
+                        msg = await server_q.get()
+                        msgs.append(msg)
+                        if msg.is_end:
+                            return msgs
+
+                msgs = loop.run_until_complete(asyncio.wait_for(collect(), 5))
+                self.assertEqual(["/app"], pickle.loads(msgs[0].msg))
+                others = [
+                    pickle.loads(m.msg)
+                    for m in msgs[:-1]
+                    if not is_wire_record(m.msg)
+                ]
+                self.assertEqual([["/app"], "hint"], others)
+                data, dropped = self.split_notices(
+                    [m for m in msgs if m.is_end or is_wire_record(m.msg)]
+                )
+                self.assertEqual(150, len(data) + dropped)
+                self.assertTrue(server_q.empty())
+            finally:
+                loop.close()
+
+    def test_illegal_policy(self):
+        with self.assertRaises(ValueError):
+            ServerQueue(Queue(), None, overflow_policy="drop-all")
+
+
+if __name__ == "__main__":
+    unittest.main()
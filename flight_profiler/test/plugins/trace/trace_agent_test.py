@@ -1,13 +1,24 @@
 import asyncio
-import pickle
+import threading
+import time
 import unittest
 from asyncio import Queue
+from concurrent.futures import ThreadPoolExecutor
 
+from flight_profiler.ext.trace_profile_C import (
+    release_trace_monitoring,
+    remove_trace_profile,
+    set_trace_monitoring,
+    set_trace_profile,
+)
 from flight_profiler.plugins.server_plugin import Message, ServerQueue
 from flight_profiler.plugins.trace.trace_agent import global_trace_agent
 from flight_profiler.plugins.trace.trace_frame import (
     WrapTraceFrame,
-    deserialize_string_frames,
+    decode_trace_aggregate,
+    decode_trace_frames,
+    encode_trace_frames,
+    encode_trace_record,
 )
 from flight_profiler.plugins.trace.trace_parser import TracePoint
 
@@ -28,6 +39,64 @@ async def async_test_func():
     print("hello")
 
 
+def nested_func(n):
+    total = 0
+    for i in range(n):
+        total += len(str(i))
+    try:
+        raise ValueError("nested")
+    except ValueError:
+        pass
+    return total + sum(i for i in range(2))
+
+
+def trace_descriptions(set_trace, depth):
+    frames = []
+    profiler = set_trace(lambda q, sending: frames.extend(sending), None, 0, False, depth)
+    try:
+        nested_func(3)
+    finally:
+        remove_trace_profile(profiler)
+    # timings differ between runs, keep method, file and parent
+    return [(frame.split("\x01")[0], frame.split("\x01")[-1]) for frame in frames]
+
+
+def call(f, n):
+    return f(n)
+
+
+def python_callee(n):
+    return n
+
+
+def polymorphic_calls():
+    # one call site reaching a python function first, then a builtin
+    call(python_callee, 1)
+    call(abs, -1)
+
+
+class ItemList(list):
+    pass
+
+
+def append_items():
+    # bound builtins are created per access and share the method def
+    for items in ([], ItemList(), [], ItemList()):
+        append = items.append
+        append(len(items))
+
+
+def slow_work():
+    time.sleep(0.01)
+
+
+def offload_func(executor):
+    executor.submit(slow_work).result()
+    thread = threading.Thread(target=slow_work, name="offload-thread")
+    thread.start()
+    thread.join()
+
+
 class TraceAgentTest(unittest.TestCase):
 
     def test_trace_module_func(self):
@@ -60,9 +129,7 @@ class TraceAgentTest(unittest.TestCase):
         self.assertIsNotNone(result)
         self.assertIsNotNone(sys_path)
 
-        wrap: WrapTraceFrame = pickle.loads(result.msg)
-        # print(wrap)
-        wrap = deserialize_string_frames(wrap)
+        wrap: WrapTraceFrame = decode_trace_frames(result.msg)
 
         self.assertTrue("test_func" in wrap.frames[0].description)
         self.assertTrue("print" in wrap.frames[1].description)
@@ -104,8 +171,7 @@ class TraceAgentTest(unittest.TestCase):
         self.assertIsNotNone(result)
         self.assertIsNotNone(sys_path)
 
-        wrap: WrapTraceFrame = pickle.loads(result.msg)
-        wrap = deserialize_string_frames(wrap)
+        wrap: WrapTraceFrame = decode_trace_frames(result.msg)
 
         self.assertTrue("async_test_func" in wrap.frames[0].description)
         self.assertTrue("print" in wrap.frames[1].description)
@@ -147,8 +213,7 @@ class TraceAgentTest(unittest.TestCase):
         self.assertIsNotNone(result)
         self.assertIsNotNone(sys_path)
 
-        wrap: WrapTraceFrame = pickle.loads(result.msg)
-        wrap = deserialize_string_frames(wrap)
+        wrap: WrapTraceFrame = decode_trace_frames(result.msg)
 
         self.assertTrue("test_func" in wrap.frames[0].description)
         self.assertTrue("print" in wrap.frames[1].description)
@@ -190,8 +255,7 @@ class TraceAgentTest(unittest.TestCase):
         self.assertIsNotNone(result)
         self.assertIsNotNone(sys_path)
 
-        wrap: WrapTraceFrame = pickle.loads(result.msg)
-        wrap = deserialize_string_frames(wrap)
+        wrap: WrapTraceFrame = decode_trace_frames(result.msg)
 
         self.assertTrue("async_test_func" in wrap.frames[0].description)
         self.assertTrue("print" in wrap.frames[1].description)
@@ -205,5 +269,225 @@ class TraceAgentTest(unittest.TestCase):
         self.assertTrue(point.unique_key() not in global_trace_agent.aop_points)
 
 
+    def test_trace_aggregate(self):
+        out_q = Queue(maxsize=200)
+        try:
+            loop = asyncio.get_event_loop()
+        except:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+        point = TracePoint(
+            module_name="flight_profiler.test.plugins.trace.trace_agent_test",
+            class_name=None,
+            method_name="test_func",
+            interval=0,
+            out_q=ServerQueue(out_q, loop),
+            limits=3,
+            entrance_time=0,
+            depth=-1,
+            aggregate=True,
+        )
+        global_trace_agent.set_point(point)
+        for _ in range(3):
+            test_func()
+
+        async def get_msg():
+            sys_path: Message = await out_q.get()
+            hello_title = await out_q.get()
+            return await out_q.get(), await out_q.get()
+
+        result, end = loop.run_until_complete(get_msg())
+        self.assertFalse(result.is_end)
+        self.assertTrue(end.is_end)
+
+        root = decode_trace_aggregate(result.msg)
+        self.assertEqual(3, root.count)
+        func_frame = root.sub_frames[0]
+        self.assertEqual("test_func", func_frame.method_name)
+        self.assertEqual(3, func_frame.count)
+        self.assertEqual("print", func_frame.sub_frames[0].method_name)
+        self.assertEqual(3, func_frame.sub_frames[0].count)
+        self.assertTrue(point.unique_key() not in global_trace_agent.aop_points)
+
+    def test_follow_threads(self):
+        out_q = Queue(maxsize=200)
+        try:
+            loop = asyncio.get_event_loop()
+        except:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+        point = TracePoint(
+            module_name="flight_profiler.test.plugins.trace.trace_agent_test",
+            class_name=None,
+            method_name="offload_func",
+            interval=0,
+            out_q=ServerQueue(out_q, loop),
+            limits=1,
+            entrance_time=0,
+            depth=-1,
+            follow_threads=True,
+        )
+        origin_submit = ThreadPoolExecutor.submit
+        global_trace_agent.set_point(point)
+        self.assertIsNot(origin_submit, ThreadPoolExecutor.submit)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="offload-pool") as executor:
+            offload_func(executor)
+
+        async def get_msg():
+            sys_path: Message = await out_q.get()
+            hello_title = await out_q.get()
+            return await out_q.get()
+
+        result = loop.run_until_complete(get_msg())
+        frames = decode_trace_frames(result.msg).frames
+        thread_frames = [
+            (idx, frame) for idx, frame in enumerate(frames)
+            if frame is not None and frame.description.startswith("[thread]")
+        ]
+        self.assertEqual(2, len(thread_frames))
+        for (idx, frame), name in zip(thread_frames, ("offload-pool_0", "offload-thread")):
+            self.assertEqual(name, frame.description.split("\x00")[1])
+            # stitched under the traced call, which submitted both
+            self.assertEqual(0, frame.pid)
+            self.assertTrue(frame.cost_ns >= 10000000)
+            work = next(
+                frame for frame in frames[idx + 1:]
+                if frame is not None and frame.description.startswith("slow_work\x00")
+            )
+            # Thread.run is traced above the target of a started thread
+            self.assertIn(idx, (work.pid, frames[work.pid].pid))
+        # hooks are removed once -n invocations were traced
+        self.assertIs(origin_submit, ThreadPoolExecutor.submit)
+
+    def test_monitoring_backend(self):
+        # same frames as the profile hook, which is also the fallback before 3.12
+        for depth in (0, 2):
+            self.assertEqual(
+                trace_descriptions(set_trace_profile, depth),
+                trace_descriptions(set_trace_monitoring, depth),
+            )
+        descriptions = [d[0].split("\x00")[0] for d in trace_descriptions(set_trace_monitoring, 0)]
+        self.assertEqual("nested_func", descriptions[0])
+        self.assertEqual(3, descriptions.count("len"))
+        self.assertIn("<genexpr>", descriptions)
+        release_trace_monitoring()
+
+    def test_monitoring_polymorphic_call_site(self):
+        for set_trace in (set_trace_profile, set_trace_monitoring):
+            # the site sees python calls in an untraced thread before it's traced
+            untraced = threading.Thread(target=call, args=(python_callee, 1))
+            for traced in range(2):
+                frames = []
+                profiler = set_trace(
+                    lambda q, sending: frames.extend(sending), None, 0, False, 0
+                )
+                try:
+                    if traced == 0:
+                        untraced.start()
+                        untraced.join()
+                    polymorphic_calls()
+                finally:
+                    remove_trace_profile(profiler)
+                names = [frame.split("\x00")[0] for frame in frames if frame is not None]
+                self.assertEqual(1, names.count("python_callee"))
+                self.assertEqual(1, names.count("abs"), set_trace)
+        release_trace_monitoring()
+
+    def test_interned_descriptors(self):
+        for set_trace in (set_trace_profile, set_trace_monitoring):
+            frames = []
+            profiler = set_trace(lambda q, sending: frames.extend(sending), None, 0, False, 0)
+            try:
+                append_items()
+            finally:
+                remove_trace_profile(profiler)
+            descriptions = [frame.split("\x01")[0] for frame in frames if frame is not None]
+            self.assertEqual(2, descriptions.count("list.append\x00<built-in>\x000"))
+            self.assertEqual(2, descriptions.count("ItemList.append\x00<built-in>\x000"))
+            self.assertTrue(descriptions[0].startswith("append_items\x00"))
+        release_trace_monitoring()
+
+    def test_frame_budget(self):
+        for set_trace in (set_trace_profile, set_trace_monitoring):
+            counts = []
+            for max_frames, max_bytes in ((0, 0), (100, 0), (0, 20000)):
+                frames = []
+                profiler = set_trace(
+                    lambda q, sending: frames.extend(sending), None, 0, False, 0, max_frames, max_bytes
+                )
+                try:
+                    nested_func(2000)
+                finally:
+                    remove_trace_profile(profiler)
+                elided_count = 0
+                kept = 0
+                for idx, frame in enumerate(frames):
+                    if frame is None:
+                        continue
+                    description, _, _, pid = frame.split("\x01")
+                    # no frame loses its parent
+                    self.assertLess(int(pid), idx)
+                    self.assertTrue(int(pid) == -1 or frames[int(pid)] is not None)
+                    if description.startswith("[elided]\x00"):
+                        elided_count += int(description.split("\x00")[1].split(" ")[0])
+                    else:
+                        kept += 1
+                if max_frames > 0:
+                    self.assertLessEqual(kept, max_frames + 1)
+                if max_bytes > 0:
+                    self.assertLess(kept, 200)
+                counts.append((kept, elided_count))
+            # every call is either kept or counted by an elided frame
+            self.assertEqual(0, counts[0][1])
+            for kept, elided_count in counts[1:]:
+                self.assertTrue(elided_count > 0)
+                self.assertEqual(counts[0][0], kept + elided_count)
+        release_trace_monitoring()
+
+    def test_encoded_frames(self):
+        for set_trace in (set_trace_profile, set_trace_monitoring):
+            for max_frames in (0, 100):
+                decoded = []
+                for encoded in (False, True):
+                    sent = []
+                    profiler = set_trace(
+                        lambda q, frames: sent.append(frames), None, 0, False, 0,
+                        max_frames, 0, encoded,
+                    )
+                    try:
+                        nested_func(2000)
+                    finally:
+                        remove_trace_profile(profiler)
+                    wrap = WrapTraceFrame(sent[0])
+                    if encoded:
+                        self.assertIsInstance(sent[0], bytes)
+                        data = encode_trace_record(
+                            sent[0], wrap.thread_id, wrap.thread_name, wrap.is_daemon
+                        )
+                    else:
+                        data = encode_trace_frames(wrap)
+                    decoded.append(decode_trace_frames(data))
+                strings, structs = decoded
+                self.assertEqual(strings.thread_name, structs.thread_name)
+                kept = [frame for frame in structs.frames if frame is not None]
+                self.assertTrue(kept[0].description.startswith("nested_func\x00"))
+                self.assertEqual(-1, kept[0].pid)
+                if max_frames == 0:
+                    # same frames as the string path, timings differ between runs
+                    self.assertEqual(
+                        [(f.description, f.pid) for f in strings.frames if f is not None],
+                        [(f.description, f.pid) for f in kept],
+                    )
+                else:
+                    elided = [f for f in kept if f.description.startswith("[elided]\x00")]
+                    self.assertTrue(len(elided) > 0)
+                    self.assertLessEqual(len(kept) - len(elided), max_frames + 1)
+                    for idx, frame in enumerate(structs.frames):
+                        if frame is not None:
+                            self.assertLess(frame.pid, idx)
+                            self.assertTrue(frame.cost_ns >= 0)
+        release_trace_monitoring()
+
+
 if __name__ == "__main__":
     unittest.main()
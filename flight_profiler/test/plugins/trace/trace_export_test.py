@@ -0,0 +1,108 @@
+import unittest
+
+from flight_profiler.plugins.trace.trace_export import ChromeTraceExporter
+from flight_profiler.plugins.trace.trace_frame import (
+    TraceAggregator,
+    WrapTraceFrame,
+    decode_trace_aggregate,
+    deserialize_string_frames,
+    encode_trace_aggregate,
+)
+
+
+def wrap_frames(frames, thread_id=7, thread_name="MainThread"):
+    wrap = WrapTraceFrame.__new__(WrapTraceFrame)
+    wrap.frames = frames
+    wrap.thread_id = thread_id
+    wrap.thread_name = thread_name
+    wrap.is_daemon = False
+    return deserialize_string_frames(wrap)
+
+
+def slices(events):
+    return [event for event in events if event["ph"] == "X"]
+
+
+def track_names(events):
+    return {
+        event["tid"]: event["args"]["name"]
+        for event in events
+        if event["name"] == "thread_name"
+    }
+
+
+class TraceExportTest(unittest.TestCase):
+
+    def test_trace_events(self):
+        exporter = ChromeTraceExporter(100)
+        events = exporter.trace_events(
+            wrap_frames(
+                [
+                    "handle\x00/app/handler.py\x0010\x011000000\x015000\x01-1",
+                    "len\x00<built-in>\x000\x011001000\x01100\x010",
+                    None,
+                    "[await]\x00\x000\x011002000\x012000\x010",
+                    "[thread]\x00pool_0\x000\x011001500\x013000\x010",
+                    "work\x00/app/handler.py\x0020\x011001600\x012000\x014",
+                    "[elided]\x0012 frames elided\x000\x011001700\x01500\x015",
+                ]
+            )
+        )
+        self.assertEqual("process_name", events[0]["name"])
+        frames = slices(events)
+        self.assertEqual(
+            ["handle", "len", "[await]", "[thread] pool_0", "work", "[elided] 12 frames elided"],
+            [event["name"] for event in frames],
+        )
+        self.assertEqual(
+            ["python", "builtin", "await", "thread", "python", "elided"],
+            [event["cat"] for event in frames],
+        )
+        self.assertEqual(1000.0, frames[0]["ts"])
+        self.assertEqual(5.0, frames[0]["dur"])
+        self.assertEqual({"file": "/app/handler.py", "line": 10}, frames[0]["args"])
+        # followed thread runs on its own track
+        self.assertEqual(7, frames[2]["tid"])
+        followed_tid = frames[3]["tid"]
+        self.assertNotEqual(7, followed_tid)
+        self.assertEqual([followed_tid] * 3, [event["tid"] for event in frames[3:]])
+        self.assertEqual({7: "MainThread", followed_tid: "pool_0"}, track_names(events))
+
+        # overlapping invocation of the same thread is put on another track
+        events = exporter.trace_events(
+            wrap_frames(["handle\x00/app/handler.py\x0010\x011004000\x015000\x01-1"])
+        )
+        self.assertNotEqual("process_name", events[0]["name"])
+        tid = slices(events)[0]["tid"]
+        self.assertEqual({tid: "MainThread #2"}, track_names(events))
+        # later invocation reuses the first track
+        events = exporter.trace_events(
+            wrap_frames(["handle\x00/app/handler.py\x0010\x012000000\x015000\x01-1"])
+        )
+        self.assertEqual([7], [event["tid"] for event in events])
+
+    def test_aggregate_events(self):
+        aggregator = TraceAggregator()
+        for _ in range(2):
+            aggregator.merge(
+                [
+                    "handle\x00/app/handler.py\x0010\x011000\x01900\x01-1",
+                    "query\x00/app/db.py\x001\x011100\x01200\x010",
+                    "render\x00/app/view.py\x001\x011300\x01500\x010",
+                ]
+            )
+        root = decode_trace_aggregate(encode_trace_aggregate(aggregator))
+        events = ChromeTraceExporter(100).aggregate_events(root)
+        self.assertEqual(["2 invocations merged"], list(track_names(events).values()))
+        frames = {event["name"]: event for event in slices(events)}
+        self.assertEqual(0, frames["handle"]["ts"])
+        self.assertEqual(1.8, frames["handle"]["dur"])
+        self.assertEqual(2, frames["handle"]["args"]["calls"])
+        # most expensive child first
+        self.assertEqual(0, frames["render"]["ts"])
+        self.assertEqual(1.0, frames["query"]["ts"])
+        self.assertAlmostEqual(0.0004, frames["handle"]["args"]["self_ms"])
+
+
+if __name__ == "__main__":
+    unittest.main()
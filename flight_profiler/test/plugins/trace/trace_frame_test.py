@@ -1,11 +1,18 @@
 import unittest
+from unittest import mock
 
+from flight_profiler.plugins.trace import trace_frame
 from flight_profiler.plugins.trace.trace_frame import (
     FlattenTreeTraceFrame,
+    TraceAggregator,
     TraceFrame,
     WrapTraceFrame,
     build_frame_stack,
+    decode_trace_aggregate,
+    decode_trace_frames,
     deserialize_string_frames,
+    encode_trace_aggregate,
+    encode_trace_frames,
 )
 from flight_profiler.test.plugins.trace import SENDING_FRAMES
 
@@ -22,6 +29,27 @@ class TraceFrameTest(unittest.TestCase):
         self.assertEqual(3, len(wrap_frame.frames))
         self.assertEqual(type(wrap_frame.frames[0]), type(raw_trace_frame))
 
+    def test_binary_frames_round_trip(self):
+        wrap_frame: WrapTraceFrame = WrapTraceFrame(SENDING_FRAMES + [None])
+        decoded = decode_trace_frames(encode_trace_frames(wrap_frame))
+        expected = deserialize_string_frames(WrapTraceFrame(SENDING_FRAMES))
+
+        self.assertEqual(wrap_frame.thread_id, decoded.thread_id)
+        self.assertEqual(wrap_frame.thread_name, decoded.thread_name)
+        self.assertEqual(4, len(decoded.frames))
+        self.assertIsNone(decoded.frames[3])
+        for frame, expected_frame in zip(decoded.frames, expected.frames):
+            self.assertEqual(expected_frame.description, frame.description)
+            self.assertEqual(expected_frame.start_ns, frame.start_ns)
+            self.assertEqual(expected_frame.cost_ns, frame.cost_ns)
+            self.assertEqual(expected_frame.pid, frame.pid)
+
+        # extension and encode_frames_section write the same bytes
+        wrap_frame = WrapTraceFrame(SENDING_FRAMES * 2 + [None])
+        encoded = encode_trace_frames(wrap_frame)
+        with mock.patch.object(trace_frame, "c_encode_trace_frames", None):
+            self.assertEqual(encoded, encode_trace_frames(wrap_frame))
+
     def test_build_frame_stack(self):
 
         wrap_frame: WrapTraceFrame = deserialize_string_frames(
@@ -55,3 +83,58 @@ class TraceFrameTest(unittest.TestCase):
         self.assertEqual(20000, cc_frame.cost_ns)
         self.assertEqual(1729678259755912000, cc_frame.start_ns)
         self.assertTrue(cc_frame.c_frame)
+
+    def test_aggregate_frames(self):
+        aggregator = TraceAggregator()
+        aggregator.merge(SENDING_FRAMES)
+        # second invocation calls print twice and spends less time in test_func
+        aggregator.merge(
+            [
+                "hello\x00main.py\x0011\x010\x0130000000\x01-1",
+                "test_func\x00main.py\x0028\x0110\x0120000000\x010",
+                "print\x00<built-in>\x000\x0120\x0110000\x011",
+                None,
+                "print\x00<built-in>\x000\x0140\x0130000\x011",
+            ]
+        )
+        # root frame below entrance time is skipped
+        TraceAggregator(entrance_time_ns=50000000).merge(SENDING_FRAMES)
+        self.assertEqual(2, aggregator.invocations)
+
+        root = decode_trace_aggregate(encode_trace_aggregate(aggregator))
+        self.assertEqual(2, root.count)
+        self.assertEqual(45188000 + 30000000, root.total_ns)
+        self.assertEqual(30000000, root.min_ns)
+
+        hello = root.sub_frames[0]
+        self.assertEqual("hello", hello.method_name)
+        self.assertEqual(2, hello.count)
+        self.assertEqual(7000 + 10000000, hello.self_ns)
+
+        test_func = hello.sub_frames[0]
+        self.assertEqual(45181000 + 20000000, test_func.total_ns)
+        self.assertEqual(20000000, test_func.min_ns)
+        self.assertEqual(45181000, test_func.max_ns)
+
+        print_frame = test_func.children["print\x00<built-in>\x000"]
+        self.assertTrue(print_frame.c_frame)
+        self.assertEqual(3, print_frame.count)
+        self.assertEqual(60000, print_frame.total_ns)
+        self.assertEqual(60000, print_frame.self_ns)
+        self.assertEqual([], print_frame.sub_frames)
+
+    def test_aggregate_elided_frames(self):
+        aggregator = TraceAggregator()
+        for count in (12, 30):
+            aggregator.merge(
+                [
+                    "hello\x00main.py\x0011\x010\x0130000000\x01-1",
+                    f"[elided]\x00{count} frames elided\x000\x0110\x0120000000\x010",
+                ]
+            )
+        hello = decode_trace_aggregate(encode_trace_aggregate(aggregator)).sub_frames[0]
+        # merged whatever the number of elided frames, and part of the caller's time
+        self.assertEqual(1, len(hello.sub_frames))
+        self.assertTrue(hello.sub_frames[0].elided_frame)
+        self.assertEqual(2, hello.sub_frames[0].count)
+        self.assertEqual(2 * 10000000, hello.self_ns)
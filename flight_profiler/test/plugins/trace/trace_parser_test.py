@@ -42,3 +42,27 @@ class TraceParserTest(unittest.TestCase):
         self.assertEqual("test_func", params.method_name)
         self.assertEqual("A", params.class_name)
         self.assertEqual(10, params.interval)
+        self.assertIsNone(params.output)
+
+        params = parser.parse_trace_point("__main__ A test_func --output trace.ndjson")
+        self.assertEqual("trace.ndjson", params.output)
+        self.assertFalse(params.aggregate)
+        params = parser.parse_trace_point("__main__ A test_func --output trace.json.gz")
+        self.assertEqual("trace.json.gz", params.output)
+
+        params = parser.parse_trace_point("__main__ A test_func -n 100 --aggregate")
+        self.assertTrue(params.aggregate)
+        self.assertIsNotNone(params.aggregator)
+        self.assertFalse(params.follow_threads)
+
+        params = parser.parse_trace_point("__main__ A test_func --follow-threads")
+        self.assertTrue(params.follow_threads)
+        self.assertEqual(100000, params.max_frames)
+        self.assertEqual(64 * 1024 * 1024, params.max_bytes)
+        self.assertFalse(params.monitoring)
+        params = parser.parse_trace_point("__main__ A test_func --monitoring")
+        self.assertTrue(params.monitoring)
+
+        params = parser.parse_trace_point("__main__ A test_func --max-frames 0 --max-memory 8")
+        self.assertEqual(0, params.max_frames)
+        self.assertEqual(8 * 1024 * 1024, params.max_bytes)
@@ -3,6 +3,7 @@ from typing import List
 
 from flight_profiler.plugins.trace.trace_frame import (
     FlattenTreeTraceFrame,
+    TraceAggregator,
     WrapTraceFrame,
     build_frame_stack,
     deserialize_string_frames,
@@ -63,3 +64,18 @@ class TraceRenderTest(unittest.TestCase):
 
         self.assertTrue("hello" in lines[1])
         self.assertEqual(3, len(lines))
+
+    def test_display_aggregate(self):
+        aggregator = TraceAggregator()
+        aggregator.merge(SENDING_FRAMES)
+        aggregator.merge(SENDING_FRAMES)
+        render = TraceRender(aggregator.root.total_ns)
+        lines = render.display_aggregate(aggregator.root).split("\n")
+
+        self.assertIn("aggregated invocations=2", lines[0])
+        self.assertIn("100.0% total=90.376ms", lines[1])
+        self.assertIn("hello", lines[1])
+        self.assertIn("calls=2", lines[2])
+        self.assertIn("test_func", lines[2])
+        self.assertIn("print", lines[3])
+        self.assertEqual(5, len(lines))
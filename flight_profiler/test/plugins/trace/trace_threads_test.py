@@ -0,0 +1,62 @@
+import unittest
+
+from flight_profiler.plugins.trace.trace_threads import FollowContext, FollowedThread
+
+
+def frame(description, start_ns, cost_ns, pid):
+    return f"{description}\x00/app/handler.py\x001\x01{start_ns}\x01{cost_ns}\x01{pid}"
+
+
+def followed_thread(context, submit_ns, caller=None, thread_name=None, frames=None):
+    followed: FollowedThread = context.spawn("submit", None)
+    followed.submit_ns = submit_ns
+    followed.caller_description = caller
+    followed.thread_name = thread_name
+    followed.start_ns = submit_ns + 10
+    followed.end_ns = submit_ns + 110
+    followed.frames = frames
+    return followed
+
+
+class TraceThreadsTest(unittest.TestCase):
+
+    def test_stitch(self):
+        context = FollowContext(None, 0, -1)
+        frames = [
+            frame("handle", 1000, 1000, -1),
+            frame("prepare", 1100, 100, 0),
+            None,
+            frame("dispatch", 1300, 500, 0),
+            frame("submit", 1400, 50, 3),
+        ]
+        # submitted by dispatch, while the submit frame of executor was running
+        followed_thread(
+            context,
+            1420,
+            caller="dispatch\x00/app/handler.py\x001",
+            thread_name="pool_0",
+            frames=[frame("work", 1430, 100, -1), None, frame("query", 1440, 50, 0)],
+        )
+        # caller is not traced, falls back to the deepest running frame
+        followed_thread(context, 1150, caller="helper\x00/app/helper.py\x001", thread_name="pool_1")
+        # not picked by a worker yet
+        followed_thread(context, 1900)
+
+        stitched = context.stitch(list(frames))
+        self.assertEqual(frames, stitched[:5])
+        parts = [None if f is None else f.split("\x01") for f in stitched[5:]]
+        self.assertEqual(["[thread]\x00pool_0\x000", "1430", "100", "3"], parts[0])
+        self.assertEqual(["work\x00/app/handler.py\x001", "1430", "100", "5"], parts[1])
+        self.assertIsNone(parts[2])
+        self.assertEqual("6", parts[3][3])
+        self.assertEqual("[thread]\x00pool_1 (running)\x000", parts[4][0])
+        self.assertEqual("1", parts[4][3])
+        self.assertEqual("[thread]\x00queued (submit)\x000", parts[5][0])
+        self.assertEqual("0", parts[5][3])
+
+        # threads are stitched once
+        self.assertEqual(frames, context.stitch(list(frames)))
+
+
+if __name__ == "__main__":
+    unittest.main()
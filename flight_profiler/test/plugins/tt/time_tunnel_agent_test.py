@@ -9,6 +9,8 @@ from flight_profiler.plugins.tt.time_tunnel_parser import TimeTunnelArgumentPars
 from flight_profiler.plugins.tt.time_tunnel_recorder import (
     BaseInvocationRecord,
     FullInvocationRecord,
+    decode_base_record,
+    decode_full_record,
     global_tt_indexer,
 )
 
@@ -21,6 +23,17 @@ class A:
         print("hello")
 
 
+class Repo:
+    def get_user(self):
+        return "user"
+
+    def get_order(self):
+        return "order"
+
+    def save(self):
+        pass
+
+
 def func():
     print("hello")
 
@@ -57,7 +70,7 @@ class TimeTunnelAgentTest(unittest.TestCase):
         result = loop.run_until_complete(get_msg_with_title(out_q))
         self.assertIsNotNone(result)
 
-        record: BaseInvocationRecord = pickle.loads(result.msg)
+        record: BaseInvocationRecord = decode_base_record(result.msg)
 
         self.assertEqual(
             "flight_profiler.test.plugins.tt.time_tunnel_agent_test", record.module_name
@@ -77,7 +90,7 @@ class TimeTunnelAgentTest(unittest.TestCase):
 
         self.assertIsNotNone(result)
 
-        record: FullInvocationRecord = pickle.loads(result.msg)
+        record: FullInvocationRecord = decode_full_record(result.msg)
 
         self.assertEqual(type(record), FullInvocationRecord)
 
@@ -99,7 +112,7 @@ class TimeTunnelAgentTest(unittest.TestCase):
 
         self.assertIsNotNone(result)
 
-        record: FullInvocationRecord = pickle.loads(result.msg)
+        record: FullInvocationRecord = decode_full_record(result.msg)
 
         self.assertEqual(type(record), FullInvocationRecord)
 
@@ -146,7 +159,7 @@ class TimeTunnelAgentTest(unittest.TestCase):
         result = loop.run_until_complete(get_msg_with_title())
         self.assertIsNotNone(result)
 
-        record: BaseInvocationRecord = pickle.loads(result.msg)
+        record: BaseInvocationRecord = decode_base_record(result.msg)
 
         self.assertEqual(
             "flight_profiler.test.plugins.tt.time_tunnel_agent_test", record.module_name
@@ -182,7 +195,7 @@ class TimeTunnelAgentTest(unittest.TestCase):
         self.assertIsNotNone(result)
         self.assertFalse(result.is_end)
 
-        record: BaseInvocationRecord = pickle.loads(result.msg)
+        record: BaseInvocationRecord = decode_base_record(result.msg)
 
         self.assertEqual(
             "flight_profiler.test.plugins.tt.time_tunnel_agent_test", record.module_name
@@ -216,7 +229,7 @@ class TimeTunnelAgentTest(unittest.TestCase):
         self.assertIsNotNone(result)
         self.assertFalse(result.is_end)
 
-        record: BaseInvocationRecord = pickle.loads(result.msg)
+        record: BaseInvocationRecord = decode_base_record(result.msg)
 
         self.assertEqual(
             "flight_profiler.test.plugins.tt.time_tunnel_agent_test", record.module_name
@@ -226,6 +239,86 @@ class TimeTunnelAgentTest(unittest.TestCase):
         self.assertTrue(record.is_ret)
         self.assertFalse(record.is_exp)
 
+    def test_time_tunnel_pattern_group(self):
+        out_q = Queue(maxsize=200)
+        try:
+            loop = asyncio.get_event_loop()
+        except:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+        origin_code = Repo.get_user.__code__
+        tt_cmds = TimeTunnelArgumentParser().parse_time_tunnel_cmds(
+            "-t flight_profiler.test.plugins.tt.time_tunnel_agent_test Repo get_* -n 2"
+        )
+        self.assertEqual(["get_order", "get_user"], [c.method_name for c in tt_cmds])
+        server_q = ServerQueue(out_q, loop)
+        for tt_cmd in tt_cmds:
+            tt_cmd.out_q = server_q
+        global_tt_agent.on_action(tt_cmds[0])
+        repo = Repo()
+        repo.save()
+        repo.get_user()
+        repo.get_order()
+        # limit is shared by the group, exceeded calls are not recorded
+        repo.get_user()
+
+        async def get_msgs():
+            # one injected message for the group, two records and one end message
+            return [await out_q.get() for _ in range(4)]
+
+        hint_msg, user_msg, order_msg, end_msg = loop.run_until_complete(get_msgs())
+        self.assertIn("2 methods", pickle.loads(hint_msg.msg))
+        self.assertEqual("get_user", decode_base_record(user_msg.msg).method_name)
+        self.assertEqual("get_order", decode_base_record(order_msg.msg).method_name)
+        self.assertTrue(end_msg.is_end)
+        self.assertTrue(out_q.empty())
+        for tt_cmd in tt_cmds:
+            self.assertTrue(tt_cmd.unique_key() not in global_tt_agent.aop_points)
+        self.assertIs(origin_code, Repo.get_user.__code__)
+
+    def test_time_tunnel_pattern_off(self):
+        out_q = Queue(maxsize=200)
+        try:
+            loop = asyncio.get_event_loop()
+        except:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+        command = (
+            "-t flight_profiler.test.plugins.tt.time_tunnel_agent_test Repo.get_* --max-targets 2"
+        )
+        origin_codes = (Repo.get_user.__code__, Repo.get_order.__code__)
+        tt_cmds = TimeTunnelArgumentParser().parse_time_tunnel_cmds(command)
+        server_q = ServerQueue(out_q, loop)
+        for tt_cmd in tt_cmds:
+            tt_cmd.out_q = server_q
+        global_tt_agent.on_action(tt_cmds[0])
+        self.assertIsNot(origin_codes[1], Repo.get_order.__code__)
+
+        # the pattern now matches more methods than --max-targets, off doesn't resolve
+        # it again and clears the recorded group with one end message
+        Repo.get_total = lambda self: 0
+        try:
+            off_cmd = TimeTunnelArgumentParser().parse_time_tunnel_cmd(command)
+            off_cmd.out_q = server_q
+            global_tt_agent.off_action(off_cmd)
+            hint_msg, end_msg = loop.run_until_complete(
+                asyncio.gather(out_q.get(), out_q.get())
+            )
+            self.assertTrue(end_msg.is_end)
+            self.assertTrue(out_q.empty())
+            self.assertEqual(
+                origin_codes, (Repo.get_user.__code__, Repo.get_order.__code__)
+            )
+            self.assertNotIn(off_cmd.group_key(), global_tt_agent.groups)
+        finally:
+            del Repo.get_total
+
+    def test_time_tunnel_pattern_no_match(self):
+        with self.assertRaises(ValueError):
+            TimeTunnelArgumentParser().parse_time_tunnel_cmds(
+                "-t flight_profiler.test.plugins.tt.time_tunnel_agent_test Repo delete_*"
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from flight_profiler.plugins.tt.time_tunnel_benchmark import ReplayBenchmark
+
+
+class Counter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.threads = set()
+        self.loops = set()
+
+    def func(self, fail_every):
+        with self.lock:
+            self.calls += 1
+            self.threads.add(threading.get_ident())
+            calls = self.calls
+        time.sleep(0.001)
+        if calls % fail_every == 0:
+            raise ValueError(f"call {calls}")
+
+    async def async_func(self):
+        self.loops.add(id(asyncio.get_running_loop()))
+        await asyncio.sleep(0.001)
+        self.calls += 1
+
+
+class ReplayBenchmarkTest(unittest.TestCase):
+
+    def test_threads(self):
+        counter = Counter()
+        benchmark = ReplayBenchmark(
+            1000, "__main__.Counter.func", counter.func, (10,), {}, times=200, concurrency=4
+        )
+        reports = []
+        summary = benchmark.run(reports.append, interval=0.01)
+        self.assertTrue(summary.finished)
+        self.assertEqual(200, summary.completed)
+        self.assertEqual(200, counter.calls)
+        self.assertEqual(20, summary.error_count)
+        self.assertIn("ValueError: call 10", summary.first_error)
+        self.assertEqual(200, summary.histogram.count)
+        self.assertTrue(summary.min_ms >= 1)
+        self.assertTrue(summary.percentile_ms(0.5) <= summary.max_ms)
+        self.assertTrue(summary.throughput > 0)
+        self.assertTrue(1 < len(counter.threads) <= 4)
+        self.assertTrue(all(not report.finished for report in reports))
+
+    def test_coroutine_shares_loop(self):
+        counter = Counter()
+        summary = ReplayBenchmark(
+            1000, "__main__.Counter.async_func", counter.async_func, (), {}, times=50, concurrency=8
+        ).run()
+        self.assertEqual(50, summary.completed)
+        self.assertEqual(0, summary.error_count)
+        self.assertEqual(1, len(counter.loops))
+
+    def test_stop(self):
+        counter = Counter()
+        benchmark = ReplayBenchmark(
+            1000, "__main__.Counter.func", counter.func, (10 ** 9,), {}, times=10 ** 6, concurrency=2
+        )
+        threading.Timer(0.05, benchmark.stop).start()
+        summary = benchmark.run()
+        self.assertTrue(0 < summary.completed < 10 ** 6)
+        self.assertEqual(summary.completed, counter.calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,18 @@
 import unittest
+from argparse import ArgumentTypeError
 
 from flight_profiler.plugins.tt.time_tunnel_agent import TimeTunnelCmd
 from flight_profiler.plugins.tt.time_tunnel_parser import TimeTunnelArgumentParser
 
 
+class OrderRepo:
+    def get_order(self):
+        pass
+
+    def get_user(self):
+        pass
+
+
 class TimeTunnelParserTest(unittest.TestCase):
 
     def setUp(self):
@@ -48,3 +57,58 @@ class TimeTunnelParserTest(unittest.TestCase):
         cmd: TimeTunnelCmd = self.parser.parse_time_tunnel_cmd(list_src)
         self.assertTrue(cmd.show_list)
         self.assertEqual("__main__.A.hello", cmd.method_filter)
+
+        output_src = "-t __main__ A func --output /tmp/tt.bin.gz"
+        cmd: TimeTunnelCmd = self.parser.parse_time_tunnel_cmd(output_src)
+        self.assertEqual("/tmp/tt.bin.gz", cmd.output)
+        self.assertEqual("func", cmd.method_name)
+
+        query_src = "-l --top 10 --since 5m --exception --page 2 --page-size 100"
+        cmd: TimeTunnelCmd = self.parser.parse_time_tunnel_cmd(query_src)
+        cmd.valid()
+        self.assertEqual("cost", cmd.sort)
+        self.assertTrue(cmd.descending)
+        self.assertEqual(300, cmd.since)
+        self.assertTrue(cmd.exception_only)
+        self.assertEqual((2, 100), (cmd.page, cmd.page_size))
+
+        spill_src = "-t __main__ func --spill /tmp/tt --spill-max-bytes 10g"
+        cmd: TimeTunnelCmd = self.parser.parse_time_tunnel_cmd(spill_src)
+        self.assertEqual("/tmp/tt", cmd.spill)
+        self.assertEqual(10 * 1024 ** 3, cmd.spill_max_bytes)
+
+        benchmark_src = "-i 1000 -p --times 1000 --concurrency 8"
+        cmd: TimeTunnelCmd = self.parser.parse_time_tunnel_cmd(benchmark_src)
+        cmd.valid()
+        self.assertEqual((1000, 8), (cmd.times, cmd.concurrency))
+        with self.assertRaises(ArgumentTypeError):
+            self.parser.parse_time_tunnel_cmd("-i 1000 --times 10").valid()
+
+        stats_src = "-s --max-records 5000 --max-bytes 64m --evict lru"
+        cmd: TimeTunnelCmd = self.parser.parse_time_tunnel_cmd(stats_src)
+        cmd.valid()
+        self.assertTrue(cmd.show_stats)
+        self.assertEqual(5000, cmd.max_records)
+        self.assertEqual(64 * 1024 * 1024, cmd.max_bytes)
+        self.assertEqual("lru", cmd.evict_policy)
+        with self.assertRaises(Exception):
+            self.parser.parse_time_tunnel_cmd("-s --max-bytes 64mb")
+
+    def test_parse_pattern(self):
+        pattern_src = "-t flight_profiler.test.plugins.tt.time_tunnel_pars* *Repo.get_* --max-targets 100"
+        # client side keeps patterns unresolved
+        cmd: TimeTunnelCmd = self.parser.parse_time_tunnel_cmd(pattern_src)
+        self.assertEqual("*Repo.get_*", cmd.method_name)
+        self.assertEqual(100, cmd.max_targets)
+        cmds = self.parser.parse_time_tunnel_cmds(pattern_src)
+        self.assertEqual(
+            [("OrderRepo", "get_order"), ("OrderRepo", "get_user")],
+            [(c.class_name, c.method_name) for c in cmds],
+        )
+        self.assertEqual(
+            "flight_profiler.test.plugins.tt.time_tunnel_parser_test", cmds[0].module_name
+        )
+        self.assertIs(cmds[0].members, cmds[1].members)
+        self.assertEqual(1, len(self.parser.parse_time_tunnel_cmds("-t __main__ func")))
+        with self.assertRaises(Exception):
+            self.parser.parse_time_tunnel_cmds(pattern_src + " -nm inner")
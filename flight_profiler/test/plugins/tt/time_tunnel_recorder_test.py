@@ -1,5 +1,7 @@
 import asyncio
+import os
 import pickle
+import tempfile
 import time
 import unittest
 from asyncio import Queue
@@ -11,8 +13,11 @@ from flight_profiler.plugins.tt.time_tunnel_recorder import (
     BaseInvocationRecord,
     FullInvocationRecord,
     TimeTunnelRecorder,
+    decode_base_records,
+    decode_full_record,
     global_tt_indexer,
 )
+from flight_profiler.plugins.tt.time_tunnel_spill import SpilledRecord
 
 
 class A:
@@ -68,7 +73,7 @@ class TimeTunnelRecorderTest(unittest.TestCase):
 
         msg: Message = loop.run_until_complete(get_msg(out_q))
         self.assertTrue(msg.is_end)
-        record_list = pickle.loads(msg.msg)
+        record_list = decode_base_records(msg.msg)
 
         self.assertEqual(type(record_list), list)
         self.assertEqual(1, len(record_list))
@@ -87,11 +92,60 @@ class TimeTunnelRecorderTest(unittest.TestCase):
         recorder.show_list_records(cmd)
 
         msg: Message = loop.run_until_complete(get_msg(out_q))
-        record_list = pickle.loads(msg.msg)
+        record_list = decode_base_records(msg.msg)
         self.assertTrue(msg.is_end)
         self.assertEqual(type(record_list), list)
         self.assertEqual(0, len(record_list))
 
+    def test_show_list_pages(self):
+        recorder, record = self.record_and_return()
+        for cost_ms in range(1, 10):
+            recorder.records(
+                index=global_tt_indexer.get_index(),
+                start_time=int(time.time() * 1000),
+                cost_ms=cost_ms,
+                is_ret=cost_ms % 3 != 0,
+                is_exp=cost_ms % 3 == 0,
+                module_name="flight_profiler.test.plugins.tt.time_tunnel_recorder_test",
+                class_name="A",
+                method_name="func",
+                args=[None, f"key{cost_ms}"],
+                kwargs={},
+                return_obj=None,
+                exp_obj=None,
+            )
+
+        out_q = Queue(maxsize=200)
+        try:
+            loop = asyncio.get_event_loop()
+        except:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+
+        def list_pages(cmd_str):
+            cmd = TimeTunnelArgumentParser().parse_time_tunnel_cmd(cmd_str)
+            cmd.out_q = ServerQueue(out_q, loop)
+            recorder.show_list_records(cmd)
+            loop.run_until_complete(asyncio.sleep(0))
+            pages = []
+            while not out_q.empty():
+                msg: Message = out_q.get_nowait()
+                pages.append([r.index for r in decode_base_records(msg.msg)])
+                self.assertEqual(out_q.empty(), msg.is_end)
+            return pages
+
+        self.assertEqual(
+            [[1000, 1001, 1002, 1003], [1004, 1005, 1006, 1007], [1008, 1009]],
+            list_pages("-l --page-size 4"),
+        )
+        self.assertEqual([[1004, 1005, 1006, 1007]], list_pages("-l --page-size 4 --page 2"))
+        self.assertEqual([[1000, 1009, 1008]], list_pages("-l --top 3"))
+        self.assertEqual([[1003, 1006, 1009]], list_pages("-l --exception --since 1h"))
+        self.assertEqual([[1006, 1009]], list_pages("-l --exception --min-cost 5"))
+        self.assertEqual([[1009]], list_pages("-l -f cost<40 --top 1"))
+        self.assertEqual([[]], list_pages("-l --until 1h -m __main__.A.func"))
+        global_tt_indexer.refresh()
+
     def test_index_records(self):
         recorder, record = self.record_and_return()
 
@@ -112,7 +166,7 @@ class TimeTunnelRecorderTest(unittest.TestCase):
         msg: Message = loop.run_until_complete(get_msg(out_q))
         self.assertTrue(msg.is_end)
 
-        full_record: FullInvocationRecord = pickle.loads(msg.msg)
+        full_record: FullInvocationRecord = decode_full_record(msg.msg)
         self.assertEqual(1000, full_record.base_record.index)
         self.assertEqual("[\n  \"key1\"\n]", full_record.args)
         self.assertEqual("None", full_record.exp_obj)
@@ -127,6 +181,156 @@ class TimeTunnelRecorderTest(unittest.TestCase):
         self.assertTrue(recorder.delete_specified_record(1000))
         self.assertEqual(0, len(recorder.invocation_records))
 
+    def test_bounded_records(self):
+        recorder, record = self.record_and_return()
+        cmd = TimeTunnelArgumentParser().parse_time_tunnel_cmd("-s --max-records 2 --evict lru")
+        recorder.configure(cmd)
+        for name in ("key2", "key3"):
+            recorder.records(
+                index=global_tt_indexer.get_index(),
+                start_time=int(time.time()),
+                cost_ms=40,
+                is_ret=True,
+                is_exp=False,
+                module_name="flight_profiler.test.plugins.tt.time_tunnel_recorder_test",
+                class_name="A",
+                method_name="func",
+                args=[None, name],
+                kwargs={},
+                return_obj=name,
+                exp_obj=None,
+            )
+        self.assertEqual(2, len(recorder.invocation_records))
+        self.assertNotIn(1000, recorder.invocation_records)
+
+        out_q = Queue(maxsize=200)
+        try:
+            loop = asyncio.get_event_loop()
+        except:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+        cmd.out_q = ServerQueue(out_q, loop)
+        recorder.show_store_stats(cmd)
+
+        async def get_msg(q):
+            return await q.get()
+
+        msg: Message = loop.run_until_complete(get_msg(out_q))
+        self.assertTrue(msg.is_end)
+        self.assertIn("records: 2/2", msg.msg)
+        self.assertIn("evict policy: lru", msg.msg)
+        self.assertIn("evicted: 1 records", msg.msg)
+
+    def test_spill_records(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            global_tt_indexer.refresh()
+            recorder = TimeTunnelRecorder()
+            recorder.configure(
+                TimeTunnelArgumentParser().parse_time_tunnel_cmd(f"-s --spill {tmp_dir}")
+            )
+            record = recorder.records(
+                index=global_tt_indexer.get_index(),
+                start_time=int(time.time() * 1000),
+                cost_ms=40,
+                is_ret=True,
+                is_exp=False,
+                module_name="flight_profiler.test.plugins.tt.time_tunnel_recorder_test",
+                class_name="A",
+                method_name="func",
+                args=[A(), "key1"],
+                kwargs={},
+                return_obj="key1",
+                exp_obj=None,
+            )
+            self.assertIsInstance(recorder.invocation_records.get(1000), SpilledRecord)
+
+            out_q = Queue(maxsize=200)
+            try:
+                loop = asyncio.get_event_loop()
+            except:
+                loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(loop)
+
+            async def get_msg(q):
+                return await q.get()
+
+            # objects are read back from segment file
+            cmd = TimeTunnelArgumentParser().parse_time_tunnel_cmd("-i 1000")
+            cmd.out_q = ServerQueue(out_q, loop)
+            recorder.show_indexed_record(cmd)
+            full_record = decode_full_record(loop.run_until_complete(get_msg(out_q)).msg)
+            self.assertEqual("[\n  \"key1\"\n]", full_record.args)
+
+            cmd = TimeTunnelArgumentParser().parse_time_tunnel_cmd("-i 1000 -p")
+            cmd.out_q = ServerQueue(out_q, loop)
+            recorder.replay_time_fragment(cmd)
+            full_record = decode_full_record(loop.run_until_complete(get_msg(out_q)).msg)
+            self.assertEqual(1001, full_record.base_record.index)
+            self.assertEqual('"key1"', full_record.return_obj)
+            self.assertIsInstance(recorder.invocation_records.get(1001), SpilledRecord)
+
+            cmd = TimeTunnelArgumentParser().parse_time_tunnel_cmd("-s")
+            cmd.out_q = ServerQueue(out_q, loop)
+            recorder.show_store_stats(cmd)
+            self.assertIn(f"spilled to: {tmp_dir}", loop.run_until_complete(get_msg(out_q)).msg)
+
+            recorder.delete_all_records()
+            self.assertEqual(0, len(recorder.invocation_records))
+            self.assertEqual(1, len(os.listdir(tmp_dir)))
+
+            recorder.records(
+                index=global_tt_indexer.get_index(),
+                start_time=int(time.time() * 1000),
+                cost_ms=40,
+                is_ret=True,
+                is_exp=False,
+                module_name="flight_profiler.test.plugins.tt.time_tunnel_recorder_test",
+                class_name="A",
+                method_name="func",
+                args=[A(), "key2"],
+                kwargs={},
+                return_obj="key2",
+                exp_obj=None,
+            )
+            recorder.configure(TimeTunnelArgumentParser().parse_time_tunnel_cmd("-s --spill off"))
+            self.assertIsNone(recorder.spill)
+            self.assertEqual(0, len(recorder.invocation_records))
+            self.assertEqual([], os.listdir(tmp_dir))
+            global_tt_indexer.refresh()
+
+    def test_replay_benchmark(self):
+        recorder, record = self.record_and_return()
+
+        out_q = Queue(maxsize=200)
+        try:
+            loop = asyncio.get_event_loop()
+        except:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+        cmd = TimeTunnelArgumentParser().parse_time_tunnel_cmd(
+            "-i 1000 -p --times 20 --concurrency 2"
+        )
+        cmd.valid()
+        cmd.out_q = ServerQueue(out_q, loop)
+
+        recorder.replay_time_fragment(cmd)
+        loop.run_until_complete(asyncio.sleep(0))
+
+        msg: Message = out_q.get_nowait()
+        while not msg.is_end:
+            msg = out_q.get_nowait()
+        summary = pickle.loads(msg.msg)
+        self.assertTrue(summary.finished)
+        self.assertEqual(20, summary.completed)
+        self.assertEqual(0, summary.error_count)
+        self.assertEqual(
+            "flight_profiler.test.plugins.tt.time_tunnel_recorder_test.A.func",
+            summary.method_identifier,
+        )
+        # benchmark replays are not recorded
+        self.assertEqual(1, len(recorder.invocation_records))
+        self.assertEqual({}, recorder.benchmarks)
+
     def test_replay_method(self):
         recorder, record = self.record_and_return()
 
@@ -147,7 +351,7 @@ class TimeTunnelRecorderTest(unittest.TestCase):
         msg: Message = loop.run_until_complete(get_msg(out_q))
         self.assertTrue(msg.is_end)
 
-        full_record: FullInvocationRecord = pickle.loads(msg.msg)
+        full_record: FullInvocationRecord = decode_full_record(msg.msg)
         self.assertEqual(1001, full_record.base_record.index)
         self.assertEqual("[\n  \"key1\"\n]", full_record.args)
         self.assertEqual("None", full_record.exp_obj)
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from flight_profiler.plugins.tt.time_tunnel_spill import (
+    SEGMENT_MAGIC,
+    TimeTunnelSpill,
+    UnpicklableValue,
+    dump_payload,
+    has_unpicklable,
+    load_payload,
+)
+
+
+class Session:
+    def __init__(self, user):
+        self.user = user
+        self.lock = threading.Lock()
+
+
+class TimeTunnelSpillTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_payload(self):
+        args, kwargs, return_obj, exp_obj = load_payload(
+            dump_payload((1, "a"), {"key": [1, 2]}, {"ok": True}, None)
+        )
+        self.assertEqual((1, "a"), args)
+        self.assertEqual({"key": [1, 2]}, kwargs)
+        self.assertEqual({"ok": True}, return_obj)
+        self.assertFalse(has_unpicklable(args))
+
+        # only values pickle rejects are kept as text
+        args, kwargs, return_obj, _ = load_payload(
+            dump_payload((Session("alice"), 1), {"lock": threading.Lock()}, "done", None)
+        )
+        self.assertIsInstance(args[0], UnpicklableValue)
+        self.assertIn('"user": "alice"', repr(args[0]))
+        self.assertEqual(1, args[1])
+        self.assertTrue(has_unpicklable(args))
+        self.assertTrue(has_unpicklable(kwargs))
+        self.assertEqual("done", return_obj)
+
+    def test_write_read(self):
+        spill = TimeTunnelSpill(self.tmp_dir.name)
+        locations = [spill.write(index, f"payload-{index}".encode())[0] for index in range(100)]
+        self.assertEqual(b"payload-42", spill.read(locations[42]))
+        # reads after more appends remap the segment
+        location, _ = spill.write(100, b"payload-100")
+        self.assertEqual(b"payload-100", spill.read(location))
+        self.assertEqual(b"payload-0", spill.read(locations[0]))
+
+        path = spill.segments[0].path
+        spill.segments[0].file.flush()
+        with open(path, "rb") as f:
+            self.assertEqual(SEGMENT_MAGIC, f.read(len(SEGMENT_MAGIC)))
+        spill.close()
+        self.assertFalse(os.path.exists(path))
+        self.assertIsNone(spill.read(location))
+
+    def test_drop_oldest(self):
+        spill = TimeTunnelSpill(self.tmp_dir.name, max_bytes=3000, segment_bytes=1000)
+        dropped = []
+        first = None
+        for index in range(20):
+            location, indexes = spill.write(index, b"x" * 200)
+            first = first or location
+            dropped.extend(indexes)
+        self.assertTrue(spill.disk_bytes() <= 3000)
+        self.assertEqual(list(range(len(dropped))), dropped)
+        self.assertIsNone(spill.read(first))
+        spill.clear()
+        self.assertEqual(1, len(spill.segments))
+        self.assertEqual(1, len(os.listdir(self.tmp_dir.name)))
+        spill.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+import sys
+import unittest
+
+from flight_profiler.plugins.tt.time_tunnel_recorder import (
+    BaseInvocationRecord,
+    FullInvocationRecord,
+)
+from flight_profiler.plugins.tt.time_tunnel_store import (
+    EVICT_LRU,
+    SORT_COST,
+    SORT_TIME,
+    TimeTunnelQuery,
+    TimeTunnelStore,
+    estimate_size,
+    format_bytes,
+    parse_duration,
+    parse_size,
+)
+
+
+class Payload:
+    def __init__(self, data):
+        self.data = data
+
+
+def make_record(index, timestamp=0, cost_ms=1.0, is_exp=False, method_name="func"):
+    return FullInvocationRecord(
+        BaseInvocationRecord(
+            index, timestamp, cost_ms, not is_exp, is_exp, "__main__", None, method_name
+        ),
+        args=(),
+        kwargs={},
+        return_obj=None,
+        exp_obj=None,
+    )
+
+
+def indexes(records):
+    return [record.base_record.index for record in records]
+
+
+class TimeTunnelStoreTest(unittest.TestCase):
+
+    def test_parse_size(self):
+        self.assertEqual(512, parse_size("512"))
+        self.assertEqual(64 * 1024 * 1024, parse_size("64m"))
+        self.assertEqual(1536, parse_size("1.5K"))
+        with self.assertRaises(ValueError):
+            parse_size("64mb")
+        with self.assertRaises(ValueError):
+            parse_size("0")
+        self.assertEqual("1.5KB", format_bytes(1536))
+
+    def test_estimate_size(self):
+        data = "x" * 10000
+        self.assertTrue(estimate_size(data) >= 10000)
+        # sampled items are extrapolated to the whole container
+        items = [data] * 100
+        self.assertTrue(estimate_size(items) >= 100 * 10000)
+        self.assertTrue(estimate_size({"key": data}) >= 10000)
+        self.assertTrue(estimate_size(Payload(data)) >= 10000)
+        self.assertEqual(sys.getsizeof(items), estimate_size(items, depth=0))
+
+    def test_evict_by_count(self):
+        store = TimeTunnelStore(max_records=3)
+        for index in range(5):
+            store.put(index, make_record(index), 10)
+        self.assertEqual([2, 3, 4], list(store.records))
+        self.assertNotIn(0, store)
+        self.assertEqual(4, store[4].base_record.index)
+        stats = store.stats()
+        self.assertEqual(3, stats.records)
+        self.assertEqual(30, stats.estimated_bytes)
+        self.assertEqual(2, stats.evicted)
+        self.assertEqual(20, stats.evicted_bytes)
+
+    def test_evict_by_bytes(self):
+        store = TimeTunnelStore(max_bytes=100)
+        store.put(1, make_record(1), 60)
+        store.put(2, make_record(2), 30)
+        store.put(3, make_record(3), 30)
+        self.assertEqual([2, 3], list(store.records))
+        # a record larger than the whole budget is still kept alone
+        store.put(4, make_record(4), 500)
+        self.assertEqual([4], list(store.records))
+
+    def test_evict_lru(self):
+        store = TimeTunnelStore(max_records=2, policy=EVICT_LRU)
+        store.put(1, make_record(1), 1)
+        store.put(2, make_record(2), 1)
+        store.get(1)
+        store.put(3, make_record(3), 1)
+        self.assertEqual([1, 3], list(store.records))
+
+    def test_configure_and_pop(self):
+        store = TimeTunnelStore()
+        for index in range(10):
+            store.put(index, make_record(index), 1)
+        store.configure(max_records=4)
+        self.assertEqual(4, len(store))
+        self.assertEqual(9, store.pop(9).base_record.index)
+        self.assertIsNone(store.pop(9))
+        self.assertEqual(3, store.stats().estimated_bytes)
+        with self.assertRaises(ValueError):
+            store.configure(policy="random")
+        store.clear()
+        self.assertEqual(0, store.stats().estimated_bytes)
+        self.assertEqual([], list(store.query(TimeTunnelQuery())))
+
+    def test_parse_duration(self):
+        self.assertEqual(30, parse_duration("30s"))
+        self.assertEqual(5400, parse_duration("1.5h"))
+        with self.assertRaises(ValueError):
+            parse_duration("30")
+        with self.assertRaises(ValueError):
+            parse_duration("-1m")
+
+    def test_query(self):
+        store = TimeTunnelStore()
+        for index in range(100):
+            store.put(
+                index,
+                make_record(
+                    index,
+                    timestamp=1000 + index * 10,
+                    cost_ms=float((index * 37) % 100),
+                    is_exp=index % 10 == 0,
+                    method_name="even" if index % 2 == 0 else "odd",
+                ),
+                1,
+            )
+        self.assertEqual(list(range(100)), indexes(store.query(TimeTunnelQuery())))
+        self.assertEqual(
+            list(range(98, -1, -2)),
+            indexes(store.query(TimeTunnelQuery(method="__main__.None.even", descending=True))),
+        )
+        self.assertEqual(
+            [0, 10, 20],
+            indexes(store.query(TimeTunnelQuery(exception_only=True, end_ms=1200))),
+        )
+        self.assertEqual(
+            [50, 51, 52],
+            indexes(store.query(TimeTunnelQuery(start_ms=1500, end_ms=1520, sort=SORT_TIME))),
+        )
+        by_cost = [
+            record.base_record.cost_ms
+            for record in store.query(TimeTunnelQuery(sort=SORT_COST, descending=True))
+        ]
+        self.assertEqual(sorted(by_cost, reverse=True), by_cost)
+        self.assertEqual(100, len(by_cost))
+        slow = list(store.query(TimeTunnelQuery(sort=SORT_COST, min_cost_ms=90)))
+        self.assertEqual(list(range(90, 100)), [r.base_record.cost_ms for r in slow])
+
+        # indexes follow deletion and eviction
+        store.pop(0)
+        store.configure(max_records=50)
+        self.assertEqual(
+            [50, 60, 70, 80, 90],
+            indexes(store.query(TimeTunnelQuery(exception_only=True))),
+        )
+        self.assertNotIn(0, store.by_exception)
+        self.assertEqual(50, sum(len(v) for v in store.by_cost.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,18 @@
 import asyncio
 import pickle
+import time
 import unittest
 from asyncio import Queue
 
 from flight_profiler.plugins.server_plugin import ServerQueue
 from flight_profiler.plugins.watch.watch_agent import global_watch_agent
-from flight_profiler.plugins.watch.watch_displayer import WatchResult
+from flight_profiler.plugins.watch.watch_displayer import (
+    WatchResult,
+    decode_watch_result,
+)
+from flight_profiler.plugins.watch.watch_monitor import MonitorSummary
 from flight_profiler.plugins.watch.watch_parser import WatchArgumentParser
+from flight_profiler.plugins.watch.watch_trigger import TRIGGER_REFRESH
 
 
 class A:
@@ -22,6 +28,25 @@ def test_func():
     return "hello"
 
 
+class Repo:
+    def get_user(self):
+        return "user"
+
+    def get_order(self):
+        return "order"
+
+    def save(self):
+        return "saved"
+
+
+def echo_func(items):
+    return items
+
+
+def sleep_func(seconds):
+    time.sleep(seconds)
+
+
 def test_builtin_func():
     serialize_msg = pickle.dumps("hello")
     return pickle.loads(serialize_msg)
@@ -50,7 +75,7 @@ class WatchAgentTest(unittest.TestCase):
         result = loop.run_until_complete(get_msg())
         self.assertIsNotNone(result)
 
-        watch_result: WatchResult = pickle.loads(result.msg)
+        watch_result: WatchResult = decode_watch_result(result.msg)
         self.assertTrue(isinstance(watch_result, WatchResult))
         self.assertEqual("\"hello\"", watch_result.value)
 
@@ -85,7 +110,7 @@ class WatchAgentTest(unittest.TestCase):
         result = loop.run_until_complete(get_msg())
         self.assertIsNotNone(result)
 
-        watch_result: WatchResult = pickle.loads(result.msg)
+        watch_result: WatchResult = decode_watch_result(result.msg)
         self.assertTrue(isinstance(watch_result, WatchResult))
         self.assertEqual("\"hello\"", watch_result.value)
 
@@ -120,7 +145,7 @@ class WatchAgentTest(unittest.TestCase):
         result = loop.run_until_complete(get_msg())
         self.assertIsNotNone(result)
 
-        watch_result: WatchResult = pickle.loads(result.msg)
+        watch_result: WatchResult = decode_watch_result(result.msg)
         self.assertTrue(isinstance(watch_result, WatchResult))
         self.assertEqual("\"hello\"", watch_result.value)
 
@@ -155,7 +180,7 @@ class WatchAgentTest(unittest.TestCase):
         result = loop.run_until_complete(get_msg())
         self.assertIsNotNone(result)
 
-        watch_result: WatchResult = pickle.loads(result.msg)
+        watch_result: WatchResult = decode_watch_result(result.msg)
         self.assertTrue(isinstance(watch_result, WatchResult))
         self.assertEqual("\"hello\"", watch_result.value)
 
@@ -163,6 +188,177 @@ class WatchAgentTest(unittest.TestCase):
         global_watch_agent.clear_watch(watch_setting)
         self.assertTrue("pickle&None&loads&None" not in global_watch_agent.aop_points)
 
+    def test_watch_offload_func(self):
+        out_q = Queue(maxsize=200)
+        try:
+            loop = asyncio.get_event_loop()
+        except:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+        watch_setting = WatchArgumentParser().parse_watch_setting(
+            "flight_profiler.test.plugins.watch.watch_agent_test echo_func"
+            " --expr args[0] --offload copy -n 1"
+        )
+        watch_setting.out_q = ServerQueue(out_q, loop)
+        global_watch_agent.add_watch(watch_setting)
+        items = [1]
+        echo_func(items)
+        # copy policy dumps the list as it was when the call returned
+        items.append(2)
+
+        async def get_msgs():
+            # skip wrapper injected message, then watch result and end message
+            await out_q.get()
+            return await out_q.get(), await out_q.get()
+
+        result_msg, end_msg = loop.run_until_complete(get_msgs())
+        watch_result: WatchResult = decode_watch_result(result_msg.msg)
+        self.assertEqual("[1]", watch_result.value.replace(" ", "").replace("\n", ""))
+        self.assertTrue(end_msg.is_end)
+        self.assertTrue(
+            "flight_profiler.test.plugins.watch.watch_agent_test&None&echo_func&None"
+            not in global_watch_agent.aop_points
+        )
+
+    def test_watch_slow_func(self):
+        out_q = Queue(maxsize=200)
+        try:
+            loop = asyncio.get_event_loop()
+        except:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+        watch_setting = WatchArgumentParser().parse_watch_setting(
+            "flight_profiler.test.plugins.watch.watch_agent_test sleep_func"
+            " --expr args[0] --slow 20x --stack -n 1"
+        )
+        watch_setting.out_q = ServerQueue(out_q, loop)
+        global_watch_agent.add_watch(watch_setting)
+        for _ in range(TRIGGER_REFRESH):
+            sleep_func(0)
+        sleep_func(0.05)
+
+        async def get_msgs():
+            # skip wrapper injected message, then the slow call and end message
+            await out_q.get()
+            return await out_q.get(), await out_q.get()
+
+        result_msg, end_msg = loop.run_until_complete(get_msgs())
+        watch_result: WatchResult = decode_watch_result(result_msg.msg)
+        self.assertEqual("0.05", watch_result.value)
+        self.assertTrue(watch_result.cost_ms >= 50)
+        self.assertIn("test_watch_slow_func", watch_result.stack)
+        self.assertTrue(end_msg.is_end)
+
+    def test_watch_monitor_func(self):
+        out_q = Queue(maxsize=200)
+        watch_setting = WatchArgumentParser().parse_watch_setting(
+            "flight_profiler.test.plugins.watch.watch_agent_test test_func --monitor 0.2 -n 1"
+        )
+        try:
+            loop = asyncio.get_event_loop()
+        except:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+        watch_setting.out_q = ServerQueue(out_q, loop)
+        global_watch_agent.add_watch(watch_setting)
+        for _ in range(20):
+            test_func()
+
+        async def get_msgs():
+            # skip wrapper injected message, then monitor summary and end message
+            await out_q.get()
+            return await out_q.get(), await out_q.get()
+
+        summary_msg, end_msg = loop.run_until_complete(get_msgs())
+        summary: MonitorSummary = pickle.loads(summary_msg.msg)
+        self.assertTrue(isinstance(summary, MonitorSummary))
+        self.assertEqual(20, summary.count)
+        self.assertEqual(0, summary.error_count)
+        self.assertTrue(summary.percentile_ms(0.99) <= summary.max_ms)
+        self.assertTrue(end_msg.is_end)
+        self.assertTrue(
+            "flight_profiler.test.plugins.watch.watch_agent_test&None&test_func&None"
+            not in global_watch_agent.aop_points
+        )
+
+    def test_watch_pattern_group(self):
+        out_q = Queue(maxsize=200)
+        try:
+            loop = asyncio.get_event_loop()
+        except:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+        watch_settings = WatchArgumentParser().parse_watch_settings(
+            "flight_profiler.test.plugins.watch.watch_agent_test Repo get_* --expr return_obj -n 2"
+        )
+        self.assertEqual(
+            ["get_order", "get_user"], [s.method_name for s in watch_settings]
+        )
+        server_q = ServerQueue(out_q, loop)
+        for watch_setting in watch_settings:
+            watch_setting.out_q = server_q
+        global_watch_agent.add_watch_group(watch_settings)
+        repo = Repo()
+        repo.save()
+        repo.get_user()
+        repo.get_order()
+        # limit is shared by the group, exceeded calls are not watched
+        repo.get_user()
+
+        async def get_msgs():
+            # one injected message for the group, two results and one end message
+            return [await out_q.get() for _ in range(4)]
+
+        hint_msg, user_msg, order_msg, end_msg = loop.run_until_complete(get_msgs())
+        self.assertIn("2 methods", pickle.loads(hint_msg.msg))
+        self.assertEqual("\"user\"", decode_watch_result(user_msg.msg).value)
+        self.assertEqual("\"order\"", decode_watch_result(order_msg.msg).value)
+        self.assertTrue(end_msg.is_end)
+        self.assertTrue(out_q.empty())
+        for watch_setting in watch_settings:
+            self.assertTrue(watch_setting.unique_key() not in global_watch_agent.aop_points)
+        self.assertFalse(hasattr(Repo.get_user, "__wrapped__"))
+
+    def test_watch_pattern_off(self):
+        out_q = Queue(maxsize=200)
+        try:
+            loop = asyncio.get_event_loop()
+        except:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+        command = "flight_profiler.test.plugins.watch.watch_agent_test Repo.get_* --max-targets 2"
+        origin_codes = (Repo.get_user.__code__, Repo.get_order.__code__)
+        watch_settings = WatchArgumentParser().parse_watch_settings(command)
+        server_q = ServerQueue(out_q, loop)
+        for watch_setting in watch_settings:
+            watch_setting.out_q = server_q
+        global_watch_agent.add_watch_group(watch_settings)
+        self.assertIsNot(origin_codes[1], Repo.get_order.__code__)
+
+        # the pattern now matches more methods than --max-targets, off doesn't resolve
+        # it again and clears the watched group with one end message
+        Repo.get_total = lambda self: 0
+        try:
+            off_setting = WatchArgumentParser().parse_watch_setting(command)
+            global_watch_agent.clear_watch_group(off_setting)
+            hint_msg, end_msg = loop.run_until_complete(
+                asyncio.gather(out_q.get(), out_q.get())
+            )
+            self.assertTrue(end_msg.is_end)
+            self.assertTrue(out_q.empty())
+            self.assertEqual(
+                origin_codes, (Repo.get_user.__code__, Repo.get_order.__code__)
+            )
+            self.assertNotIn(off_setting.group_key(), global_watch_agent.groups)
+        finally:
+            del Repo.get_total
+
+    def test_watch_pattern_no_match(self):
+        with self.assertRaises(ValueError):
+            WatchArgumentParser().parse_watch_settings(
+                "flight_profiler.test.plugins.watch.watch_agent_test Repo delete_*"
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -36,3 +36,67 @@ class WatchParserTest(unittest.TestCase):
         self.assertEqual("args[0]['query']=='hello'", params.filter_expr)
         self.assertEqual(3 + 2, params.watch_displayer.expand_level)
         self.assertTrue(params.record_on_exception)
+
+        sample_src = "__main__ test_func --sample 0.01 --rate 5/s"
+        params = parser.parse_watch_setting(sample_src)
+        self.assertEqual(0.01, params.sample_rate)
+        self.assertEqual("5/s", params.rate_limit)
+        self.assertTrue(params.sampler.enabled)
+        self.assertIsNone(parser.parse_watch_setting(no_cls_src).sample_rate)
+
+        with self.assertRaises(Exception):
+            parser.parse_watch_setting("__main__ test_func --sample 2")
+        with self.assertRaises(Exception):
+            parser.parse_watch_setting("__main__ test_func --rate 5/d")
+
+        monitor_src = "__main__ test_func --monitor 5 -n 3"
+        params = parser.parse_watch_setting(monitor_src)
+        self.assertEqual(5.0, params.monitor_interval)
+        self.assertEqual(3, params.monitor_reporter.cycles)
+        self.assertIsNone(parser.parse_watch_setting(no_cls_src).monitor_reporter)
+
+        with self.assertRaises(Exception):
+            parser.parse_watch_setting("__main__ test_func --monitor 0")
+
+        params = parser.parse_watch_setting("__main__ test_func --overflow block")
+        self.assertEqual("block", params.overflow_policy)
+        self.assertIsNone(parser.parse_watch_setting(no_cls_src).overflow_policy)
+
+        with self.assertRaises(Exception):
+            parser.parse_watch_setting("__main__ test_func --overflow drop-all")
+
+        params = parser.parse_watch_setting("__main__ test_func --offload copy")
+        self.assertEqual("copy", params.offload)
+        self.assertIsNotNone(params.dump_worker)
+        self.assertIsNone(parser.parse_watch_setting(no_cls_src).dump_worker)
+        # monitor mode never offloads
+        params = parser.parse_watch_setting("__main__ test_func --monitor 5 --offload ref")
+        self.assertIsNone(params.dump_worker)
+
+        with self.assertRaises(Exception):
+            parser.parse_watch_setting("__main__ test_func --offload deep")
+
+        params = parser.parse_watch_setting("__main__ test_func --slow p99 --stack -n 3")
+        self.assertEqual(0.99, params.latency_trigger.quantile)
+        self.assertTrue(params.capture_stack)
+        # -n limits dumped slow calls rather than observed calls
+        self.assertEqual(3, params.max_count)
+        self.assertIsNone(parser.parse_watch_setting(no_cls_src).latency_trigger)
+
+        with self.assertRaises(Exception):
+            parser.parse_watch_setting("__main__ test_func --slow 99ms")
+        with self.assertRaises(Exception):
+            parser.parse_watch_setting("__main__ test_func --slow p99 --monitor 5")
+
+        # client side keeps patterns unresolved
+        params = parser.parse_watch_setting("myapp.* *Repo.get_* --max-targets 80")
+        self.assertEqual("myapp.*", params.module_name)
+        self.assertEqual("*Repo.get_*", params.method_name)
+        with self.assertRaises(Exception):
+            parser.parse_watch_setting("myapp.* get_* --max-targets 0")
+
+        params = parser.parse_watch_setting("__main__ test_func --output /tmp/watch.ndjson.gz")
+        self.assertEqual("/tmp/watch.ndjson.gz", params.output)
+        self.assertIsNone(parser.parse_watch_setting(no_cls_src).output)
+        with self.assertRaises(Exception):
+            parser.parse_watch_setting("__main__ test_func --output watch.txt")
@@ -0,0 +1,51 @@
+import unittest
+
+from flight_profiler.plugins.watch.watch_trigger import (
+    TRIGGER_REFRESH,
+    TRIGGER_WINDOW,
+    LatencyTrigger,
+    parse_trigger,
+)
+
+
+class WatchTriggerTest(unittest.TestCase):
+
+    def test_parse_trigger(self):
+        self.assertEqual((0.99, 1.0), parse_trigger("p99"))
+        quantile, multiplier = parse_trigger("P99.9")
+        self.assertAlmostEqual(0.999, quantile)
+        self.assertEqual(1.0, multiplier)
+        self.assertEqual((0.5, 3.0), parse_trigger("3x"))
+        for value in ("p100", "p0", "99", "0x", "slow"):
+            with self.assertRaises(ValueError):
+                parse_trigger(value)
+
+    def test_percentile_trigger(self):
+        trigger = LatencyTrigger(0.99)
+        # nothing is slow before warm up
+        self.assertFalse(trigger.observe(1000.0))
+        for i in range(TRIGGER_REFRESH * 10):
+            trigger.observe(1.0 + (i % 100) / 100)
+        self.assertFalse(trigger.observe(1.5))
+        self.assertTrue(trigger.observe(10.0))
+
+    def test_multiple_trigger(self):
+        trigger = LatencyTrigger(0.5, 3)
+        for _ in range(TRIGGER_REFRESH):
+            trigger.observe(1.0)
+        self.assertFalse(trigger.observe(2.5))
+        self.assertTrue(trigger.observe(3.5))
+
+    def test_adapt_to_load(self):
+        trigger = LatencyTrigger(0.99)
+        for _ in range(TRIGGER_WINDOW):
+            trigger.observe(1.0)
+        self.assertTrue(trigger.observe(5.0))
+        # latency of two windows ago is forgotten
+        for _ in range(TRIGGER_WINDOW * 2):
+            trigger.observe(5.0)
+        self.assertFalse(trigger.observe(5.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+from flight_profiler.plugins.watch.watch_displayer import (
+    WatchResult,
+    decode_watch_result,
+    encode_watch_result,
+)
+from flight_profiler.utils.record_file import (
+    FORMAT_BINARY,
+    FORMAT_CHROME_TRACE,
+    FORMAT_NDJSON,
+    TRACE_SUFFIX_FORMATS,
+    RecordFileWriter,
+    parse_output_path,
+    read_record_file,
+)
+
+
+def watch_records(count):
+    return [
+        encode_watch_result(
+            WatchResult(
+                method_identifier="__main__.func",
+                cost_ms=float(i),
+                start_ms=i,
+                expr="args",
+                type="tuple",
+                value=f"({i},)",
+            )
+        )
+        for i in range(count)
+    ]
+
+
+class RecordFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write(self, name, records, accept=None):
+        path = os.path.join(self.tmp_dir.name, name)
+        writer = RecordFileWriter(path, decode_watch_result, accept)
+        self.assertTrue(writer.start())
+        for record in records:
+            writer.write(record)
+        writer.close()
+        return path, writer
+
+    def test_parse_output_path(self):
+        self.assertEqual((FORMAT_NDJSON, False), parse_output_path("capture.ndjson"))
+        self.assertEqual((FORMAT_NDJSON, True), parse_output_path("/tmp/capture.jsonl.gz"))
+        self.assertEqual((FORMAT_BINARY, True), parse_output_path("capture.bin.gz"))
+        with self.assertRaises(ValueError):
+            parse_output_path("capture.txt")
+        with self.assertRaises(ValueError):
+            parse_output_path(".ndjson")
+        # chrome trace events are only written by trace
+        with self.assertRaises(ValueError):
+            parse_output_path("capture.json")
+        self.assertEqual(
+            (FORMAT_CHROME_TRACE, True),
+            parse_output_path("capture.json.gz", TRACE_SUFFIX_FORMATS),
+        )
+
+    def test_write_ndjson_gz(self):
+        path, writer = self.write("capture.ndjson.gz", watch_records(1000))
+        self.assertEqual(1000, writer.written)
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(1000, len(lines))
+        self.assertEqual("__main__.func", lines[0]["method_identifier"])
+        self.assertEqual("(999,)", lines[-1]["value"])
+
+    def test_write_binary(self):
+        records = watch_records(100)
+        path, writer = self.write(
+            "capture.bin", records, accept=lambda result: result.cost_ms >= 50
+        )
+        self.assertEqual(50, writer.written)
+        self.assertEqual(50, writer.skipped)
+        # records are kept as received, decoded by the usual decoder
+        self.assertEqual(records[50:], list(read_record_file(path)))
+        self.assertEqual(50, decode_watch_result(records[50]).start_time)
+
+    def test_write_chrome_trace(self):
+        path = os.path.join(self.tmp_dir.name, "capture.json")
+        writer = RecordFileWriter(
+            path,
+            decode_watch_result,
+            to_events=lambda result: [{"name": result.value, "ts": result.start_time}],
+        )
+        self.assertTrue(writer.start())
+        for record in watch_records(3):
+            writer.write(record)
+        writer.close()
+        with open(path, encoding="utf-8") as f:
+            events = json.load(f)
+        self.assertEqual(["(0,)", "(1,)", "(2,)"], [event["name"] for event in events])
+
+    def test_open_failed(self):
+        writer = RecordFileWriter(
+            os.path.join(self.tmp_dir.name, "missing", "capture.bin"), decode_watch_result
+        )
+        self.assertFalse(writer.start())
+        writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
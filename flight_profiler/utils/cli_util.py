@@ -3,7 +3,8 @@ import sys
 from typing import Union
 
 from flight_profiler.common.expression_result import ExpressionResult
-from flight_profiler.communication.flight_client import FlightClient
+from flight_profiler.common.wire_format import decode_drop_notice, is_drop_notice
+from flight_profiler.communication.flight_session import open_flight_client
 from flight_profiler.utils.render_util import (
     COLOR_BRIGHT_GREEN,
     COLOR_END,
@@ -33,6 +34,25 @@ def show_normal_info(msg: str) -> None:
     """
     print(f"{COLOR_WHITE_255}{msg}{COLOR_END}")
 
+
+def show_drop_notice(content: bytes) -> bool:
+    """
+    Display how many messages server dropped because client could not keep up.
+
+    Args:
+        content (bytes): Message received from server
+
+    Returns:
+        bool: True if content is a drop notice and has been displayed
+    """
+    if not is_drop_notice(content):
+        return False
+    show_error_info(
+        f"[WARN] {decode_drop_notice(content)} messages dropped, "
+        f"client can't keep up with target process."
+    )
+    return True
+
 def verify_exit_code(exit_code: int, pid: Union[int, str]) -> None:
     """
     Verify the exit code and display appropriate error messages.
@@ -72,12 +92,14 @@ def common_plugin_execute_routine(
         "param": param
     }
     try:
-        client = FlightClient(host="localhost", port=port)
+        client = open_flight_client(port)
     except:
         show_error_info("Target process exited!")
         return
     try:
         for line in client.request_stream(body):
+            if show_drop_notice(line):
+                continue
             if not expression_result:
                 if line:
                     if raw_text:
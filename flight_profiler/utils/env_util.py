@@ -2,7 +2,7 @@ import os
 import platform
 import subprocess
 import sys
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
 
 def is_linux() -> bool:
@@ -135,3 +135,61 @@ def get_current_process_uids() -> Tuple[int, int, int, int]:
 
     # Fallback to os functions
     return (os.getuid(), os.geteuid(), os.geteuid(), os.geteuid())
+
+
+def get_child_pids(pid: int) -> List[int]:
+    """
+    Get direct child processes of a process, e.g. workers forked by a gunicorn master.
+
+    Args:
+        pid (int): Parent process ID
+
+    Returns:
+        List[int]: Child process IDs in ascending order, empty if none or not supported
+    """
+    children: List[int] = []
+    if is_linux():
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat", "r") as f:
+                    stat = f.read()
+            except OSError:
+                continue
+            # comm may contain spaces and parentheses, fields restart after the last ')'
+            fields = stat[stat.rfind(")") + 2 :].split()
+            if len(fields) > 1 and int(fields[1]) == pid:
+                children.append(int(entry))
+    elif is_mac():
+        try:
+            result = subprocess.run(
+                ["pgrep", "-P", str(pid)], capture_output=True, text=True
+            )
+            children = [int(line) for line in result.stdout.split()]
+        except (OSError, ValueError):
+            pass
+    return sorted(children)
+
+
+def is_pid_namespaced(pid: int) -> bool:
+    """
+    Check if a process may see itself under another pid than ours, like a process in a
+    container seen from the host.
+
+    Args:
+        pid (int): Process ID as seen by current process
+
+    Returns:
+        bool: False only if the pid is known to be the same inside the process
+    """
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("NSpid:"):
+                    # pid in each nested namespace, the last one is seen by the process itself
+                    return int(line.split()[-1]) != pid
+    except (OSError, ValueError):
+        pass
+    # kernels before 4.1 don't report NSpid
+    return True
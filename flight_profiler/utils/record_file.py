@@ -0,0 +1,292 @@
+import argparse
+import gzip
+import io
+import json
+import queue
+import struct
+import sys
+import threading
+import time
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from flight_profiler.utils.render_util import COLOR_END, COLOR_RED, COLOR_WHITE_255
+
+# ndjson: one json object per line, records are decoded by the writer thread
+# bin: wire records as received, length prefixed, decoded later by the same decoders
+# chrome: Chrome Trace Event json array, opened by chrome://tracing and ui.perfetto.dev,
+# records are turned into events by the command, only trace supports it
+FORMAT_NDJSON = "ndjson"
+FORMAT_BINARY = "bin"
+FORMAT_CHROME_TRACE = "chrome"
+_SUFFIX_FORMATS = {
+    ".ndjson": FORMAT_NDJSON,
+    ".jsonl": FORMAT_NDJSON,
+    ".bin": FORMAT_BINARY,
+}
+TRACE_SUFFIX_FORMATS = {**_SUFFIX_FORMATS, ".json": FORMAT_CHROME_TRACE}
+GZIP_SUFFIX = ".gz"
+
+BINARY_FILE_MAGIC = b"FPREC\x01"
+_RECORD_LENGTH = struct.Struct("<I")
+
+# records waiting for writer thread, receiving blocks once full so memory stays bounded
+WRITE_QUEUE_SIZE = 65536
+WRITE_BUFFER_SIZE = 1 << 20
+GZIP_LEVEL = 6
+# seconds between two refreshes of the live counter
+PROGRESS_INTERVAL = 0.5
+
+_CLOSED = object()
+
+
+def parse_output_path(
+    path: str, suffix_formats: Optional[Dict[str, str]] = None
+) -> Tuple[str, bool]:
+    """
+    Detect file format from the suffix of output path.
+
+    Args:
+        path (str): Output path like capture.ndjson, capture.ndjson.gz or capture.bin
+        suffix_formats (Optional[Dict[str, str]]): Supported suffixes, defaults to ndjson and bin
+
+    Returns:
+        Tuple[str, bool]: (file format, whether file is gzip compressed)
+
+    Raises:
+        ValueError: if suffix is not supported
+    """
+    if suffix_formats is None:
+        suffix_formats = _SUFFIX_FORMATS
+    compressed = path.endswith(GZIP_SUFFIX)
+    name = path[: -len(GZIP_SUFFIX)] if compressed else path
+    for suffix, file_format in suffix_formats.items():
+        if name.endswith(suffix) and len(name) > len(suffix):
+            return file_format, compressed
+    suffixes = list(suffix_formats)
+    raise ValueError(
+        f"output: {path} should end with {', '.join(suffixes[:-1])} or {suffixes[-1]},"
+        f" optionally followed by .gz"
+    )
+
+
+def check_output_path(value: str) -> str:
+    """
+    argparse type of --output options.
+    """
+    try:
+        parse_output_path(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def check_trace_output_path(value: str) -> str:
+    """
+    argparse type of --output option of trace, which also writes chrome trace events.
+    """
+    try:
+        parse_output_path(value, TRACE_SUFFIX_FORMATS)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def open_record_file(path: str, mode: str) -> BinaryIO:
+    """
+    Open a buffered record file, gzip compressed if path ends with .gz.
+
+    Args:
+        path (str): File path
+        mode (str): "rb" or "wb"
+
+    Returns:
+        BinaryIO: Buffered binary stream
+    """
+    if not path.endswith(GZIP_SUFFIX):
+        return open(path, mode, buffering=WRITE_BUFFER_SIZE)
+    gzip_file = gzip.GzipFile(path, mode, compresslevel=GZIP_LEVEL)
+    # batch small records before they reach the compressor
+    if mode == "wb":
+        return io.BufferedWriter(gzip_file, WRITE_BUFFER_SIZE)
+    return io.BufferedReader(gzip_file, WRITE_BUFFER_SIZE)
+
+
+def _plain(value: Any) -> Any:
+    if hasattr(value, "__dict__"):
+        return vars(value)
+    return str(value)
+
+
+def record_to_json(record: Any) -> str:
+    """
+    Serialize a decoded record, objects are written as dicts of their attributes.
+
+    Args:
+        record (Any): Decoded record like WatchResult
+
+    Returns:
+        str: Single line json text
+    """
+    return json.dumps(record, default=_plain, ensure_ascii=False)
+
+
+def read_record_file(path: str) -> Iterator[bytes]:
+    """
+    Iterate wire records of a binary record file.
+
+    Args:
+        path (str): Path of .bin or .bin.gz file
+
+    Returns:
+        Iterator[bytes]: Wire records in received order
+
+    Raises:
+        ValueError: if file is not a record file
+    """
+    with open_record_file(path, "rb") as f:
+        if f.read(len(BINARY_FILE_MAGIC)) != BINARY_FILE_MAGIC:
+            raise ValueError(f"{path} is not a flight profiler record file.")
+        while True:
+            header = f.read(_RECORD_LENGTH.size)
+            if len(header) < _RECORD_LENGTH.size:
+                return
+            (length,) = _RECORD_LENGTH.unpack(header)
+            yield f.read(length)
+
+
+class RecordFileWriter:
+    """
+    Writes records streamed by server to a file on a background thread, so that receiving
+    never waits for decoding, compression or disk. Terminal only shows a live counter.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        decode: Callable[[bytes], Any],
+        accept: Optional[Callable[[Any], bool]] = None,
+        to_events: Optional[Callable[[Any], List[Dict[str, Any]]]] = None,
+    ):
+        """
+        Args:
+            path (str): Output path, format is detected by parse_output_path
+            decode (Callable[[bytes], Any]): Decoder of wire records, used by ndjson and accept
+            accept (Optional[Callable[[Any], bool]]): Filter of decoded records, None keeps all
+            to_events (Optional[Callable[[Any], List[Dict[str, Any]]]]): Converts decoded
+                records to chrome trace events, required by .json output
+        """
+        self.path = path
+        self.file_format, _ = parse_output_path(
+            path, TRACE_SUFFIX_FORMATS if to_events is not None else None
+        )
+        self.decode = decode
+        self.accept = accept
+        self.to_events = to_events
+        self.events_written = 0
+        self.records: queue.Queue = queue.Queue(WRITE_QUEUE_SIZE)
+        self.written = 0
+        self.skipped = 0
+        self.error: Optional[str] = None
+        self.last_progress = 0.0
+        self.file: Optional[BinaryIO] = None
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """
+        Returns:
+            bool: False if output file can't be created, reason is already displayed
+        """
+        try:
+            self.file = open_record_file(self.path, "wb")
+            if self.file_format == FORMAT_BINARY:
+                self.file.write(BINARY_FILE_MAGIC)
+            elif self.file_format == FORMAT_CHROME_TRACE:
+                self.file.write(b"[\n")
+        except OSError as e:
+            sys.stdout.write(f"{COLOR_RED}Open {self.path} failed: {e}{COLOR_END}\n")
+            return False
+        self.thread = threading.Thread(
+            target=self.__run, name="flight-profiler-record-writer", daemon=True
+        )
+        self.thread.start()
+        return True
+
+    def write(self, content: bytes) -> None:
+        if self.error is None:
+            self.records.put(content)
+        self.show_progress()
+
+    def close(self) -> None:
+        """
+        waits until received records are written, then prints final counter
+        """
+        if self.thread is None:
+            return
+        self.records.put(_CLOSED)
+        self.thread.join()
+        self.thread = None
+        self.show_progress(final=True)
+
+    def show_progress(self, final: bool = False) -> None:
+        now = time.time()
+        if not final and now - self.last_progress < PROGRESS_INTERVAL:
+            return
+        self.last_progress = now
+        text = f"\r{COLOR_WHITE_255}{self.written} records written to {self.path}"
+        if self.skipped > 0:
+            text += f", {self.skipped} skipped"
+        sys.stdout.write(text + COLOR_END)
+        if final:
+            sys.stdout.write("\n")
+            if self.error is not None:
+                sys.stdout.write(f"{COLOR_RED}Writing {self.path} failed: {self.error}{COLOR_END}\n")
+        sys.stdout.flush()
+
+    def __encode(self, content: bytes) -> Optional[bytes]:
+        record = None
+        if self.accept is not None or self.file_format != FORMAT_BINARY:
+            record = self.decode(content)
+            if self.accept is not None and not self.accept(record):
+                return None
+        if self.file_format == FORMAT_NDJSON:
+            return (record_to_json(record) + "\n").encode("utf-8", "surrogatepass")
+        if self.file_format == FORMAT_CHROME_TRACE:
+            return self.__encode_events(self.to_events(record))
+        return _RECORD_LENGTH.pack(len(content)) + content
+
+    def __encode_events(self, events: List[Dict[str, Any]]) -> bytes:
+        # events of one array are separated by commas, the array stays readable by
+        # viewers even if the closing bracket is never written
+        lines = []
+        for event in events:
+            separator = ",\n" if self.events_written > 0 else ""
+            lines.append(separator + json.dumps(event, ensure_ascii=False))
+            self.events_written += 1
+        return "".join(lines).encode("utf-8", "surrogatepass")
+
+    def __run(self) -> None:
+        records = self.records
+        f = self.file
+        try:
+            while True:
+                content = records.get()
+                if content is _CLOSED:
+                    break
+                data = self.__encode(content)
+                if data is None:
+                    self.skipped += 1
+                    continue
+                f.write(data)
+                self.written += 1
+            if self.file_format == FORMAT_CHROME_TRACE:
+                f.write(b"\n]\n")
+        except Exception as e:
+            self.error = str(e)
+            # keep draining so receiving never blocks on a dead writer
+            while records.get() is not _CLOSED:
+                pass
+        finally:
+            try:
+                f.close()
+            except Exception as e:
+                self.error = self.error or str(e)
@@ -241,3 +241,20 @@ def render_expression_result(result: ExpressionResult) -> str:
         f"{align_json_lines(left_offset + 2, value, split_internal_line=False)}{COLOR_END}"
     )
     return value_str
+
+
+def build_pattern_spy_command_hint(method_identifiers: List[str]) -> str:
+    """
+    Build a spy command hint message for a command instrumenting methods matched by a pattern.
+
+    Args:
+        method_identifiers (List[str]): Full names of instrumented methods
+
+    Returns:
+        str: Formatted spy command hint message
+    """
+    methods = "\n".join(f"  {identifier}" for identifier in method_identifiers)
+    return (
+        f"{COLOR_WHITE_255}Spy was successfully added on {len(method_identifiers)} methods"
+        f", press Ctrl-C to stop:\n{methods}{COLOR_END}"
+    )